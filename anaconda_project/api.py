@@ -218,6 +218,31 @@ class AnacondaProject(object):
                                                    command=command,
                                                    extra_command_args=extra_command_args)
 
+    def prepare_all_env_specs(self, project, environ, mode=provide.PROVIDE_MODE_DEVELOPMENT, workers=None):
+        """Prepare a project with each of its env specs.
+
+        The environments for the env specs are created or updated
+        several at a time, then the project is prepared with each
+        env spec in turn.
+
+        See ``prepare_project_locally()`` for additional details
+        that also apply to this method.
+
+        Args:
+            project (Project): from the ``load_project`` method
+            environ (dict): os.environ or the previously-prepared environ; not modified in-place
+            mode (str): one of ``PROVIDE_MODE_DEVELOPMENT``, ``PROVIDE_MODE_PRODUCTION``, ``PROVIDE_MODE_CHECK``
+            workers (int): max environments to create at once, None for ANACONDA_PROJECT_PREPARE_WORKERS or CPU count
+
+        Returns:
+            a list of results with ``env_spec_name``, ``result`` (a ``PrepareResult``) and ``seconds``
+
+        """
+        return prepare.prepare_all_env_specs_without_interaction(project=project,
+                                                                 environ=environ,
+                                                                 mode=mode,
+                                                                 workers=workers)
+
     def unprepare(self, project, prepare_result, whitelist=None):
         """Attempt to clean up project-scoped resources allocated by prepare().
 
@@ -714,17 +739,18 @@ class AnacondaProject(object):
         """
         return project_ops.clean(project=project, prepare_result=prepare_result)
 
-    def archive(self, project, filename):
+    def archive(self, project, filename, compression_level=None):
         """Make an archive of the non-ignored files in the project.
 
         Args:
             project (``Project``): the project
-            filename (str): name of a zip, tar.gz, or tar.bz2 archive file
+            filename (str): name of a zip, tar.gz, tar.bz2, or tar.xz archive file
+            compression_level (int): 0 (none) to 9 (most), or None for the default
 
         Returns:
             a ``Status``, if failed has ``errors``
         """
-        return project_ops.archive(project=project, filename=filename)
+        return project_ops.archive(project=project, filename=filename, compression_level=compression_level)
 
     def unarchive(self, filename, project_dir, parent_dir=None, frontend=None):
         """Unpack an archive of the project.
@@ -741,7 +767,7 @@ class AnacondaProject(object):
         if project_dir is None.
 
         Args:
-            filename (str): name of a zip, tar.gz, or tar.bz2 archive file
+            filename (str): name of a zip, tar.gz, tar.bz2, or tar.xz archive file
             project_dir (str): the directory to place the project inside
             parent_dir (str): directory to place project_dir within
             frontend (Frontend): frontend instance representing current UX
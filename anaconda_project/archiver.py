@@ -13,10 +13,12 @@ import errno
 import fnmatch
 import os
 import platform
+import re
 import shutil
 import subprocess
+import sys
 import tarfile
-import tempfile
+import time
 import uuid
 import zipfile
 
@@ -26,12 +28,20 @@ from anaconda_project.internal.simple_status import SimpleStatus
 from anaconda_project.internal.directory_contains import subdirectory_relative_to_directory
 from anaconda_project.internal.rename import rename_over_existing
 from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+from anaconda_project.internal import compression as compression_streams
+from anaconda_project.internal import notebook_index
+from anaconda_project.internal import solve_cache
 
 
 class _FileInfo(object):
-    def __init__(self, project_directory, filename, is_directory):
-        self.full_path = os.path.abspath(filename)
-        self.relative_path = os.path.relpath(self.full_path, start=project_directory)
+    def __init__(self, project_directory, filename, is_directory, relative_path=None):
+        if relative_path is None:
+            self.full_path = os.path.abspath(filename)
+            self.relative_path = os.path.relpath(self.full_path, start=project_directory)
+        else:
+            # the walker already knows these, and abspath/relpath add up on big trees
+            self.full_path = filename
+            self.relative_path = relative_path
         if platform.system() == 'Windows':
             self.unixified_relative_path = self.relative_path.replace("\\", "/")
         else:
@@ -40,75 +50,158 @@ class _FileInfo(object):
         self.is_directory = is_directory
 
 
+class _ListdirEntry(object):
+    """Enough of os.DirEntry for _list_project, for Pythons without os.scandir."""
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+
+def _scandir(directory):
+    scandir = getattr(os, 'scandir', None)
+    if scandir is not None:
+        # DirEntry usually knows whether it's a directory without a stat
+        return list(scandir(directory))
+    else:
+        return [_ListdirEntry(directory, name) for name in os.listdir(directory)]
+
+
 def _list_project(project_directory, ignore_filter, frontend):
+    project_directory = os.path.abspath(project_directory)
     try:
-        file_infos = []
-        for root, dirs, files in os.walk(project_directory):
-            filtered_dirs = []
-            for d in dirs:
-                info = _FileInfo(project_directory=project_directory, filename=os.path.join(root, d), is_directory=True)
-                if ignore_filter(info):
-                    continue
-                else:
-                    filtered_dirs.append(d)
-                    file_infos.append(info)
+        entries = _scandir(project_directory)
+    except OSError as e:
+        frontend.error("Could not list files in %s: %s." % (project_directory, str(e)))
+        return None
+
+    # We list directories in the same order os.walk would, so
+    # each directory's children come out together.
+    file_infos = []
+    to_visit = [('', entries)]
+    while to_visit:
+        (relative_root, entries) = to_visit.pop()
+        subdirs = []
+        files = []
+        for entry in entries:
+            relative_path = entry.name if relative_root == '' else os.path.join(relative_root, entry.name)
+            try:
+                is_directory = entry.is_dir()
+            except OSError:
+                is_directory = False
+            info = _FileInfo(project_directory=project_directory,
+                             filename=entry.path,
+                             is_directory=is_directory,
+                             relative_path=relative_path)
+            if is_directory:
+                subdirs.append((info, entry))
+            else:
+                files.append(info)
 
+        recurse_into = []
+        for (info, entry) in subdirs:
             # don't even recurse into filtered-out directories, mostly because recursing into
             # "envs" is very slow
-            dirs[:] = filtered_dirs
+            if ignore_filter(info):
+                continue
+            file_infos.append(info)
+            try:
+                # like os.walk, we don't follow symlinks to directories
+                if not entry.is_symlink():
+                    recurse_into.append(info)
+            except OSError:
+                pass
 
-            for f in files:
-                info = _FileInfo(project_directory=project_directory,
-                                 filename=os.path.join(root, f),
-                                 is_directory=False)
-                if not ignore_filter(info):
-                    file_infos.append(info)
+        for info in files:
+            if not ignore_filter(info):
+                file_infos.append(info)
 
-        return file_infos
-    except OSError as e:
-        frontend.error("Could not list files in %s: %s." % (project_directory, str(e)))
-        return None
+        for info in reversed(recurse_into):
+            try:
+                to_visit.append((info.relative_path, _scandir(info.full_path)))
+            except OSError:
+                # os.walk also skips directories it can't list
+                pass
 
+    return file_infos
+
+
+def _translate_pattern(pattern):
+    regex = fnmatch.translate(pattern)
+    # drop the end-of-string anchor (and python 2's trailing flags)
+    for suffix in ('\\Z(?ms)', '\\Z'):
+        if regex.endswith(suffix):
+            return regex[:-len(suffix)]
+    return regex  # pragma: no cover (no fnmatch we know of does this)
 
-class _FilePattern(object):
-    def __init__(self, pattern):
-        assert pattern != ''
-        # the glob string
-        self.pattern = pattern
+
+def _compile_patterns(globs):
+    """Compile globs into one regex which matches a "/"-prefixed path if any glob matches it or a parent."""
+    if len(globs) == 0:
+        return None
+    alternatives = "|".join("(?:%s)" % _translate_pattern(glob) for glob in globs)
+    # A parent is a prefix of the path which ends just before a "/"
+    # (or at the end); checking that the prefix doesn't itself end
+    # in "/" keeps us from matching the bare leading "/".
+    regex = "(?:%s)(?<=[^/])(?=/|\\Z)" % alternatives
+    flags = re.DOTALL
+    if platform.system() == 'Windows':
+        # fnmatch is case-insensitive on Windows
+        flags |= re.IGNORECASE
+    return re.compile(regex, flags)
+
+
+class _PatternMatcher(object):
+    """Matches infos against many ignore patterns at once."""
+    def __init__(self, patterns):
+        file_globs = []
+        directory_globs = []
+        for pattern in patterns:
+            if pattern.pattern.startswith("/"):
+                # we have to match the full path or one of its parents exactly
+                glob = pattern.pattern
+            else:
+                # we only have to match the end of the path (implicit "*/")
+                glob = "*/" + pattern.pattern
+            # ending with / means only match directories
+            if glob.endswith("/"):
+                directory_globs.append(glob[:-1])
+            else:
+                file_globs.append(glob)
+        self._any = _compile_patterns(file_globs)
+        self._directory_only = _compile_patterns(directory_globs)
 
     def matches(self, info):
         # Unlike .gitignore, this is a path-unaware match; fnmatch doesn't pay
         # any attention to "/" as a special character. However, on Windows, we
         # have fixed up unixified_relative_path to have / instead of \, so that
         # it will match patterns specified with /.
-        def match(path, pattern):
-            assert path.startswith("/")
-            while path != '/':
-                if fnmatch.fnmatch(path, pattern):
-                    return True
-                # this assumes that on Windows, dirname on a unixified path
-                # will do the right thing...
-                path = os.path.dirname(path)
-            return False
-
-        if self.pattern.startswith("/"):
-            # we have to match the full path or one of its parents exactly
-            pattern = self.pattern
-        else:
-            # we only have to match the end of the path (implicit "*/")
-            pattern = "*/" + self.pattern
 
         # So that */ matches even plain "foo" we need to start with /
         match_against = "/" + info.unixified_relative_path
+        if self._any is not None and self._any.match(match_against) is not None:
+            return True
+        if info.is_directory and self._directory_only is not None:
+            return self._directory_only.match(match_against) is not None
+        return False
 
-        # ending with / means only match directories
-        if pattern.endswith("/"):
-            if info.is_directory:
-                return match(match_against, pattern[:-1])
-            else:
-                return False
-        else:
-            return match(match_against, pattern)
+
+class _FilePattern(object):
+    def __init__(self, pattern):
+        assert pattern != ''
+        # the glob string
+        self.pattern = pattern
+        self._matcher = None
+
+    def matches(self, info):
+        if self._matcher is None:
+            self._matcher = _PatternMatcher([self])
+        return self._matcher.matches(info)
 
 
 def _parse_ignore_file(filename, frontend):
@@ -200,13 +293,7 @@ def _ignore_file_filter(project_directory, frontend):
     if patterns is None:
         return None
 
-    def matches_some_pattern(info):
-        for pattern in patterns:
-            if pattern.matches(info):
-                return True
-        return False
-
-    return matches_some_pattern
+    return _PatternMatcher(patterns).matches
 
 
 def _enumerate_archive_files(project_directory, frontend, requirements):
@@ -218,13 +305,7 @@ def _enumerate_archive_files(project_directory, frontend, requirements):
     plugin_patterns = set()
     for req in requirements:
         plugin_patterns = plugin_patterns.union(req.ignore_patterns)
-    plugin_patterns = [_FilePattern(s) for s in plugin_patterns]
-
-    def is_plugin_generated(info):
-        for pattern in plugin_patterns:
-            if pattern.matches(info):
-                return True
-        return False
+    is_plugin_generated = _PatternMatcher([_FilePattern(s) for s in plugin_patterns]).matches
 
     def all_filters(info):
         return git_filter(info) or ignore_file_filter(info) or is_plugin_generated(info)
@@ -251,41 +332,126 @@ def _leaf_infos(infos):
     return sorted(all_by_name.values(), key=lambda x: x.relative_path)
 
 
-def _write_tar(archive_root_name, infos, filename, compression, frontend):
-    if compression is None:
-        compression = ""
+def _write_tar(archive_root_name, infos, filename, compression, frontend, compression_level=None):
+    with compression_streams.open_for_writing(filename, compression, level=compression_level) as f:
+        with tarfile.open(fileobj=f, mode='w') as tf:
+            for info in _leaf_infos(infos):
+                arcname = os.path.join(archive_root_name, info.relative_path)
+                frontend.info("  added %s" % arcname)
+                tf.add(info.full_path, arcname=arcname)
+
+
+# compressing these again only wastes time
+_ALREADY_COMPRESSED_EXTENSIONS = ('.zip', '.gz', '.tgz', '.bz2', '.tbz2', '.xz', '.txz', '.lzma', '.zst', '.7z', '.rar',
+                                  '.whl', '.egg', '.jar', '.conda', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.mp3',
+                                  '.mp4', '.m4a', '.ogg', '.avi', '.mov', '.mkv', '.pdf', '.parquet', '.h5')
+
+
+def _zip_compress_type(info, compression_level):
+    if compression_level is None or compression_level == 0:
+        return zipfile.ZIP_STORED
+    elif info.basename.lower().endswith(_ALREADY_COMPRESSED_EXTENSIONS):
+        return zipfile.ZIP_STORED
     else:
-        compression = ":" + compression
-    with tarfile.open(filename, ('w%s' % compression)) as tf:
-        for info in _leaf_infos(infos):
-            arcname = os.path.join(archive_root_name, info.relative_path)
-            frontend.info("  added %s" % arcname)
-            tf.add(info.full_path, arcname=arcname)
+        return zipfile.ZIP_DEFLATED
 
 
-def _write_zip(archive_root_name, infos, filename, frontend):
+def _write_zip(archive_root_name, infos, filename, frontend, compression_level=None):
     with zipfile.ZipFile(filename, 'w') as zf:
+        if compression_level is not None and sys.version_info >= (3, 7):
+            # older zipfile always uses zlib's default level
+            zf.compresslevel = compression_level
         for info in _leaf_infos(infos):
             arcname = os.path.join(archive_root_name, info.relative_path)
             frontend.info("  added %s" % arcname)
-            zf.write(info.full_path, arcname=arcname)
+            zf.write(info.full_path, arcname=arcname, compress_type=_zip_compress_type(info, compression_level))
+
+
+def _git_check_ignored(project_directory, relative_paths, frontend):
+    if len(relative_paths) == 0 or not os.path.exists(os.path.join(project_directory, ".git")):
+        return set()
+
+    # Unlike 'git ls-files --others', this only looks at the paths
+    # we give it, rather than every untracked file in the project.
+    # Like ls-files, it doesn't count tracked files as ignored.
+    try:
+        process = logged_subprocess.Popen(['git', 'check-ignore', '--stdin', '-z'],
+                                          cwd=project_directory,
+                                          stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.PIPE)
+        (out, err) = process.communicate("".join(path + "\0" for path in relative_paths).encode('utf-8'))
+    except OSError as e:
+        frontend.error("Failed to run 'git check-ignore'; %s" % str(e))
+        return None
+    # 1 means nothing was ignored
+    if process.returncode not in (0, 1):
+        message = err.decode('utf-8').replace("\n", " ")
+        frontend.error("'git check-ignore' failed to check ignored files: %s." % (message))
+        return None
+    return set(path for path in out.decode('utf-8').split("\0") if path != '')
+
+
+_notebook_index = None
+
+
+def _get_notebook_index():
+    global _notebook_index
+
+    if os.environ.get('ANACONDA_PROJECT_DISABLE_NOTEBOOK_INDEX', '') != '':
+        directory = None
+    else:
+        directory = (os.environ.get('ANACONDA_PROJECT_NOTEBOOK_INDEX_DIR', '')
+                     or solve_cache.default_directory("notebooks"))
+    if _notebook_index is None or _notebook_index.directory != directory:
+        _notebook_index = notebook_index.NotebookIndex(directory)
+    return _notebook_index
 
 
 # function exported for project.py
-def _list_relative_paths_for_unignored_project_files(project_directory, frontend, requirements):
-    infos = _enumerate_archive_files(project_directory, frontend, requirements=requirements)
-    if infos is None:
+def _list_unignored_notebooks(project_directory, frontend, requirements):
+    """List the notebooks we'd put in an archive, with "/" separators, except top-level hidden ones.
+
+    This finds the same notebooks as _enumerate_archive_files, but it
+    only lists directories that changed since the last time.
+    """
+    ignore_file_filter = _ignore_file_filter(project_directory, frontend)
+    if ignore_file_filter is None:
+        return None
+
+    plugin_patterns = set()
+    for req in requirements:
+        plugin_patterns = plugin_patterns.union(req.ignore_patterns)
+    is_plugin_generated = _PatternMatcher([_FilePattern(s) for s in plugin_patterns]).matches
+
+    def is_ignored(relative_path, is_directory):
+        native_path = relative_path.replace("/", os.sep)
+        info = _FileInfo(project_directory=project_directory,
+                         filename=os.path.join(project_directory, native_path),
+                         is_directory=is_directory,
+                         relative_path=native_path)
+        return ignore_file_filter(info) or is_plugin_generated(info)
+
+    try:
+        notebooks = _get_notebook_index().find(project_directory, is_ignored, _scandir)
+    except OSError as e:
+        frontend.error("Could not list files in %s: %s." % (os.path.abspath(project_directory), str(e)))
+        return None
+
+    git_ignored = _git_check_ignored(project_directory, notebooks, frontend)
+    if git_ignored is None:
         return None
-    return [info.relative_path for info in infos]
+    return [path for path in notebooks if path not in git_ignored]
 
 
 # function exported for project_ops.py
-def _archive_project(project, filename):
+def _archive_project(project, filename, compression_level=None):
     """Make an archive of the non-ignored files in the project.
 
     Args:
         project (``Project``): the project
         filename (str): name for the new zip or tar.gz archive file
+        compression_level (int): 0-9, or None for the default (zips are not compressed by default)
 
     Returns:
         a ``Status``, if failed has ``errors``
@@ -308,6 +474,12 @@ def _archive_project(project, filename):
         frontend.error("%s has been modified but not saved." % project.project_file.basename)
         return SimpleStatus(success=False, description="Can't create an archive.", errors=frontend.pop_errors())
 
+    if compression_level is not None and (compression_level < compression_streams.MIN_LEVEL
+                                          or compression_level > compression_streams.MAX_LEVEL):
+        frontend.error("Compression level must be from %d to %d, not %d." %
+                       (compression_streams.MIN_LEVEL, compression_streams.MAX_LEVEL, compression_level))
+        return SimpleStatus(success=False, description="Can't create an archive.", errors=frontend.pop_errors())
+
     infos = _enumerate_archive_files(project.directory_path,
                                      frontend,
                                      requirements=project.union_of_requirements_for_all_envs)
@@ -325,17 +497,34 @@ def _archive_project(project, filename):
     tmp_filename = filename + ".tmp-" + str(uuid.uuid4())
     try:
         if filename.lower().endswith(".zip"):
-            _write_zip(project.name, infos, tmp_filename, frontend)
+            _write_zip(project.name, infos, tmp_filename, frontend, compression_level=compression_level)
         elif filename.lower().endswith(".tar.gz"):
-            _write_tar(project.name, infos, tmp_filename, compression="gz", frontend=frontend)
+            _write_tar(project.name,
+                       infos,
+                       tmp_filename,
+                       compression="gz",
+                       frontend=frontend,
+                       compression_level=compression_level)
         elif filename.lower().endswith(".tar.bz2"):
-            _write_tar(project.name, infos, tmp_filename, compression="bz2", frontend=frontend)
+            _write_tar(project.name,
+                       infos,
+                       tmp_filename,
+                       compression="bz2",
+                       frontend=frontend,
+                       compression_level=compression_level)
+        elif filename.lower().endswith(".tar.xz") and compression_streams.method_available('xz'):
+            _write_tar(project.name,
+                       infos,
+                       tmp_filename,
+                       compression="xz",
+                       frontend=frontend,
+                       compression_level=compression_level)
         elif filename.lower().endswith(".tar"):
             _write_tar(project.name, infos, tmp_filename, compression=None, frontend=frontend)
         else:
             frontend.error("Unsupported archive filename %s." % (filename))
             return SimpleStatus(success=False,
-                                description="Project archive filename must be a .zip, .tar.gz, or .tar.bz2.",
+                                description="Project archive filename must be a .zip, .tar.gz, .tar.bz2, or .tar.xz.",
                                 errors=frontend.pop_errors())
         rename_over_existing(tmp_filename, filename)
     except IOError as e:
@@ -364,62 +553,84 @@ def _archive_project(project, filename):
     return SimpleStatus(success=True, description=("Created project archive %s" % filename))
 
 
-def _list_files_zip(zip_path):
-    with zipfile.ZipFile(zip_path, mode='r') as zf:
-        return sorted(zf.namelist())
+# big enough that each read and write is one system call for most files
+_UNPACK_BUFFER_SIZE = 1024 * 1024
 
 
-def _list_files_tar(tar_path):
-    with tarfile.open(tar_path, mode='r') as tf:
-        # we don't want links or block devices or anything weird, they could be a security problem
-        return sorted([member.name for member in tf.getmembers() if member.isreg() or member.isdir()])
+class _UnpackStats(object):
+    def __init__(self):
+        self.files = 0
+        self.size = 0
+        self.start = time.time()
 
+    def describe(self):
+        seconds = time.time() - self.start
+        megabytes = self.size / (1024.0 * 1024.0)
+        rate = megabytes / max(seconds, 0.001)
+        return "Unpacked %d files (%.1f MB) in %.1f seconds (%.1f MB/s)." % (self.files, megabytes, seconds, rate)
 
-def _extract_files_zip(zip_path, src_and_dest, frontend):
-    # the zipfile API has no way to extract to a filename of
-    # our choice, so we have to unpack to a temporary location,
-    # then copy those files over.
-    tmpdir = tempfile.mkdtemp()
-    try:
-        with zipfile.ZipFile(zip_path, mode='r') as zf:
-            zf.extractall(tmpdir)
-            for (src, dest) in src_and_dest:
-                frontend.info("Unpacking %s to %s" % (src, dest))
-                src_path = os.path.join(tmpdir, src)
-                if os.path.isdir(src_path):
-                    makedirs_ok_if_exists(dest)
-                    shutil.copystat(src_path, dest)
-                else:
-                    makedirs_ok_if_exists(os.path.dirname(dest))
-                    shutil.copy2(src_path, dest)
-    finally:
-        try:
-            shutil.rmtree(tmpdir)
-        except (IOError, OSError):
-            pass
 
+def _open_zip(zip_path):
+    return zipfile.ZipFile(zip_path, mode='r')
 
-def _extract_files_tar(tar_path, src_and_dest, frontend):
-    with tarfile.open(tar_path, mode='r') as tf:
-        for (src, dest) in src_and_dest:
-            frontend.info("Unpacking %s to %s" % (src, dest))
-            member = tf.getmember(src)
-            # we could also use tf._extract_member here, but the
-            # solution below with only the public API isn't that
-            # bad.
-            if member.isreg():
-                makedirs_ok_if_exists(os.path.dirname(dest))
-                tf.makefile(member, dest)
-            else:
-                assert member.isdir()  # we filtered out other types
-                makedirs_ok_if_exists(dest)
 
-            try:
-                tf.chown(member, dest, False)  # pragma: no cover (python 3.5 has another param)
-            except TypeError:  # pragma: no cover
-                tf.chown(member, dest)  # pragma: no cover (python 2.7, 3.4)
-            tf.chmod(member, dest)
-            tf.utime(member, dest)
+def _open_tar(tar_path):
+    return tarfile.open(tar_path, mode='r')
+
+
+def _list_files_zip(zf):
+    return sorted(zf.namelist())
+
+
+def _list_files_tar(tf):
+    # we don't want links or block devices or anything weird, they could be a security problem
+    return sorted([member.name for member in tf.getmembers() if member.isreg() or member.isdir()])
+
+
+def _extract_files_zip(zf, src_and_dest, frontend):
+    # We write each member straight to where it goes, rather
+    # than using extractall() on a temporary directory and
+    # copying from there, so each byte is only written once.
+    stats = _UnpackStats()
+    for (src, dest) in src_and_dest:
+        frontend.info("Unpacking %s to %s" % (src, dest))
+        info = zf.getinfo(src)
+        if src.endswith('/'):
+            makedirs_ok_if_exists(dest)
+        else:
+            makedirs_ok_if_exists(os.path.dirname(dest))
+            with zf.open(info) as source:
+                with open(dest, 'wb') as f:
+                    shutil.copyfileobj(source, f, _UNPACK_BUFFER_SIZE)
+            stats.files += 1
+            stats.size += info.file_size
+    frontend.info(stats.describe())
+
+
+def _extract_files_tar(tf, src_and_dest, frontend):
+    stats = _UnpackStats()
+    for (src, dest) in src_and_dest:
+        frontend.info("Unpacking %s to %s" % (src, dest))
+        member = tf.getmember(src)
+        # we could also use tf._extract_member here, but the
+        # solution below with only the public API isn't that
+        # bad.
+        if member.isreg():
+            makedirs_ok_if_exists(os.path.dirname(dest))
+            tf.makefile(member, dest)
+            stats.files += 1
+            stats.size += member.size
+        else:
+            assert member.isdir()  # we filtered out other types
+            makedirs_ok_if_exists(dest)
+
+        try:
+            tf.chown(member, dest, False)  # pragma: no cover (python 3.5 has another param)
+        except TypeError:  # pragma: no cover
+            tf.chown(member, dest)  # pragma: no cover (python 2.7, 3.4)
+        tf.chmod(member, dest)
+        tf.utime(member, dest)
+    frontend.info(stats.describe())
 
 
 def _split_after_first(path):
@@ -441,9 +652,9 @@ def _split_after_first(path):
     return _helper(path, None)
 
 
-def _get_source_and_dest_files(archive_path, list_files, project_dir, parent_dir, frontend):
+def _get_source_and_dest_files(archive, list_files, project_dir, parent_dir, frontend):
 
-    names = list_files(archive_path)
+    names = list_files(archive)
     if len(names) == 0:
         frontend.error("A valid project archive must contain at least one file.")
         return None
@@ -533,45 +744,52 @@ def _unarchive_project(archive_filename, project_dir, frontend, parent_dir=None)
 
     frontend = _new_error_recorder(frontend)
 
+    open_archive = None
     list_files = None
     extract_files = None
     if archive_filename.endswith(".zip"):
+        open_archive = _open_zip
         list_files = _list_files_zip
         extract_files = _extract_files_zip
-    elif any([archive_filename.endswith(suffix) for suffix in [".tar", ".tar.gz", ".tar.bz2"]]):
+    elif any([archive_filename.endswith(suffix) for suffix in [".tar", ".tar.gz", ".tar.bz2", ".tar.xz"]]):
+        open_archive = _open_tar
         list_files = _list_files_tar
         extract_files = _extract_files_tar
     else:
-        frontend.error("Unsupported archive filename %s, must be a .zip, .tar.gz, or .tar.bz2" % (archive_filename))
+        frontend.error("Unsupported archive filename %s, must be a .zip, .tar.gz, .tar.bz2, or .tar.xz" %
+                       (archive_filename))
         return SimpleStatus(success=False,
                             description=("Could not unpack archive %s" % archive_filename),
                             errors=frontend.pop_errors())
 
     try:
-        result = _get_source_and_dest_files(archive_filename, list_files, project_dir, parent_dir, frontend)
-        if result is None:
-            return SimpleStatus(success=False,
-                                description=("Could not unpack archive %s" % archive_filename),
-                                errors=frontend.pop_errors())
-        (canonical_project_dir, src_and_dest) = result
-
-        if len(src_and_dest) == 0:
-            frontend.error("Archive does not contain a project directory or is empty.")
-            return SimpleStatus(success=False,
-                                description=("Could not unpack archive %s" % archive_filename),
-                                errors=frontend.pop_errors())
+        # we only open (and for compressed tars, decompress) the archive once
+        # for both listing and extracting
+        with open_archive(archive_filename) as archive:
+            result = _get_source_and_dest_files(archive, list_files, project_dir, parent_dir, frontend)
+            if result is None:
+                return SimpleStatus(success=False,
+                                    description=("Could not unpack archive %s" % archive_filename),
+                                    errors=frontend.pop_errors())
+            (canonical_project_dir, src_and_dest) = result
+
+            if len(src_and_dest) == 0:
+                frontend.error("Archive does not contain a project directory or is empty.")
+                return SimpleStatus(success=False,
+                                    description=("Could not unpack archive %s" % archive_filename),
+                                    errors=frontend.pop_errors())
+
+            assert not os.path.exists(canonical_project_dir)
+            os.makedirs(canonical_project_dir)
 
-        assert not os.path.exists(canonical_project_dir)
-        os.makedirs(canonical_project_dir)
-
-        try:
-            extract_files(archive_filename, src_and_dest, frontend)
-        except Exception as e:
             try:
-                shutil.rmtree(canonical_project_dir)
-            except (IOError, OSError):
-                pass
-            raise e
+                extract_files(archive, src_and_dest, frontend)
+            except Exception as e:
+                try:
+                    shutil.rmtree(canonical_project_dir)
+                except (IOError, OSError):
+                    pass
+                raise e
 
         return _UnarchiveStatus(success=True,
                                 description=("Project archive unpacked to %s." % canonical_project_dir),
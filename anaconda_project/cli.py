@@ -8,9 +8,13 @@
 """The ``main`` function chooses and runs a subcommand."""
 from __future__ import absolute_import, print_function
 
+import os
+import sys
+
 # the point of this file is to make the internal main() into a public
 # entry point.
-import anaconda_project.internal.cli.main as cli_main
+from anaconda_project.internal.cli.run_with_daemon import exec_with_daemon
+from anaconda_project.internal.cli.run_with_snapshot import exec_with_snapshot
 
 
 def main():
@@ -18,4 +22,10 @@ def main():
 
     Conda expects us to take no args and return an exit code.
     """
+    # before importing the rest of the tool, since skipping that is
+    # what the daemon and the snapshots are for
+    exec_with_daemon(sys.argv, os.environ)
+    exec_with_snapshot(sys.argv, os.environ)
+
+    import anaconda_project.internal.cli.main as cli_main
     return cli_main.main()
@@ -15,6 +15,7 @@ import difflib
 from anaconda_project.yaml_file import (_CommentedMap, _CommentedSeq, _block_style_all_nodes)
 from anaconda_project.internal.metaclass import with_metaclass
 from anaconda_project.internal import conda_api
+from anaconda_project.internal import parallel
 from anaconda_project.env_spec import _combine_conda_package_lists
 
 _conda_manager_classes = []
@@ -45,6 +46,14 @@ def new_conda_manager(frontend=None):
     return klass(frontend=frontend)
 
 
+def solve_worker_count():
+    """Max number of conda dependency solves to run at once.
+
+    Configured with the ANACONDA_PROJECT_SOLVE_WORKERS environment variable.
+    """
+    return parallel.worker_count_from_environment('ANACONDA_PROJECT_SOLVE_WORKERS')
+
+
 class CondaManagerError(Exception):
     """General Conda error."""
 
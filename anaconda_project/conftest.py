@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import os
+
+import pytest
+
+# each of these caches defaults to a directory under the user's
+# cache directory, which tests must not fill up (the YAML cache and
+# run snapshots even contain values from the test projects)
+_CACHE_DIR_VARIABLES = ('ANACONDA_PROJECT_YAML_CACHE_DIR', 'ANACONDA_PROJECT_RUN_SNAPSHOT_DIR',
+                        'ANACONDA_PROJECT_SOLVE_CACHE_DIR', 'ANACONDA_PROJECT_INSTALLED_CACHE_DIR',
+                        'ANACONDA_PROJECT_NOTEBOOK_INDEX_DIR')
+
+
+@pytest.fixture(autouse=True)
+def _isolate_caches(tmpdir_factory):
+    # we don't use the monkeypatch fixture, because some tests
+    # call monkeypatch.undo() and that would undo this too
+    caches = str(tmpdir_factory.mktemp("caches"))
+    saved = dict((name, os.environ.get(name)) for name in _CACHE_DIR_VARIABLES)
+    for name in _CACHE_DIR_VARIABLES:
+        os.environ[name] = os.path.join(caches, name.lower())
+    yield
+    for (name, value) in saved.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
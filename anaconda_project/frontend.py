@@ -134,3 +134,28 @@ class _ErrorRecordingFrontendProxy(Frontend):
 
 def _new_error_recorder(frontend):
     return _ErrorRecordingFrontendProxy(frontend)
+
+
+class _BufferedFrontend(Frontend):
+    """Hold on to messages from background work so they can be shown in order later."""
+    def __init__(self):
+        super(_BufferedFrontend, self).__init__()
+        self._messages = []
+
+    def info(self, message):
+        """Log an info-level message."""
+        self._messages.append((True, message))
+
+    def error(self, message):
+        """Log an error-level message."""
+        self._messages.append((False, message))
+
+    def replay(self, frontend):
+        """Send our messages on to another frontend and forget them."""
+        messages = self._messages
+        self._messages = []
+        for (is_info, message) in messages:
+            if is_info:
+                frontend.info(message)
+            else:
+                frontend.error(message)
@@ -13,14 +13,14 @@ from anaconda_project.internal.cli import console_utils
 import anaconda_project.project_ops as project_ops
 
 
-def archive_command(project_dir, archive_filename):
+def archive_command(project_dir, archive_filename, compression_level=None):
     """Make an archive of the project.
 
     Returns:
         exit code
     """
     project = load_project(project_dir)
-    status = project_ops.archive(project, archive_filename)
+    status = project_ops.archive(project, archive_filename, compression_level=compression_level)
     if status:
         print(status.status_description)
         return 0
@@ -31,4 +31,4 @@ def archive_command(project_dir, archive_filename):
 
 def main(args):
     """Start the archive command and return exit status code."""
-    return archive_command(args.directory, args.filename)
+    return archive_command(args.directory, args.filename, args.compression_level)
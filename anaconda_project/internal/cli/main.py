@@ -8,34 +8,36 @@
 """The ``main`` function chooses and runs a subcommand."""
 from __future__ import absolute_import, print_function
 
+import importlib
 import logging
 import os
 import sys
 from argparse import ArgumentParser, REMAINDER
 
-from anaconda_project.internal.cli.prepare_with_mode import (UI_MODE_TEXT_ASK_QUESTIONS,
-                                                             UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK, _all_ui_modes)
+from anaconda_project.internal.cli.ui_modes import (UI_MODE_TEXT_ASK_QUESTIONS,
+                                                    UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK, _all_ui_modes)
 from anaconda_project import __version__ as version
 from anaconda_project.verbose import push_verbose_logger, pop_verbose_logger
-from anaconda_project.project import ALL_COMMAND_TYPES
+from anaconda_project.internal.command_types import ALL_COMMAND_TYPES
 from anaconda_project.requirements_registry.registry import RequirementsRegistry
 from anaconda_project.requirements_registry.requirements.download import _hash_algorithms
 import anaconda_project
 from anaconda_project.internal.cli.bug_handler import handle_bugs
-import anaconda_project.internal.cli.init as init
-import anaconda_project.internal.cli.run as run
-import anaconda_project.internal.cli.prepare as prepare
-import anaconda_project.internal.cli.clean as clean
-import anaconda_project.internal.cli.archive as archive
-import anaconda_project.internal.cli.unarchive as unarchive
-import anaconda_project.internal.cli.upload as upload
-import anaconda_project.internal.cli.download as download
-import anaconda_project.internal.cli.activate as activate
-import anaconda_project.internal.cli.variable_commands as variable_commands
-import anaconda_project.internal.cli.download_commands as download_commands
-import anaconda_project.internal.cli.service_commands as service_commands
-import anaconda_project.internal.cli.environment_commands as environment_commands
-import anaconda_project.internal.cli.command_commands as command_commands
+
+
+def _subcommand(module_name, function_name='main'):
+    """Get a main function for a subcommand that imports its module when called.
+
+    Importing every subcommand module up front would import nearly
+    all of anaconda_project and its dependencies (requests,
+    binstar_client, tornado...) before we even know which
+    subcommand we're running.
+    """
+    def main(args):
+        module = importlib.import_module('anaconda_project.internal.cli.' + module_name)
+        return getattr(module, function_name)(args)
+
+    return main
 
 
 def _parse_args_and_run_subcommand(argv):
@@ -94,7 +96,7 @@ def _parse_args_and_run_subcommand(argv):
                         help="Do not add the default package set to the environment.",
                         default=None)
     preset.add_argument('-y', '--yes', action='store_true', help="Assume yes to all confirmation prompts", default=None)
-    preset.set_defaults(main=init.main)
+    preset.set_defaults(main=_subcommand('init'))
 
     preset = subparsers.add_parser('run', help="Run the project, setting up requirements first")
     add_prepare_args(preset, include_command=False)
@@ -104,37 +106,60 @@ def _parse_args_and_run_subcommand(argv):
                         nargs='?',
                         help="A command name from anaconda-project.yml")
     preset.add_argument('extra_args_for_command', metavar='EXTRA_ARGS_FOR_COMMAND', default=None, nargs=REMAINDER)
-    preset.set_defaults(main=run.main)
+    preset.set_defaults(main=_subcommand('run'))
 
     preset = subparsers.add_parser('prepare', help="Set up the project requirements, but does not run the project")
     preset.add_argument('--all', action='store_true', help="Prepare all environments", default=None)
+    preset.add_argument('--all-env-specs',
+                        action='store_true',
+                        help=("Prepare all environments, creating several at once "
+                              "(at most ANACONDA_PROJECT_PREPARE_WORKERS), and report how long each took"),
+                        default=None)
     preset.add_argument('--refresh', action='store_true', help='Remove and recreate the environment', default=None)
+    preset.add_argument('--verify-downloads',
+                        action='store_true',
+                        help='Check the checksums of downloaded files, downloading them again if they do not match',
+                        default=None)
     add_prepare_args(preset)
-    preset.set_defaults(main=prepare.main)
+    preset.set_defaults(main=_subcommand('prepare'))
+
+    preset = subparsers.add_parser('daemon', help="Keep projects prepared so that 'run' starts commands quickly")
+    preset.add_argument('--socket',
+                        metavar='SOCKET_PATH',
+                        default=None,
+                        help="Unix socket to listen on (defaults to $ANACONDA_PROJECT_DAEMON_SOCKET)")
+    preset.set_defaults(main=_subcommand('prepare_daemon'))
 
     preset = subparsers.add_parser('clean',
                                    help="Removes generated state (stops services, deletes environment files, etc)")
     add_directory_arg(preset)
-    preset.set_defaults(main=clean.main)
+    preset.set_defaults(main=_subcommand('clean'))
 
     if not anaconda_project._beta_test_mode:
         preset = subparsers.add_parser('activate',
                                        help="Set up the project and output shell export commands reflecting the setup")
         add_prepare_args(preset)
-        preset.set_defaults(main=activate.main)
+        preset.set_defaults(main=_subcommand('activate'))
 
     preset = subparsers.add_parser('archive',
-                                   help="Create a .zip, .tar.gz, or .tar.bz2 archive with project files in it")
+                                   help="Create a .zip, .tar.gz, .tar.bz2, or .tar.xz archive with project files in it")
     add_directory_arg(preset)
     preset.add_argument('filename', metavar='ARCHIVE_FILENAME')
-    preset.set_defaults(main=archive.main)
+    preset.add_argument('--compression-level',
+                        metavar='LEVEL',
+                        type=int,
+                        choices=range(0, 10),
+                        default=None,
+                        help='Compression level from 0 (store only) to 9 (smallest); zip files are not compressed '
+                        'unless this is given')
+    preset.set_defaults(main=_subcommand('archive'))
 
     preset = subparsers.add_parser('unarchive',
-                                   help="Unpack a .zip, .tar.gz, or .tar.bz2 archive with project files in it")
+                                   help="Unpack a .zip, .tar.gz, .tar.bz2, or .tar.xz archive with project files in it")
     preset.add_argument('filename', metavar='ARCHIVE_FILENAME')
     preset.add_argument('directory', metavar='DESTINATION_DIRECTORY', default=None, nargs='?')
 
-    preset.set_defaults(main=unarchive.main)
+    preset.set_defaults(main=_subcommand('unarchive'))
 
     preset = subparsers.add_parser('upload', help="Upload the project to Anaconda Cloud")
     add_directory_arg(preset)
@@ -147,7 +172,7 @@ def _parse_args_and_run_subcommand(argv):
                         help='Project archive suffix (.tar.gz, .tar.bz2, .zip)',
                         default='.tar.bz2',
                         choices=['.tar.gz', '.tar.bz2', '.zip'])
-    preset.set_defaults(main=upload.main)
+    preset.set_defaults(main=_subcommand('upload'))
 
     preset = subparsers.add_parser('download', help="Download the project from Anaconda Cloud")
     add_directory_arg(preset)
@@ -163,7 +188,7 @@ def _parse_args_and_run_subcommand(argv):
     preset.add_argument('-s', '--site', metavar='SITE', help='Select site to use')
     preset.add_argument('-t', '--token', metavar='TOKEN', help='Auth token or a path to a file containing a token')
     preset.add_argument('-u', '--user', metavar='USERNAME', help='User account, defaults to the current user')
-    preset.set_defaults(main=download.main)
+    preset.set_defaults(main=_subcommand('download'))
 
     preset = subparsers.add_parser('add-variable', help="Add a required environment variable to the project")
     add_env_spec_arg(preset)
@@ -173,32 +198,32 @@ def _parse_args_and_run_subcommand(argv):
                         default=None,
                         help='Default value if environment variable is unset')
     add_directory_arg(preset)
-    preset.set_defaults(main=variable_commands.main_add)
+    preset.set_defaults(main=_subcommand('variable_commands', 'main_add'))
 
     preset = subparsers.add_parser('remove-variable', help="Remove an environment variable from the project")
     add_env_spec_arg(preset)
     add_directory_arg(preset)
     preset.add_argument('vars_to_remove', metavar='VARS_TO_REMOVE', default=None, nargs=REMAINDER)
-    preset.set_defaults(main=variable_commands.main_remove)
+    preset.set_defaults(main=_subcommand('variable_commands', 'main_remove'))
 
     preset = subparsers.add_parser('list-variables', help="List all variables on the project")
     add_env_spec_arg(preset)
     add_directory_arg(preset)
-    preset.set_defaults(main=variable_commands.main_list)
+    preset.set_defaults(main=_subcommand('variable_commands', 'main_list'))
 
     preset = subparsers.add_parser('set-variable',
                                    help="Set an environment variable value in anaconda-project-local.yml")
     add_env_spec_arg(preset)
     preset.add_argument('vars_and_values', metavar='VARS_AND_VALUES', default=None, nargs=REMAINDER)
     add_directory_arg(preset)
-    preset.set_defaults(main=variable_commands.main_set)
+    preset.set_defaults(main=_subcommand('variable_commands', 'main_set'))
 
     preset = subparsers.add_parser('unset-variable',
                                    help="Unset an environment variable value from anaconda-project-local.yml")
     add_env_spec_arg(preset)
     add_directory_arg(preset)
     preset.add_argument('vars_to_unset', metavar='VARS_TO_UNSET', default=None, nargs=REMAINDER)
-    preset.set_defaults(main=variable_commands.main_unset)
+    preset.set_defaults(main=_subcommand('variable_commands', 'main_unset'))
 
     preset = subparsers.add_parser('add-download', help="Add a URL to be downloaded before running commands")
     add_directory_arg(preset)
@@ -211,18 +236,18 @@ def _parse_args_and_run_subcommand(argv):
                         default=None,
                         choices=_hash_algorithms)
     preset.add_argument('--hash-value', help="The expected checksum hash of the downloaded file", default=None)
-    preset.set_defaults(main=download_commands.main_add)
+    preset.set_defaults(main=_subcommand('download_commands', 'main_add'))
 
     preset = subparsers.add_parser('remove-download', help="Remove a download from the project and from the filesystem")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
     preset.add_argument('filename_variable', metavar='ENV_VAR_FOR_FILENAME', default=None)
-    preset.set_defaults(main=download_commands.main_remove)
+    preset.set_defaults(main=_subcommand('download_commands', 'main_remove'))
 
     preset = subparsers.add_parser('list-downloads', help="List all downloads on the project")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
-    preset.set_defaults(main=download_commands.main_list)
+    preset.set_defaults(main=_subcommand('download_commands', 'main_list'))
 
     service_types = RequirementsRegistry().list_service_types()
     service_choices = list(map(lambda s: s.name, service_types))
@@ -235,18 +260,18 @@ def _parse_args_and_run_subcommand(argv):
     add_env_spec_arg(preset)
     add_service_variable_name(preset)
     preset.add_argument('service_type', metavar='SERVICE_TYPE', default=None, choices=service_choices)
-    preset.set_defaults(main=service_commands.main_add)
+    preset.set_defaults(main=_subcommand('service_commands', 'main_add'))
 
     preset = subparsers.add_parser('remove-service', help="Remove a service from the project")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
     preset.add_argument('variable', metavar='SERVICE_REFERENCE', default=None)
-    preset.set_defaults(main=service_commands.main_remove)
+    preset.set_defaults(main=_subcommand('service_commands', 'main_remove'))
 
     preset = subparsers.add_parser('list-services', help="List services present in the project")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
-    preset.set_defaults(main=service_commands.main_list)
+    preset.set_defaults(main=_subcommand('service_commands', 'main_list'))
 
     def add_package_args(preset):
         preset.add_argument('-c',
@@ -260,54 +285,54 @@ def _parse_args_and_run_subcommand(argv):
     add_directory_arg(preset)
     add_package_args(preset)
     add_env_spec_name_arg(preset, required=True)
-    preset.set_defaults(main=environment_commands.main_add)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_add'))
 
     preset = subparsers.add_parser('remove-env-spec', help="Remove an environment spec from the project")
     add_directory_arg(preset)
     add_env_spec_name_arg(preset, required=True)
-    preset.set_defaults(main=environment_commands.main_remove)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_remove'))
 
     preset = subparsers.add_parser('list-env-specs', help="List all environment specs for the project")
     add_directory_arg(preset)
-    preset.set_defaults(main=environment_commands.main_list_env_specs)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_list_env_specs'))
 
     preset = subparsers.add_parser('export-env-spec', help="Save an environment spec as a conda environment file")
     add_directory_arg(preset)
     add_env_spec_name_arg(preset, required=False)
     preset.add_argument('filename', metavar='ENVIRONMENT_FILE')
-    preset.set_defaults(main=environment_commands.main_export)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_export'))
 
     preset = subparsers.add_parser('lock', help="Lock all packages at their current versions")
     add_directory_arg(preset)
     add_env_spec_name_arg(preset, required=False)
-    preset.set_defaults(main=environment_commands.main_lock)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_lock'))
 
     preset = subparsers.add_parser('unlock', help="Remove locked package versions")
     add_directory_arg(preset)
     add_env_spec_name_arg(preset, required=False)
-    preset.set_defaults(main=environment_commands.main_unlock)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_unlock'))
 
     preset = subparsers.add_parser('update', help="Update all packages to their latest versions")
     add_directory_arg(preset)
     add_env_spec_name_arg(preset, required=False)
-    preset.set_defaults(main=environment_commands.main_update)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_update'))
 
     preset = subparsers.add_parser('add-packages', help="Add packages to one or all project environments")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
     add_package_args(preset)
-    preset.set_defaults(main=environment_commands.main_add_packages)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_add_packages'))
 
     preset = subparsers.add_parser('remove-packages', help="Remove packages from one or all project environments")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
     preset.add_argument('packages', metavar='PACKAGE_NAME', default=None, nargs='+')
-    preset.set_defaults(main=environment_commands.main_remove_packages)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_remove_packages'))
 
     preset = subparsers.add_parser('list-packages', help="List packages for an environment on the project")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
-    preset.set_defaults(main=environment_commands.main_list_packages)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_list_packages'))
 
     def add_platforms_list(preset):
         preset.add_argument('platforms', metavar='PLATFORM_NAME', default=None, nargs='+')
@@ -316,18 +341,18 @@ def _parse_args_and_run_subcommand(argv):
     add_directory_arg(preset)
     add_env_spec_arg(preset)
     add_platforms_list(preset)
-    preset.set_defaults(main=environment_commands.main_add_platforms)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_add_platforms'))
 
     preset = subparsers.add_parser('remove-platforms', help="Remove platforms from one or all project environments")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
     add_platforms_list(preset)
-    preset.set_defaults(main=environment_commands.main_remove_platforms)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_remove_platforms'))
 
     preset = subparsers.add_parser('list-platforms', help="List platforms for an environment on the project")
     add_directory_arg(preset)
     add_env_spec_arg(preset)
-    preset.set_defaults(main=environment_commands.main_list_platforms)
+    preset.set_defaults(main=_subcommand('environment_commands', 'main_list_platforms'))
 
     def add_command_name_arg(preset):
         preset.add_argument('name', metavar="NAME", help="Command name used to invoke it")
@@ -348,20 +373,20 @@ def _parse_args_and_run_subcommand(argv):
                         action="store_false",
                         help=" The command does not support project's HTTP server options")
     preset.add_argument('command', metavar="COMMAND", help="Command line or app filename to add")
-    preset.set_defaults(main=command_commands.main, supports_http_options=None)
+    preset.set_defaults(main=_subcommand('command_commands'), supports_http_options=None)
 
     preset = subparsers.add_parser('remove-command', help="Remove a command from the project")
     add_directory_arg(preset)
     add_command_name_arg(preset)
-    preset.set_defaults(main=command_commands.main_remove)
+    preset.set_defaults(main=_subcommand('command_commands', 'main_remove'))
 
     preset = subparsers.add_parser('list-default-command', help="List only the default command on the project")
     add_directory_arg(preset)
-    preset.set_defaults(main=command_commands.main_default)
+    preset.set_defaults(main=_subcommand('command_commands', 'main_default'))
 
     preset = subparsers.add_parser('list-commands', help="List the commands on the project")
     add_directory_arg(preset)
-    preset.set_defaults(main=command_commands.main_list)
+    preset.set_defaults(main=_subcommand('command_commands', 'main_list'))
 
     # argparse doesn't do this for us for whatever reason
     if len(argv) < 2:
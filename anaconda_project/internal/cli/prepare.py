@@ -9,12 +9,21 @@
 from __future__ import absolute_import, print_function
 
 import anaconda_project.internal.cli.console_utils as console_utils
-from anaconda_project.internal.cli.prepare_with_mode import prepare_with_ui_mode_printing_errors
+from anaconda_project.internal.cli.prepare_with_mode import (prepare_with_ui_mode_printing_errors,
+                                                             prepare_all_env_specs_with_ui_mode_printing_errors)
 from anaconda_project.internal.cli.project_load import load_project
+from anaconda_project import project_ops
 from anaconda_project.requirements_registry.providers.conda_env import _remove_env_path
 
 
-def prepare_command(project_dir, ui_mode, conda_environment, command_name, all=False, refresh=False):
+def prepare_command(project_dir,
+                    ui_mode,
+                    conda_environment,
+                    command_name,
+                    all=False,
+                    refresh=False,
+                    verify_downloads=False,
+                    all_env_specs=False):
     """Configure the project to run.
 
     Returns:
@@ -23,7 +32,19 @@ def prepare_command(project_dir, ui_mode, conda_environment, command_name, all=F
     project = load_project(project_dir)
     if console_utils.print_project_problems(project):
         return False
-    if all:
+    if verify_downloads:
+        # files that fail are removed, so the prepare below downloads them again
+        status = project_ops.verify_downloads(project, conda_environment)
+        if status:
+            print(status.status_description)
+        else:
+            console_utils.print_status_errors(status)
+    if all_env_specs:
+        if refresh:
+            for env_spec in project.env_specs.values():
+                _remove_env_path(env_spec.path(project.directory_path))
+        result = prepare_all_env_specs_with_ui_mode_printing_errors(project, ui_mode=ui_mode)
+    elif all:
         result = []
         for k, v in project.env_specs.items():
             if refresh:
@@ -46,7 +67,8 @@ def prepare_command(project_dir, ui_mode, conda_environment, command_name, all=F
 
 def main(args):
     """Start the prepare command and return exit status code."""
-    if prepare_command(args.directory, args.mode, args.env_spec, args.command, args.all, args.refresh):
+    if prepare_command(args.directory, args.mode, args.env_spec, args.command, args.all, args.refresh,
+                       args.verify_downloads, args.all_env_specs):
         print("The project is ready to run commands.")
         print("Use `anaconda-project list-commands` to see what's available.")
         return 0
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""The ``daemon`` command keeps projects loaded and prepared, so ``run`` can skip preparing them."""
+from __future__ import absolute_import, print_function
+
+import collections
+import os
+import socket
+import sys
+import threading
+
+try:
+    import socketserver
+except ImportError:  # pragma: no cover (py2 only)
+    import SocketServer as socketserver  # pragma: no cover (py2 only)
+
+from anaconda_project.frontend import NullFrontend
+from anaconda_project.internal import daemon_protocol
+from anaconda_project.internal.cli.run import (_command_from_name, _project_file_paths, _watched_paths,
+                                               _prepare_can_be_reused)
+from anaconda_project.internal.run_snapshot import stamp, variables_affecting_prepare
+from anaconda_project.prepare import prepare_without_interaction
+from anaconda_project.project import Project
+from anaconda_project.provide import (PROVIDE_MODE_PRODUCTION, PROVIDE_MODE_DEVELOPMENT, PROVIDE_MODE_CHECK)
+
+MAX_RESULTS = 256
+
+
+def _variables_key(requirements, environ):
+    variables = variables_affecting_prepare([requirement.env_var for requirement in requirements], environ)
+    return tuple(variables)
+
+
+def _fallback(reason):
+    return dict(fallback=reason)
+
+
+class PrepareDaemon(object):
+    """Loaded projects and prepare results, kept between requests."""
+    def __init__(self, prepare=prepare_without_interaction):
+        """Create a daemon that prepares projects with the given function."""
+        self._prepare = prepare
+        # guards the dicts below; never held while loading or preparing
+        self._lock = threading.Lock()
+        # directory => lock held while handling a request for that project
+        self._directory_locks = dict()
+        # directory => (stamp, project)
+        self._projects = dict()
+        # key => (watched paths, stamp, changed variables, removed variables)
+        self._results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _directory_lock(self, directory):
+        with self._lock:
+            return self._directory_locks.setdefault(directory, threading.Lock())
+
+    def _project(self, directory):
+        current_stamp = stamp(_project_file_paths(directory))
+        with self._lock:
+            cached = self._projects.get(directory)
+        if current_stamp is not None and cached is not None and cached[0] == current_stamp:
+            return cached[1]
+        project = Project(directory, frontend=NullFrontend(), must_exist=True)
+        with self._lock:
+            if current_stamp is None:
+                self._projects.pop(directory, None)
+            else:
+                self._projects[directory] = (current_stamp, project)
+        return project
+
+    def _remember(self, key, paths, environ, result):
+        current_stamp = stamp(paths)
+        if current_stamp is None:
+            return
+        changed = dict((name, value) for (name, value) in result.environ.items() if environ.get(name) != value)
+        removed = [name for name in environ if name not in result.environ]
+        with self._lock:
+            self._results[key] = (paths, current_stamp, changed, removed)
+            while len(self._results) > MAX_RESULTS:
+                self._results.popitem(last=False)
+
+    def handle(self, message):
+        """Answer one request from ``run``.
+
+        Args:
+            message (dict): the request, with the ``run`` arguments and environment
+
+        Returns:
+            a reply dict with either ``exec_info`` or ``fallback`` set
+        """
+        if message.get('version') != daemon_protocol.PROTOCOL_VERSION:
+            return _fallback("unsupported protocol version")
+        try:
+            directory = message['directory']
+            environ = message['environ']
+            mode = message['mode']
+        except KeyError as e:
+            return _fallback("request is missing %s" % e)
+        if mode not in (PROVIDE_MODE_PRODUCTION, PROVIDE_MODE_DEVELOPMENT, PROVIDE_MODE_CHECK):
+            return _fallback("unknown mode %s" % mode)
+        if 'PATH' not in environ:
+            return _fallback("PATH is not set")
+
+        # a slow prepare only holds up other requests for the same project
+        with self._directory_lock(directory):
+            return self._handle(directory, environ, mode, message.get('env_spec'), message.get('command'),
+                                message.get('extra_args') or [])
+
+    def _handle(self, directory, environ, mode, env_spec_name, command_name, extra_args):
+        project = self._project(directory)
+        if project.problems or project.has_bootstrap_env_spec():
+            return _fallback("project can't be prepared without help")
+        if env_spec_name is not None and env_spec_name not in project.env_specs:
+            return _fallback("no env spec %s" % env_spec_name)
+        command = _command_from_name(project, command_name)
+        if command is None:
+            return _fallback("no command to run")
+
+        requirements = project.requirements(env_spec_name)
+        key = (directory, env_spec_name, command_name, mode, _variables_key(requirements, environ))
+        with self._lock:
+            cached = self._results.get(key)
+        if cached is not None and stamp(cached[0]) == cached[1]:
+            with self._lock:
+                self.hits += 1
+            (changed, removed) = cached[2:]
+            environ_copy = dict(environ)
+            environ_copy.update(changed)
+            for name in removed:
+                environ_copy.pop(name, None)
+            exec_info = command.exec_info_for_environment(environ_copy, extra_args=extra_args)
+        else:
+            with self._lock:
+                self.misses += 1
+                self._results.pop(key, None)
+            result = self._prepare(project,
+                                   environ=environ,
+                                   mode=mode,
+                                   env_spec_name=env_spec_name,
+                                   command=command,
+                                   extra_command_args=extra_args)
+            if result.failed:
+                return _fallback("prepare failed")
+            exec_info = result.command_exec_info
+            if _prepare_can_be_reused(requirements):
+                self._remember(key, _watched_paths(project, requirements, result), environ, result)
+
+        if exec_info is None:
+            return _fallback("command can't run on this platform")
+        return dict(exec_info=dict(args=exec_info.args, cwd=exec_info.cwd, shell=exec_info.shell, env=exec_info.env))
+
+    def listen(self, socket_path):
+        """Start listening on a unix socket, replacing one left by a daemon that died.
+
+        Returns:
+            a ``socketserver`` server; call its ``serve_forever()``
+
+        Raises:
+            socket.error if the socket can't be created, or another daemon is using it
+        """
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except socket.error:
+                os.remove(socket_path)
+            else:
+                raise socket.error("another daemon is listening on %s" % socket_path)
+            finally:
+                probe.close()
+
+        # only this user may connect, since we hand out their environment
+        old_umask = os.umask(0o077)
+        try:
+            server = _Server(socket_path, _Handler)
+        finally:
+            os.umask(old_umask)
+        server.prepare_daemon = self
+        return server
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            message = daemon_protocol.receive_message(self.request)
+        except (socket.error, daemon_protocol.ProtocolError):
+            return
+        try:
+            reply = self.server.prepare_daemon.handle(message)
+        except Exception as e:
+            reply = _fallback("daemon failed: %s" % e)
+        try:
+            daemon_protocol.send_message(self.request, reply)
+        except socket.error:
+            pass
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main(args):
+    """Start the daemon command and return exit status code."""
+    socket_path = args.socket or os.environ.get(daemon_protocol.SOCKET_VARIABLE)
+    if not socket_path:
+        print("Specify --socket or set %s." % daemon_protocol.SOCKET_VARIABLE, file=sys.stderr)
+        return 1
+    if not hasattr(socket, 'AF_UNIX'):
+        print("The daemon needs unix sockets, which aren't available on this platform.", file=sys.stderr)
+        return 1
+
+    try:
+        server = PrepareDaemon().listen(socket_path)
+    except (socket.error, OSError) as e:
+        print("Could not listen on %s: %s" % (socket_path, e), file=sys.stderr)
+        return 1
+
+    print("Preparing projects for 'anaconda-project run' on %s (Ctrl+C to stop)." % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.remove(socket_path)
+        except OSError:
+            pass
+    return 0
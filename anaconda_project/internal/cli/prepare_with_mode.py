@@ -8,27 +8,20 @@
 """Command-line-specific project prepare utilities."""
 from __future__ import absolute_import, print_function
 
+import time
+
 from anaconda_project import prepare
-from anaconda_project import project_ops
 from anaconda_project.requirements_registry.requirement import EnvVarRequirement
 from anaconda_project.requirements_registry.requirements.conda_env import CondaEnvRequirement
 
 from anaconda_project.provide import (PROVIDE_MODE_PRODUCTION, PROVIDE_MODE_DEVELOPMENT, PROVIDE_MODE_CHECK)
 
 import anaconda_project.internal.cli.console_utils as console_utils
-
-# these UI_MODE_ strings are used as values for command line options, so they are user-visible
-
-# ASK_QUESTIONS mode is supposed to ask about default actions too,
-# like whether to start servers.  It isn't implemented yet.
-UI_MODE_TEXT_ASK_QUESTIONS = "ask"
-UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK = "development_defaults_or_ask"
-UI_MODE_TEXT_ASSUME_YES_PRODUCTION = "production_defaults"
-UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT = "development_defaults"
-UI_MODE_TEXT_ASSUME_NO = "check"
-
-_all_ui_modes = (UI_MODE_TEXT_ASK_QUESTIONS, UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK,
-                 UI_MODE_TEXT_ASSUME_YES_PRODUCTION, UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT, UI_MODE_TEXT_ASSUME_NO)
+from anaconda_project.internal.cli.ui_modes import (UI_MODE_TEXT_ASK_QUESTIONS,
+                                                    UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK,
+                                                    UI_MODE_TEXT_ASSUME_YES_PRODUCTION,
+                                                    UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT, UI_MODE_TEXT_ASSUME_NO,
+                                                    _all_ui_modes)
 
 
 def _interactively_fix_missing_variables(project, result):
@@ -64,6 +57,7 @@ def _interactively_fix_missing_variables(project, result):
         values[status.requirement.env_var] = reply
 
     if len(values) > 0:
+        from anaconda_project import project_ops
         status = project_ops.set_variables(project, result.env_spec_name, values.items(), result)
         if status:
             return True
@@ -74,33 +68,8 @@ def _interactively_fix_missing_variables(project, result):
         return start_over
 
 
-def prepare_with_ui_mode_printing_errors(project,
-                                         environ=None,
-                                         ui_mode=UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT,
-                                         env_spec_name=None,
-                                         command_name=None,
-                                         command=None,
-                                         extra_command_args=None):
-    """Perform all steps needed to get a project ready to execute.
-
-    This may need to ask the user questions, may start services,
-    run scripts, load configuration, install packages... it can do
-    anything. Expect side effects.
-
-    Args:
-        project (Project): the project
-        environ (dict): the environment to prepare (None to use os.environ)
-        ui_mode (str): one of ``UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT``,
-                       ``UI_MODE_TEXT_ASSUME_YES_PRODUCTION``, ``UI_MODE_TEXT_ASSUME_NO``
-        env_spec_name (str): the environment spec name to require, or None for default
-        command_name (str): command name to use or None for default
-        command (ProjectCommand): a command object or None
-        extra_command_args (list of str): extra args for the command we prepare
-
-    Returns:
-        a ``PrepareResult`` instance
-
-    """
+def _provide_mode_for_ui_mode(ui_mode):
+    """Get the provide mode and whether to ask questions."""
     assert ui_mode in _all_ui_modes  # the arg parser should have guaranteed this
 
     ask = False
@@ -122,6 +91,10 @@ def prepare_with_ui_mode_printing_errors(project,
     # exist on Provider in case they are useful to implement this.
     assert ui_mode != UI_MODE_TEXT_ASK_QUESTIONS  # Not implemented yet
 
+    return (provide_mode, ask)
+
+
+def _print_suggestions(project):
     # TODO: this could let you fix the suggestions if they are fixable.
     # (Note that we fix fatal problems in project_load.py, but we only
     #  display suggestions when we do a manual prepare, run, etc.)
@@ -132,6 +105,38 @@ def prepare_with_ui_mode_printing_errors(project,
             print("  * " + suggestion)
         print("")
 
+
+def prepare_with_ui_mode_printing_errors(project,
+                                         environ=None,
+                                         ui_mode=UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT,
+                                         env_spec_name=None,
+                                         command_name=None,
+                                         command=None,
+                                         extra_command_args=None):
+    """Perform all steps needed to get a project ready to execute.
+
+    This may need to ask the user questions, may start services,
+    run scripts, load configuration, install packages... it can do
+    anything. Expect side effects.
+
+    Args:
+        project (Project): the project
+        environ (dict): the environment to prepare (None to use os.environ)
+        ui_mode (str): one of ``UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT``,
+                       ``UI_MODE_TEXT_ASSUME_YES_PRODUCTION``, ``UI_MODE_TEXT_ASSUME_NO``
+        env_spec_name (str): the environment spec name to require, or None for default
+        command_name (str): command name to use or None for default
+        command (ProjectCommand): a command object or None
+        extra_command_args (list of str): extra args for the command we prepare
+
+    Returns:
+        a ``PrepareResult`` instance
+
+    """
+    (provide_mode, ask) = _provide_mode_for_ui_mode(ui_mode)
+
+    _print_suggestions(project)
+
     environ = None
     while True:
         result = prepare.prepare_without_interaction(project,
@@ -151,3 +156,51 @@ def prepare_with_ui_mode_printing_errors(project,
         break
 
     return result
+
+
+def prepare_all_env_specs_with_ui_mode_printing_errors(project,
+                                                       environ=None,
+                                                       ui_mode=UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT):
+    """Prepare the project with every env spec, creating environments concurrently.
+
+    After preparing, prints how long each env spec took.
+
+    Args:
+        project (Project): the project
+        environ (dict): the environment to prepare (None to use os.environ)
+        ui_mode (str): one of ``UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT``,
+                       ``UI_MODE_TEXT_ASSUME_YES_PRODUCTION``, ``UI_MODE_TEXT_ASSUME_NO``
+
+    Returns:
+        the first failed ``PrepareResult``, or the last result if none failed
+
+    """
+    (provide_mode, ask) = _provide_mode_for_ui_mode(ui_mode)
+
+    _print_suggestions(project)
+
+    results = []
+    for item in prepare.prepare_all_env_specs_without_interaction(project, environ, mode=provide_mode):
+        result = item.result
+        seconds = item.seconds
+        while result.failed and ask and _interactively_fix_missing_variables(project, result):
+            start = time.time()
+            # re-prepare, building on our previous environ
+            result = prepare.prepare_without_interaction(project,
+                                                         result.environ,
+                                                         mode=provide_mode,
+                                                         env_spec_name=item.env_spec_name)
+            seconds += time.time() - start
+        results.append((item.env_spec_name, result, seconds))
+
+    for (env_spec_name, result, seconds) in results:
+        if result.failed:
+            print("Failed to prepare env spec '%s' (%.1f seconds)." % (env_spec_name, seconds))
+        else:
+            print("Prepared env spec '%s' in %.1f seconds." % (env_spec_name, seconds))
+
+    failures = [result for (_, result, _) in results if result.failed]
+    if len(failures) > 0:
+        return failures[0]
+    else:
+        return results[-1][1]
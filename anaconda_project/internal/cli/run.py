@@ -8,12 +8,20 @@
 """The ``run`` command executes a project, by default without asking questions (fails on missing config)."""
 from __future__ import absolute_import, print_function
 
+import os
 import sys
 
+from anaconda_project.internal import env_fingerprint, run_snapshot
 from anaconda_project.internal.cli.prepare_with_mode import prepare_with_ui_mode_printing_errors
 from anaconda_project.internal.cli.project_load import load_project
+from anaconda_project.internal.cli.run_with_daemon import _PROVIDE_MODE_FOR_UI_MODE
+from anaconda_project.local_state_file import possible_local_state_file_names
 from anaconda_project.project_commands import ProjectCommand
-from anaconda_project.internal.cli.environment_commands import (create_bootstrap_env, run_on_bootstrap_env)
+from anaconda_project.project_file import possible_project_file_names
+from anaconda_project.project_lock_file import possible_project_lock_file_names
+from anaconda_project.requirements_registry.requirement import EnvVarRequirement
+from anaconda_project.requirements_registry.requirements.download import DownloadRequirement
+from anaconda_project.requirements_registry.requirements.service import ServiceRequirement
 
 
 def _command_from_name(project, command_name):
@@ -32,6 +40,46 @@ def _command_from_name(project, command_name):
     return command
 
 
+def _project_file_paths(directory):
+    names = possible_project_file_names + possible_project_lock_file_names + possible_local_state_file_names
+    return [os.path.join(directory, name) for name in names]
+
+
+def _watched_paths(project, requirements, result):
+    """Get the files that preparing depended on, which change if it has to be done again."""
+    paths = _project_file_paths(project.directory_path)
+    if result.env_prefix is not None:
+        # pip only changes site-packages, not conda-meta
+        paths.extend(env_fingerprint.package_directories(result.env_prefix))
+    for requirement in requirements:
+        if isinstance(requirement, DownloadRequirement):
+            paths.append(os.path.join(project.directory_path, requirement.filename))
+    return paths
+
+
+def _prepare_can_be_reused(requirements):
+    # a service can stop without any file changing
+    return not any(isinstance(requirement, ServiceRequirement) for requirement in requirements)
+
+
+def _save_snapshot(project, request, result):
+    snapshots = run_snapshot._get_run_snapshots(os.environ)
+    if snapshots is None or request['mode'] is None:
+        return
+    requirements = project.requirements(request['env_spec'])
+    if not _prepare_can_be_reused(requirements):
+        return
+    # we don't write passwords to disk
+    if any(isinstance(requirement, EnvVarRequirement) and requirement.encrypted for requirement in requirements):
+        return
+    snapshots.save(request,
+                   paths=_watched_paths(project, requirements, result),
+                   names=[requirement.env_var for requirement in requirements],
+                   environ=os.environ,
+                   prepared_environ=result.environ,
+                   exec_info=result.command_exec_info)
+
+
 def run_command(project_dir, ui_mode, conda_environment, command_name, extra_command_args):
     """Run the project.
 
@@ -41,6 +89,8 @@ def run_command(project_dir, ui_mode, conda_environment, command_name, extra_com
     project = load_project(project_dir)
 
     if project.has_bootstrap_env_spec() and not project.is_running_in_bootstrap_env():
+        # only imported here, since environment_commands imports most of anaconda_project
+        from anaconda_project.internal.cli.environment_commands import (create_bootstrap_env, run_on_bootstrap_env)
         print("Project should be ran by bootstrap env... fixing.")
         create_bootstrap_env(project)
         run_on_bootstrap_env(project)
@@ -63,8 +113,13 @@ def run_command(project_dir, ui_mode, conda_environment, command_name, extra_com
                   project_dir,
                   file=sys.stderr)
         else:
+            request = dict(directory=os.path.abspath(project_dir),
+                           env_spec=conda_environment,
+                           command=command_name,
+                           mode=_PROVIDE_MODE_FOR_UI_MODE.get(ui_mode),
+                           extra_args=extra_command_args or [])
+            _save_snapshot(project, request, result)
             try:
-
                 result.command_exec_info.execvpe()
             except OSError as e:
                 print("Failed to execute '%s': %s" % (" ".join(result.command_exec_info.args), e.strerror),
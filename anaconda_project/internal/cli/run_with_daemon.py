@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Hand ``anaconda-project run`` off to the prepare daemon, if there is one.
+
+This runs before the rest of the command line tool is imported, so
+it only imports the standard library and a few of our modules that
+don't import anything else.
+"""
+from __future__ import absolute_import
+
+import os
+import socket
+import sys
+from argparse import ArgumentParser, REMAINDER
+
+from anaconda_project.internal import daemon_protocol
+from anaconda_project.provide import (PROVIDE_MODE_PRODUCTION, PROVIDE_MODE_DEVELOPMENT, PROVIDE_MODE_CHECK)
+from anaconda_project.internal.cli.ui_modes import (UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK,
+                                                    UI_MODE_TEXT_ASSUME_YES_PRODUCTION,
+                                                    UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT, UI_MODE_TEXT_ASSUME_NO)
+
+# the provide mode for each --mode value; if preparing fails in a
+# mode that can ask questions, the daemon falls back and run asks
+# them as usual
+_PROVIDE_MODE_FOR_UI_MODE = {
+    UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK: PROVIDE_MODE_DEVELOPMENT,
+    UI_MODE_TEXT_ASSUME_YES_DEVELOPMENT: PROVIDE_MODE_DEVELOPMENT,
+    UI_MODE_TEXT_ASSUME_YES_PRODUCTION: PROVIDE_MODE_PRODUCTION,
+    UI_MODE_TEXT_ASSUME_NO: PROVIDE_MODE_CHECK
+}
+
+
+class _UnsupportedArguments(Exception):
+    pass
+
+
+class _RunArgumentParser(ArgumentParser):
+    def error(self, message):
+        raise _UnsupportedArguments(message)
+
+
+def _parse_run_args(argv):
+    """Parse the args of ``anaconda-project run``, or return None for anything else."""
+    if len(argv) < 2 or argv[1] != 'run':
+        return None
+    # the same arguments as the real "run" parser, without help
+    parser = _RunArgumentParser(add_help=False)
+    parser.add_argument('--directory', default='.')
+    parser.add_argument('--env-spec', default=None)
+    parser.add_argument('--mode', default=UI_MODE_TEXT_DEVELOPMENT_DEFAULTS_OR_ASK)
+    parser.add_argument('command', default=None, nargs='?')
+    parser.add_argument('extra_args_for_command', default=None, nargs=REMAINDER)
+    try:
+        args = parser.parse_args(argv[2:])
+    except _UnsupportedArguments:
+        return None
+    if args.mode not in _PROVIDE_MODE_FOR_UI_MODE:
+        return None
+    return args
+
+
+def _native(s):
+    if sys.version_info[0] == 2 and not isinstance(s, str):  # pragma: no cover (py2 only)
+        return s.encode('utf-8')
+    return s
+
+
+def exec_with_daemon(argv, environ):
+    """Exec the command for ``anaconda-project run`` as prepared by the daemon.
+
+    Does nothing unless ``ANACONDA_PROJECT_DAEMON_SOCKET`` is set
+    and argv is a ``run`` command line.
+
+    Args:
+        argv (list of str): the command line
+        environ (dict): the environment to prepare and run in
+
+    Returns:
+        Does not return if the daemon prepared the command. Returns None if run should go on as usual.
+    """
+    socket_path = environ.get(daemon_protocol.SOCKET_VARIABLE)
+    if not socket_path or not hasattr(socket, 'AF_UNIX'):
+        return None
+    args = _parse_run_args(argv)
+    if args is None:
+        return None
+
+    reply = daemon_protocol.request(
+        socket_path,
+        dict(directory=os.path.abspath(args.directory),
+             env_spec=args.env_spec,
+             command=args.command,
+             mode=_PROVIDE_MODE_FOR_UI_MODE[args.mode],
+             extra_args=args.extra_args_for_command or [],
+             environ=dict(environ)))
+    if reply is None or 'exec_info' not in reply:
+        return None
+    return _exec(reply['exec_info'])
+
+
+def _exec(exec_info):
+    """Exec a command described by a dict with args, cwd, shell and env; returns None if exec fails."""
+    command_args = [_native(arg) for arg in exec_info['args']]
+    if exec_info['shell']:
+        # this is all shell=True does on unix
+        command_args = ['/bin/sh', '-c'] + command_args
+    env = dict((_native(name), _native(value)) for (name, value) in exec_info['env'].items())
+
+    old_dir = os.getcwd()
+    try:
+        os.chdir(exec_info['cwd'])
+        sys.stderr.flush()
+        sys.stdout.flush()
+        os.execvpe(command_args[0], command_args, env)
+    except OSError:
+        # let run try again and report the error
+        return None
+    finally:
+        # if exec failed (or is mocked in tests)
+        os.chdir(old_dir)
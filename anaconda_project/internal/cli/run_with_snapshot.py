@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Exec ``anaconda-project run`` from the snapshot the last identical ``run`` saved.
+
+Like ``run_with_daemon``, this runs before the rest of the command
+line tool is imported.
+"""
+from __future__ import absolute_import
+
+import os
+
+from anaconda_project.internal import run_snapshot
+from anaconda_project.internal.cli.run_with_daemon import _exec, _parse_run_args, _PROVIDE_MODE_FOR_UI_MODE
+
+
+def exec_with_snapshot(argv, environ):
+    """Exec the command for ``anaconda-project run`` from a snapshot, if it's still good.
+
+    Args:
+        argv (list of str): the command line
+        environ (dict): the environment to run in
+
+    Returns:
+        Does not return if there was a snapshot. Returns None if run should go on as usual.
+    """
+    args = _parse_run_args(argv)
+    if args is None:
+        return None
+    snapshots = run_snapshot._get_run_snapshots(environ)
+    if snapshots is None:
+        return None
+
+    request = dict(directory=os.path.abspath(args.directory),
+                   env_spec=args.env_spec,
+                   command=args.command,
+                   mode=_PROVIDE_MODE_FOR_UI_MODE[args.mode],
+                   extra_args=args.extra_args_for_command or [])
+    exec_info = snapshots.load(request, dict(environ))
+    if exec_info is None:
+        return None
+    return _exec(exec_info)
@@ -204,8 +204,13 @@ def _monkeypatch_can_connect_to_socket_to_fail_to_find_redis(monkeypatch):
         else:
             return True  # can't start a custom Redis here
 
+    def mock_can_listen_on_port(port):
+        return False  # every port is taken
+
     monkeypatch.setattr("anaconda_project.requirements_registry.network_util.can_connect_to_socket",
                         mock_can_connect_to_socket)
+    monkeypatch.setattr("anaconda_project.requirements_registry.network_util.can_listen_on_port",
+                        mock_can_listen_on_port)
 
 
 def test_main_fails_to_redis(monkeypatch, capsys):
@@ -68,3 +68,30 @@ def test_archive_command_on_invalid_project(capsys):
                 'Unable to load the project.\n') in err
 
     with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: "variables:\n  42"}, check)
+
+
+def test_archive_command_with_compression_level(capsys):
+    def check(dirname):
+        archivefile = os.path.join(dirname, "foo.zip")
+        code = _parse_args_and_run_subcommand(
+            ['anaconda-project', 'archive', '--directory', dirname, '--compression-level', '9', archivefile])
+        assert code == 0
+
+        with zipfile.ZipFile(archivefile, mode='r') as zf:
+            assert [info.compress_type for info in zf.infolist()] == [zipfile.ZIP_DEFLATED, zipfile.ZIP_DEFLATED]
+
+    with_directory_contents_completing_project_file({'foo.py': 'print("hello")\n'}, check)
+
+
+def test_archive_command_with_bad_compression_level(capsys):
+    def check(dirname):
+        archivefile = os.path.join(dirname, "foo.zip")
+        code = _parse_args_and_run_subcommand(
+            ['anaconda-project', 'archive', '--directory', dirname, '--compression-level', '10', archivefile])
+        assert code == 2
+
+        out, err = capsys.readouterr()
+        assert "invalid choice: 10" in err
+        assert not os.path.exists(archivefile)
+
+    with_directory_contents_completing_project_file({'foo.py': 'print("hello")\n'}, check)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import subprocess
+import sys
+
+import pytest
+
+# how many modules (ours, the standard library's and our dependencies')
+# an import may bring in. Generous, since it varies with the Python and
+# dependency versions, but well under the ~500 modules imported when the
+# parser imported every subcommand. Unlike import times, these don't
+# depend on how loaded the machine is.
+MAIN_MODULE_LIMIT = 250
+RUN_MODULE_LIMIT = 450
+
+# only needed by subcommands that talk to the network or the keyring
+_heavy_modules = ('requests', 'binstar_client', 'tornado', 'keyring', 'anaconda_project.client')
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 7), reason="-X importtime needs Python 3.7")
+
+
+def _import_times(module):
+    """Get {module name: cumulative seconds} for a fresh import of module."""
+    output = subprocess.check_output([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                                     stderr=subprocess.STDOUT).decode('utf-8')
+    times = dict()
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        (_, cumulative, name) = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_parsing_arguments_imports_no_subcommands():
+    times = _import_times('anaconda_project.internal.cli.main')
+
+    imported = set(times.keys())
+    for name in _heavy_modules + ('anaconda_project.project', 'anaconda_project.prepare',
+                                  'anaconda_project.project_ops', 'anaconda_project.internal.cli.run'):
+        assert name not in imported
+
+
+def test_run_imports_only_what_it_needs():
+    times = _import_times('anaconda_project.internal.cli.run')
+
+    imported = set(times.keys())
+    for name in _heavy_modules + ('anaconda_project.project_ops', ):
+        assert name not in imported
+
+
+def test_entry_point_imports_only_the_daemon_client():
+    times = _import_times('anaconda_project.cli')
+
+    assert 'anaconda_project.internal.cli.run_with_daemon' in times
+    assert 'anaconda_project.internal.cli.main' not in times
+
+
+def test_import_module_limits():
+    assert len(_import_times('anaconda_project.internal.cli.main')) < MAIN_MODULE_LIMIT
+    assert len(_import_times('anaconda_project.internal.cli.run')) < RUN_MODULE_LIMIT
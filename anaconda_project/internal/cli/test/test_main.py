@@ -13,8 +13,8 @@ import os
 import anaconda_project
 from anaconda_project.internal.cli.main import _parse_args_and_run_subcommand
 
-all_subcommands = ('init', 'run', 'prepare', 'clean', 'activate', 'archive', 'unarchive', 'upload', 'download',
-                   'add-variable', 'remove-variable', 'list-variables', 'set-variable', 'unset-variable',
+all_subcommands = ('init', 'run', 'prepare', 'daemon', 'clean', 'activate', 'archive', 'unarchive', 'upload',
+                   'download', 'add-variable', 'remove-variable', 'list-variables', 'set-variable', 'unset-variable',
                    'add-download', 'remove-download', 'list-downloads', 'add-service', 'remove-service',
                    'list-services', 'add-env-spec', 'remove-env-spec', 'list-env-specs', 'export-env-spec', 'lock',
                    'unlock', 'update', 'add-packages', 'remove-packages', 'list-packages', 'add-platforms',
@@ -67,13 +67,15 @@ expected_usage_msg_format = (  # noqa
     '    run                 Run the project, setting up requirements first\n'
     '    prepare             Set up the project requirements, but does not run the\n'
     '                        project\n'
+    "    daemon              Keep projects prepared so that 'run' starts commands\n"
+    '                        quickly\n'
     '    clean               Removes generated state (stops services, deletes\n'
     '                        environment files, etc)\n'
     '%s'
-    '    archive             Create a .zip, .tar.gz, or .tar.bz2 archive with\n'
-    '                        project files in it\n'
-    '    unarchive           Unpack a .zip, .tar.gz, or .tar.bz2 archive with\n'
-    '                        project files in it\n'
+    '    archive             Create a .zip, .tar.gz, .tar.bz2, or .tar.xz archive\n'
+    '                        with project files in it\n'
+    '    unarchive           Unpack a .zip, .tar.gz, .tar.bz2, or .tar.xz archive\n'
+    '                        with project files in it\n'
     '    upload              Upload the project to Anaconda Cloud\n'
     '    download            Download the project from Anaconda Cloud\n'
     '    add-variable        Add a required environment variable to the project\n'
@@ -82,8 +82,13 @@ def _monkeypatch_can_connect_to_socket_to_fail_to_find_redis(monkeypatch):
         else:
             return True  # can't start a custom Redis here
 
+    def mock_can_listen_on_port(port):
+        return False  # every port is taken
+
     monkeypatch.setattr("anaconda_project.requirements_registry.network_util.can_connect_to_socket",
                         mock_can_connect_to_socket)
+    monkeypatch.setattr("anaconda_project.requirements_registry.network_util.can_listen_on_port",
+                        mock_can_listen_on_port)
 
 
 def test_main_fails_to_redis(monkeypatch, capsys):
@@ -103,7 +108,7 @@ def test_main_fails_to_redis(monkeypatch, capsys):
 
     def main_redis_url(dirname):
         project_dir_disable_dedicated_env(dirname)
-        code = main(Args(directory=dirname, all=False, refresh=False))
+        code = main(Args(directory=dirname, all=False, refresh=False, verify_downloads=False, all_env_specs=False))
         assert 1 == code
 
     with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: """
@@ -206,6 +211,77 @@ env_specs:
     assert err == ""
 
 
+def test_prepare_command_all_env_specs(capsys, monkeypatch):
+    def mock_conda_create(prefix, pkgs, channels, stdout_callback, stderr_callback):
+        from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+        metadir = os.path.join(prefix, "conda-meta")
+        makedirs_ok_if_exists(metadir)
+        for p in pkgs:
+            pkgmeta = os.path.join(metadir, "%s-0.1-pyNN.json" % p)
+            open(pkgmeta, 'a').close()
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api.create', mock_conda_create)
+    monkeypatch.setenv('ANACONDA_PROJECT_PREPARE_WORKERS', '2')
+
+    def check_prepare_all_env_specs(dirname):
+        result = _parse_args_and_run_subcommand(
+            ['anaconda-project', 'prepare', '--directory', dirname, '--all-env-specs', '--refresh'])
+        assert result == 0
+
+        for name in ('foo', 'bar'):
+            package_json = os.path.join(dirname, "envs", name, "conda-meta", "nonexistent_%s-0.1-pyNN.json" % name)
+            assert os.path.isfile(package_json)
+
+    with_directory_contents_completing_project_file(
+        {
+            DEFAULT_PROJECT_FILENAME:
+            """
+env_specs:
+  foo:
+    packages:
+        - nonexistent_foo
+  bar:
+    packages:
+        - nonexistent_bar
+"""
+        }, check_prepare_all_env_specs)
+
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert len(lines) == 4
+    assert lines[0].startswith("Prepared env spec 'foo' in ")
+    assert lines[1].startswith("Prepared env spec 'bar' in ")
+    assert lines[2:] == [
+        "The project is ready to run commands.", "Use `anaconda-project list-commands` to see what's available."
+    ]
+    assert err == ""
+
+
+def test_prepare_command_all_env_specs_failure(capsys, monkeypatch):
+    def mock_conda_create(prefix, pkgs, channels, stdout_callback, stderr_callback):
+        from anaconda_project.internal.conda_api import CondaError
+        raise CondaError("no packages for you")
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api.create', mock_conda_create)
+
+    def check_prepare_all_env_specs(dirname):
+        result = _parse_args_and_run_subcommand(
+            ['anaconda-project', 'prepare', '--directory', dirname, '--all-env-specs'])
+        assert result == 1
+
+    with_directory_contents_completing_project_file(
+        {DEFAULT_PROJECT_FILENAME: """
+env_specs:
+  foo:
+    packages:
+        - nonexistent_foo
+"""}, check_prepare_all_env_specs)
+
+    out, err = capsys.readouterr()
+    assert out.startswith("Failed to prepare env spec 'foo' (")
+    assert "no packages for you" in err
+
+
 def test_prepare_command_all_environments_refresh(capsys, monkeypatch):
     def mock_conda_create(prefix, pkgs, channels, stdout_callback, stderr_callback):
         from anaconda_project.internal.makedirs import makedirs_ok_if_exists
@@ -625,3 +701,35 @@ Use `anaconda-project list-commands` to see what's available.
 packages: []
 weird_field: 42
 """}, check)
+
+
+def test_prepare_command_verify_downloads(capsys, monkeypatch):
+    verified = []
+
+    def mock_verify_downloads(project, env_spec_name):
+        verified.append(env_spec_name)
+        return SimpleStatus(success=False,
+                            description="Some downloaded files failed verification.",
+                            errors=["it didn't match"])
+
+    monkeypatch.setattr('anaconda_project.project_ops.verify_downloads', mock_verify_downloads)
+
+    def mock_prepare(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr('anaconda_project.internal.cli.prepare.prepare_with_ui_mode_printing_errors', mock_prepare)
+
+    def check(dirname):
+        code = _parse_args_and_run_subcommand(['anaconda-project', 'prepare', '--directory', dirname])
+        assert code == 0
+        assert [] == verified
+
+        code = _parse_args_and_run_subcommand(
+            ['anaconda-project', 'prepare', '--directory', dirname, '--verify-downloads'])
+        assert code == 0
+        assert [None] == verified
+
+    with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: ""}, check)
+
+    out, err = capsys.readouterr()
+    assert "Some downloaded files failed verification.\n" == err
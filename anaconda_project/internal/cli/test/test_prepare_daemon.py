@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from anaconda_project.internal import daemon_protocol
+from anaconda_project.internal.cli.main import _parse_args_and_run_subcommand
+from anaconda_project.internal.cli.prepare_daemon import PrepareDaemon
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+from anaconda_project.prepare import prepare_without_interaction
+from anaconda_project.project_file import DEFAULT_PROJECT_FILENAME
+from anaconda_project.test.environ_utils import minimal_environ
+from anaconda_project.test.test_prepare import _push_fake_env_creator, _pop_fake_env_creator
+
+daemon_project = """
+name: daemon_test
+platforms: [linux-32,linux-64,osx-64,win-32,win-64]
+commands:
+  hello:
+    unix: echo hello
+    windows: echo hello
+"""
+
+
+def _counting_prepare(calls):
+    def prepare(project, **kwargs):
+        calls.append(kwargs)
+        return prepare_without_interaction(project, **kwargs)
+
+    return prepare
+
+
+def _request(dirname, **kwargs):
+    message = dict(version=daemon_protocol.PROTOCOL_VERSION,
+                   directory=dirname,
+                   environ=minimal_environ(),
+                   mode='development',
+                   command='hello')
+    message.update(kwargs)
+    return message
+
+
+def _with_daemon_project(monkeypatch, check, contents=daemon_project):
+    # everything we create in the test is brand new
+    monkeypatch.setattr('anaconda_project.internal.run_snapshot.RACY_SECONDS', 0)
+
+    def wrapped(dirname):
+        _push_fake_env_creator()
+        try:
+            check(dirname)
+        finally:
+            _pop_fake_env_creator()
+
+    with_directory_contents({DEFAULT_PROJECT_FILENAME: contents}, wrapped)
+
+
+def test_reuses_prepare_result(monkeypatch):
+    def check(dirname):
+        calls = []
+        daemon = PrepareDaemon(prepare=_counting_prepare(calls))
+
+        first = daemon.handle(_request(dirname, extra_args=['a b']))
+        assert first['exec_info']['args'] == ["echo hello 'a b'"]
+        assert first['exec_info']['shell'] is True
+        assert first['exec_info']['cwd'] == dirname
+        assert first['exec_info']['env']['PROJECT_DIR'] == dirname
+
+        second = daemon.handle(_request(dirname, extra_args=['c']))
+        assert second['exec_info']['args'] == ["echo hello c"]
+        assert second['exec_info']['env'] == first['exec_info']['env']
+
+        assert len(calls) == 1
+        assert (daemon.hits, daemon.misses) == (1, 1)
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_only_prepare_variables_affect_reuse(monkeypatch):
+    def check(dirname):
+        calls = []
+        daemon = PrepareDaemon(prepare=_counting_prepare(calls))
+
+        daemon.handle(_request(dirname))
+        reply = daemon.handle(_request(dirname, environ=minimal_environ(SOME_JOB_ID='42')))
+        assert len(calls) == 1
+        # the unrelated variable is passed through to the command
+        assert reply['exec_info']['env']['SOME_JOB_ID'] == '42'
+
+        daemon.handle(_request(dirname, environ=minimal_environ(ANACONDA_PROJECT_SOMETHING='yes')))
+        assert len(calls) == 2
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_reloads_changed_project(monkeypatch):
+    def check(dirname):
+        calls = []
+        daemon = PrepareDaemon(prepare=_counting_prepare(calls))
+
+        assert daemon.handle(_request(dirname))['exec_info']['args'] == ["echo hello"]
+
+        filename = os.path.join(dirname, DEFAULT_PROJECT_FILENAME)
+        with open(filename, 'w') as f:
+            f.write(daemon_project.replace("echo hello", "echo goodbye"))
+        an_hour_ago = time.time() - 3600
+        os.utime(filename, (an_hour_ago, an_hour_ago))
+
+        assert daemon.handle(_request(dirname))['exec_info']['args'] == ["echo goodbye"]
+        assert len(calls) == 2
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_prepares_again_when_environment_changes(monkeypatch):
+    def check(dirname):
+        calls = []
+        daemon = PrepareDaemon(prepare=_counting_prepare(calls))
+
+        daemon.handle(_request(dirname))
+        os.makedirs(os.path.join(dirname, "envs", "default", "conda-meta"))
+        daemon.handle(_request(dirname))
+        assert len(calls) == 2
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_slow_prepare_does_not_block_other_projects(monkeypatch):
+    monkeypatch.setattr('anaconda_project.internal.run_snapshot.RACY_SECONDS', 0)
+
+    def check(dirname):
+        fast_dir = os.path.join(dirname, "fast")
+        slow_dir = os.path.join(dirname, "slow")
+        slow_started = threading.Event()
+        release_slow = threading.Event()
+
+        def prepare(project, **kwargs):
+            if project.directory_path == slow_dir:
+                slow_started.set()
+                release_slow.wait(30)
+            return prepare_without_interaction(project, **kwargs)
+
+        daemon = PrepareDaemon(prepare=prepare)
+        assert 'exec_info' in daemon.handle(_request(fast_dir))
+
+        slow_replies = []
+        thread = threading.Thread(target=lambda: slow_replies.append(daemon.handle(_request(slow_dir))))
+        thread.start()
+        try:
+            assert slow_started.wait(30)
+            # served from the cache while the other project is still preparing
+            assert 'exec_info' in daemon.handle(_request(fast_dir))
+            assert (daemon.hits, daemon.misses) == (1, 2)
+            assert slow_replies == []
+        finally:
+            release_slow.set()
+            thread.join()
+        assert 'exec_info' in slow_replies[0]
+
+    _push_fake_env_creator()
+    try:
+        with_directory_contents(
+            {
+                "fast/" + DEFAULT_PROJECT_FILENAME: daemon_project,
+                "slow/" + DEFAULT_PROJECT_FILENAME: daemon_project
+            }, check)
+    finally:
+        _pop_fake_env_creator()
+
+
+def test_falls_back(monkeypatch):
+    def check(dirname):
+        calls = []
+        daemon = PrepareDaemon(prepare=_counting_prepare(calls))
+
+        assert 'fallback' in daemon.handle(_request(dirname, version=0))
+        assert 'fallback' in daemon.handle(_request(dirname, mode='ask'))
+        assert 'fallback' in daemon.handle(_request(dirname, env_spec='nope'))
+        assert calls == []
+
+        # FOO has no value, so this needs someone to answer a question
+        for _ in range(2):
+            assert 'fallback' in daemon.handle(_request(dirname))
+        assert len(calls) == 2
+
+    _with_daemon_project(monkeypatch, check, contents=daemon_project + "variables:\n  - FOO\n")
+
+
+def test_falls_back_for_broken_project(monkeypatch):
+    def check(dirname):
+        daemon = PrepareDaemon()
+        assert 'fallback' in daemon.handle(_request(dirname))
+
+    _with_daemon_project(monkeypatch, check, contents="name: [not, a, string]\n")
+
+
+def _serve(daemon, socket_path):
+    server = daemon.listen(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    return stop
+
+
+def test_serves_requests_on_socket(monkeypatch):
+    def check(dirname):
+        socket_path = os.path.join(dirname, "daemon.sock")
+        # left behind by a daemon that died
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+
+        daemon = PrepareDaemon()
+        stop = _serve(daemon, socket_path)
+        try:
+            assert os.stat(socket_path).st_mode & 0o077 == 0
+            reply = daemon_protocol.request(socket_path, _request(dirname))
+            assert reply['exec_info']['args'] == ["echo hello"]
+
+            with pytest.raises(socket.error):
+                PrepareDaemon().listen(socket_path)
+        finally:
+            stop()
+
+        assert daemon_protocol.request(os.path.join(dirname, "nothing.sock"), _request(dirname)) is None
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_daemon_command_needs_socket(capsys, monkeypatch):
+    monkeypatch.delenv(daemon_protocol.SOCKET_VARIABLE, raising=False)
+    assert 1 == _parse_args_and_run_subcommand(['anaconda-project', 'daemon'])
+    out, err = capsys.readouterr()
+    assert "Specify --socket or set ANACONDA_PROJECT_DAEMON_SOCKET.\n" == err
+
+
+def test_replies_fallback_when_daemon_fails(monkeypatch):
+    def check(dirname):
+        socket_path = os.path.join(dirname, "daemon.sock")
+        daemon = PrepareDaemon()
+
+        def mock_handle(message):
+            raise RuntimeError("oops")
+
+        monkeypatch.setattr(daemon, 'handle', mock_handle)
+        stop = _serve(daemon, socket_path)
+        try:
+            assert daemon_protocol.request(socket_path, _request(dirname)) == dict(fallback="daemon failed: oops")
+
+            # a client that hangs up without a complete message gets nothing
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(socket_path)
+            client.sendall(b'{"version": ')
+            client.shutdown(socket.SHUT_WR)
+            assert client.recv(1024) == b''
+            client.close()
+        finally:
+            stop()
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_daemon_command_serves_until_interrupted(capsys, monkeypatch):
+    def check(dirname):
+        socket_path = os.path.join(dirname, "daemon.sock")
+        served = []
+
+        def mock_serve_forever(server, *args, **kwargs):
+            served.append(server.server_address)
+            assert os.path.exists(socket_path)
+            raise KeyboardInterrupt()
+
+        monkeypatch.setattr('anaconda_project.internal.cli.prepare_daemon._Server.serve_forever', mock_serve_forever)
+        assert 0 == _parse_args_and_run_subcommand(['anaconda-project', 'daemon', '--socket', socket_path])
+        assert served == [socket_path]
+        assert not os.path.exists(socket_path)
+
+        out, err = capsys.readouterr()
+        assert ("Preparing projects for 'anaconda-project run' on %s (Ctrl+C to stop).\n" % socket_path) == out
+        assert '' == err
+
+    with_directory_contents(dict(), check)
+
+
+def test_daemon_command_cannot_listen(capsys, monkeypatch):
+    def check(dirname):
+        socket_path = os.path.join(dirname, "missing", "daemon.sock")
+        monkeypatch.setenv(daemon_protocol.SOCKET_VARIABLE, socket_path)
+        assert 1 == _parse_args_and_run_subcommand(['anaconda-project', 'daemon'])
+
+        out, err = capsys.readouterr()
+        assert '' == out
+        assert err.startswith("Could not listen on %s: " % socket_path)
+
+    with_directory_contents(dict(), check)
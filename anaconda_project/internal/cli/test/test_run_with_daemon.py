@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import os
+
+from anaconda_project.internal.cli.prepare_daemon import PrepareDaemon
+from anaconda_project.internal.cli.ui_modes import _all_ui_modes, UI_MODE_TEXT_ASK_QUESTIONS
+from anaconda_project.internal.cli.run_with_daemon import (exec_with_daemon, _parse_run_args, _PROVIDE_MODE_FOR_UI_MODE)
+from anaconda_project.internal.cli.test.test_prepare_daemon import _serve, _with_daemon_project
+from anaconda_project.test.environ_utils import minimal_environ
+
+
+def test_parse_run_args():
+    args = _parse_run_args(['anaconda-project', 'run', '--directory', 'foo', '--env-spec', 'bar', 'hello', '-x', 'y'])
+    assert args.directory == 'foo'
+    assert args.env_spec == 'bar'
+    assert args.mode == 'development_defaults_or_ask'
+    assert args.command == 'hello'
+    assert args.extra_args_for_command == ['-x', 'y']
+
+    assert _parse_run_args(['anaconda-project', 'prepare']) is None
+    assert _parse_run_args(['anaconda-project', '--verbose', 'run']) is None
+    assert _parse_run_args(['anaconda-project', 'run', '--help']) is None
+    assert _parse_run_args(['anaconda-project', 'run', '--mode', 'ask']) is None
+
+
+def test_supports_all_modes_run_supports():
+    run_modes = set(_all_ui_modes) - set([UI_MODE_TEXT_ASK_QUESTIONS])
+    assert run_modes == set(_PROVIDE_MODE_FOR_UI_MODE.keys())
+
+
+def _mock_execvpe(monkeypatch):
+    executed = dict()
+
+    def mock_execvpe(file, args, env):
+        executed['file'] = file
+        executed['args'] = args
+        executed['env'] = env
+        executed['cwd'] = os.getcwd()
+
+    monkeypatch.setattr('os.execvpe', mock_execvpe)
+    return executed
+
+
+def test_exec_with_daemon(monkeypatch):
+    def check(dirname):
+        socket_path = os.path.join(dirname, "daemon.sock")
+        stop = _serve(PrepareDaemon(), socket_path)
+        try:
+            executed = _mock_execvpe(monkeypatch)
+            environ = minimal_environ(ANACONDA_PROJECT_DAEMON_SOCKET=socket_path)
+            old_dir = os.getcwd()
+            exec_with_daemon(['anaconda-project', 'run', '--directory', dirname, 'hello', 'world'], environ)
+            assert os.getcwd() == old_dir
+        finally:
+            stop()
+
+        assert executed['file'] == '/bin/sh'
+        assert executed['args'] == ['/bin/sh', '-c', 'echo hello world']
+        assert executed['cwd'] == dirname
+        assert executed['env']['PROJECT_DIR'] == dirname
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_exec_with_daemon_does_nothing_without_daemon(monkeypatch):
+    def check(dirname):
+        executed = _mock_execvpe(monkeypatch)
+        argv = ['anaconda-project', 'run', '--directory', dirname, 'hello']
+
+        exec_with_daemon(argv, minimal_environ())
+        environ = minimal_environ(ANACONDA_PROJECT_DAEMON_SOCKET=os.path.join(dirname, "nothing.sock"))
+        exec_with_daemon(argv, environ)
+        assert executed == dict()
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_exec_with_daemon_does_nothing_on_fallback(monkeypatch):
+    def check(dirname):
+        socket_path = os.path.join(dirname, "daemon.sock")
+        stop = _serve(PrepareDaemon(), socket_path)
+        try:
+            executed = _mock_execvpe(monkeypatch)
+            environ = minimal_environ(ANACONDA_PROJECT_DAEMON_SOCKET=socket_path)
+            exec_with_daemon(['anaconda-project', 'run', '--directory', dirname, '--env-spec', 'nope'], environ)
+            assert executed == dict()
+        finally:
+            stop()
+
+    _with_daemon_project(monkeypatch, check)
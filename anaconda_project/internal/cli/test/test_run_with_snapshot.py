@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import os
+import shutil
+import time
+
+from anaconda_project.internal.cli.run import run_command
+from anaconda_project.internal.cli.run_with_snapshot import exec_with_snapshot
+from anaconda_project.internal.cli.test.test_prepare_daemon import _with_daemon_project
+from anaconda_project.internal.cli.test.test_run_with_daemon import _mock_execvpe
+
+
+def test_run_saves_snapshot_and_exec_uses_it(monkeypatch):
+    def check(dirname):
+        monkeypatch.setenv('ANACONDA_PROJECT_RUN_SNAPSHOT_DIR', os.path.join(dirname, "snapshots"))
+        argv = ['anaconda-project', 'run', '--directory', dirname, 'hello', 'world']
+
+        executed = _mock_execvpe(monkeypatch)
+        assert exec_with_snapshot(argv, os.environ) is None
+        assert executed == dict()
+
+        run_command(dirname, 'development_defaults_or_ask', None, 'hello', ['world'])
+        assert executed['args'] == ['/bin/sh', '-c', 'echo hello world']
+        prepared_env = executed['env']
+
+        executed = _mock_execvpe(monkeypatch)
+        monkeypatch.setattr('anaconda_project.internal.cli.run.load_project', None)
+        exec_with_snapshot(argv, os.environ)
+        assert executed['file'] == '/bin/sh'
+        assert executed['args'] == ['/bin/sh', '-c', 'echo hello world']
+        assert executed['cwd'] == dirname
+        assert executed['env'] == prepared_env
+
+        # different arguments need their own prepare
+        executed = _mock_execvpe(monkeypatch)
+        exec_with_snapshot(argv[:-1], os.environ)
+        assert executed == dict()
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def _make_pip_package(dirname):
+    site_packages = os.path.join(dirname, 'envs', 'default', 'lib', 'python3.7', 'site-packages')
+    dist_info = os.path.join(site_packages, 'foo-1.0.dist-info')
+    os.makedirs(dist_info)
+    when = time.time() - 60
+    os.utime(site_packages, (when, when))
+    return dist_info
+
+
+def test_pip_change_invalidates_snapshot(monkeypatch):
+    def check(dirname):
+        monkeypatch.setenv('ANACONDA_PROJECT_RUN_SNAPSHOT_DIR', os.path.join(dirname, "snapshots"))
+        argv = ['anaconda-project', 'run', '--directory', dirname, 'hello']
+        dist_info = _make_pip_package(dirname)
+
+        executed = _mock_execvpe(monkeypatch)
+        run_command(dirname, 'development_defaults_or_ask', None, 'hello', [])
+        assert executed['args'] == ['/bin/sh', '-c', 'echo hello']
+
+        executed = _mock_execvpe(monkeypatch)
+        exec_with_snapshot(argv, os.environ)
+        assert executed['args'] == ['/bin/sh', '-c', 'echo hello']
+
+        # as if we'd "pip uninstall foo", which doesn't touch conda-meta
+        shutil.rmtree(dist_info)
+        executed = _mock_execvpe(monkeypatch)
+        exec_with_snapshot(argv, os.environ)
+        assert executed == dict()
+
+    _with_daemon_project(monkeypatch, check)
+
+
+def test_no_snapshot_for_encrypted_variables(monkeypatch):
+    def check(dirname):
+        snapshot_dir = os.path.join(dirname, "snapshots")
+        monkeypatch.setenv('ANACONDA_PROJECT_RUN_SNAPSHOT_DIR', snapshot_dir)
+        monkeypatch.setenv('DB_PASSWORD', 'secret')
+
+        executed = _mock_execvpe(monkeypatch)
+        run_command(dirname, 'development_defaults_or_ask', None, 'hello', [])
+        assert executed['env']['DB_PASSWORD'] == 'secret'
+        assert not os.path.exists(snapshot_dir)
+
+    _with_daemon_project(monkeypatch,
+                         check,
+                         contents="""
+name: snapshot_test
+platforms: [linux-32,linux-64,osx-64,win-32,win-64]
+variables:
+  - DB_PASSWORD
+commands:
+  hello:
+    unix: echo hello
+    windows: echo hello
+""")
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""The kinds of command a project can define.
+
+These live apart from ``project`` so the command line parser can
+list them without importing the rest of the package.
+"""
+
+# These strings are used in the command line options to anaconda-project,
+# so changing them has back-compat consequences.
+COMMAND_TYPE_CONDA_APP_ENTRY = 'conda_app_entry'
+COMMAND_TYPE_SHELL = 'unix'
+COMMAND_TYPE_WINDOWS = 'windows'
+COMMAND_TYPE_NOTEBOOK = 'notebook'
+COMMAND_TYPE_BOKEH_APP = 'bokeh_app'
+
+ALL_COMMAND_TYPES = (COMMAND_TYPE_CONDA_APP_ENTRY, COMMAND_TYPE_SHELL, COMMAND_TYPE_WINDOWS, COMMAND_TYPE_NOTEBOOK,
+                     COMMAND_TYPE_BOKEH_APP)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Compressed output streams for writing archives.
+
+The gzip and bz2 writers split the data into large blocks and
+compress several blocks at once on threads (zlib and bz2 release
+the GIL while they work), the way pigz does. The result is still
+an ordinary file that the gzip and bz2 modules (and so tarfile)
+can read: for gzip, one member made of sync-flushed deflate
+blocks; for bz2, one complete stream per block, back to back.
+"""
+from __future__ import absolute_import
+
+import bz2
+import gzip
+import struct
+import sys
+import time
+import zlib
+
+from anaconda_project.internal.parallel import map_in_threads, worker_count_from_environment
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover (python 2)
+    lzma = None
+
+# tar compression methods, named the way tarfile names them
+METHODS = (None, 'gz', 'bz2', 'xz')
+
+MIN_LEVEL = 0
+MAX_LEVEL = 9
+
+# same as tarfile.open
+DEFAULT_LEVEL = 9
+# same as the xz command
+DEFAULT_XZ_LEVEL = 6
+
+_GZIP_BLOCK_SIZE = 1024 * 1024
+_BZ2_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def compress_worker_count():
+    """Number of threads to compress with (ANACONDA_PROJECT_COMPRESS_WORKERS, default the number of CPUs)."""
+    return worker_count_from_environment('ANACONDA_PROJECT_COMPRESS_WORKERS')
+
+
+def method_available(method):
+    """True if we can write (and tarfile can read) the given method."""
+    if method == 'xz':
+        return lzma is not None
+    return method in METHODS
+
+
+def _multistream_bz2_readable():
+    # before 3.3 the bz2 module stops after the first stream
+    return sys.version_info >= (3, 3)
+
+
+class _BlockWriter(object):
+    """A write-only file which compresses blocks of data on several threads.
+
+    Subclasses provide ``_header``, ``_compress_block`` and ``_trailer``.
+    """
+    def __init__(self, filename, level, workers, block_size):
+        self._file = open(filename, 'wb')
+        self._level = level
+        self._workers = workers
+        self._block_size = block_size
+        self._pending = []
+        self._pending_size = 0
+        self._blocks = []
+        self._offset = 0
+        self.closed = False
+        try:
+            self._file.write(self._header())
+        except Exception:
+            self._file.close()
+            raise
+
+    def write(self, data):
+        """Write bytes; they are compressed later, a batch of blocks at a time."""
+        if not data:
+            return
+        self._consumed(data)
+        self._offset += len(data)
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size < self._block_size:
+            return
+        joined = b"".join(self._pending)
+        start = 0
+        while len(joined) - start >= self._block_size:
+            self._blocks.append(joined[start:start + self._block_size])
+            start += self._block_size
+            if len(self._blocks) >= self._workers:
+                self._flush_blocks()
+        rest = joined[start:]
+        self._pending = [rest] if rest else []
+        self._pending_size = len(rest)
+
+    def tell(self):
+        """Number of uncompressed bytes written so far."""
+        return self._offset
+
+    def _flush_blocks(self):
+        # we keep at most one block per worker in memory, compress
+        # them all at once, then write them out in order
+        for compressed in map_in_threads(self._compress_block, self._blocks, self._workers):
+            self._file.write(compressed)
+        self._blocks = []
+
+    def close(self):
+        """Compress anything left, write the trailer, and close the file."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self._pending_size > 0:
+                self._blocks.append(b"".join(self._pending))
+                self._pending = []
+                self._pending_size = 0
+            self._flush_blocks()
+            self._file.write(self._trailer())
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _consumed(self, data):
+        pass
+
+    def _header(self):
+        return b""
+
+    def _trailer(self):
+        return b""
+
+
+class _GzipBlockWriter(_BlockWriter):
+    def __init__(self, filename, level, workers):
+        self._crc = zlib.crc32(b"") & 0xffffffff
+        super(_GzipBlockWriter, self).__init__(filename, level, workers, _GZIP_BLOCK_SIZE)
+
+    def _consumed(self, data):
+        self._crc = zlib.crc32(data, self._crc) & 0xffffffff
+
+    def _header(self):
+        # magic, deflate, no flags, mtime, no extra flags, unknown OS
+        return b"\x1f\x8b\x08\x00" + struct.pack("<L", int(time.time()) & 0xffffffff) + b"\x00\xff"
+
+    def _compress_block(self, block):
+        # A sync flush ends the block on a byte boundary without
+        # marking it final, so the blocks can simply be concatenated.
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _trailer(self):
+        # an empty final block to end the deflate stream, then crc and size
+        ending = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH)
+        return ending + struct.pack("<LL", self._crc, self._offset & 0xffffffff)
+
+
+class _Bz2BlockWriter(_BlockWriter):
+    def __init__(self, filename, level, workers):
+        super(_Bz2BlockWriter, self).__init__(filename, level, workers, _BZ2_BLOCK_SIZE)
+
+    def _compress_block(self, block):
+        # bz2 has no level 0
+        return bz2.compress(block, max(1, self._level))
+
+
+def open_for_writing(filename, method, level=None, workers=None):
+    """Open a file which compresses what's written to it.
+
+    Args:
+        filename (str): file to create
+        method (str): one of ``METHODS``; None for no compression
+        level (int): 0-9, or None for the method's default
+        workers (int): threads to compress with, None for ``compress_worker_count()``
+
+    Returns:
+        a binary file-like object with ``write``, ``tell`` and ``close``
+    """
+    if not method_available(method):
+        raise ValueError("Compression method %r is not available." % (method, ))
+    if level is None:
+        level = DEFAULT_XZ_LEVEL if method == 'xz' else DEFAULT_LEVEL
+    if level < MIN_LEVEL or level > MAX_LEVEL:
+        raise ValueError("Compression level must be from %d to %d, not %d." % (MIN_LEVEL, MAX_LEVEL, level))
+    if workers is None:
+        workers = compress_worker_count()
+
+    if method is None:
+        return open(filename, 'wb')
+    elif method == 'gz':
+        if workers > 1:
+            return _GzipBlockWriter(filename, level, workers)
+        else:
+            return gzip.GzipFile(filename, 'wb', compresslevel=level)
+    elif method == 'bz2':
+        if workers > 1 and _multistream_bz2_readable():
+            return _Bz2BlockWriter(filename, level, workers)
+        else:
+            return bz2.BZ2File(filename, 'w', compresslevel=max(1, level))
+    else:
+        assert method == 'xz'
+        # the lzma module has no threaded mode
+        return lzma.LZMAFile(filename, 'w', preset=level)
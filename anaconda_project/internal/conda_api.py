@@ -9,6 +9,7 @@ from __future__ import absolute_import, print_function, division, unicode_litera
 
 import collections
 import errno
+import hashlib
 import json
 import os
 import platform
@@ -18,6 +19,8 @@ import sys
 import tempfile
 
 from anaconda_project.internal import streaming_popen
+from anaconda_project.internal import conda_meta_index
+from anaconda_project.internal import solve_cache
 from anaconda_project.internal.directory_contains import subdirectory_relative_to_directory
 from anaconda_project.internal.py2_compat import is_string
 
@@ -134,18 +137,17 @@ def _call_conda(extra_args, json_mode=False, platform=None, stdout_callback=None
     (cmd_list, command_in_errors) = _get_platform_hacked_conda_command(extra_args, platform=platform)
 
     try:
-        (p, stdout_lines, stderr_lines) = streaming_popen.popen(cmd_list,
-                                                                stdout_callback=stdout_callback,
-                                                                stderr_callback=stderr_callback)
+        # get stdout as one string, since it can be a big JSON document
+        (p, out, errstr) = streaming_popen.popen_text(cmd_list,
+                                                      stdout_callback=stdout_callback,
+                                                      stderr_callback=stderr_callback)
     except OSError as e:
         raise CondaError("failed to run: %r: %r" % (command_in_errors, repr(e)))
-    errstr = "".join(stderr_lines)
     if p.returncode != 0:
         parsed = None
         message = errstr
         if json_mode:
             try:
-                out = "".join(stdout_lines)
                 parsed = json.loads(out)
                 if parsed is not None and isinstance(parsed, dict):
                     # some versions of conda do 'error' and others
@@ -162,10 +164,10 @@ def _call_conda(extra_args, json_mode=False, platform=None, stdout_callback=None
     elif errstr != '' and stderr_callback is None:
         # this is a sort of fallback because not all of our code
         # passes in a callback yet.
-        for line in stderr_lines:
+        for line in errstr.splitlines():
             print("%s %s: %s" % ("conda", extra_args[0], line.strip()), file=sys.stderr)
 
-    return "".join(stdout_lines)
+    return out
 
 
 def _call_and_parse_json(extra_args, platform=None):
@@ -234,6 +236,19 @@ def create(prefix, pkgs=None, channels=(), stdout_callback=None, stderr_callback
     _call_conda(cmd_list, stdout_callback=stdout_callback, stderr_callback=stderr_callback)
 
 
+def clone(prefix, source_prefix, stdout_callback=None, stderr_callback=None):
+    """Create an environment at prefix with the same packages as source_prefix.
+
+    conda links the packages from its package cache and fixes up
+    any files which contain the source prefix.
+    """
+    if os.path.exists(prefix):
+        raise CondaEnvExistsError('Conda environment [%s] already exists' % prefix)
+
+    cmd_list = ['create', '--yes', '--prefix', prefix, '--clone', source_prefix]
+    _call_conda(cmd_list, stdout_callback=stdout_callback, stderr_callback=stderr_callback)
+
+
 def install(prefix, pkgs=None, channels=(), stdout_callback=None, stderr_callback=None):
     """Install packages into an environment either by name or path with a specified set of packages."""
     if not pkgs or not isinstance(pkgs, (list, tuple)):
@@ -272,9 +287,7 @@ def _parse_dist(dist):
         return None
 
 
-def installed(prefix):
-    """Get a dict of package names to (name, version, build) tuples."""
-    meta_dir = os.path.join(prefix, 'conda-meta')
+def _list_conda_meta(meta_dir):
     try:
         full_names = set(fn[:-5] for fn in os.listdir(meta_dir) if fn.endswith('.json'))
     except OSError as e:
@@ -282,20 +295,166 @@ def installed(prefix):
             full_names = set()
         else:
             raise CondaError(str(e))
-    result = dict()
+    packages = []
     for full_name in full_names:
         pieces = _parse_dist(full_name)
         if pieces is not None:
-            result[pieces[0]] = pieces
-    return result
+            packages.append(pieces)
+    return packages
+
+
+_conda_meta_index = None
+
+
+def _get_conda_meta_index():
+    global _conda_meta_index
+
+    if os.environ.get('ANACONDA_PROJECT_DISABLE_INSTALLED_CACHE', '') != '':
+        directory = None
+    else:
+        directory = (os.environ.get('ANACONDA_PROJECT_INSTALLED_CACHE_DIR', '')
+                     or solve_cache.default_directory("installed"))
+    if _conda_meta_index is None or _conda_meta_index.directory != directory:
+        _conda_meta_index = conda_meta_index.CondaMetaIndex(directory)
+    return _conda_meta_index
+
+
+def installed(prefix):
+    """Get a dict of package names to (name, version, build) tuples.
+
+    The parsed contents of conda-meta are cached, in memory and on
+    disk unless ANACONDA_PROJECT_DISABLE_INSTALLED_CACHE is set,
+    until conda-meta changes.
+    """
+    meta_dir = os.path.join(os.path.abspath(prefix), 'conda-meta')
+    packages = _get_conda_meta_index().packages(meta_dir, _list_conda_meta)
+    return dict((pieces[0], pieces) for pieces in packages)
+
+
+_cached_info = None
+
+
+def _get_cached_info():
+    # what we use from conda info doesn't change while we're
+    # running, and conda info is slow
+    global _cached_info
+
+    if _cached_info is None:
+        _cached_info = info()
+    return _cached_info
+
+
+def _get_pkgs_dirs():
+    return _get_cached_info().get('pkgs_dirs', [])
+
+
+def _configured_channels():
+    # conda searches the channels from .condarc (or $CONDARC) as
+    # well as any we pass on the command line
+    try:
+        return _get_cached_info().get('channels', [])
+    except CondaError:
+        return None
+
+
+def _channel_index_token():
+    # conda keeps its downloaded channel indexes in pkgs/cache,
+    # so this changes whenever conda refreshes an index.
+    try:
+        pkgs_dirs = _get_pkgs_dirs()
+    except CondaError:
+        return None
+    digest = hashlib.sha1()
+    for pkgs_dir in pkgs_dirs:
+        cache_dir = os.path.join(pkgs_dir, 'cache')
+        try:
+            names = sorted(name for name in os.listdir(cache_dir) if name.endswith('.json'))
+        except OSError:
+            continue
+        for name in names:
+            try:
+                st = os.stat(os.path.join(cache_dir, name))
+            except OSError:
+                continue
+            digest.update(("%s %s %d %d\n" % (cache_dir, name, int(st.st_mtime), st.st_size)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+_solve_cache = None
+
+
+def _get_solve_cache():
+    """Get the solve cache, or None if it's disabled."""
+    global _solve_cache
+
+    if os.environ.get('ANACONDA_PROJECT_DISABLE_SOLVE_CACHE', '') != '':
+        return None
+    directory = os.environ.get('ANACONDA_PROJECT_SOLVE_CACHE_DIR', '') or solve_cache.default_directory()
+    try:
+        max_entries = int(os.environ.get('ANACONDA_PROJECT_SOLVE_CACHE_SIZE', solve_cache.DEFAULT_MAX_ENTRIES))
+    except ValueError:
+        max_entries = solve_cache.DEFAULT_MAX_ENTRIES
+    if _solve_cache is None or _solve_cache.directory != directory or _solve_cache.max_entries != max_entries:
+        _solve_cache = solve_cache.SolveCache(directory, max_entries=max_entries)
+    return _solve_cache
+
+
+def solve_cache_statistics():
+    """Get a dict with the ``hits`` and ``misses`` of the solve cache in this process."""
+    cache = _solve_cache
+    if cache is None:
+        return dict(hits=0, misses=0)
+    return dict(hits=cache.hits, misses=cache.misses)
+
+
+def _solve_cache_key(cache, pkgs, channels, platform):
+    """Get the solve cache key, or None if we can't tell which channels conda would use."""
+    configured_channels = _configured_channels()
+    if configured_channels is None:
+        return None
+    return cache.key(pkgs, channels, platform or current_platform(), configured_channels=configured_channels)
+
+
+def forget_resolved_dependencies(pkgs, channels=(), platform=None):
+    """Drop any cached result of resolve_dependencies() with these args, so the next call runs conda."""
+    cache = _get_solve_cache()
+    key = None if cache is None else _solve_cache_key(cache, pkgs, channels, platform)
+    if key is not None:
+        cache.forget(key)
 
 
 def resolve_dependencies(pkgs, channels=(), platform=None):
-    """Resolve packages into a full transitive list of (name, version, build) tuples."""
+    """Resolve packages into a full transitive list of (name, version, build) tuples.
+
+    Results are cached on disk unless ANACONDA_PROJECT_DISABLE_SOLVE_CACHE is set.
+    """
     if not pkgs or not isinstance(pkgs, (list, tuple)):
         raise TypeError('must specify a list of one or more packages to install into existing environment, not %r',
                         pkgs)
 
+    cache = _get_solve_cache()
+    key = None if cache is None else _solve_cache_key(cache, pkgs, channels, platform)
+    if key is not None:
+        token = _channel_index_token()
+        if token is not None:
+            cached = cache.get(key, token)
+            if cached is not None:
+                return cached
+
+    results = _resolve_dependencies_with_conda(pkgs, channels, platform)
+
+    if key is not None:
+        # conda may have refreshed its index while solving, so we
+        # get the token again
+        token = _channel_index_token()
+        if token is not None:
+            cache.put(key, token, results)
+
+    return results
+
+
+def _resolve_dependencies_with_conda(pkgs, channels, platform):
+
     # even with --dry-run, conda wants to create the prefix,
     # so we ensure it's somewhere out of the way.
     prefix = tempfile.mkdtemp(prefix="_anaconda_project_resolve_")
@@ -468,16 +627,34 @@ $                                  # end-of-line
 
 _conda_constraint_pat = re.compile('=(?P<version>[^=<>!]+)(?P<build>=[^=<>!]+)?', re.VERBOSE)
 
+# ParsedSpec is immutable so we can hand out the same one each time
+_parsed_specs = dict()
+_MAX_PARSED_SPECS = 10000
+
 
 def parse_spec(spec):
     """Parse a package name and version spec as conda would.
 
+    Results are remembered, since we parse the same specs on every prepare.
+
     Returns:
        ``ParsedSpec`` or None on failure
     """
     if not is_string(spec):
         raise TypeError("Expected a string not %r" % spec)
 
+    try:
+        return _parsed_specs[spec]
+    except KeyError:
+        pass
+    parsed = _parse_spec_uncached(spec)
+    if len(_parsed_specs) >= _MAX_PARSED_SPECS:
+        _parsed_specs.clear()
+    _parsed_specs[spec] = parsed
+    return parsed
+
+
+def _parse_spec_uncached(spec):
     m = _spec_pat.match(spec)
     if m is None:
         return None
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Cache of the packages installed in a prefix, keyed on the conda-meta directory.
+
+conda adds and removes a json file in ``conda-meta`` for every
+package it installs or removes, which changes the directory's
+mtime. So as long as the directory looks the same as last time,
+we can reuse the list of packages we parsed then, either from
+memory or from a small JSON file in the user's cache directory.
+
+Filesystems may only store mtimes to the second, so a directory
+modified very recently could change again without its mtime
+changing; we don't cache anything about those.
+"""
+from __future__ import absolute_import
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+import time
+
+from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+from anaconda_project.internal.rename import rename_over_existing
+
+# seconds; a directory modified more recently than this isn't cached
+RACY_SECONDS = 2.0
+
+
+def _stat_key(meta_dir):
+    """Describe the directory in a way that changes when files come and go, or None if it's too new to trust."""
+    info = os.stat(meta_dir)
+    if time.time() - info.st_mtime < RACY_SECONDS:
+        return None
+    return [repr(info.st_mtime), info.st_ino, info.st_dev]
+
+
+class CondaMetaIndex(object):
+    """Installed packages per prefix, in memory and optionally on disk."""
+    def __init__(self, directory=None):
+        """Create an index, saving entries in directory unless it's None."""
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._memory = dict()
+        self._lock = threading.Lock()
+
+    def _filename(self, meta_dir):
+        key = hashlib.sha1(meta_dir.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def _load(self, meta_dir, stat_key):
+        if self.directory is None:
+            return None
+        try:
+            with codecs.open(self._filename(meta_dir), 'r', encoding='utf-8') as f:
+                entry = json.loads(f.read())
+            if entry['meta_dir'] != meta_dir or entry['stat'] != stat_key:
+                return None
+            return [tuple(item) for item in entry['packages']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, meta_dir, stat_key, packages):
+        if self.directory is None:
+            return
+        filename = self._filename(meta_dir)
+        tmp_filename = "%s.tmp-%d-%d" % (filename, os.getpid(), threading.current_thread().ident)
+        try:
+            makedirs_ok_if_exists(self.directory)
+            with codecs.open(tmp_filename, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(dict(meta_dir=meta_dir, stat=stat_key, packages=[list(p) for p in packages])))
+            rename_over_existing(tmp_filename, filename)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_filename)
+            except OSError:
+                pass
+
+    def packages(self, meta_dir, list_packages):
+        """Get the list of (name, version, build) tuples for a conda-meta directory.
+
+        Args:
+            meta_dir (str): the conda-meta directory
+            list_packages (callable): takes meta_dir and returns the tuples, used on a cache miss
+
+        Returns:
+            list of (name, version, build) tuples
+        """
+        try:
+            stat_key = _stat_key(meta_dir)
+        except OSError:
+            # let list_packages decide what a missing or unreadable directory means
+            return list_packages(meta_dir)
+
+        if stat_key is not None:
+            with self._lock:
+                cached = self._memory.get(meta_dir)
+            if cached is not None and cached[0] == stat_key:
+                self._count(hit=True)
+                return cached[1]
+            from_disk = self._load(meta_dir, stat_key)
+            if from_disk is not None:
+                self._count(hit=True)
+                self._remember(meta_dir, stat_key, from_disk)
+                return from_disk
+
+        self._count(hit=False)
+        packages = list_packages(meta_dir)
+        if stat_key is not None:
+            self._remember(meta_dir, stat_key, packages)
+            self._save(meta_dir, stat_key, packages)
+        return packages
+
+    def _remember(self, meta_dir, stat_key, packages):
+        with self._lock:
+            self._memory[meta_dir] = (stat_key, packages)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Messages between ``anaconda-project run`` and the prepare daemon.
+
+Each message is one line of JSON sent over a unix socket; the
+client sends a request and the daemon sends back one reply.
+
+This module only uses the standard library, because the client
+side runs before we've imported anything else; the whole point of
+the daemon is to skip that.
+"""
+from __future__ import absolute_import
+
+import json
+import socket
+
+# set this to the daemon's socket path to have ``run`` hand off to it
+SOCKET_VARIABLE = 'ANACONDA_PROJECT_DAEMON_SOCKET'
+
+PROTOCOL_VERSION = 1
+
+# seconds to wait for the daemon to answer; it may have to create
+# an environment, so this is generous
+DEFAULT_TIMEOUT = 60 * 60
+
+
+class ProtocolError(Exception):
+    """Raised when a message is malformed or the other side hangs up early."""
+    pass
+
+
+def send_message(sock, message):
+    """Send a dict as a line of JSON."""
+    sock.sendall((json.dumps(message) + "\n").encode('utf-8'))
+
+
+def receive_message(sock):
+    """Receive a line of JSON and return it as a dict.
+
+    Raises:
+        ProtocolError if the connection closes before a whole line arrives or the line isn't a JSON object
+    """
+    chunks = []
+    while True:
+        chunk = sock.recv(64 * 1024)
+        if not chunk:
+            raise ProtocolError("connection closed before a complete message")
+        chunks.append(chunk)
+        if chunk.endswith(b"\n"):
+            break
+    try:
+        message = json.loads(b"".join(chunks).decode('utf-8'))
+    except ValueError as e:
+        raise ProtocolError("invalid message: %s" % e)
+    if not isinstance(message, dict):
+        raise ProtocolError("invalid message: not an object")
+    return message
+
+
+def request(socket_path, message, timeout=DEFAULT_TIMEOUT):
+    """Send a request to the daemon and get its reply.
+
+    Args:
+        socket_path (str): the daemon's unix socket
+        message (dict): the request
+        timeout (float): seconds to wait for the reply
+
+    Returns:
+        the reply dict, or None if there's no daemon listening or it didn't answer properly
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        message = dict(message, version=PROTOCOL_VERSION)
+        send_message(sock, message)
+        return receive_message(sock)
+    except (socket.error, ProtocolError):
+        return None
+    finally:
+        sock.close()
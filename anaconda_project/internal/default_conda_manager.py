@@ -9,16 +9,46 @@
 from __future__ import absolute_import
 
 import codecs
-import glob
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
 
-from anaconda_project.conda_manager import (CondaManager, CondaEnvironmentDeviations, CondaLockSet, CondaManagerError)
+from anaconda_project.conda_manager import (CondaManager, CondaEnvironmentDeviations, CondaLockSet, CondaManagerError,
+                                            solve_worker_count)
 import anaconda_project.internal.conda_api as conda_api
 import anaconda_project.internal.pip_api as pip_api
+import anaconda_project.internal.env_fingerprint as env_fingerprint
+import anaconda_project.internal.env_pool as env_pool
 import anaconda_project.internal.makedirs as makedirs
+import anaconda_project.internal.parallel as parallel
 
 from anaconda_project import __version__ as version
 
+# Shared among all DefaultCondaManager instances, since callers may
+# resolve several env specs at once on separate threads, each of
+# which resolves several platforms at once.
+_solve_semaphore = None
+_solve_semaphore_lock = threading.Lock()
+
+
+def _solve_slots():
+    global _solve_semaphore
+    with _solve_semaphore_lock:
+        if _solve_semaphore is None:
+            _solve_semaphore = threading.BoundedSemaphore(solve_worker_count())
+        return _solve_semaphore
+
+
+def _get_env_pool():
+    """The pool of golden environments, or None unless ANACONDA_PROJECT_ENV_POOL_DIR is set."""
+    directory = os.environ.get('ANACONDA_PROJECT_ENV_POOL_DIR', '')
+    if directory == '':
+        return None
+    return env_pool.EnvPool(os.path.abspath(directory))
+
 
 def _refactor_common_packages(existing_sets, include_predicate, factored_name):
     # For items in existing_sets included by include_predicate,
@@ -124,68 +154,36 @@ class DefaultCondaManager(CondaManager):
     def _timestamp_file(self, prefix, spec):
         return os.path.join(self._cache_directory(prefix), "env-specs", spec.locked_hash)
 
-    def _timestamp_comparison_directories(self, prefix):
-        # this is a little bit heuristic; we are trying to detect
-        # if any packages are installed or removed. This may need
-        # to become more comprehensive.  We don't want to check
-        # directories that would change at runtime like /var/run,
-        # and we need this to be reasonably fast (so we can't do a
-        # full directory walk or something). Remember that on
-        # Linux at least a new mtime on a directory means
-        # _immediate_ child directory entries were added or
-        # removed, changing the files themselves or the files in
-        # subdirs will not affect mtime. Windows may be a bit
-        # different.
-
-        # Linux
-        dirs = list(glob.iglob(os.path.join(prefix, "lib", "python*", "site-packages")))
-        dirs.append(os.path.join(prefix, "bin"))
-        dirs.append(os.path.join(prefix, "lib"))
-        # Windows
-        dirs.append(os.path.join(prefix, "Lib", "site-packages"))
-        dirs.append(os.path.join(prefix, "Library", "bin"))
-        dirs.append(os.path.join(prefix, "Scripts"))
-        # conda-meta
-        dirs.append(os.path.join(prefix, "conda-meta"))
-
-        return dirs
-
     def _timestamp_file_up_to_date(self, prefix, spec):
         # The goal here is to return False if 1) the env spec
         # has changed (different hash) or 2) the environment has
-        # been modified (e.g. by pip or conda).
+        # been modified (e.g. by pip or conda). We detect 2) by
+        # recording a fingerprint of the installed packages when
+        # we write the timestamp file; see env_fingerprint.py.
 
         filename = self._timestamp_file(prefix, spec)
         try:
-            stamp_mtime = os.path.getmtime(filename)
-        except OSError:
+            with codecs.open(filename, 'r', encoding='utf-8') as f:
+                content = json.loads(f.read())
+        except (IOError, OSError, ValueError):
             return False
 
-        dirs = self._timestamp_comparison_directories(prefix)
-
-        for d in dirs:
-            try:
-                d_mtime = os.path.getmtime(d)
-            except OSError:
-                d_mtime = 0
-            # When we write the timestamp, we put it 1s in the
-            # future, so we want >= here (if the d_mtime has gone
-            # into the future from when we wrote the timestamp,
-            # the directory has changed).
-            if d_mtime >= stamp_mtime:
-                return False
+        if not isinstance(content, dict) or 'fingerprint' not in content:
+            # written by an older version of anaconda-project
+            return False
 
-        return True
+        return content['fingerprint'] == env_fingerprint.compute_fingerprint(prefix, self._cache_directory(prefix))
 
-    def _write_a_file(self, filename):
+    def _write_a_file(self, filename, extra_content=None):
+        # we don't read the version for now, but recording it in
+        # case in the future that is useful.
+        content = dict(anaconda_project_version=version)
+        if extra_content is not None:
+            content.update(extra_content)
         try:
             makedirs.makedirs_ok_if_exists(os.path.dirname(filename))
             with codecs.open(filename, 'w', encoding='utf-8') as f:
-                # we don't read the contents of the file for now, but
-                # recording the version in it in case in the future
-                # that is useful. We need to write something to the
-                # file to bump its mtime if it already exists...
-                f.write('{"anaconda_project_version": "%s"}\n' % version)
+                f.write(json.dumps(content) + "\n")
             return True
         except (IOError, OSError):
             # ignore errors because this is just an optimization, if we
@@ -197,20 +195,8 @@ class DefaultCondaManager(CondaManager):
         return self._write_a_file(filename)
 
     def _write_timestamp_file(self, prefix, spec):
-        filename = self._timestamp_file(prefix, spec)
-        if self._write_a_file(filename):
-            # set the timestamp 1s in the future, which guarantees
-            # it doesn't have the same mtime as any files in the
-            # environment changed by us; if another process
-            # changes some files during the current second, then
-            # we would not notice those changes. The alternative
-            # is that we falsely believe we changed things
-            # ourselves. Ultimately clock resolution keeps us from
-            # perfection here without some sort of cross-process
-            # locking.
-            actual_time = os.path.getmtime(filename)
-            next_tick_time = actual_time + 1
-            os.utime(filename, (next_tick_time, next_tick_time))
+        fingerprint = env_fingerprint.compute_fingerprint(prefix, self._cache_directory(prefix))
+        self._write_a_file(self._timestamp_file(prefix, spec), dict(fingerprint=fingerprint))
 
     def resolve_dependencies(self, package_specs, channels, platforms):
         by_platform = {}
@@ -224,11 +210,28 @@ class DefaultCondaManager(CondaManager):
             resolve_for_platforms.remove(current)
             resolve_for_platforms = [current] + resolve_for_platforms
         for conda_platform in resolve_for_platforms:
-            try:
-                self._log_info("Resolving conda packages for %s" % conda_platform)
-                deps = conda_api.resolve_dependencies(pkgs=package_specs, platform=conda_platform, channels=channels)
-            except conda_api.CondaError as e:
-                raise CondaManagerError("Error resolving for {}: {}".format(conda_platform, str(e)))
+            self._log_info("Resolving conda packages for %s" % conda_platform)
+
+        def resolve(conda_platform):
+            start = time.time()
+            with _solve_slots():
+                try:
+                    deps = conda_api.resolve_dependencies(pkgs=package_specs,
+                                                          platform=conda_platform,
+                                                          channels=channels)
+                except conda_api.CondaError as e:
+                    return (None, e, time.time() - start)
+            return (deps, None, time.time() - start)
+
+        # each platform is a separate conda subprocess, so we can
+        # run them at the same time; the results are merged in the
+        # same order we would have used serially.
+        results = parallel.map_in_threads(resolve, resolve_for_platforms, max_workers=solve_worker_count())
+
+        for (conda_platform, (deps, error, elapsed)) in zip(resolve_for_platforms, results):
+            if error is not None:
+                raise CondaManagerError("Error resolving for {}: {}".format(conda_platform, str(error)))
+            self._log_info("Resolved conda packages for %s in %.1f seconds" % (conda_platform, elapsed))
             locked_specs = ["%s=%s=%s" % dep for dep in deps]
             by_platform[conda_platform] = sorted(locked_specs)
 
@@ -273,27 +276,34 @@ class DefaultCondaManager(CondaManager):
 
         return (sorted(list(missing)), sorted(list(wrong_version)))
 
-    def _find_pip_missing(self, prefix, spec):
-        # this is an important optimization to avoid a slow "pip
-        # list" operation if the project has no pip packages
+    def _find_pip_deviations(self, prefix, spec):
+        # this is an important optimization to avoid listing
+        # site-packages if the project has no pip packages
         if len(spec.pip_package_names_set) == 0:
-            return []
+            return ([], [])
 
         try:
             installed = pip_api.installed(prefix)
         except pip_api.PipError as e:
             raise CondaManagerError("pip failed while listing installed packages in %s: %s" % (prefix, str(e)))
-
-        # TODO: we don't verify that the environment contains the right versions
-        # https://github.com/Anaconda-Server/anaconda-project/issues/77
+        installed_versions = dict((pip_api.normalize_name(name), version) for (name, version) in installed.values())
 
         missing = set()
+        wrong_version = set()
 
         for name in spec.pip_package_names_set:
-            if name not in installed:
+            installed_version = installed_versions.get(pip_api.normalize_name(name))
+            if installed_version is None:
                 missing.add(name)
+                continue
+            # As with conda packages, we only notice an unmet "==";
+            # other constraints are left to pip.
+            parsed = pip_api.parse_spec(spec.specs_for_pip_package_names([name])[0])
+            if parsed is not None and parsed.exact_version is not None and \
+               not pip_api.version_matches(parsed.exact_version, installed_version):
+                wrong_version.add(name)
 
-        return sorted(list(missing))
+        return (sorted(list(missing)), sorted(list(wrong_version)))
 
     def _broken_lock_set_error(self, spec):
         error = None
@@ -334,16 +344,17 @@ class DefaultCondaManager(CondaManager):
             conda_missing = []
             conda_wrong_version = []
             pip_missing = []
+            pip_wrong_version = []
         else:
             (conda_missing, conda_wrong_version) = self._find_conda_deviations(prefix, spec)
-            pip_missing = self._find_pip_missing(prefix, spec)
+            (pip_missing, pip_wrong_version) = self._find_pip_deviations(prefix, spec)
             broken = self._is_environment_writable(prefix)
             # For readonly environments, do not enforce the writing of the timestamp.
             # But mark other deviations as unfixable
-            unfixable = not broken and (conda_missing or conda_wrong_version or pip_missing)
+            unfixable = not broken and (conda_missing or conda_wrong_version or pip_missing or pip_wrong_version)
 
         all_missing_string = ", ".join(conda_missing + pip_missing)
-        all_wrong_version_string = ", ".join(conda_wrong_version)
+        all_wrong_version_string = ", ".join(conda_wrong_version + pip_wrong_version)
 
         if all_missing_string != "" and all_wrong_version_string != "":
             summary = "Conda environment is missing packages: %s and has wrong versions of: %s" % (
@@ -362,10 +373,49 @@ class DefaultCondaManager(CondaManager):
                                           missing_packages=conda_missing,
                                           wrong_version_packages=conda_wrong_version,
                                           missing_pip_packages=pip_missing,
-                                          wrong_version_pip_packages=(),
+                                          wrong_version_pip_packages=pip_wrong_version,
                                           broken=broken,
                                           unfixable=unfixable)
 
+    def _clone_from_pool(self, prefix, spec, create_at):
+        # Only locked env specs go in the pool; an unlocked one
+        # could resolve to different packages tomorrow.
+        pool = _get_env_pool()
+        lock_set = spec.lock_set
+        if pool is None or lock_set is None or not (lock_set.enabled and lock_set.supports_current_platform):
+            return False
+
+        key = "%s-%s" % (conda_api.current_platform(), spec.locked_hash)
+        golden = pool.golden_prefix(key)
+        if not pool.is_ready(key):
+            self._log_info("Creating shared environment %s to clone from." % golden)
+            try:
+                built = pool.build(key, create_at)
+            except EnvironmentError as e:
+                # the pool may be shared with users who can write to it when we can't
+                self._log_info("Failed to create shared environment %s, creating %s from scratch: %s" %
+                               (golden, prefix, str(e)))
+                return False
+            if not built:
+                self._log_info("Shared environment %s is being created by another process." % golden)
+                return False
+
+        self._log_info("Cloning shared environment %s to %s." % (golden, prefix))
+        try:
+            conda_api.clone(prefix, golden, stdout_callback=self._on_stdout, stderr_callback=self._on_stderr)
+        except conda_api.CondaError as e:
+            self._log_info("Failed to clone %s, creating %s from scratch: %s" % (golden, prefix, str(e)))
+            shutil.rmtree(prefix, ignore_errors=True)
+            return False
+        return True
+
+    def _download_pip_packages(self, prefix, pip_specs, directory):
+        try:
+            pip_api.download(prefix, pip_specs, directory)
+        except pip_api.PipError as e:
+            # pip install will download whatever we didn't
+            self._log_info("Could not download pip packages ahead of time: %s" % str(e))
+
     def fix_environment_deviations(self, prefix, spec, deviations=None, create=True):
         if deviations is None:
             deviations = self.find_environment_deviations(prefix, spec)
@@ -373,22 +423,47 @@ class DefaultCondaManager(CondaManager):
         if deviations.unfixable:
             raise CondaManagerError("Unable to update environment at %s" % prefix)
 
+        pip_names = sorted(set(deviations.missing_pip_packages + deviations.wrong_version_pip_packages))
+        pip_specs = spec.specs_for_pip_package_names(pip_names)
+        assert len(pip_specs) == len(pip_names)
+        download_directory = None
+
         if os.path.isdir(os.path.join(prefix, 'conda-meta')):
             to_update = list(set(deviations.missing_packages + deviations.wrong_version_packages))
             if len(to_update) > 0:
                 specs = spec.specs_for_conda_package_names(to_update)
                 assert len(specs) == len(to_update)
-                spec.apply_pins(prefix, specs)
-                try:
-                    conda_api.install(prefix=prefix,
-                                      pkgs=specs,
-                                      channels=spec.channels,
-                                      stdout_callback=self._on_stdout,
-                                      stderr_callback=self._on_stderr)
-                except conda_api.CondaError as e:
-                    raise CondaManagerError("Failed to install packages: {}: {}".format(", ".join(specs), str(e)))
-                finally:
-                    spec.remove_pins(prefix)
+
+                def install_conda_packages():
+                    spec.apply_pins(prefix, specs)
+                    try:
+                        conda_api.install(prefix=prefix,
+                                          pkgs=specs,
+                                          channels=spec.channels,
+                                          stdout_callback=self._on_stdout,
+                                          stderr_callback=self._on_stderr)
+                    except conda_api.CondaError as e:
+                        raise CondaManagerError("Failed to install packages: {}: {}".format(", ".join(specs), str(e)))
+                    finally:
+                        spec.remove_pins(prefix)
+
+                # If conda leaves python and pip alone, what pip
+                # downloads can't depend on what conda does, so we
+                # fetch the pip packages while conda works.
+                if len(pip_specs) > 0 and not (set(['python', 'pip']) & set(to_update)) and \
+                   pip_api.is_pip_installed(prefix):
+                    download_directory = tempfile.mkdtemp(prefix="anaconda_project_pip_")
+
+                    def download_pip_packages():
+                        self._download_pip_packages(prefix, pip_specs, download_directory)
+
+                    try:
+                        parallel.map_in_threads(lambda step: step(), [install_conda_packages, download_pip_packages], 2)
+                    except Exception:
+                        shutil.rmtree(download_directory, ignore_errors=True)
+                        raise
+                else:
+                    install_conda_packages()
         elif create:
             # Create environment from scratch
 
@@ -397,27 +472,31 @@ class DefaultCondaManager(CondaManager):
             if len(command_line_packages) == 0:
                 command_line_packages = set(['python'])
 
-            try:
-                conda_api.create(prefix=prefix,
+            def create_at(where):
+                conda_api.create(prefix=where,
                                  pkgs=list(command_line_packages),
                                  channels=spec.channels,
                                  stdout_callback=self._on_stdout,
                                  stderr_callback=self._on_stderr)
+
+            try:
+                if not self._clone_from_pool(prefix, spec, create_at):
+                    create_at(prefix)
             except conda_api.CondaError as e:
                 raise CondaManagerError("Failed to create environment at %s: %s" % (prefix, str(e)))
         else:
             raise CondaManagerError("Conda environment at %s does not exist" % (prefix))
 
         # now add pip if needed
-        missing = list(deviations.missing_pip_packages)
-        if len(missing) > 0:
-            specs = spec.specs_for_pip_package_names(missing)
-            assert len(specs) == len(missing)
+        if len(pip_specs) > 0:
             try:
-                pip_api.install(prefix=prefix, pkgs=specs)
+                pip_api.install(prefix=prefix, pkgs=pip_specs, find_links=download_directory)
             except pip_api.PipError as e:
                 raise CondaManagerError("Failed to install missing pip packages: {}: {}".format(
-                    ", ".join(missing), str(e)))
+                    ", ".join(pip_names), str(e)))
+            finally:
+                if download_directory is not None:
+                    shutil.rmtree(download_directory, ignore_errors=True)
 
         # write a file to tell us we can short-circuit next time
         self._write_timestamp_file(prefix, spec)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Cheap fingerprint of the set of packages installed in a prefix.
+
+The fingerprint is built from the names of the conda records in
+``conda-meta`` and the pip ``.dist-info``/``.egg-info`` entries in
+site-packages. Those names include the package version, so
+installing, removing, or changing the version of any package
+changes the fingerprint, while unrelated changes to the prefix
+(bytecode files, caches, logs) do not.
+
+Listing those directories is cheap but not free, so we keep the
+last listing of each directory in a cache file alongside its
+mtime. A directory whose mtime hasn't changed since the cache was
+written is not listed again, so checking a warm environment costs
+a handful of stats.
+"""
+from __future__ import absolute_import
+
+import codecs
+import glob
+import hashlib
+import json
+import os
+
+from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+from anaconda_project.internal.rename import rename_over_existing
+
+CACHE_FILENAME = "fingerprint.json"
+
+# A directory modified this close to the time we wrote the cache
+# might have been modified again within the filesystem's mtime
+# resolution without its mtime changing, so we don't trust the
+# cached listing for it (this is the "racy git" problem).
+_RACY_SECONDS = 2.0
+
+_CONDA_META_SUFFIXES = ('.json', )
+_SITE_PACKAGES_SUFFIXES = ('.dist-info', '.egg-info')
+
+
+def _fingerprint_directories(prefix):
+    # returns list of (path relative to prefix, entry suffixes we care about)
+    dirs = [("conda-meta", _CONDA_META_SUFFIXES)]
+    # Linux/Mac
+    for site_packages in sorted(glob.iglob(os.path.join(prefix, "lib", "python*", "site-packages"))):
+        dirs.append((os.path.relpath(site_packages, prefix), _SITE_PACKAGES_SUFFIXES))
+    # Windows
+    dirs.append((os.path.join("Lib", "site-packages"), _SITE_PACKAGES_SUFFIXES))
+    return dirs
+
+
+def package_directories(prefix):
+    """Get the directories in the prefix whose entries change when packages are installed or removed.
+
+    Args:
+        prefix (str): the environment prefix
+
+    Returns:
+        list of absolute paths, some of which may not exist
+    """
+    return [os.path.join(prefix, relative) for (relative, suffixes) in _fingerprint_directories(prefix)]
+
+
+def _load_cache(filename):
+    try:
+        written = os.path.getmtime(filename)
+        with codecs.open(filename, 'r', encoding='utf-8') as f:
+            cache = json.loads(f.read())
+        if isinstance(cache, dict) and isinstance(cache.get('directories', None), dict):
+            return (cache['directories'], written)
+    except (IOError, OSError, ValueError):
+        pass
+    return (dict(), None)
+
+
+def _save_cache(filename, directories):
+    tmp_filename = filename + ".tmp-" + str(os.getpid())
+    try:
+        makedirs_ok_if_exists(os.path.dirname(filename))
+        with codecs.open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(directories=directories), sort_keys=True))
+        rename_over_existing(tmp_filename, filename)
+    except (IOError, OSError):
+        # ignore errors because the cache is just an optimization
+        # (and the prefix may well be read-only)
+        try:
+            os.remove(tmp_filename)
+        except (IOError, OSError):
+            pass
+
+
+def _list_entries(path, suffixes):
+    try:
+        return sorted(name for name in os.listdir(path) if name.endswith(suffixes))
+    except OSError:
+        return []
+
+
+def compute_fingerprint(prefix, cache_directory):
+    """Get a fingerprint string for the packages installed in the prefix.
+
+    Args:
+        prefix (str): the environment prefix
+        cache_directory (str): where to keep our listing cache
+
+    Returns:
+        a hex digest which changes if the installed conda or pip packages change
+    """
+    cache_filename = os.path.join(cache_directory, CACHE_FILENAME)
+    (cached, written) = _load_cache(cache_filename)
+
+    directories = dict()
+    needs_save = False
+    for (relative, suffixes) in _fingerprint_directories(prefix):
+        try:
+            mtime = os.path.getmtime(os.path.join(prefix, relative))
+        except OSError:
+            mtime = None
+
+        old = cached.get(relative, None)
+        if old is not None and old.get('mtime', None) == mtime and \
+           (mtime is None or (written is not None and mtime + _RACY_SECONDS < written)):
+            entries = old.get('entries', [])
+        else:
+            entries = [] if mtime is None else _list_entries(os.path.join(prefix, relative), suffixes)
+            # save even if nothing changed so that we leave the
+            # racy window and can trust the listing next time
+            needs_save = True
+        directories[relative] = dict(mtime=mtime, entries=entries)
+
+    if needs_save or set(cached.keys()) != set(directories.keys()):
+        _save_cache(cache_filename, directories)
+
+    digest = hashlib.sha1()
+    for relative in sorted(directories.keys()):
+        digest.update(relative.encode('utf-8'))
+        for entry in directories[relative]['entries']:
+            digest.update(b"\0")
+            digest.update(entry.encode('utf-8'))
+        digest.update(b"\n")
+    return digest.hexdigest()
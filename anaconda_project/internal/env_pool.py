@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""A shared directory of "golden" environments to clone new ones from.
+
+Many checkouts of the same project (on a CI host, say) need identical
+environments. We build one environment per lock set in the pool, and
+then create each project's environment by cloning it, which links
+the packages from conda's package cache instead of solving and
+downloading again.
+
+Golden environments are never used directly, only cloned. Building
+one is claimed by creating a ``.building`` directory next to it, so
+two processes don't build the same one at once; whoever loses the
+race just creates its environment the usual way.
+"""
+from __future__ import absolute_import
+
+import os
+import shutil
+import time
+
+from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+
+# a claim older than this was left by a process that died
+STALE_CLAIM_SECONDS = 60 * 60
+
+
+class EnvPool(object):
+    """Golden environments in a directory, one per key."""
+    def __init__(self, directory):
+        """Create a pool in the given directory (which need not exist yet)."""
+        self.directory = directory
+
+    def golden_prefix(self, key):
+        """Get the prefix of the golden environment for a key."""
+        return os.path.join(self.directory, key)
+
+    def _ready_file(self, key):
+        return os.path.join(self.directory, key + ".ready")
+
+    def _claim_directory(self, key):
+        return os.path.join(self.directory, key + ".building")
+
+    def is_ready(self, key):
+        """True if the golden environment for key was completely built."""
+        return (os.path.isfile(self._ready_file(key))
+                and os.path.isdir(os.path.join(self.golden_prefix(key), 'conda-meta')))
+
+    def _claim(self, key):
+        claim = self._claim_directory(key)
+        try:
+            os.mkdir(claim)
+            return True
+        except OSError:
+            pass
+        try:
+            if time.time() - os.path.getmtime(claim) < STALE_CLAIM_SECONDS:
+                return False
+            os.rmdir(claim)
+            os.mkdir(claim)
+            return True
+        except OSError:
+            return False
+
+    def build(self, key, create):
+        """Build the golden environment for key, unless another process is building it.
+
+        Args:
+            key (str): identifies the environment's contents
+            create (callable): takes a prefix and creates the environment there
+
+        Returns:
+            True if the golden environment is ready, False if someone else is building it
+
+        Raises:
+            whatever ``create`` raises, after removing the partial environment
+        """
+        makedirs_ok_if_exists(self.directory)
+        if not self._claim(key):
+            return False
+        try:
+            if self.is_ready(key):
+                return True
+            prefix = self.golden_prefix(key)
+            # left by a build that failed or was interrupted
+            shutil.rmtree(prefix, ignore_errors=True)
+            try:
+                create(prefix)
+            except Exception:
+                shutil.rmtree(prefix, ignore_errors=True)
+                raise
+            with open(self._ready_file(key), 'w'):
+                pass
+            return True
+        finally:
+            try:
+                os.rmdir(self._claim_directory(key))
+            except OSError:
+                pass
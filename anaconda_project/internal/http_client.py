@@ -12,16 +12,116 @@ from tornado import gen
 
 import anaconda_project.internal.makedirs as makedirs
 import anaconda_project.internal.rename as rename
+from anaconda_project.internal.parallel import worker_count_from_environment
 
+import io
+import json
 import os
 import hashlib
+import re
+
+# how many times we retry a failed request (or range of a
+# request) before giving up; the delay doubles each time.
+DEFAULT_RETRIES = 3
+_RETRY_DELAY_SECONDS = 1.0
+
+# we don't split a download into ranges smaller than this; for
+# small files the extra requests cost more than they save.
+_MIN_RANGE_SIZE = 16 * 1024 * 1024
+
+_READ_SIZE = 1024 * 1024
+
+_content_range_re = re.compile(r'^\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$', re.IGNORECASE)
+
+
+def _retries_from_environment():
+    try:
+        return max(0, int(os.environ.get('ANACONDA_PROJECT_DOWNLOAD_RETRIES', DEFAULT_RETRIES)))
+    except ValueError:
+        return DEFAULT_RETRIES
+
+
+def _is_retryable(error):
+    if isinstance(error, httpclient.HTTPError):
+        # 599 is what tornado gives us for timeouts and dropped connections
+        return error.code == 599 or error.code >= 500
+    # connection refused, reset, etc.
+    return isinstance(error, EnvironmentError)
+
+
+def _file_size(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def _remove_if_exists(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+
+class _ResponseHeaders(object):
+    """Collects the interesting parts of a response from header_callback.
+
+    header_callback also sees the headers of redirects, so we start
+    over whenever there's a new status line.
+    """
+    def __init__(self):
+        self.code = None
+        self.headers = dict()
+        self.complete = False
+
+    def __call__(self, line):
+        if line.startswith("HTTP/"):
+            self.__init__()
+            try:
+                self.code = int(line.split(" ", 2)[1])
+            except (IndexError, ValueError):
+                self.code = None
+        elif line.strip() == "":
+            self.complete = True
+        elif ":" in line:
+            (name, value) = line.split(":", 1)
+            self.headers[name.strip().lower()] = value.strip()
+
+    @property
+    def content_range(self):
+        """(first, last, total) from Content-Range or None; total is None if unknown."""
+        match = _content_range_re.match(self.headers.get('content-range', ''))
+        if match is None:
+            return None
+        total = match.group(3)
+        return (int(match.group(1)), int(match.group(2)), None if total == '*' else int(total))
+
+    @property
+    def validator(self):
+        """Something to send in If-Range so we notice if the file changes, or None."""
+        etag = self.headers.get('etag', None)
+        if etag is not None and not etag.startswith("W/"):
+            return etag
+        return self.headers.get('last-modified', None)
 
 
 class FileDownloader(object):
-    def __init__(self, url, filename, hash_algorithm=None):
+    def __init__(self, url, filename, hash_algorithm=None, connections=None, retries=None):
         """Downloader for the given url to the given filename, computing the given hash.
 
         hash_algorithm is the name of a hash function in hashlib
+
+        If we find a ``.part`` file left behind by an earlier
+        download of the same url, we ask the server for only the
+        rest of the file. With connections > 1 we download
+        large files as several byte ranges at once, if the server
+        supports that. We only download in pieces if the server
+        sends an ETag or Last-Modified, or there's a hash_algorithm,
+        so we notice if the file changes in between.
+
+        connections defaults to the
+        ANACONDA_PROJECT_DOWNLOAD_CONNECTIONS environment variable
+        (or 1), and retries to ANACONDA_PROJECT_DOWNLOAD_RETRIES.
         """
         self._url = url
         self._filename = filename
@@ -29,6 +129,15 @@ class FileDownloader(object):
         self._hash = None
         self._client = None
         self._errors = []
+        if connections is None:
+            connections = worker_count_from_environment('ANACONDA_PROJECT_DOWNLOAD_CONNECTIONS', default=1)
+        self._connections = max(1, connections)
+        if retries is None:
+            retries = _retries_from_environment()
+        self._retries = retries
+        self._tmp_filename = filename + ".part"
+        # remembers which url (and which version of it) the .part is from
+        self._resume_filename = self._tmp_filename + ".json"
 
     @gen.coroutine
     def run(self):
@@ -42,12 +151,10 @@ class FileDownloader(object):
             self._errors.append("Could not create directory '%s': %s" % (dirname, e))
             raise gen.Return(None)
 
-        if self._hash_algorithm is not None:
-            hasher = getattr(hashlib, self._hash_algorithm)()
         self._client = httpclient.AsyncHTTPClient(
             # No need for this, and removed in 5.0 anyway
             # io_loop=io_loop,
-            max_clients=1,
+            max_clients=self._connections,
             # without this we buffer a huge amount
             # of stuff and then call the streaming_callback
             # once.
@@ -56,66 +163,352 @@ class FileDownloader(object):
             max_body_size=100 * 1024 * 1024 * 1024,
             force_instance=True)
 
-        tmp_filename = self._filename + ".part"
         try:
-            _file = open(tmp_filename, 'wb')
+            response = None
+            if self._connections > 1:
+                response = yield self._run_ranges()
+            if response is None and len(self._errors) == 0:
+                response = yield self._run_single()
+            raise gen.Return(response)
+        finally:
+            self._client.close()
+
+    def _new_hasher(self):
+        if self._hash_algorithm is None:
+            return None
+        return getattr(hashlib, self._hash_algorithm)()
+
+    def _request(self, headers, header_callback=None, streaming_callback=None, method='GET'):
+        timeout_in_seconds = 60 * 10  # pretty long because we could be dealing with huge files
+        return httpclient.HTTPRequest(url=self._url,
+                                      method=method,
+                                      headers=headers,
+                                      header_callback=header_callback,
+                                      streaming_callback=streaming_callback,
+                                      request_timeout=timeout_in_seconds)
+
+    def _load_resume_validator(self):
+        """Get (resumable, validator) for an existing .part file."""
+        try:
+            with io.open(self._resume_filename, 'r', encoding='utf-8') as f:
+                saved = json.loads(f.read())
+            if saved['url'] == self._url:
+                return (True, saved.get('validator', None))
+        except (EnvironmentError, ValueError, KeyError, TypeError):
+            pass
+        return (False, None)
+
+    def _save_resume_validator(self, validator):
+        try:
+            with io.open(self._resume_filename, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(dict(url=self._url, validator=validator)))
+        except EnvironmentError:
+            pass
+
+    def _discard_partial(self):
+        _remove_if_exists(self._tmp_filename)
+        _remove_if_exists(self._resume_filename)
+
+    def _can_resume(self, validator):
+        """Whether we'd notice if the file changed while we download it in pieces.
+
+        Without If-Range the server happily sends the tail of a new
+        version of the file, so we need a validator, or a hash to
+        check the result against.
+        """
+        return validator is not None or self._hash_algorithm is not None
+
+    def _resumable_offset(self):
+        """Bytes we can keep from an earlier attempt, and the validator to send with If-Range."""
+        offset = _file_size(self._tmp_filename)
+        if offset == 0:
+            return (0, None)
+        (resumable, validator) = self._load_resume_validator()
+        if not resumable or not self._can_resume(validator):
+            self._discard_partial()
+            return (0, None)
+        return (offset, validator)
+
+    def _hash_existing(self, hasher, length):
+        if hasher is None or length == 0:
+            return
+        with open(self._tmp_filename, 'rb') as f:
+            while length > 0:
+                data = f.read(min(_READ_SIZE, length))
+                if not data:
+                    break
+                hasher.update(data)
+                length -= len(data)
+
+    def _finish(self, hasher):
+        """Rename the .part file into place; returns False on failure."""
+        try:
+            rename.rename_over_existing(self._tmp_filename, self._filename)
         except EnvironmentError as e:
-            self._errors.append("Failed to open %s: %s" % (tmp_filename, e))
-            raise gen.Return(None)
+            self._errors.append("Failed to rename %s to %s: %s" % (self._tmp_filename, self._filename, str(e)))
+            self._discard_partial()
+            return False
+        _remove_if_exists(self._resume_filename)
+        if hasher is not None:
+            self._hash = hasher.hexdigest()
+        return True
+
+    @gen.coroutine
+    def _backoff(self, attempt):
+        yield gen.sleep(_RETRY_DELAY_SECONDS * (2**attempt))
+
+    @gen.coroutine
+    def _run_single(self):
+        """Download with one connection, resuming from the .part file if possible."""
+        attempt = 0
+        while True:
+            (offset, validator) = self._resumable_offset()
+            mode = 'ab' if offset > 0 else 'wb'
+            try:
+                _file = open(self._tmp_filename, mode)
+            except EnvironmentError as e:
+                self._errors.append("Failed to open %s: %s" % (self._tmp_filename, e))
+                raise gen.Return(None)
 
-        def cleanup_tmp():
             try:
-                _file.close()
-                # future: we could save it in order to try
-                # resuming a failed download midstream, but
-                # pointless until the download code above
-                # knows how to resume.
-                os.remove(tmp_filename)
+                hasher = self._new_hasher()
+                self._hash_existing(hasher, offset)
             except EnvironmentError:
-                pass
+                # we'll have to start over
+                _file.close()
+                self._discard_partial()
+                continue
+
+            headers = _ResponseHeaders()
+            state = dict(written=0, started=False, restarted=False)
+
+            def writer(chunk):
+                if len(self._errors) > 0:
+                    return
+
+                if headers.code == 206:
+                    content_range = headers.content_range
+                    if content_range is None or content_range[0] != offset:
+                        return
+                elif headers.code != 200:
+                    # an error page, we don't want it in the file
+                    return
+
+                if not state['started']:
+                    state['started'] = True
+                    if offset > 0 and headers.code == 200:
+                        # server sent the whole file (doesn't do ranges,
+                        # or the file changed), so start over.
+                        state['restarted'] = True
+                        _file.seek(0)
+                        _file.truncate()
+                        state['hasher'] = self._new_hasher()
+                    else:
+                        state['hasher'] = hasher
+                    if offset == 0 or state['restarted']:
+                        self._save_resume_validator(headers.validator)
+
+                if state['hasher'] is not None:
+                    state['hasher'].update(chunk)
+
+                try:
+                    _file.write(chunk)
+                    state['written'] += len(chunk)
+                except EnvironmentError as e:
+                    # we can't actually throw this error or Tornado freaks out, so instead
+                    # we ignore all future chunks once we have an error, which does mean
+                    # we continue to download bytes that we don't use. yuck.
+                    self._errors.append("Failed to write to %s: %s" % (self._tmp_filename, e))
+
+            request_headers = dict()
+            if offset > 0:
+                request_headers['Range'] = 'bytes=%d-' % offset
+                if validator is not None:
+                    request_headers['If-Range'] = validator
+
+            error = None
+            response = None
+            try:
+                response = yield self._client.fetch(
+                    self._request(request_headers, header_callback=headers, streaming_callback=writer))
+            except Exception as e:
+                error = e
+            finally:
+                try:
+                    _file.close()  # be sure tmp_filename is flushed
+                except EnvironmentError:
+                    pass
 
-        def writer(chunk):
             if len(self._errors) > 0:
-                return
+                self._discard_partial()
+                raise gen.Return(response)
+
+            if error is None:
+                # assert fetch() was supposed to throw the error, not leave it here unthrown
+                assert response.error is None
+                content_range = headers.content_range
+                if response.code == 206 and (content_range is None or content_range[0] != offset):
+                    # not the range we asked for; we can't use it
+                    self._discard_partial()
+                    error = httpclient.HTTPError(response.code, "Server sent the wrong range")
+                else:
+                    self._finish(state.get('hasher', hasher))
+                    raise gen.Return(response)
+            elif offset > 0 and isinstance(error, httpclient.HTTPError) and error.code == 416:
+                # our .part must already be complete, or the file shrank;
+                # we can't tell which, so start over.
+                self._discard_partial()
+                continue
+
+            if attempt >= self._retries or not _is_retryable(error):
+                self._errors.append("Failed download to %s: %s" % (self._filename, str(error)))
+                if offset + state['written'] == 0:
+                    self._discard_partial()
+                raise gen.Return(None)
+
+            yield self._backoff(attempt)
+            attempt += 1
+
+    @gen.coroutine
+    def _probe(self):
+        """HEAD the url to see whether we can download it in ranges."""
+        headers = _ResponseHeaders()
+        try:
+            response = yield self._client.fetch(self._request(dict(), header_callback=headers, method='HEAD'))
+            length = int(headers.headers.get('content-length', ''))
+        except Exception:
+            # if it's really broken, the plain download will report it
+            raise gen.Return((None, None, None))
+        if headers.headers.get('accept-ranges', '').lower() != 'bytes':
+            raise gen.Return((None, None, None))
+        raise gen.Return((response, headers, length))
 
-            if self._hash_algorithm is not None:
-                hasher.update(chunk)
+    @gen.coroutine
+    def _fetch_range(self, validator, progress, index, ranges):
+        """Fetch one of the ranges with retries; returns an error or None."""
+        (first, last) = ranges[index]
+        attempt = 0
+        while True:
+            start = progress[index]
+            if start > last:
+                raise gen.Return(None)
 
+            headers = _ResponseHeaders()
             try:
-                _file.write(chunk)
+                _file = open(self._tmp_filename, 'r+b')
+                _file.seek(start)
             except EnvironmentError as e:
-                # we can't actually throw this error or Tornado freaks out, so instead
-                # we ignore all future chunks once we have an error, which does mean
-                # we continue to download bytes that we don't use. yuck.
-                self._errors.append("Failed to write to %s: %s" % (tmp_filename, e))
+                self._errors.append("Failed to open %s: %s" % (self._tmp_filename, e))
+                raise gen.Return(e)
 
-        try:
-            timeout_in_seconds = 60 * 10  # pretty long because we could be dealing with huge files
-            request = httpclient.HTTPRequest(url=self._url,
-                                             streaming_callback=writer,
-                                             request_timeout=timeout_in_seconds)
+            def writer(chunk):
+                if len(self._errors) > 0:
+                    return
+                content_range = headers.content_range
+                if headers.code != 206 or content_range is None or content_range[0] != start:
+                    return
+                # don't run into the next range if the server sends extra
+                chunk = chunk[:last + 1 - progress[index]]
+                try:
+                    _file.write(chunk)
+                    progress[index] += len(chunk)
+                except EnvironmentError as e:
+                    self._errors.append("Failed to write to %s: %s" % (self._tmp_filename, e))
+
+            request_headers = {'Range': 'bytes=%d-%d' % (start, last)}
+            if validator is not None:
+                request_headers['If-Range'] = validator
+
+            error = None
             try:
-                response = yield self._client.fetch(request)
+                yield self._client.fetch(
+                    self._request(request_headers, header_callback=headers, streaming_callback=writer))
             except Exception as e:
-                self._errors.append("Failed download to %s: %s" % (self._filename, str(e)))
+                error = e
+            finally:
+                try:
+                    _file.close()
+                except EnvironmentError:
+                    pass
+
+            if len(self._errors) > 0:
+                raise gen.Return(self._errors[0])
+            if error is None:
+                if headers.code != 206 or progress[index] <= last:
+                    # server stopped doing ranges (maybe the file changed)
+                    raise gen.Return(
+                        httpclient.HTTPError(headers.code or 599, "Server did not send range %d-%d" % (start, last)))
                 raise gen.Return(None)
+            if attempt >= self._retries or not _is_retryable(error):
+                raise gen.Return(error)
+            yield self._backoff(attempt)
+            attempt += 1
 
-            # assert fetch() was supposed to throw the error, not leave it here unthrown
-            assert response.error is None
+    @gen.coroutine
+    def _run_ranges(self):
+        """Download in several ranges at once; returns None to fall back to _run_single."""
+        (response, headers, length) = yield self._probe()
+        if response is None or not self._can_resume(headers.validator):
+            raise gen.Return(None)
+        (offset, validator) = self._resumable_offset()
+        if offset > 0 and (offset > length or validator != headers.validator):
+            self._discard_partial()
+            offset = 0
+        remaining = length - offset
+        count = min(self._connections, remaining // _MIN_RANGE_SIZE)
+        if count < 2:
+            raise gen.Return(None)
 
-            if len(self._errors) == 0:
-                try:
-                    _file.close()  # be sure tmp_filename is flushed
-                    rename.rename_over_existing(tmp_filename, self._filename)
-                except EnvironmentError as e:
-                    self._errors.append("Failed to rename %s to %s: %s" % (tmp_filename, self._filename, str(e)))
+        try:
+            with open(self._tmp_filename, 'ab') as f:
+                f.truncate(length)
+        except EnvironmentError as e:
+            self._errors.append("Failed to open %s: %s" % (self._tmp_filename, e))
+            raise gen.Return(None)
+        self._save_resume_validator(headers.validator)
 
-            if len(self._errors) == 0 and self._hash_algorithm is not None:
-                self._hash = hasher.hexdigest()
+        size = remaining // count
+        ranges = []
+        for i in range(count):
+            first = offset + i * size
+            last = (offset + (i + 1) * size - 1) if i < count - 1 else (length - 1)
+            ranges.append((first, last))
+        progress = [first for (first, last) in ranges]
 
+        results = yield [self._fetch_range(headers.validator, progress, i, ranges) for i in range(count)]
+        failures = [error for error in results if error is not None]
+
+        if len(failures) == 0:
+            hasher = self._new_hasher()
+            try:
+                self._hash_existing(hasher, length)
+            except EnvironmentError as e:
+                self._errors.append("Failed to read %s: %s" % (self._tmp_filename, e))
+                self._discard_partial()
+                raise gen.Return(None)
+            self._finish(hasher)
             raise gen.Return(response)
-        finally:
-            cleanup_tmp()
+
+        if len(self._errors) > 0:
+            # failed to write, no sense keeping it
+            self._discard_partial()
+            raise gen.Return(None)
+
+        # keep what we have from the start of the file, so we can resume from there.
+        complete = offset
+        for ((first, last), reached) in zip(ranges, progress):
+            complete = reached
+            if reached <= last:
+                break
+        try:
+            with open(self._tmp_filename, 'r+b') as f:
+                f.truncate(complete)
+        except EnvironmentError:
+            self._discard_partial()
+        if complete == 0:
+            self._discard_partial()
+        self._errors.append("Failed download to %s: %s" % (self._filename, str(failures[0])))
+        raise gen.Return(None)
 
     @property
     def hash(self):
@@ -9,6 +9,7 @@
 from __future__ import absolute_import, print_function
 
 import sys
+import threading
 
 try:
     from urllib.parse import quote_plus
@@ -17,6 +18,9 @@ except ImportError:  # pragma: no cover (py2 only)
 
 _fallback_keyring = 0
 _fake_in_memory_keyring = dict()
+# requirement status checks may look up passwords from several
+# threads, and keyring backends aren't necessarily thread-safe
+_lock = threading.RLock()
 
 
 def enable_fallback_keyring():
@@ -76,47 +80,50 @@ def _make_username(env_prefix, variable):
 
 def get(env_prefix, variable):
     name = _make_username(env_prefix, variable)
-    if not _use_fallback_keyring():
-        try:
-            got = keyring.get_password("anaconda", name)
-            return got
-        except Exception as e:
-            # keyring throws a bare "RuntimeError" if it has no working backend;
-            # not sure what else it can throw.
-            _onetime_keyring_complain_and_disable("Exception getting a password: " + str(e))
+    with _lock:
+        if not _use_fallback_keyring():
+            try:
+                got = keyring.get_password("anaconda", name)
+                return got
+            except Exception as e:
+                # keyring throws a bare "RuntimeError" if it has no working backend;
+                # not sure what else it can throw.
+                _onetime_keyring_complain_and_disable("Exception getting a password: " + str(e))
 
-    # on either exception, or disabled
-    return _fake_in_memory_keyring.get(name, None)
+        # on either exception, or disabled
+        return _fake_in_memory_keyring.get(name, None)
 
 
 def set(env_prefix, variable, value):
     assert value is not None
 
     name = _make_username(env_prefix, variable)
-    if not _use_fallback_keyring():
-        try:
-            keyring.set_password("anaconda", name, value)
-            return
-        except Exception as e:
-            # keyring throws a bare "RuntimeError" if it has no working backend;
-            # not sure what else it can throw.
-            _onetime_keyring_complain_and_disable("Exception setting a password: " + str(e))
+    with _lock:
+        if not _use_fallback_keyring():
+            try:
+                keyring.set_password("anaconda", name, value)
+                return
+            except Exception as e:
+                # keyring throws a bare "RuntimeError" if it has no working backend;
+                # not sure what else it can throw.
+                _onetime_keyring_complain_and_disable("Exception setting a password: " + str(e))
 
-    # on either exception, or disabled
-    _fake_in_memory_keyring[name] = value
+        # on either exception, or disabled
+        _fake_in_memory_keyring[name] = value
 
 
 def unset(env_prefix, variable):
     name = _make_username(env_prefix, variable)
-    if not _use_fallback_keyring():
-        try:
-            keyring.delete_password("anaconda", name)
-            return
-        except Exception as e:
-            # keyring throws a bare "RuntimeError" if it has no working backend;
-            # not sure what else it can throw.
-            _onetime_keyring_complain_and_disable("Exception deleting a password: " + str(e))
-
-    # on either exception, or disabled
-    if name in _fake_in_memory_keyring:
-        del _fake_in_memory_keyring[name]
+    with _lock:
+        if not _use_fallback_keyring():
+            try:
+                keyring.delete_password("anaconda", name)
+                return
+            except Exception as e:
+                # keyring throws a bare "RuntimeError" if it has no working backend;
+                # not sure what else it can throw.
+                _onetime_keyring_complain_and_disable("Exception deleting a password: " + str(e))
+
+        # on either exception, or disabled
+        if name in _fake_in_memory_keyring:
+            del _fake_in_memory_keyring[name]
@@ -8,8 +8,10 @@
 from __future__ import absolute_import, print_function
 
 import subprocess
+import time
 
 from anaconda_project import verbose
+from anaconda_project.internal import trace
 
 
 def _log_args(args):
@@ -17,16 +19,56 @@ def _log_args(args):
     log.info("$ %s", " ".join(args))
 
 
+def _trace_name(args):
+    return "subprocess " + args[0] if len(args) > 0 else "subprocess"
+
+
+class _TracedPopen(subprocess.Popen):
+    """Popen that records a trace span once we see the process exit."""
+    def __init__(self, args, **kwargs):
+        self._trace_args = args
+        self._trace_start = time.time()
+        self._trace_recorded = False
+        super(_TracedPopen, self).__init__(args=args, **kwargs)
+
+    def _record_exit(self):
+        if self.returncode is not None and not self._trace_recorded:
+            self._trace_recorded = True
+            trace.record(_trace_name(self._trace_args), "subprocess", self._trace_start,
+                         dict(argv=self._trace_args, returncode=self.returncode))
+
+    def poll(self):
+        code = super(_TracedPopen, self).poll()
+        self._record_exit()
+        return code
+
+    def wait(self, *args, **kwargs):
+        code = super(_TracedPopen, self).wait(*args, **kwargs)
+        self._record_exit()
+        return code
+
+
 def call(args, **kwargs):
     _log_args(args)
-    return subprocess.call(args=args, **kwargs)
+    with trace.span(_trace_name(args), "subprocess", argv=args) as span_args:
+        span_args['returncode'] = subprocess.call(args=args, **kwargs)
+        return span_args['returncode']
 
 
 def Popen(args, **kwargs):
     _log_args(args)
+    if trace.enabled():
+        return _TracedPopen(args=args, **kwargs)
     return subprocess.Popen(args=args, **kwargs)
 
 
 def check_output(args, **kwargs):
     _log_args(args)
-    return subprocess.check_output(args=args, **kwargs)
+    with trace.span(_trace_name(args), "subprocess", argv=args) as span_args:
+        try:
+            output = subprocess.check_output(args=args, **kwargs)
+        except subprocess.CalledProcessError as e:
+            span_args['returncode'] = e.returncode
+            raise
+        span_args['returncode'] = 0
+        return output
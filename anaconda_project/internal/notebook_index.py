@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Find the notebooks in a project without listing every directory every time.
+
+We remember, for each directory in the project, its subdirectories
+and the notebooks in it. A directory's mtime changes whenever an
+entry is added to it, removed from it, or renamed, so if the mtime
+hasn't changed we can reuse what we saw last time and only stat
+the directory, instead of listing it. The index is kept in memory
+and saved in the user's cache directory for the next process.
+
+As with the conda-meta index, directories modified in the last
+couple of seconds are always listed, since a coarse mtime might
+not show a change made right after we looked.
+"""
+from __future__ import absolute_import
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+import time
+
+from anaconda_project.internal import solve_cache
+
+NOTEBOOK_SUFFIX = '.ipynb'
+
+DEFAULT_MAX_ENTRIES = 100
+
+_RACY_SECONDS = 2.0
+
+_FORMAT_VERSION = 1
+
+
+def _directory_key(path):
+    info = os.stat(path)
+    if time.time() - info.st_mtime < _RACY_SECONDS:
+        return None
+    return [repr(info.st_mtime), info.st_ino]
+
+
+def _join(relative_root, name):
+    return name if relative_root == '' else relative_root + '/' + name
+
+
+class NotebookIndex(object):
+    """Subdirectories and notebooks of each directory in each project we've looked at."""
+    def __init__(self, directory=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """Create an index, saving it in directory unless that's None."""
+        self.directory = directory
+        self.max_entries = max_entries
+        # directories we could reuse and directories we had to list,
+        # in the most recent find()
+        self.reused = 0
+        self.listed = 0
+        self._projects = dict()
+        self._lock = threading.Lock()
+
+    def _filename(self, project_directory):
+        key = hashlib.sha1(project_directory.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def _load(self, project_directory):
+        with self._lock:
+            listings = self._projects.get(project_directory)
+        if listings is not None or self.directory is None:
+            return listings or dict()
+        try:
+            with codecs.open(self._filename(project_directory), 'r', encoding='utf-8') as f:
+                saved = json.loads(f.read())
+            if saved['version'] != _FORMAT_VERSION or saved['project'] != project_directory:
+                return dict()
+            return dict(saved['directories'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return dict()
+
+    def _save(self, project_directory, listings):
+        with self._lock:
+            self._projects[project_directory] = listings
+        if self.directory is None:
+            return
+        text = json.dumps(dict(version=_FORMAT_VERSION, project=project_directory, directories=listings))
+        solve_cache.save_entry(self.directory, self._filename(project_directory), text, self.max_entries)
+
+    def _list(self, full_path, list_directory):
+        subdirs = []
+        notebooks = []
+        for entry in list_directory(full_path):
+            try:
+                is_directory = entry.is_dir()
+                # we don't look inside symlinked directories, same as os.walk
+                if is_directory and not entry.is_symlink():
+                    subdirs.append(entry.name)
+            except OSError:
+                is_directory = False
+            if not is_directory and entry.name.endswith(NOTEBOOK_SUFFIX):
+                notebooks.append(entry.name)
+        return (sorted(subdirs), sorted(notebooks))
+
+    def find(self, project_directory, is_ignored, list_directory):
+        """Find the notebooks in a project.
+
+        Hidden files and directories at the top of the project are
+        skipped, as is anything ``is_ignored`` says to skip. We don't
+        look inside ignored directories.
+
+        Args:
+            project_directory (str): the project directory
+            is_ignored (callable): takes a relative path with "/" separators and an is-directory bool
+            list_directory (callable): takes a path and returns a list of entries like ``os.DirEntry``
+
+        Returns:
+            sorted list of notebook paths relative to the project, with "/" separators
+
+        Raises:
+            OSError if the project directory itself can't be listed
+        """
+        project_directory = os.path.abspath(project_directory)
+        old_listings = self._load(project_directory)
+        new_listings = dict()
+        self.reused = 0
+        self.listed = 0
+        found = []
+
+        to_visit = ['']
+        while to_visit:
+            relative_root = to_visit.pop()
+            full_path = os.path.join(project_directory, *relative_root.split('/'))
+            try:
+                key = _directory_key(full_path)
+                old = old_listings.get(relative_root)
+                if key is not None and old is not None and old[0] == key:
+                    (subdirs, notebooks) = (old[1], old[2])
+                    self.reused += 1
+                else:
+                    (subdirs, notebooks) = self._list(full_path, list_directory)
+                    self.listed += 1
+            except OSError:
+                if relative_root == '':
+                    raise
+                # a directory we can't read, or one that went away
+                continue
+            if key is not None:
+                new_listings[relative_root] = [key, subdirs, notebooks]
+
+            for name in notebooks:
+                if relative_root == '' and name.startswith('.'):
+                    continue
+                relative_path = _join(relative_root, name)
+                if not is_ignored(relative_path, False):
+                    found.append(relative_path)
+            for name in reversed(subdirs):
+                if relative_root == '' and name.startswith('.'):
+                    continue
+                relative_path = _join(relative_root, name)
+                if not is_ignored(relative_path, True):
+                    to_visit.append(relative_path)
+
+        if new_listings != old_listings:
+            self._save(project_directory, new_listings)
+        else:
+            with self._lock:
+                self._projects[project_directory] = new_listings
+
+        return sorted(found)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Run independent, mostly-blocking work items on a bounded number of threads."""
+from __future__ import absolute_import
+
+import multiprocessing
+import os
+from threading import Lock, Thread
+
+
+def worker_count_from_environment(variable, default=None):
+    """Get a worker count from an environment variable.
+
+    Args:
+        variable (str): name of the environment variable
+        default (int): count to use if unset or invalid, None for the number of CPUs
+
+    Returns:
+        an int, at least 1
+    """
+    if default is None:
+        try:
+            default = multiprocessing.cpu_count()
+        except NotImplementedError:  # pragma: no cover (only on weird platforms)
+            default = 1
+    try:
+        count = int(os.environ.get(variable, default))
+    except ValueError:
+        count = default
+    return max(1, count)
+
+
+def map_in_threads(func, items, max_workers):
+    """Call func(item) for each item using at most max_workers threads.
+
+    Results come back in the same order as items no matter what
+    order the calls finish in. If any call raises, the other
+    calls still run to completion and then the exception from the
+    earliest item is raised.
+
+    Args:
+        func (callable): function of one item
+        items (iterable): the items
+        max_workers (int): max threads to use
+
+    Returns:
+        list of func's return values
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = [None] * len(items)
+    state = dict(next=0)
+    lock = Lock()
+
+    def take_index():
+        with lock:
+            i = state['next']
+            state['next'] = i + 1
+        return i
+
+    def work():
+        i = take_index()
+        while i < len(items):
+            try:
+                results[i] = func(items[i])
+            except Exception as e:
+                errors[i] = e
+            i = take_index()
+
+    worker_count = min(max(1, max_workers), len(items))
+    if worker_count <= 1:
+        # no point in a thread
+        work()
+    else:
+        threads = []
+        for _ in range(worker_count):
+            t = Thread(target=work)
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+
+    return results
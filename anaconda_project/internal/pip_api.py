@@ -7,6 +7,7 @@
 # -----------------------------------------------------------------------------
 from __future__ import absolute_import, print_function
 
+import codecs
 import collections
 import subprocess
 import os
@@ -41,6 +42,15 @@ def _get_pip_command(prefix, extra_args):
     return cmd_list
 
 
+def is_pip_installed(prefix):
+    """True if the environment has a pip command."""
+    try:
+        _get_pip_command(prefix, [])
+        return True
+    except PipNotInstalledError:
+        return False
+
+
 def _call_pip(prefix, extra_args):
     cmd_list = _get_pip_command(prefix, extra_args)
 
@@ -58,13 +68,30 @@ def _call_pip(prefix, extra_args):
     return out
 
 
-def install(prefix, pkgs=None):
-    """Install packages into an environment."""
+def install(prefix, pkgs=None, find_links=None):
+    """Install packages into an environment.
+
+    If find_links is a directory, pip looks there for archives (such
+    as ones from ``download()``) before going to the index.
+    """
     if not pkgs or not isinstance(pkgs, (list, tuple)):
         raise TypeError('must specify a list of one or more packages to install into existing environment, not %r' %
                         pkgs)
 
     args = ['install', '--quiet']
+    if find_links is not None:
+        args.extend(['--find-links', find_links])
+    args.extend(pkgs)
+
+    return _call_pip(prefix, extra_args=args)
+
+
+def download(prefix, pkgs, directory):
+    """Download packages (and their dependencies) for an environment into a directory, without installing them."""
+    if not pkgs or not isinstance(pkgs, (list, tuple)):
+        raise TypeError('must specify a list of one or more packages to download, not %r' % pkgs)
+
+    args = ['download', '--quiet', '--dest', directory]
     args.extend(pkgs)
 
     return _call_pip(prefix, extra_args=args)
@@ -80,23 +107,92 @@ def remove(prefix, pkgs=None):
     return _call_pip(prefix, extra_args=args)
 
 
-def installed(prefix):
-    """Get a dict of package names to (name, version) tuples."""
-    if not os.path.isdir(prefix):
-        return dict()
-
+def _site_packages_directories(prefix):
+    candidates = [os.path.join(prefix, 'Lib', 'site-packages')]
     try:
-        # Use freeze instead of list so we get a consistent format across
-        # different versions of pip
-        out = _call_pip(prefix, extra_args=['freeze']).decode('utf-8')
-        # on Windows, $ in a regex doesn't match \r\n, we need to get rid of \r
-        out = out.replace("\r\n", "\n")
-    except PipNotInstalledError:
-        out = ""  # if pip isn't installed, there are no pip packages
-    # the output to parse ("legacy" format mode) looks like this:
-    #   ympy (0.7.6.1)
-    #   tables (3.2.2)
-    #   terminado (0.5)
+        lib_names = sorted(os.listdir(os.path.join(prefix, 'lib')))
+    except OSError:
+        lib_names = []
+    for name in lib_names:
+        if name.startswith('python'):
+            candidates.append(os.path.join(prefix, 'lib', name, 'site-packages'))
+    return [candidate for candidate in candidates if os.path.isdir(candidate)]
+
+
+def _read_metadata(filename):
+    """Get (name, version) from the headers of a METADATA or PKG-INFO file, or None."""
+    headers = dict()
+    try:
+        with codecs.open(filename, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.rstrip('\r\n')
+                if line == '':
+                    # the body (long description) starts after a blank line
+                    break
+                if ':' in line and not line[0].isspace():
+                    (key, value) = line.split(':', 1)
+                    headers.setdefault(key.strip().lower(), value.strip())
+                if 'name' in headers and 'version' in headers:
+                    break
+    except (IOError, OSError):
+        return None
+    if headers.get('name') and headers.get('version'):
+        return (headers['name'], headers['version'])
+    else:
+        return None
+
+
+def _metadata_file(site_packages, entry):
+    path = os.path.join(site_packages, entry)
+    if entry.endswith('.dist-info'):
+        return os.path.join(path, 'METADATA')
+    elif entry.endswith('.egg-info'):
+        # either a directory or, from distutils, the PKG-INFO itself
+        if os.path.isdir(path):
+            return os.path.join(path, 'PKG-INFO')
+        return path
+    elif entry.endswith('.egg'):
+        return os.path.join(path, 'EGG-INFO', 'PKG-INFO')
+    elif entry.endswith('.egg-link'):
+        # "pip install -e" of a setuptools project points to its source tree
+        try:
+            with codecs.open(path, 'r', encoding='utf-8') as f:
+                source = f.readline().strip()
+            for name in os.listdir(source):
+                if name.endswith('.egg-info'):
+                    return os.path.join(source, name, 'PKG-INFO')
+        except (IOError, OSError):
+            pass
+    return None
+
+
+def _installed_from_metadata(site_packages_directories):
+    result = dict()
+    for site_packages in site_packages_directories:
+        try:
+            entries = sorted(os.listdir(site_packages))
+        except OSError:
+            continue
+        for entry in entries:
+            metadata_file = _metadata_file(site_packages, entry)
+            if metadata_file is None:
+                continue
+            name_and_version = _read_metadata(metadata_file)
+            if name_and_version is not None:
+                result.setdefault(name_and_version[0], name_and_version)
+    return result
+
+
+def _installed_from_freeze(prefix):
+    # Use freeze instead of list so we get a consistent format across
+    # different versions of pip
+    out = _call_pip(prefix, extra_args=['freeze']).decode('utf-8')
+    # on Windows, $ in a regex doesn't match \r\n, we need to get rid of \r
+    out = out.replace("\r\n", "\n")
+    # the output to parse looks like this:
+    #   sympy==0.7.6.1
+    #   tables==3.2.2
+    #   terminado==0.5
     line_re = re.compile(r"^(.+)==(.+)$", flags=re.MULTILINE)
     result = dict()
     for match in line_re.finditer(out):
@@ -104,10 +200,68 @@ def installed(prefix):
     return result
 
 
-ParsedPipSpec = collections.namedtuple('ParsedPipSpec', ['name'])
+def installed(prefix):
+    """Get a dict of package names to (name, version) tuples.
+
+    We read the ``.dist-info`` and ``.egg-info`` metadata in the
+    environment's site-packages rather than running ``pip freeze``,
+    which has to start a Python and import pip. Unlike freeze, this
+    includes pip, setuptools and wheel themselves.
+    """
+    if not os.path.isdir(prefix):
+        return dict()
+
+    if not is_pip_installed(prefix):
+        return dict()  # if pip isn't installed, there are no pip packages
+
+    site_packages_directories = _site_packages_directories(prefix)
+    if len(site_packages_directories) == 0:
+        # an unusual layout; let pip find its packages
+        return _installed_from_freeze(prefix)
+    return _installed_from_metadata(site_packages_directories)
+
+
+_normalize_name_re = re.compile(r"[-_.]+")
+
+
+def normalize_name(name):
+    """Normalize a project name the way pip compares them, so "Foo_Bar" and "foo-bar" are the same."""
+    return _normalize_name_re.sub("-", name).lower()
+
+
+def _release_and_local(version):
+    (release, _, local) = version.strip().lower().partition('+')
+    if release.startswith('v'):
+        release = release[1:]
+    pieces = release.split('.')
+    # "1.2" and "1.2.0" are the same version
+    while len(pieces) > 1 and pieces[-1] == '0':
+        pieces.pop()
+    return ('.'.join(pieces), local)
+
+
+def version_matches(wanted, installed_version):
+    """Check an installed version against the version in a ``==`` spec.
+
+    This is a small subset of PEP 440: trailing zeros don't matter,
+    and a local version label (``+something``) on the installed
+    version is ignored unless the spec has one too.
+    """
+    (wanted_release, wanted_local) = _release_and_local(wanted)
+    (installed_release, installed_local) = _release_and_local(installed_version)
+    if wanted_release != installed_release:
+        return False
+    return wanted_local == '' or wanted_local == installed_local
+
+
+ParsedPipSpec = collections.namedtuple('ParsedPipSpec', ['name', 'exact_version'])
 
 _spec_pat = re.compile(r' *([a-zA-Z0-9][-_.a-zA-Z0-9]+)')
 
+# "foo==1.2" or "foo[extra] == 1.2" but not "foo==1.*", "foo==1.2,!=1.2.1",
+# or anything with an environment marker, which pip might skip
+_exact_version_pat = re.compile(r'^ *[a-zA-Z0-9][-_.a-zA-Z0-9]*(?: *\[[^\]]*\])? *== *([-_.+!a-zA-Z0-9]+) *$')
+
 _egg_fragment_re = re.compile(r'[#&]egg=([^&]*)')
 
 _egg_fragment_postfix_re = re.compile(r'^(.*?)(?:-dev|-\d.*)$')
@@ -151,7 +305,7 @@ def _extract_name_from_egg_fragment(url):
 
 
 def parse_spec(spec):
-    """Parse a pip spec, right now we only understand the name portion.
+    """Parse a pip spec, right now we only understand the name and an exact version.
 
     Parsing it exactly as pip would is extremely complicated, and
     we would pretty much have to import the pip code.
@@ -159,18 +313,23 @@ def parse_spec(spec):
 
     What we understand currently is an url with a "#egg=foo"
     fragment, and a plain package name (possibly with version info
-    on it). We don't understand filesystem paths yet.
+    on it, of which we only understand a single "==" version).
+    We don't understand filesystem paths yet.
 
     Returns:
        ``ParsedPipSpec`` or None on failure
 
     """
+    exact_version = None
     if _is_pip_understood_url(spec):
         name = _extract_name_from_egg_fragment(spec)
     else:
         name = _extract_name(spec)
+        m = _exact_version_pat.match(spec)
+        if m is not None:
+            exact_version = m.group(1)
 
     if name is None:
         return None
     else:
-        return ParsedPipSpec(name=name)
+        return ParsedPipSpec(name=name, exact_version=exact_version)
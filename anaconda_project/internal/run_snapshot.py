@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Snapshots of prepared ``run`` commands, so a repeat ``run`` can skip preparing.
+
+After ``anaconda-project run`` prepares a project, it saves what it
+is about to exec: the command line, its working directory, and the
+changes preparing made to the environment. The next ``run`` with
+the same arguments can exec straight from the snapshot, without
+loading the project, while the files preparing depended on (the
+project, lock and local state files, the environment's
+``conda-meta`` and site-packages directories, and any downloaded
+files) are unchanged and the variables that can affect preparing
+have the same values.
+
+Snapshots are signed with a key that only the user can read, so we
+only ever exec command lines we saved ourselves.
+
+This runs before the rest of the command line tool is imported, so
+it only imports the standard library and a few of our modules that
+don't import anything else.
+"""
+from __future__ import absolute_import
+
+import binascii
+import codecs
+import errno
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+from anaconda_project.internal import solve_cache
+from anaconda_project.internal.conda_meta_index import RACY_SECONDS
+from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+
+# besides the project's own requirement variables
+PREPARE_VARIABLES = ('PATH', 'PROJECT_DIR')
+PREPARE_VARIABLE_PREFIXES = ('CONDA_', 'ANACONDA_PROJECT_')
+
+DEFAULT_MAX_ENTRIES = 100
+
+# 2 added the environment's site-packages to the watched paths
+_FORMAT_VERSION = 2
+
+
+def stamp(paths):
+    """Describe the files at paths so we notice changes, or None if one changed too recently to tell."""
+    now = time.time()
+    result = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+        except OSError:
+            result.append([path, None])
+            continue
+        if now - info.st_mtime < RACY_SECONDS:
+            return None
+        result.append([path, repr(info.st_mtime), info.st_size, info.st_ino])
+    return result
+
+
+def variables_affecting_prepare(names, environ):
+    """Get the (name, value) pairs in environ that preparing could depend on.
+
+    Args:
+        names (iterable of str): the env vars of the project's requirements
+        environ (dict): the environment
+
+    Returns:
+        sorted list of (name, value)
+    """
+    names = set(names)
+    names.update(PREPARE_VARIABLES)
+    return sorted((name, value) for (name, value) in environ.items()
+                  if name in names or name.startswith(PREPARE_VARIABLE_PREFIXES))
+
+
+class RunSnapshots(object):
+    """A directory of signed snapshots of prepared commands."""
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        """Create snapshots in the given directory (which need not exist yet)."""
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._key = None
+
+    def _filename(self, request):
+        text = json.dumps(request, sort_keys=True)
+        return os.path.join(self.directory, hashlib.sha1(text.encode('utf-8')).hexdigest() + ".json")
+
+    def _signing_key(self, create):
+        with self._lock:
+            if self._key is not None:
+                return self._key
+            filename = os.path.join(self.directory, "key")
+            try:
+                with open(filename, 'rb') as f:
+                    self._key = f.read()
+            except (IOError, OSError) as e:
+                if e.errno != errno.ENOENT or not create:
+                    return None
+                key = binascii.hexlify(os.urandom(32))
+                try:
+                    makedirs_ok_if_exists(self.directory)
+                    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except (IOError, OSError):
+                    return None
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(key)
+                self._key = key
+            if len(self._key) == 0:
+                self._key = None
+            return self._key
+
+    def _sign(self, key, body):
+        return hmac.new(key, body.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def load(self, request, environ):
+        """Get the command to exec, if we have a snapshot for request that's still good.
+
+        Args:
+            request (dict): directory, env_spec, command, mode and extra_args of the ``run``
+            environ (dict): the environment ``run`` was started with
+
+        Returns:
+            dict with the args, cwd, shell and env to exec, or None
+        """
+        key = self._signing_key(create=False)
+        if key is None:
+            return None
+        try:
+            with codecs.open(self._filename(request), 'r', encoding='utf-8') as f:
+                signed = json.loads(f.read())
+            body = signed['body']
+            if not hmac.compare_digest(self._sign(key, body), str(signed['signature'])):
+                return None
+            snapshot = json.loads(body)
+            if snapshot['version'] != _FORMAT_VERSION or snapshot['request'] != request:
+                return None
+            if stamp(snapshot['paths']) != snapshot['stamp']:
+                return None
+            variables = variables_affecting_prepare(snapshot['names'], environ)
+            if [list(item) for item in variables] != snapshot['variables']:
+                return None
+            env = dict(environ)
+            env.update(snapshot['changed'])
+            for name in snapshot['removed']:
+                env.pop(name, None)
+            exec_info = snapshot['exec_info']
+            return dict(args=exec_info['args'], cwd=exec_info['cwd'], shell=exec_info['shell'], env=env)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, request, paths, names, environ, prepared_environ, exec_info):
+        """Save a snapshot of a prepared command.
+
+        Args:
+            request (dict): directory, env_spec, command, mode and extra_args of the ``run``
+            paths (list of str): files and directories that preparing depended on
+            names (list of str): the env vars of the project's requirements
+            environ (dict): the environment before preparing
+            prepared_environ (dict): the environment after preparing
+            exec_info (CommandExecInfo): the command to exec
+
+        Returns:
+            True if we saved a snapshot
+        """
+        current_stamp = stamp(paths)
+        if current_stamp is None:
+            return False
+        key = self._signing_key(create=True)
+        if key is None:
+            return False
+
+        changed = dict((name, value) for (name, value) in prepared_environ.items() if environ.get(name) != value)
+        removed = sorted(name for name in environ if name not in prepared_environ)
+        body = json.dumps(
+            dict(version=_FORMAT_VERSION,
+                 request=request,
+                 paths=paths,
+                 stamp=current_stamp,
+                 names=sorted(set(names)),
+                 variables=variables_affecting_prepare(names, environ),
+                 changed=changed,
+                 removed=removed,
+                 exec_info=dict(args=exec_info.args, cwd=exec_info.cwd, shell=exec_info.shell)))
+
+        signed = json.dumps(dict(body=body, signature=self._sign(key, body)))
+        # the environment may have things in it that other users shouldn't see
+        return solve_cache.save_entry(self.directory, self._filename(request), signed, self.max_entries, private=True)
+
+
+_run_snapshots = None
+
+
+# function exported for the run command
+def _get_run_snapshots(environ):
+    global _run_snapshots
+
+    # run_with_snapshot execs commands the way run does on unix
+    if os.name != 'posix' or environ.get('ANACONDA_PROJECT_DISABLE_RUN_SNAPSHOTS', '') != '':
+        return None
+    directory = environ.get('ANACONDA_PROJECT_RUN_SNAPSHOT_DIR', '') or solve_cache.default_directory("runs")
+    if _run_snapshots is None or _run_snapshots.directory != directory:
+        _run_snapshots = RunSnapshots(directory)
+    return _run_snapshots
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""On-disk cache of conda dependency solves.
+
+Each entry is a small JSON file named after a hash of what went
+into the solve: the package specs, the channels, and the
+platform. The entry also records a token that changes when conda's
+channel index is refreshed, and is only used if the token still
+matches. We bump an entry's mtime when we use it, and evict the
+least recently used entries when there are too many.
+"""
+from __future__ import absolute_import
+
+import codecs
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+
+from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+from anaconda_project.internal.rename import rename_over_existing
+
+DEFAULT_MAX_ENTRIES = 500
+# a day; we also notice when conda refreshes its index, but
+# if nothing has run conda in a while the index could be stale.
+DEFAULT_MAX_AGE = 60 * 60 * 24
+
+
+def default_directory(name="solves"):
+    """Directory for the solve cache if ANACONDA_PROJECT_SOLVE_CACHE_DIR isn't set.
+
+    Other caches can pass a different name to get a sibling directory.
+    """
+    if platform.system() == 'Windows':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser("~"))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "anaconda-project", name)
+
+
+def save_entry(directory, filename, text, max_entries, private=False):
+    """Write a cache entry and evict the least recently used ones if there are too many.
+
+    Entries are the ``.json`` files in directory. The entry is
+    written to a temporary file and renamed into place, so readers
+    never see part of it. Errors are ignored.
+
+    Args:
+        directory (str): the cache directory, created if needed
+        filename (str): the entry to write, in directory
+        text (str): the content of the entry
+        max_entries (int): how many entries to keep
+        private (bool): True if only the user may read the entry
+
+    Returns:
+        True if the entry was written
+    """
+    tmp_filename = "%s.tmp-%d-%d" % (filename, os.getpid(), threading.current_thread().ident)
+    try:
+        makedirs_ok_if_exists(directory)
+        fd = os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600 if private else 0o666)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        rename_over_existing(tmp_filename, filename)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+        return False
+    evict_entries(directory, max_entries)
+    return True
+
+
+def evict_entries(directory, max_entries):
+    """Remove the ``.json`` files in directory with the oldest mtimes, keeping max_entries of them."""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".json")]
+    except OSError:
+        return
+    if len(names) <= max_entries:
+        return
+    by_last_use = []
+    for name in names:
+        try:
+            by_last_use.append((os.path.getmtime(os.path.join(directory, name)), name))
+        except OSError:
+            pass
+    by_last_use.sort()
+    for (_, name) in by_last_use[:len(by_last_use) - max_entries]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def _normalize_specs(specs):
+    return sorted(set(" ".join(spec.split()) for spec in specs))
+
+
+class SolveCache(object):
+    """A directory of cached solve results."""
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        """Create a cache in the given directory (which need not exist yet)."""
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, specs, channels, platform, configured_channels=()):
+        """Compute the cache key for a solve.
+
+        Spec order doesn't matter to the solver but channel order
+        does (it's the priority order), so we only sort the specs.
+        ``configured_channels`` are the channels conda is configured
+        to search besides the explicit ``channels``.
+        """
+        description = json.dumps(dict(specs=_normalize_specs(specs),
+                                      channels=list(channels),
+                                      configured_channels=list(configured_channels),
+                                      platform=platform),
+                                 sort_keys=True)
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, index_token):
+        """Get the cached list of (name, version, build) tuples, or None."""
+        filename = self._filename(key)
+        try:
+            with codecs.open(filename, 'r', encoding='utf-8') as f:
+                entry = json.loads(f.read())
+            created = float(entry['created'])
+            results = [tuple(item) for item in entry['results']]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            self._count(hit=False)
+            return None
+
+        if entry.get('index', None) != index_token or created + self.max_age < time.time():
+            self._count(hit=False)
+            self.forget(key)
+            return None
+
+        try:
+            # mtime is our "last used" time for eviction
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return results
+
+    def put(self, key, index_token, results):
+        """Store a list of (name, version, build) tuples; errors are ignored."""
+        text = json.dumps(dict(created=time.time(), index=index_token, results=[list(item) for item in results]))
+        save_entry(self.directory, self._filename(key), text, self.max_entries)
+
+    def forget(self, key):
+        """Remove an entry if it exists."""
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
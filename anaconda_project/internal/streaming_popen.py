@@ -8,9 +8,17 @@
 from __future__ import absolute_import, print_function
 
 import codecs
+import errno
+import os
+import select
 import subprocess
 from threading import Thread
 
+try:
+    import selectors
+except ImportError:  # pragma: no cover (py2 only)
+    selectors = None  # pragma: no cover (py2 only)
+
 try:
     from queue import Queue
 except ImportError:  # pragma: no cover (py2 only)
@@ -18,134 +26,169 @@ except ImportError:  # pragma: no cover (py2 only)
 
 from anaconda_project.internal import logged_subprocess
 
+# os.read() on a pipe returns whatever is available up to this
+# size without waiting for more, so we still see conda's "....."
+# progress as it happens, but a big JSON document arrives in a
+# few large chunks instead of one character at a time.
+_CHUNK_SIZE = 65536
+
 
 # this function exists to be mocked in tests
 def _read_from_stream(stream, count):
-    return stream.read(count)
+    return os.read(stream.fileno(), count)
 
 
-def _read_and_queue_data(pipe, queue):
+# this function exists to be mocked in tests
+def _can_select_pipes():
+    # select() on Windows only works on sockets
+    return os.name != 'nt'
+
+
+class _Output(object):
+    """Everything read from one of the child's pipes so far."""
+    def __init__(self, pipe, callback):
+        self.pipe = pipe
+        self._callback = callback
+        self._buffer = bytearray()
+        if callback is None:
+            self._decoder = None
+        else:
+            # we use errors=replace because a strict decoder can
+            # raise an exception "prematurely" (before returning all
+            # valid bytes). Arguably replace is nicer anyway for
+            # our purposes.
+            self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def fileno(self):
+        return self.pipe.fileno()
+
+    def feed(self, data):
+        """Add bytes read from the pipe, where empty bytes means end of file."""
+        self._buffer.extend(data)
+        if self._decoder is not None:
+            text = self._decoder.decode(data, len(data) == 0)
+            if len(text) > 0:
+                self._callback(text)
+
+    def text(self):
+        # decoding the whole buffer at once gives the same text
+        # the incremental decoder passed to the callback.
+        return self._buffer.decode('utf-8', 'replace')
+
+
+def _read_with_selector(outputs):
+    if selectors is None:  # pragma: no cover (py2 only)
+        return _read_with_select(outputs)  # pragma: no cover (py2 only)
+
+    selector = selectors.DefaultSelector()
+    try:
+        for output in outputs:
+            selector.register(output, selectors.EVENT_READ)
+        remaining = len(outputs)
+        while remaining > 0:
+            for (key, events) in selector.select():
+                output = key.fileobj
+                data = _read_from_stream(output.pipe, _CHUNK_SIZE)
+                output.feed(data)
+                if len(data) == 0:
+                    selector.unregister(output)
+                    remaining -= 1
+    finally:
+        selector.close()
+
+
+def _read_with_select(outputs):  # pragma: no cover (py2 only)
+    remaining = list(outputs)
+    while len(remaining) > 0:
+        try:
+            (readable, _, _) = select.select(remaining, [], [])
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        for output in readable:
+            data = _read_from_stream(output.pipe, _CHUNK_SIZE)
+            output.feed(data)
+            if len(data) == 0:
+                remaining.remove(output)
+
+
+def _read_and_queue_data(output, queue):
     try:
         while True:
-            # Reading one character at a time is ridiculous, but
-            # the problem is we want to immediately display each
-            # "." in conda's "Doing stuff....." sort of output. If
-            # we read >1 char, Python apparently will call the
-            # read() system call more than once trying to fill up
-            # our requested buffer, which is undesirable because
-            # it prevents showing streaming progress to the user.
-            data = _read_from_stream(pipe, 1)
+            data = _read_from_stream(output.pipe, _CHUNK_SIZE)
+            queue.put((output, data, None))
             if len(data) == 0:
                 break
-            remaining = data
-            while len(remaining) > 0:
-                (start, sep, end) = remaining.partition('\n')
-                if sep == '':
-                    # no newline found, send chunk along
-                    queue.put((pipe, remaining, None))
-                    remaining = ''
-                else:
-                    # newline found, send line and then
-                    # look for another line
-                    queue.put((pipe, start + sep, None))
-                    remaining = end
-        queue.put((pipe, None, None))
     except Exception as e:
-        queue.put((pipe, None, e))
-
-
-def _reader_thread(pipe, queue):
-    t = Thread(target=_read_and_queue_data, args=(pipe, queue))
-    t.daemon = True
-    t.start()
-    return t
+        queue.put((output, None, e))
 
 
-def _combine_lines(datas):
-    combined = []
-    for data in datas:
-        if len(combined) == 0 or combined[-1].endswith("\n"):
-            combined.append(data)
+def _read_in_threads(outputs):
+    queue = Queue()
+    threads = []
+    for output in outputs:
+        t = Thread(target=_read_and_queue_data, args=(output, queue))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    # the callbacks only ever run on this thread
+    first_error = None
+    remaining = len(outputs)
+    while remaining > 0:
+        (output, data, error) = queue.get()
+        if error is not None:
+            if first_error is None:
+                first_error = error
+            remaining -= 1
         else:
-            combined[-1] = combined[-1] + data
-    return combined
-
+            output.feed(data)
+            if len(data) == 0:
+                remaining -= 1
 
-def popen(args, stdout_callback, stderr_callback, **kwargs):
-    def ignore_line(line):
-        pass
+    for t in threads:
+        t.join()
 
-    if stdout_callback is None:
-        stdout_callback = ignore_line
-    if stderr_callback is None:
-        stderr_callback = ignore_line
+    if first_error is not None:
+        raise first_error
 
-    p = logged_subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-    queue = Queue()
+def _split_lines(text):
+    lines = text.split("\n")
+    result = [line + "\n" for line in lines[:-1]]
+    if lines[-1] != "":
+        result.append(lines[-1])
+    return result
 
-    # Create/destroy reader outside of the threads, since there
-    # have been threading bugs in related destructors such as TextIOWrapper
-    # https://bugs.python.org/issue28387
-    #
-    # In case the reader isn't thread-safe (likely) we only use it
-    # from one thread at a time, even though all creation/deletion
-    # is in this main thread, reading is always in the child
-    # threads.
-    #
-    # we use errors=replace primarily because with strict
-    # errors, TextIOWrapper can raise an exception
-    # "prematurely" (before returning all valid bytes).
-    # Arguably replace is nicer anyway for our purposes.
-    #
-    # We don't close these readers, because it seems to result
-    # in a double-close on the underlying file.
-    stdout_wrapper = codecs.getreader('utf-8')(p.stdout, errors='replace')
-    stderr_wrapper = codecs.getreader('utf-8')(p.stderr, errors='replace')
-
-    stdout_thread = _reader_thread(stdout_wrapper, queue)
-    stderr_thread = _reader_thread(stderr_wrapper, queue)
-
-    stdout_buffer = []
-    stderr_buffer = []
 
-    first_error = None
-    stdout_joined = False
-    stderr_joined = False
-    while not (queue.empty() and (stdout_joined and stderr_joined)):
-        (which, data, error) = queue.get()
-        if error is not None and first_error is None:
-            first_error = error
-        if data is None:
-            if which is stdout_wrapper:
-                stdout_thread.join()
-                stdout_joined = True
-                assert not stdout_thread.is_alive()
-            else:
-                assert which is stderr_wrapper
-                stderr_thread.join()
-                stderr_joined = True
-                assert not stderr_thread.is_alive()
-        else:
-            if which is stdout_wrapper:
-                stdout_callback(data)
-                stdout_buffer.append(data)
-            else:
-                assert which is stderr_wrapper
-                stderr_callback(data)
-                stderr_buffer.append(data)
+def popen_text(args, stdout_callback, stderr_callback, **kwargs):
+    """Run a process, passing its output to callbacks as it arrives.
 
-    assert queue.empty()
+    Each callback gets a string with whatever the process wrote
+    since the last call, which may be several lines or part of a
+    line. A callback can be None.
 
-    p.stdout.close()
-    p.stderr.close()
+    Returns:
+        tuple of the Popen object, the whole stdout as a string, and the whole stderr as a string
+    """
+    p = logged_subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-    p.wait()
+    outputs = [_Output(p.stdout, stdout_callback), _Output(p.stderr, stderr_callback)]
+    try:
+        if _can_select_pipes():
+            _read_with_selector(outputs)
+        else:
+            _read_in_threads(outputs)
+    finally:
+        p.stdout.close()
+        p.stderr.close()
+        p.wait()
 
-    stdout_buffer = _combine_lines(stdout_buffer)
-    stderr_buffer = _combine_lines(stderr_buffer)
+    return (p, outputs[0].text(), outputs[1].text())
 
-    if first_error is not None:
-        raise first_error
 
-    return (p, stdout_buffer, stderr_buffer)
+def popen(args, stdout_callback, stderr_callback, **kwargs):
+    """Like popen_text(), but return stdout and stderr as lists of lines."""
+    (p, stdout_text, stderr_text) = popen_text(args, stdout_callback, stderr_callback, **kwargs)
+    return (p, _split_lines(stdout_text), _split_lines(stderr_text))
@@ -15,31 +15,95 @@ import uuid
 import hashlib
 import socket
 
+_DOWNLOAD_PATTERN = "abcdefghijklmnop".encode("utf-8")
+
+
+def _download_content(offset, length):
+    """The bytes of a test download, which repeats _DOWNLOAD_PATTERN, from offset."""
+    block = _DOWNLOAD_PATTERN * 21
+    skip = offset % len(_DOWNLOAD_PATTERN)
+    while length > 0:
+        to_write = block[skip:skip + min(length, 320)]
+        length -= len(to_write)
+        yield to_write
+
 
 class _DownloadView(RequestHandler):
     def __init__(self, application, *args, **kwargs):
         # Note: application is stored as self.application
         super(_DownloadView, self).__init__(application, *args, **kwargs)
 
+    def _requested_range(self, length):
+        if self.get_argument("ranges", "true") != "true":
+            return None
+        header = self.request.headers.get('Range', None)
+        if header is None or not header.startswith("bytes="):
+            return None
+        if_range = self.request.headers.get('If-Range', None)
+        if if_range is not None and if_range != self._etag():
+            return None
+        (first, last) = header[len("bytes="):].split("-")
+        first = int(first)
+        last = int(last) if last != "" else length - 1
+        return (first, min(last, length - 1))
+
+    def _etag(self):
+        return '"%s"' % self.get_argument("etag", "v1")
+
+    def _set_validator(self):
+        if self.get_argument("validators", "true") == "true":
+            self.set_header('ETag', self._etag())
+
+    def head(self, *args, **kwargs):
+        length = int(self.get_argument("length"))
+        self.set_status(200)
+        self.set_header('Content-Length', str(length))
+        if self.get_argument("ranges", "true") == "true":
+            self.set_header('Accept-Ranges', 'bytes')
+        self._set_validator()
+        self.finish()
+
     @gen.coroutine
     def get(self, *args, **kwargs):
         download_id = self.get_argument("id")
         hash_algorithm = self.get_argument("hash_algorithm", None)
         length = int(self.get_argument("length"))
-
-        print("Planning to send %d bytes" % length)
-        if hash_algorithm:
-            hasher = getattr(hashlib, hash_algorithm)()
-
-        self.set_status(200)
-        self.set_header('Content-Length', str(length))
-        data = ("abcdefghijklmnop" * 20).encode("utf-8")
-        remaining = length
-        while remaining > 0:
-            to_write = data[:remaining]
-            if hash_algorithm:
-                hasher.update(to_write)
-            remaining = remaining - len(to_write)
+        # drop the connection after sending this many bytes, the first N times
+        fail_after = int(self.get_argument("fail_after", "-1"))
+        fail_times = int(self.get_argument("fail_times", "1"))
+        previous_requests = len(self.application.requests.get(download_id, []))
+        self.application.requests.setdefault(download_id, []).append(self.request.headers.get('Range', None))
+        # with changing=true the content is different every time we're asked for it
+        shift = previous_requests if self.get_argument("changing", "false") == "true" else 0
+
+        requested = self._requested_range(length)
+        if requested is not None and requested[0] >= length:
+            self.set_status(416)
+            self.set_header('Content-Range', 'bytes */%d' % length)
+            self.finish()
+            return
+        elif requested is not None:
+            (first, last) = requested
+            self.set_status(206)
+            self.set_header('Content-Range', 'bytes %d-%d/%d' % (first, last, length))
+        else:
+            (first, last) = (0, length - 1)
+            self.set_status(200)
+
+        print("Planning to send %d bytes" % (last + 1 - first))
+        self.set_header('Content-Length', str(last + 1 - first))
+        self._set_validator()
+        failures = self.application.failures.get(download_id, 0)
+        sent = 0
+        for to_write in _download_content(first + shift, last + 1 - first):
+            if fail_after >= 0 and failures < fail_times and sent + len(to_write) > fail_after:
+                to_write = to_write[:fail_after - sent]
+                self.write(to_write)
+                yield self.flush()
+                self.application.failures[download_id] = failures + 1
+                self.request.connection.close()
+                return
+            sent += len(to_write)
             self.write(to_write)
             try:
                 yield self.flush()
@@ -47,6 +111,9 @@ class _DownloadView(RequestHandler):
                 raise e
 
         if hash_algorithm:
+            hasher = getattr(hashlib, hash_algorithm)()
+            for data in _download_content(shift, length):
+                hasher.update(data)
             self.application.hashes[download_id] = hasher.hexdigest()
 
         self.finish()
@@ -65,6 +132,8 @@ class _ErrorView(RequestHandler):
 class _TestServerApplication(Application):
     def __init__(self, **kwargs):
         self.hashes = dict()
+        self.failures = dict()
+        self.requests = dict()
         patterns = [(r'/download', _DownloadView), (r'/error', _ErrorView)]
         super(_TestServerApplication, self).__init__(patterns, **kwargs)
 
@@ -105,15 +174,24 @@ class _TestServer(object):
     def error_url(self):
         return self.url + "error"
 
-    def new_download_url(self, download_length, hash_algorithm):
+    def new_download_url(self, download_length, hash_algorithm, **options):
         url = (self.url + "download?id=" + str(uuid.uuid4()) + "&length=" + str(download_length))
         if hash_algorithm:
             url += "&hash_algorithm=" + hash_algorithm
+        for (name, value) in sorted(options.items()):
+            url += "&%s=%s" % (name, value)
         return url
 
-    def server_computed_hash_for_downloaded_url(self, download_url):
+    def _download_id(self, download_url):
         i = download_url.index("id=")
-        download_id = download_url[(i + 3):][:36]
+        return download_url[(i + 3):][:36]
+
+    def ranges_requested_for_url(self, download_url):
+        """The Range header (or None) of each GET of the url."""
+        return self._application.requests.get(self._download_id(download_url), [])
+
+    def server_computed_hash_for_downloaded_url(self, download_url):
+        download_id = self._download_id(download_url)
         if download_id not in self._application.hashes:
             raise RuntimeError("It looks like the download from %s did not complete" % download_url)
         return self._application.hashes[download_id]
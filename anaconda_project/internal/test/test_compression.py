@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import bz2
+import gzip
+import os
+
+import pytest
+
+from anaconda_project.internal import compression
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+
+def _sample_data():
+    return b"".join([(u"line %d of the sample\n" % i).encode('ascii') * (i % 7 + 1) for i in range(20000)])
+
+
+def _write_in_pieces(f, data, piece_size):
+    for i in range(0, len(data), piece_size):
+        f.write(data[i:i + piece_size])
+
+
+def _check_round_trip(method, read, level, workers, monkeypatch):
+    # small blocks so we get lots of them
+    monkeypatch.setattr(compression, '_GZIP_BLOCK_SIZE', 10000)
+    monkeypatch.setattr(compression, '_BZ2_BLOCK_SIZE', 10000)
+
+    def check(dirname):
+        filename = os.path.join(dirname, "out")
+        data = _sample_data()
+        f = compression.open_for_writing(filename, method, level=level, workers=workers)
+        with f:
+            _write_in_pieces(f, data, 3333)
+            assert f.tell() == len(data)
+        assert read(filename) == data
+        return os.path.getsize(filename)
+
+    return with_directory_contents(dict(), check)
+
+
+def _read_gzip(filename):
+    with gzip.GzipFile(filename, 'rb') as f:
+        return f.read()
+
+
+def _read_bz2(filename):
+    with bz2.BZ2File(filename, 'r') as f:
+        return f.read()
+
+
+def test_gzip_on_threads(monkeypatch):
+    for level in (0, 1, 9):
+        _check_round_trip('gz', _read_gzip, level, 4, monkeypatch)
+
+
+def test_gzip_without_threads(monkeypatch):
+    _check_round_trip('gz', _read_gzip, 6, 1, monkeypatch)
+
+
+def test_gzip_on_threads_is_compressed(monkeypatch):
+    def check(dirname):
+        filename = os.path.join(dirname, "out.gz")
+        with compression.open_for_writing(filename, 'gz', level=9, workers=3) as f:
+            f.write(_sample_data())
+        assert os.path.getsize(filename) < len(_sample_data()) / 10
+
+    with_directory_contents(dict(), check)
+
+
+def test_bz2_on_threads(monkeypatch):
+    for level in (0, 1, 9):
+        _check_round_trip('bz2', _read_bz2, level, 4, monkeypatch)
+
+
+def test_bz2_without_threads(monkeypatch):
+    _check_round_trip('bz2', _read_bz2, 9, 1, monkeypatch)
+
+
+def test_xz(monkeypatch):
+    if not compression.method_available('xz'):
+        pytest.skip("no lzma module")
+    import lzma
+
+    def read(filename):
+        with lzma.LZMAFile(filename, 'r') as f:
+            return f.read()
+
+    _check_round_trip('xz', read, 1, 4, monkeypatch)
+
+
+def test_no_compression(monkeypatch):
+    def read(filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    size = _check_round_trip(None, read, None, 4, monkeypatch)
+    assert size == len(_sample_data())
+
+
+def test_worker_count_from_environment(monkeypatch):
+    monkeypatch.setenv('ANACONDA_PROJECT_COMPRESS_WORKERS', '3')
+    assert compression.compress_worker_count() == 3
+
+
+def test_bad_method_or_level():
+    def check(dirname):
+        filename = os.path.join(dirname, "out")
+        with pytest.raises(ValueError) as excinfo:
+            compression.open_for_writing(filename, 'rar')
+        assert "Compression method 'rar' is not available." == str(excinfo.value)
+
+        with pytest.raises(ValueError) as excinfo:
+            compression.open_for_writing(filename, 'gz', level=11)
+        assert "Compression level must be from 0 to 9, not 11." == str(excinfo.value)
+
+        assert not os.path.exists(filename)
+
+    with_directory_contents(dict(), check)
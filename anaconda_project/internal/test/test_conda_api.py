@@ -12,6 +12,7 @@ import os
 import platform
 import pytest
 import random
+import time
 
 from pprint import pprint
 
@@ -27,6 +28,13 @@ else:
     IPYTHON_BINARY = "bin/ipython"
 
 
+@pytest.fixture(autouse=True)
+def no_solve_cache(monkeypatch):
+    # many tests here mock out conda, so we don't want to cache
+    # what they say; the tests of the cache turn it back on.
+    monkeypatch.setenv('ANACONDA_PROJECT_DISABLE_SOLVE_CACHE', '1')
+
+
 def monkeypatch_conda_not_to_use_links(monkeypatch):
     # on Windows, if you hardlink a file that's in use you can't then
     # remove the file. So we need to pass --copy to conda to avoid errors
@@ -249,6 +257,22 @@ def test_conda_install_gets_channels(monkeypatch):
     conda_api.install(prefix='/prefix', pkgs=['python'], channels=['foo'])
 
 
+def test_conda_clone(monkeypatch):
+    def mock_call_conda(extra_args, json_mode=False, platform=None, stdout_callback=None, stderr_callback=None):
+        assert ['create', '--yes', '--prefix', '/prefix', '--clone', '/golden'] == extra_args
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api._call_conda', mock_call_conda)
+    conda_api.clone(prefix='/prefix', source_prefix='/golden')
+
+
+def test_conda_clone_onto_existing_prefix():
+    def do_test(dirname):
+        with pytest.raises(conda_api.CondaEnvExistsError):
+            conda_api.clone(prefix=dirname, source_prefix='/golden')
+
+    with_directory_contents(dict(), do_test)
+
+
 def test_resolve_root_prefix():
     prefix = conda_api.resolve_env_to_prefix('root')
     assert prefix is not None
@@ -328,6 +352,85 @@ def test_installed_cannot_list_dir(monkeypatch):
     assert 'cannot list this' in repr(excinfo.value)
 
 
+def test_installed_is_cached_until_conda_meta_changes(monkeypatch):
+    def check_installed(dirname):
+        monkeypatch.setenv('ANACONDA_PROJECT_INSTALLED_CACHE_DIR', os.path.join(dirname, "cache"))
+        meta_dir = os.path.join(dirname, "prefix", "conda-meta")
+        an_hour_ago = time.time() - 3600
+        os.utime(meta_dir, (an_hour_ago, an_hour_ago))
+
+        prefix = os.path.join(dirname, "prefix")
+        expected = {'numpy': ('numpy', '1.11.0', 'py36_0')}
+        assert expected == conda_api.installed(prefix)
+
+        listdir_calls = []
+        real_listdir = os.listdir
+
+        def mock_listdir(path):
+            listdir_calls.append(path)
+            return real_listdir(path)
+
+        monkeypatch.setattr('os.listdir', mock_listdir)
+
+        assert expected == conda_api.installed(prefix)
+        assert [] == listdir_calls
+
+        # also on disk, for the next process
+        monkeypatch.setattr('anaconda_project.internal.conda_api._conda_meta_index', None)
+        assert expected == conda_api.installed(prefix)
+        assert [] == listdir_calls
+
+        with open(os.path.join(meta_dir, "python-3.6.0-0.json"), 'w') as f:
+            f.write("{}")
+        half_an_hour_ago = time.time() - 1800
+        os.utime(meta_dir, (half_an_hour_ago, half_an_hour_ago))
+        expected['python'] = ('python', '3.6.0', '0')
+        assert expected == conda_api.installed(prefix)
+        assert [meta_dir] == listdir_calls
+
+    with_directory_contents({'prefix/conda-meta/numpy-1.11.0-py36_0.json': ""}, check_installed)
+
+
+def test_installed_cache_disabled(monkeypatch):
+    def check_installed(dirname):
+        monkeypatch.setenv('ANACONDA_PROJECT_DISABLE_INSTALLED_CACHE', '1')
+        monkeypatch.setenv('ANACONDA_PROJECT_INSTALLED_CACHE_DIR', os.path.join(dirname, "cache"))
+        meta_dir = os.path.join(dirname, "conda-meta")
+        an_hour_ago = time.time() - 3600
+        os.utime(meta_dir, (an_hour_ago, an_hour_ago))
+
+        assert {'numpy': ('numpy', '1.11.0', 'py36_0')} == conda_api.installed(dirname)
+        assert not os.path.exists(os.path.join(dirname, "cache"))
+
+    with_directory_contents({'conda-meta/numpy-1.11.0-py36_0.json': ""}, check_installed)
+
+
+def test_parse_spec_is_memoized(monkeypatch):
+    calls = []
+    real_parse = conda_api._parse_spec_uncached
+
+    def counting_parse(spec):
+        calls.append(spec)
+        return real_parse(spec)
+
+    monkeypatch.setattr(conda_api, '_parse_spec_uncached', counting_parse)
+    monkeypatch.setattr(conda_api, '_parsed_specs', dict())
+
+    first = conda_api.parse_spec("memoized_package=1.0=abc")
+    assert first is conda_api.parse_spec("memoized_package=1.0=abc")
+    assert ["memoized_package=1.0=abc"] == calls
+    assert first.exact_build_string == 'abc'
+
+    # a parse failure is remembered too
+    assert conda_api.parse_spec("memoized_package=") is None
+    assert conda_api.parse_spec("memoized_package=") is None
+    assert 2 == len(calls)
+
+    monkeypatch.setattr(conda_api, '_MAX_PARSED_SPECS', 2)
+    conda_api.parse_spec("another_package")
+    assert 1 == len(conda_api._parsed_specs)
+
+
 def test_set_conda_env_in_path_unix(monkeypatch):
     import platform
     if platform.system() == 'Windows':
@@ -1172,3 +1275,139 @@ def test_validate_platform_list():
     assert ['linux-64', 'foo-64'] == platforms
     assert ['foo-64'] == unknown
     assert ['something', 'wtf'] == invalid
+
+
+_mkl_link_json = json.dumps({'actions': [{'LINK': [{'build_string': '0', 'name': 'mkl', 'version': '2017.0.1'}]}]})
+
+
+def _with_solve_cache(monkeypatch, func):
+    def check(dirname):
+        monkeypatch.delenv('ANACONDA_PROJECT_DISABLE_SOLVE_CACHE')
+        monkeypatch.setenv('ANACONDA_PROJECT_SOLVE_CACHE_DIR', dirname)
+        monkeypatch.setattr('anaconda_project.internal.conda_api._solve_cache', None)
+        index = dict(token='first', channels=['defaults'])
+        monkeypatch.setattr('anaconda_project.internal.conda_api._channel_index_token', lambda: index['token'])
+        monkeypatch.setattr('anaconda_project.internal.conda_api._configured_channels', lambda: index['channels'])
+        calls = []
+
+        def mock_call_conda(extra_args, json_mode, platform=None, stdout_callback=None, stderr_callback=None):
+            calls.append(extra_args)
+            return _mkl_link_json
+
+        monkeypatch.setattr('anaconda_project.internal.conda_api._call_conda', mock_call_conda)
+        func(dirname, calls, index)
+
+    with_directory_contents(dict(), check)
+
+
+def test_resolve_dependencies_uses_solve_cache(monkeypatch):
+    def check(dirname, calls, index):
+        expected = [('mkl', '2017.0.1', '0')]
+        assert expected == conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        assert len(calls) == 1
+        assert dict(hits=0, misses=1) == conda_api.solve_cache_statistics()
+
+        # spec order and whitespace don't matter
+        assert expected == conda_api.resolve_dependencies(['bar', ' foo=1.0 '], channels=['abc'])
+        assert len(calls) == 1
+        assert dict(hits=1, misses=1) == conda_api.solve_cache_statistics()
+
+        # channels, platform, and the channel index do matter
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['nbc'])
+        assert len(calls) == 2
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'], platform='win-32')
+        assert len(calls) == 3
+        index['token'] = 'second'
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        assert len(calls) == 4
+        assert dict(hits=1, misses=4) == conda_api.solve_cache_statistics()
+
+        # so do the channels in .condarc
+        index['channels'] = ['conda-forge', 'defaults']
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        assert len(calls) == 5
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        assert len(calls) == 5
+
+        # forgetting makes us run conda again
+        conda_api.forget_resolved_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        assert len(calls) == 6
+        conda_api.resolve_dependencies(['foo=1.0', 'bar'], channels=['abc'])
+        assert len(calls) == 6
+
+    _with_solve_cache(monkeypatch, check)
+
+
+def test_resolve_dependencies_solve_cache_can_be_disabled(monkeypatch):
+    def check(dirname, calls, index):
+        monkeypatch.setenv('ANACONDA_PROJECT_DISABLE_SOLVE_CACHE', '1')
+        conda_api.resolve_dependencies(['foo=1.0'])
+        conda_api.resolve_dependencies(['foo=1.0'])
+        assert len(calls) == 2
+        assert [] == os.listdir(dirname)
+        # does nothing
+        conda_api.forget_resolved_dependencies(['foo=1.0'])
+
+    _with_solve_cache(monkeypatch, check)
+
+
+def test_resolve_dependencies_does_not_cache_without_index_token(monkeypatch):
+    def check(dirname, calls, index):
+        index['token'] = None
+        conda_api.resolve_dependencies(['foo=1.0'])
+        conda_api.resolve_dependencies(['foo=1.0'])
+        assert len(calls) == 2
+        assert [] == os.listdir(dirname)
+        conda_api.forget_resolved_dependencies(['foo=1.0'])
+
+    _with_solve_cache(monkeypatch, check)
+
+
+def test_resolve_dependencies_does_not_cache_without_configured_channels(monkeypatch):
+    def check(dirname, calls, index):
+        index['channels'] = None
+        conda_api.resolve_dependencies(['foo=1.0'])
+        conda_api.resolve_dependencies(['foo=1.0'])
+        assert len(calls) == 2
+        assert [] == os.listdir(dirname)
+        conda_api.forget_resolved_dependencies(['foo=1.0'])
+
+    _with_solve_cache(monkeypatch, check)
+
+
+def test_configured_channels(monkeypatch):
+    monkeypatch.setattr('anaconda_project.internal.conda_api._cached_info', None)
+    monkeypatch.setattr('anaconda_project.internal.conda_api.info',
+                        lambda: dict(channels=['https://repo.example.com/main/linux-64']))
+    assert ['https://repo.example.com/main/linux-64'] == conda_api._configured_channels()
+
+    def mock_info():
+        raise conda_api.CondaError("no conda")
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api._cached_info', None)
+    monkeypatch.setattr('anaconda_project.internal.conda_api.info', mock_info)
+    assert conda_api._configured_channels() is None
+
+
+def test_channel_index_token_changes_with_conda_index(monkeypatch):
+    def check(dirname):
+        monkeypatch.setattr('anaconda_project.internal.conda_api._cached_info', None)
+        monkeypatch.setattr('anaconda_project.internal.conda_api.info',
+                            lambda: dict(pkgs_dirs=[dirname, os.path.join(dirname, "nope")]))
+        first = conda_api._channel_index_token()
+        assert first == conda_api._channel_index_token()
+        with open(os.path.join(dirname, "cache", "abcdef.json"), 'w') as f:
+            f.write("{}")
+        assert first != conda_api._channel_index_token()
+
+    with_directory_contents({"cache/something.json": "{}", "cache/not-an-index.txt": ""}, check)
+
+
+def test_channel_index_token_when_conda_info_fails(monkeypatch):
+    def mock_info():
+        raise conda_api.CondaError("no conda")
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api._cached_info', None)
+    monkeypatch.setattr('anaconda_project.internal.conda_api.info', mock_info)
+    assert conda_api._channel_index_token() is None
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import os
+import time
+
+from anaconda_project.internal.conda_meta_index import CondaMetaIndex
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+_packages = [('python', '3.6.0', '0'), ('numpy', '1.11.0', 'py36_0')]
+
+
+def _age(path):
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+
+class _Lister(object):
+    def __init__(self, packages):
+        self.packages = packages
+        self.calls = 0
+
+    def __call__(self, meta_dir):
+        self.calls += 1
+        return list(self.packages)
+
+
+def test_conda_meta_index_in_memory():
+    def check(dirname):
+        meta_dir = os.path.join(dirname, "conda-meta")
+        _age(meta_dir)
+        index = CondaMetaIndex(directory=None)
+        lister = _Lister(_packages)
+
+        assert _packages == index.packages(meta_dir, lister)
+        assert _packages == index.packages(meta_dir, lister)
+        assert 1 == lister.calls
+        assert (1, 1) == (index.hits, index.misses)
+
+        # installing a package changes the directory
+        with open(os.path.join(meta_dir, "bar-1.0-0.json"), 'w') as f:
+            f.write("{}")
+        os.utime(meta_dir, (time.time() - 30, time.time() - 30))
+        lister.packages = _packages + [('bar', '1.0', '0')]
+        assert lister.packages == index.packages(meta_dir, lister)
+        assert 2 == lister.calls
+
+    with_directory_contents({"conda-meta/foo-1.0-0.json": "{}"}, check)
+
+
+def test_conda_meta_index_on_disk():
+    def check(dirname):
+        meta_dir = os.path.join(dirname, "prefix", "conda-meta")
+        _age(meta_dir)
+        cache_dir = os.path.join(dirname, "cache")
+        lister = _Lister(_packages)
+
+        assert _packages == CondaMetaIndex(cache_dir).packages(meta_dir, lister)
+        assert 1 == len(os.listdir(cache_dir))
+
+        # a new index (as in a new process) finds it on disk
+        index = CondaMetaIndex(cache_dir)
+        assert _packages == index.packages(meta_dir, lister)
+        assert 1 == lister.calls
+        assert (1, 0) == (index.hits, index.misses)
+
+        # a corrupt file is just a miss
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), 'w') as f:
+                f.write("not json")
+        index = CondaMetaIndex(cache_dir)
+        assert _packages == index.packages(meta_dir, lister)
+        assert 2 == lister.calls
+
+    with_directory_contents({"prefix/conda-meta/foo-1.0-0.json": "{}"}, check)
+
+
+def test_conda_meta_index_ignores_recently_modified_directory():
+    def check(dirname):
+        meta_dir = os.path.join(dirname, "conda-meta")
+        cache_dir = os.path.join(dirname, "cache")
+        index = CondaMetaIndex(cache_dir)
+        lister = _Lister(_packages)
+
+        # with_directory_contents just created it
+        index.packages(meta_dir, lister)
+        index.packages(meta_dir, lister)
+        assert 2 == lister.calls
+        assert not os.path.exists(cache_dir)
+
+    with_directory_contents({"conda-meta/foo-1.0-0.json": "{}"}, check)
+
+
+def test_conda_meta_index_missing_directory():
+    def check(dirname):
+        meta_dir = os.path.join(dirname, "conda-meta")
+        index = CondaMetaIndex(None)
+        lister = _Lister([])
+        assert [] == index.packages(meta_dir, lister)
+        assert [] == index.packages(meta_dir, lister)
+        assert 2 == lister.calls
+
+    with_directory_contents(dict(), check)
+
+
+def test_conda_meta_index_cannot_save(monkeypatch):
+    def check(dirname):
+        meta_dir = os.path.join(dirname, "conda-meta")
+        _age(meta_dir)
+        # the cache "directory" is a file
+        cache_dir = os.path.join(dirname, "cache")
+        with open(cache_dir, 'w') as f:
+            f.write("")
+        lister = _Lister(_packages)
+        assert _packages == CondaMetaIndex(cache_dir).packages(meta_dir, lister)
+        assert _packages == CondaMetaIndex(cache_dir).packages(meta_dir, lister)
+        assert 2 == lister.calls
+
+    with_directory_contents({"conda-meta/foo-1.0-0.json": "{}"}, check)
@@ -8,10 +8,12 @@
 from __future__ import absolute_import, print_function
 
 import codecs
+import errno
 import json
 import os
 import platform
 import pytest
+import threading
 import time
 from pprint import pprint
 
@@ -23,8 +25,10 @@ from anaconda_project.frontend import NullFrontend
 from anaconda_project.internal.default_conda_manager import (DefaultCondaManager, _extract_common)
 import anaconda_project.internal.pip_api as pip_api
 import anaconda_project.internal.conda_api as conda_api
+import anaconda_project.internal.env_fingerprint as env_fingerprint
 
 from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+from anaconda_project.internal.test.fake_frontend import FakeFrontend
 from anaconda_project.internal.test.test_conda_api import monkeypatch_conda_not_to_use_links
 
 if platform.system() == 'Windows':
@@ -267,7 +271,6 @@ def test_conda_create_and_install_and_remove(monkeypatch):
 
         # test that we can remove a package
         assert manager._timestamp_file_up_to_date(envdir, spec)
-        time.sleep(1)  # removal is fast enough to break our timestamp resolution
         manager.remove_packages(prefix=envdir, packages=['ipython'])
         assert not os.path.exists(os.path.join(envdir, IPYTHON_BINARY))
         assert not manager._timestamp_file_up_to_date(envdir, spec)
@@ -307,21 +310,14 @@ def test_timestamp_file_works(monkeypatch):
         manager = DefaultCondaManager(frontend=NullFrontend())
 
         def print_timestamps(when):
-            newest_in_prefix = 0
-            for d in manager._timestamp_comparison_directories(envdir):
-                try:
-                    t = os.path.getmtime(d)
-                except Exception:
-                    t = 0
-                if t > newest_in_prefix:
-                    newest_in_prefix = t
             timestamp_fname = manager._timestamp_file(envdir, spec)
             try:
-                timestamp_file = os.path.getmtime(timestamp_fname)
+                with codecs.open(timestamp_fname, 'r', encoding='utf-8') as f:
+                    recorded = json.loads(f.read()).get('fingerprint')
             except Exception:
-                timestamp_file = 0
-            print("%s: timestamp file %d prefix %d diff %g" %
-                  (when, timestamp_file, newest_in_prefix, newest_in_prefix - timestamp_file))
+                recorded = None
+            current = env_fingerprint.compute_fingerprint(envdir, manager._cache_directory(envdir))
+            print("%s: timestamp file fingerprint %s prefix fingerprint %s" % (when, recorded, current))
 
         print_timestamps("before env creation")
 
@@ -373,16 +369,24 @@ def test_timestamp_file_works(monkeypatch):
 
         assert manager._timestamp_file_up_to_date(envdir, spec)
 
-        # now modify conda-meta and check that we DO call the package managers
-        time.sleep(1.1)  # be sure we are in a new second
+        # a file in conda-meta which isn't a package record doesn't matter
         conda_meta_dir = os.path.join(envdir, "conda-meta")
-        print("conda-meta original timestamp: %d" % os.path.getmtime(conda_meta_dir))
-        inside_conda_meta = os.path.join(conda_meta_dir, "thing.txt")
+        not_a_record = os.path.join(conda_meta_dir, "thing.txt")
+        with codecs.open(not_a_record, 'w', encoding='utf-8') as f:
+            f.write(u"This file is not a package record\n")
+        assert manager._timestamp_file_up_to_date(envdir, spec)
+        os.remove(not_a_record)
+
+        # now modify conda-meta and check that we DO call the
+        # package managers (no sleep, we don't depend on mtimes)
+        inside_conda_meta = os.path.join(conda_meta_dir, "thing-1.0-0.json")
         with codecs.open(inside_conda_meta, 'w', encoding='utf-8') as f:
-            f.write(u"This file should change the mtime on conda-meta\n")
-        print("file inside conda-meta %d and conda-meta itself %d" %
-              (os.path.getmtime(inside_conda_meta), os.path.getmtime(conda_meta_dir)))
+            f.write(u"{}\n")
+        assert not manager._timestamp_file_up_to_date(envdir, spec)
         os.remove(inside_conda_meta)
+        assert manager._timestamp_file_up_to_date(envdir, spec)
+        with codecs.open(inside_conda_meta, 'w', encoding='utf-8') as f:
+            f.write(u"{}\n")
 
         print_timestamps("after touching conda-meta")
 
@@ -391,6 +395,7 @@ def test_timestamp_file_works(monkeypatch):
         deviations = manager.find_environment_deviations(envdir, spec)
 
         assert len(called) == 2
+        os.remove(inside_conda_meta)
 
         assert deviations.missing_packages == ()
         assert deviations.missing_pip_packages == ()
@@ -422,20 +427,21 @@ def test_timestamp_file_ignores_failed_write(monkeypatch):
 
         manager = DefaultCondaManager(frontend=NullFrontend())
 
+        filename = manager._timestamp_file(envdir, spec)
+
         counts = dict(calls=0)
 
         def mock_open(*args, **kwargs):
-            counts['calls'] += 1
-            if counts['calls'] == 1:
-                raise IOError("did not open")
-            else:
-                return real_open(*args, **kwargs)
+            if args[0] == filename:
+                counts['calls'] += 1
+                if counts['calls'] == 1:
+                    raise IOError("did not open")
+            return real_open(*args, **kwargs)
 
         monkeypatch.setattr('codecs.open', mock_open)
 
         # this should NOT throw but also should not write the
         # timestamp file (we ignore errors)
-        filename = manager._timestamp_file(envdir, spec)
         assert filename.startswith(envdir)
         assert not os.path.exists(filename)
         manager._write_timestamp_file(envdir, spec)
@@ -448,11 +454,216 @@ def test_timestamp_file_ignores_failed_write(monkeypatch):
         # check on the file contents
         with real_open(filename, 'r', encoding='utf-8') as f:
             content = json.loads(f.read())
-            assert dict(anaconda_project_version=version) == content
+            assert version == content['anaconda_project_version']
+            assert env_fingerprint.compute_fingerprint(envdir,
+                                                       manager._cache_directory(envdir)) == content['fingerprint']
+
+    with_directory_contents(dict(), do_test)
+
+
+def _monkeypatch_pool_conda(monkeypatch, calls, clone_fails=False):
+    def mock_create(prefix, pkgs=None, channels=(), stdout_callback=None, stderr_callback=None):
+        calls.append(('create', prefix))
+        os.makedirs(os.path.join(prefix, 'conda-meta'))
+
+    def mock_clone(prefix, source_prefix, stdout_callback=None, stderr_callback=None):
+        calls.append(('clone', prefix, source_prefix))
+        if clone_fails:
+            os.makedirs(prefix)
+            raise conda_api.CondaError("clone failed")
+        os.makedirs(os.path.join(prefix, 'conda-meta'))
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api.create', mock_create)
+    monkeypatch.setattr('anaconda_project.internal.conda_api.clone', mock_clone)
+
+
+_locked_spec = EnvSpec(name='myenv',
+                       conda_packages=['python'],
+                       channels=[],
+                       platforms=conda_api.default_platforms,
+                       lock_set=CondaLockSet(package_specs_by_platform={'all': ['python=3.6.0=0']},
+                                             platforms=conda_api.default_platforms))
+
+
+def test_create_clones_from_env_pool(monkeypatch):
+    def do_test(dirname):
+        pool_dir = os.path.join(dirname, "pool")
+        monkeypatch.setenv('ANACONDA_PROJECT_ENV_POOL_DIR', pool_dir)
+        calls = []
+        _monkeypatch_pool_conda(monkeypatch, calls)
+        golden = os.path.join(pool_dir, "%s-%s" % (conda_api.current_platform(), _locked_spec.locked_hash))
+
+        manager = DefaultCondaManager(frontend=NullFrontend())
+        first = os.path.join(dirname, "first")
+        manager.fix_environment_deviations(first, _locked_spec)
+        assert calls == [('create', golden), ('clone', first, golden)]
+        assert os.path.isdir(os.path.join(first, 'conda-meta'))
+        # the golden environment isn't marked as prepared, only its clones
+        assert os.path.exists(manager._timestamp_file(first, _locked_spec))
+        assert not os.path.exists(manager._timestamp_file(golden, _locked_spec))
+
+        # a second checkout only clones
+        del calls[:]
+        second = os.path.join(dirname, "second")
+        manager.fix_environment_deviations(second, _locked_spec)
+        assert calls == [('clone', second, golden)]
+
+    with_directory_contents(dict(), do_test)
+
+
+def test_create_from_scratch_if_clone_fails(monkeypatch):
+    def do_test(dirname):
+        pool_dir = os.path.join(dirname, "pool")
+        monkeypatch.setenv('ANACONDA_PROJECT_ENV_POOL_DIR', pool_dir)
+        calls = []
+        _monkeypatch_pool_conda(monkeypatch, calls, clone_fails=True)
+        frontend = FakeFrontend()
+        manager = DefaultCondaManager(frontend=frontend)
+        envdir = os.path.join(dirname, "myenv")
+
+        manager.fix_environment_deviations(envdir, _locked_spec)
+        assert [call[0] for call in calls] == ['create', 'clone', 'create']
+        assert calls[-1] == ('create', envdir)
+        assert any(line.startswith("Failed to clone ") for line in frontend.logs)
+
+    with_directory_contents(dict(), do_test)
+
+
+def test_create_from_scratch_if_env_pool_not_writable(monkeypatch):
+    def do_test(dirname):
+        pool_dir = os.path.join(dirname, "pool")
+        monkeypatch.setenv('ANACONDA_PROJECT_ENV_POOL_DIR', pool_dir)
+        calls = []
+        _monkeypatch_pool_conda(monkeypatch, calls)
+
+        def mock_makedirs_ok_if_exists(path):
+            raise OSError(errno.EACCES, "Permission denied", path)
+
+        monkeypatch.setattr('anaconda_project.internal.env_pool.makedirs_ok_if_exists', mock_makedirs_ok_if_exists)
+        frontend = FakeFrontend()
+        manager = DefaultCondaManager(frontend=frontend)
+        envdir = os.path.join(dirname, "myenv")
+
+        manager.fix_environment_deviations(envdir, _locked_spec)
+        assert calls == [('create', envdir)]
+        assert os.path.isdir(os.path.join(envdir, 'conda-meta'))
+        assert any(line.startswith("Failed to create shared environment ") for line in frontend.logs)
+
+    with_directory_contents(dict(), do_test)
+
+
+def test_unlocked_env_spec_does_not_use_env_pool(monkeypatch):
+    def do_test(dirname):
+        monkeypatch.setenv('ANACONDA_PROJECT_ENV_POOL_DIR', os.path.join(dirname, "pool"))
+        calls = []
+        _monkeypatch_pool_conda(monkeypatch, calls)
+        spec = EnvSpec(name='myenv', conda_packages=['python'], channels=[])
+        envdir = os.path.join(dirname, "myenv")
+
+        DefaultCondaManager(frontend=NullFrontend()).fix_environment_deviations(envdir, spec)
+        assert calls == [('create', envdir)]
+        assert not os.path.exists(os.path.join(dirname, "pool"))
+
+    with_directory_contents(dict(), do_test)
+
+
+def test_env_pool_disabled_by_default(monkeypatch):
+    def do_test(dirname):
+        monkeypatch.delenv('ANACONDA_PROJECT_ENV_POOL_DIR', raising=False)
+        calls = []
+        _monkeypatch_pool_conda(monkeypatch, calls)
+        envdir = os.path.join(dirname, "myenv")
+
+        DefaultCondaManager(frontend=NullFrontend()).fix_environment_deviations(envdir, _locked_spec)
+        assert calls == [('create', envdir)]
 
     with_directory_contents(dict(), do_test)
 
 
+def _monkeypatch_pip_and_conda(monkeypatch, calls, pip_installed):
+    def mock_conda_installed(prefix):
+        return {'python': ('python', '3.6.0', '0')}
+
+    def mock_conda_install(prefix, pkgs=None, channels=(), stdout_callback=None, stderr_callback=None):
+        calls.append(('conda install', pkgs))
+
+    def mock_pip_download(prefix, pkgs, directory):
+        calls.append(('pip download', pkgs))
+        with open(os.path.join(directory, "foo-1.0-py2.py3-none-any.whl"), 'w'):
+            pass
+
+    def mock_pip_install(prefix, pkgs=None, find_links=None):
+        if find_links is not None:
+            assert os.listdir(find_links) == ["foo-1.0-py2.py3-none-any.whl"]
+        calls.append(('pip install', pkgs, find_links))
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api.installed', mock_conda_installed)
+    monkeypatch.setattr('anaconda_project.internal.conda_api.install', mock_conda_install)
+    monkeypatch.setattr('anaconda_project.internal.pip_api.installed', lambda prefix: pip_installed)
+    monkeypatch.setattr('anaconda_project.internal.pip_api.is_pip_installed', lambda prefix: True)
+    monkeypatch.setattr('anaconda_project.internal.pip_api.download', mock_pip_download)
+    monkeypatch.setattr('anaconda_project.internal.pip_api.install', mock_pip_install)
+
+
+def test_pip_package_with_wrong_version(monkeypatch):
+    def do_test(dirname):
+        calls = []
+        _monkeypatch_pip_and_conda(monkeypatch,
+                                   calls,
+                                   pip_installed={
+                                       'foo': ('foo', '0.9'),
+                                       'Bar_Baz': ('Bar_Baz', '2.0'),
+                                       'pinned': ('pinned', '1.0.0')
+                                   })
+        spec = EnvSpec(name='myenv',
+                       conda_packages=['python'],
+                       pip_packages=['foo==1.0', 'bar-baz', 'pinned==1.0'],
+                       channels=[])
+        manager = DefaultCondaManager(frontend=NullFrontend())
+
+        deviations = manager.find_environment_deviations(dirname, spec)
+        assert deviations.missing_pip_packages == ()
+        assert deviations.wrong_version_pip_packages == ('foo', )
+        assert deviations.summary == "Conda environment has wrong versions of: foo"
+
+        manager.fix_environment_deviations(dirname, spec, deviations)
+        assert calls == [('pip install', ['foo==1.0'], None)]
+
+    with_directory_contents({"conda-meta/python-3.6.0-0.json": "{}"}, do_test)
+
+
+def test_pip_packages_download_while_conda_installs(monkeypatch):
+    def do_test(dirname):
+        calls = []
+        _monkeypatch_pip_and_conda(monkeypatch, calls, pip_installed=dict())
+        spec = EnvSpec(name='myenv', conda_packages=['python', 'numpy'], pip_packages=['foo'], channels=[])
+        manager = DefaultCondaManager(frontend=NullFrontend())
+
+        manager.fix_environment_deviations(dirname, spec)
+        assert sorted(calls[:2]) == [('conda install', ['numpy']), ('pip download', ['foo'])]
+        assert calls[2][:2] == ('pip install', ['foo'])
+        download_directory = calls[2][2]
+        assert download_directory is not None
+        assert not os.path.exists(download_directory)
+
+    with_directory_contents({"conda-meta/python-3.6.0-0.json": "{}"}, do_test)
+
+
+def test_pip_packages_not_downloaded_while_conda_changes_python(monkeypatch):
+    def do_test(dirname):
+        calls = []
+        _monkeypatch_pip_and_conda(monkeypatch, calls, pip_installed=dict())
+        spec = EnvSpec(name='myenv', conda_packages=['python=3.7', 'numpy'], pip_packages=['foo'], channels=[])
+        manager = DefaultCondaManager(frontend=NullFrontend())
+
+        manager.fix_environment_deviations(dirname, spec)
+        assert [call[0] for call in calls] == ['conda install', 'pip install']
+        assert sorted(calls[0][1]) == ['numpy', 'python=3.7']
+        assert calls[1] == ('pip install', ['foo'], None)
+
+    with_directory_contents({"conda-meta/python-3.6.0-0.json": "{}"}, do_test)
+
+
 def test_resolve_dependencies_with_conda_api_mock(monkeypatch):
     def mock_resolve_dependencies(pkgs, platform, channels):
         return [('bokeh', '0.12.4', '0'), ('thing', '1.0', '1')]
@@ -465,6 +676,58 @@ def test_resolve_dependencies_with_conda_api_mock(monkeypatch):
     assert lock_set.package_specs_for_current_platform == ('bokeh=0.12.4=0', 'thing=1.0=1')
 
 
+def test_resolve_dependencies_for_several_platforms_at_once(monkeypatch):
+    state = dict(running=0, most=0)
+    lock = threading.Lock()
+
+    def mock_resolve_dependencies(pkgs, platform, channels):
+        with lock:
+            state['running'] += 1
+            state['most'] = max(state['most'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        return [('bokeh', '0.12.4', '0'), ('thing-for-' + platform, '1.0', '1')]
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api.resolve_dependencies', mock_resolve_dependencies)
+    monkeypatch.setattr('anaconda_project.internal.default_conda_manager._solve_semaphore', None)
+    monkeypatch.setenv('ANACONDA_PROJECT_SOLVE_WORKERS', '4')
+
+    frontend = FakeFrontend()
+    manager = DefaultCondaManager(frontend=frontend)
+
+    platforms = ('linux-64', 'osx-64', 'win-32', 'win-64')
+    lock_set = manager.resolve_dependencies(['bokeh'], channels=(), platforms=platforms)
+    assert state['most'] > 1
+    assert lock_set.package_specs_for_platform('win-32') == ('bokeh=0.12.4=0', 'thing-for-win-32=1.0=1')
+    assert lock_set.package_specs_for_platform('osx-64') == ('bokeh=0.12.4=0', 'thing-for-osx-64=1.0=1')
+
+    # messages come in the same order no matter which finishes first
+    current = conda_api.current_platform()
+    ordered = [current] + [p for p in platforms if p != current]
+    assert ["Resolving conda packages for %s" % p for p in ordered] == frontend.logs[:4]
+    assert [p for p in ordered] == [line.split()[4] for line in frontend.logs[4:]]
+    assert all(line.startswith("Resolved conda packages for ") for line in frontend.logs[4:])
+
+
+def test_resolve_dependencies_reports_error_from_first_platform(monkeypatch):
+    def mock_resolve_dependencies(pkgs, platform, channels):
+        if platform == 'win-64':
+            time.sleep(0.05)
+        raise conda_api.CondaError("nope for %s" % platform)
+
+    monkeypatch.setattr('anaconda_project.internal.conda_api.resolve_dependencies', mock_resolve_dependencies)
+    monkeypatch.setattr('anaconda_project.internal.conda_api.current_platform', lambda: 'win-64')
+
+    manager = DefaultCondaManager(frontend=NullFrontend())
+
+    with pytest.raises(CondaManagerError) as excinfo:
+        manager.resolve_dependencies(['bokeh'], channels=(), platforms=('linux-64', 'win-64'))
+
+    # current platform is reported even though another one failed first
+    assert 'Error resolving for win-64: nope for win-64' == str(excinfo.value)
+
+
 @pytest.mark.slow
 def test_resolve_dependencies_with_actual_conda():
     manager = DefaultCondaManager(frontend=NullFrontend())
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2016, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import codecs
+import os
+import time
+
+from anaconda_project.internal.env_fingerprint import compute_fingerprint, package_directories, CACHE_FILENAME
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+_fake_prefix = {
+    "conda-meta/python-3.6.0-0.json": "{}",
+    "conda-meta/history": "",
+    "lib/python3.6/site-packages/requests-2.0.dist-info/METADATA": "",
+    "lib/python3.6/site-packages/foo.py": ""
+}
+
+
+def _touch(path):
+    with codecs.open(path, 'w', encoding='utf-8') as f:
+        f.write(u"{}")
+
+
+def _age_directories(prefix, seconds):
+    then = time.time() - seconds
+    for relative in ("conda-meta", os.path.join("lib", "python3.6", "site-packages")):
+        os.utime(os.path.join(prefix, relative), (then, then))
+
+
+def test_fingerprint_is_stable():
+    def check(dirname):
+        cache = os.path.join(dirname, "var", "cache")
+        first = compute_fingerprint(dirname, cache)
+        assert os.path.isfile(os.path.join(cache, CACHE_FILENAME))
+        assert first == compute_fingerprint(dirname, cache)
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_changes_with_packages_in_same_second():
+    def check(dirname):
+        cache = os.path.join(dirname, "var", "cache")
+        original = compute_fingerprint(dirname, cache)
+
+        record = os.path.join(dirname, "conda-meta", "numpy-1.0-0.json")
+        _touch(record)
+        with_numpy = compute_fingerprint(dirname, cache)
+        assert original != with_numpy
+
+        os.remove(record)
+        assert original == compute_fingerprint(dirname, cache)
+
+        dist_info = os.path.join(dirname, "lib", "python3.6", "site-packages", "bar-1.0.dist-info")
+        os.makedirs(dist_info)
+        assert original != compute_fingerprint(dirname, cache)
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_ignores_unrelated_files():
+    def check(dirname):
+        cache = os.path.join(dirname, "var", "cache")
+        original = compute_fingerprint(dirname, cache)
+        _touch(os.path.join(dirname, "conda-meta", "something.txt"))
+        _touch(os.path.join(dirname, "lib", "python3.6", "site-packages", "bar.py"))
+        assert original == compute_fingerprint(dirname, cache)
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_does_not_list_unchanged_directories(monkeypatch):
+    def check(dirname):
+        cache = os.path.join(dirname, "var", "cache")
+        _age_directories(dirname, 60)
+        original = compute_fingerprint(dirname, cache)
+
+        listed = []
+        real_listdir = os.listdir
+
+        def traced_listdir(path):
+            listed.append(path)
+            return real_listdir(path)
+
+        monkeypatch.setattr('os.listdir', traced_listdir)
+
+        assert original == compute_fingerprint(dirname, cache)
+        # glob lists "lib" to find site-packages, but the package
+        # directories themselves aren't listed again
+        assert os.path.join(dirname, "conda-meta") not in listed
+        assert os.path.join(dirname, "lib", "python3.6", "site-packages") not in listed
+
+        # now a changed directory gets listed again
+        _touch(os.path.join(dirname, "conda-meta", "numpy-1.0-0.json"))
+        assert original != compute_fingerprint(dirname, cache)
+        assert os.path.join(dirname, "conda-meta") in listed
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_relists_racy_directories(monkeypatch):
+    def check(dirname):
+        cache = os.path.join(dirname, "var", "cache")
+        original = compute_fingerprint(dirname, cache)
+
+        # same mtime as before but the cache was written too
+        # recently to trust it; we must list the directory again
+        conda_meta = os.path.join(dirname, "conda-meta")
+        mtime = os.path.getmtime(conda_meta)
+        _touch(os.path.join(conda_meta, "numpy-1.0-0.json"))
+        os.utime(conda_meta, (mtime, mtime))
+        assert original != compute_fingerprint(dirname, cache)
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_ignores_unwritable_cache(monkeypatch):
+    def check(dirname):
+        def mock_makedirs(path):
+            raise OSError("nope")
+
+        monkeypatch.setattr('anaconda_project.internal.env_fingerprint.makedirs_ok_if_exists', mock_makedirs)
+        cache = os.path.join(dirname, "var", "cache")
+        first = compute_fingerprint(dirname, cache)
+        assert not os.path.exists(cache)
+        assert first == compute_fingerprint(dirname, cache)
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_ignores_corrupt_cache():
+    def check(dirname):
+        cache = os.path.join(dirname, "var", "cache")
+        first = compute_fingerprint(dirname, cache)
+        with codecs.open(os.path.join(cache, CACHE_FILENAME), 'w', encoding='utf-8') as f:
+            f.write(u"not json")
+        assert first == compute_fingerprint(dirname, cache)
+
+    with_directory_contents(_fake_prefix, check)
+
+
+def test_fingerprint_of_missing_prefix():
+    def check(dirname):
+        prefix = os.path.join(dirname, "nope")
+        cache = os.path.join(dirname, "cache")
+        assert compute_fingerprint(prefix, cache) == compute_fingerprint(prefix, cache)
+
+    with_directory_contents(dict(), check)
+
+
+def test_package_directories():
+    def check(dirname):
+        assert [
+            os.path.join(dirname, "conda-meta"),
+            os.path.join(dirname, "lib", "python3.6", "site-packages"),
+            os.path.join(dirname, "Lib", "site-packages")
+        ] == package_directories(dirname)
+
+    with_directory_contents(_fake_prefix, check)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import os
+import time
+
+import pytest
+
+from anaconda_project.internal.env_pool import EnvPool, STALE_CLAIM_SECONDS
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+
+def _fake_create(calls):
+    def create(prefix):
+        calls.append(prefix)
+        os.makedirs(os.path.join(prefix, 'conda-meta'))
+
+    return create
+
+
+def test_build_then_ready():
+    def check(dirname):
+        pool = EnvPool(os.path.join(dirname, "pool"))
+        assert not pool.is_ready("abc")
+
+        calls = []
+        assert pool.build("abc", _fake_create(calls))
+        assert calls == [pool.golden_prefix("abc")]
+        assert pool.is_ready("abc")
+        assert not os.path.exists(os.path.join(dirname, "pool", "abc.building"))
+
+        # building again does nothing
+        assert pool.build("abc", _fake_create(calls))
+        assert len(calls) == 1
+
+    with_directory_contents(dict(), check)
+
+
+def test_build_failure_removes_partial_env():
+    def check(dirname):
+        pool = EnvPool(dirname)
+
+        def failing_create(prefix):
+            os.makedirs(os.path.join(prefix, 'conda-meta'))
+            raise RuntimeError("no")
+
+        with pytest.raises(RuntimeError):
+            pool.build("abc", failing_create)
+        assert not os.path.exists(pool.golden_prefix("abc"))
+        assert not os.path.exists(os.path.join(dirname, "abc.building"))
+        assert not pool.is_ready("abc")
+
+        # a later build starts over
+        calls = []
+        assert pool.build("abc", _fake_create(calls))
+        assert pool.is_ready("abc")
+
+    with_directory_contents(dict(), check)
+
+
+def test_build_skipped_while_another_process_builds():
+    def check(dirname):
+        pool = EnvPool(dirname)
+        os.mkdir(os.path.join(dirname, "abc.building"))
+
+        calls = []
+        assert not pool.build("abc", _fake_create(calls))
+        assert calls == []
+        assert not pool.is_ready("abc")
+
+    with_directory_contents(dict(), check)
+
+
+def test_build_takes_over_stale_claim():
+    def check(dirname):
+        pool = EnvPool(dirname)
+        claim = os.path.join(dirname, "abc.building")
+        os.mkdir(claim)
+        long_ago = time.time() - STALE_CLAIM_SECONDS - 10
+        os.utime(claim, (long_ago, long_ago))
+
+        calls = []
+        assert pool.build("abc", _fake_create(calls))
+        assert len(calls) == 1
+        assert pool.is_ready("abc")
+
+    with_directory_contents(dict(), check)
+
+
+def test_not_ready_without_conda_meta():
+    def check(dirname):
+        pool = EnvPool(dirname)
+        assert not pool.is_ready("abc")
+
+    with_directory_contents({"abc.ready": "", "abc/bin/python": ""}, check)
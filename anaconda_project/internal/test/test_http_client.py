@@ -8,11 +8,12 @@
 from __future__ import absolute_import, print_function
 
 from anaconda_project.internal.http_client import FileDownloader
-from anaconda_project.internal.test.http_server import HttpServerTestContext
+from anaconda_project.internal.test.http_server import HttpServerTestContext, _download_content
 from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
 
 from tornado.ioloop import IOLoop
 
+import json
 import os
 import sys
 import platform
@@ -194,3 +195,253 @@ def test_download_fail_to_rename_tmp_file(monkeypatch):
             assert not os.path.isfile(filename + ".part")
 
     with_directory_contents(dict(), inside_directory_fail_to_rename_tmp_file)
+
+
+def _expected_content(offset, length):
+    return b"".join(_download_content(offset, length))
+
+
+def _no_retry_delay(monkeypatch):
+    monkeypatch.setattr('anaconda_project.internal.http_client._RETRY_DELAY_SECONDS', 0)
+
+
+def test_download_resumes_part_file():
+    def inside_directory_resume(dirname):
+        filename = os.path.join(dirname, "downloaded-file")
+        length = 56780
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=length, hash_algorithm='md5')
+            with open(filename + ".part", 'wb') as f:
+                f.write(_expected_content(0, 10000))
+            with open(filename + ".part.json", 'w') as f:
+                f.write(json.dumps(dict(url=url, validator='"v1"')))
+
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5')
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert response.code == 206
+            assert ['bytes=10000-'] == server.ranges_requested_for_url(url)
+            # the hash covers the part we already had
+            assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+            with open(filename, 'rb') as f:
+                assert f.read() == _expected_content(0, length)
+            assert not os.path.isfile(filename + ".part")
+            assert not os.path.isfile(filename + ".part.json")
+
+    with_directory_contents(dict(), inside_directory_resume)
+
+
+def test_download_restarts_part_file_from_other_url():
+    def inside_directory_restart(dirname):
+        filename = os.path.join(dirname, "downloaded-file")
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=1024, hash_algorithm='md5')
+            with open(filename + ".part", 'wb') as f:
+                f.write(b"not from this url")
+
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5')
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert response.code == 200
+            assert [None] == server.ranges_requested_for_url(url)
+            assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+            with open(filename, 'rb') as f:
+                assert f.read() == _expected_content(0, 1024)
+
+    with_directory_contents(dict(), inside_directory_restart)
+
+
+def test_download_resume_when_file_changed_or_ranges_unsupported():
+    def check(options):
+        def inside_directory_restart(dirname):
+            filename = os.path.join(dirname, "downloaded-file")
+            with HttpServerTestContext() as server:
+                url = server.new_download_url(download_length=5000, hash_algorithm='md5', **options)
+                with open(filename + ".part", 'wb') as f:
+                    f.write(b"x" * 3000)
+                with open(filename + ".part.json", 'w') as f:
+                    f.write(json.dumps(dict(url=url, validator='"v1"')))
+
+                download = FileDownloader(url=url, filename=filename, hash_algorithm='md5')
+                response = IOLoop.current().run_sync(download.run)
+                assert [] == download.errors
+                # server sent the whole thing, so we started over
+                assert response.code == 200
+                assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+                with open(filename, 'rb') as f:
+                    assert f.read() == _expected_content(0, 5000)
+
+        with_directory_contents(dict(), inside_directory_restart)
+
+    check(dict(etag='v2'))
+    check(dict(ranges='false'))
+
+
+def test_download_part_file_already_complete():
+    def inside_directory_complete(dirname):
+        filename = os.path.join(dirname, "downloaded-file")
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=1000, hash_algorithm='md5')
+            with open(filename + ".part", 'wb') as f:
+                f.write(_expected_content(0, 1000))
+            with open(filename + ".part.json", 'w') as f:
+                f.write(json.dumps(dict(url=url, validator='"v1"')))
+
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5')
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert response.code == 200
+            assert ['bytes=1000-', None] == server.ranges_requested_for_url(url)
+            assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+
+    with_directory_contents(dict(), inside_directory_complete)
+
+
+def test_download_retries_and_resumes_dropped_connection(monkeypatch):
+    def inside_directory_retry(dirname):
+        _no_retry_delay(monkeypatch)
+        filename = os.path.join(dirname, "downloaded-file")
+        length = 1024 * 1024
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=length, hash_algorithm='sha1', fail_after=4000, fail_times=2)
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='sha1', retries=2)
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert response.code == 206
+            assert [None, 'bytes=4000-', 'bytes=8000-'] == server.ranges_requested_for_url(url)
+            assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+            assert os.path.getsize(filename) == length
+
+    with_directory_contents(dict(), inside_directory_retry)
+
+
+def test_download_without_validator_or_hash_does_not_resume(monkeypatch):
+    def inside_directory_no_validator(dirname):
+        _no_retry_delay(monkeypatch)
+        filename = os.path.join(dirname, "downloaded-file")
+        length = 100000
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=length,
+                                          hash_algorithm=None,
+                                          validators='false',
+                                          changing='true',
+                                          fail_after=4000)
+            # left behind by an earlier download, when we got no validator
+            with open(filename + ".part", 'wb') as f:
+                f.write(_expected_content(0, 3000))
+            with open(filename + ".part.json", 'w') as f:
+                f.write(json.dumps(dict(url=url, validator=None)))
+
+            download = FileDownloader(url=url, filename=filename, connections=2, retries=2)
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert response.code == 200
+            # no ranges, since we couldn't tell if the file changed
+            assert [None, None] == server.ranges_requested_for_url(url)
+            # the second version of the file, not spliced onto the first
+            with open(filename, 'rb') as f:
+                assert f.read() == _expected_content(1, length)
+            assert not os.path.isfile(filename + ".part.json")
+
+    with_directory_contents(dict(), inside_directory_no_validator)
+
+
+def test_download_gives_up_but_keeps_part_file(monkeypatch):
+    def inside_directory_give_up(dirname):
+        _no_retry_delay(monkeypatch)
+        filename = os.path.join(dirname, "downloaded-file")
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=100000, hash_algorithm='md5', fail_after=4000, fail_times=5)
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5', retries=1)
+            response = IOLoop.current().run_sync(download.run)
+            assert response is None
+            assert 1 == len(download.errors)
+            assert download.errors[0].startswith("Failed download to %s: " % filename)
+            assert [None, 'bytes=4000-'] == server.ranges_requested_for_url(url)
+            assert not os.path.isfile(filename)
+            assert os.path.getsize(filename + ".part") == 8000
+
+            # a later download picks up where we left off
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5', retries=3)
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert 'bytes=8000-' == server.ranges_requested_for_url(url)[2]
+            assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+
+    with_directory_contents(dict(), inside_directory_give_up)
+
+
+def test_download_does_not_retry_http_error(monkeypatch):
+    def inside_directory_no_retry(dirname):
+        filename = os.path.join(dirname, "downloaded-file")
+        slept = []
+        monkeypatch.setattr('anaconda_project.internal.http_client.FileDownloader._backoff', slept.append)
+        with HttpServerTestContext() as server:
+            download = FileDownloader(url=server.error_url, filename=filename, retries=5)
+            response = IOLoop.current().run_sync(download.run)
+            assert response is None
+            assert ['Failed download to %s: HTTP 404: Not Found' % filename] == download.errors
+            assert [] == slept
+
+    with_directory_contents(dict(), inside_directory_no_retry)
+
+
+def _download_in_ranges(monkeypatch, length, connections, **options):
+    def inside_directory_ranges(dirname):
+        _no_retry_delay(monkeypatch)
+        monkeypatch.setattr('anaconda_project.internal.http_client._MIN_RANGE_SIZE', 1024)
+        filename = os.path.join(dirname, "downloaded-file")
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=length, hash_algorithm='md5', **options)
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5', connections=connections)
+            response = IOLoop.current().run_sync(download.run)
+            assert [] == download.errors
+            assert response.code == 200
+            assert download.hash == server.server_computed_hash_for_downloaded_url(url)
+            with open(filename, 'rb') as f:
+                assert f.read() == _expected_content(0, length)
+            assert not os.path.isfile(filename + ".part")
+            return server.ranges_requested_for_url(url)
+
+    return with_directory_contents(dict(), inside_directory_ranges)
+
+
+def test_download_in_parallel_ranges(monkeypatch):
+    requested = _download_in_ranges(monkeypatch, 1024 * 1024 + 7, 4)
+    assert sorted(requested) == sorted(
+        ['bytes=0-262144', 'bytes=262145-524289', 'bytes=524290-786434', 'bytes=786435-1048582'])
+
+
+def test_download_in_parallel_ranges_retries_a_range(monkeypatch):
+    # each range fails the first time
+    requested = _download_in_ranges(monkeypatch, 40000, 2, fail_after=1000, fail_times=1)
+    assert 3 == len(requested)
+    assert 'bytes=0-19999' in requested
+    assert 'bytes=1000-19999' in requested or 'bytes=21000-39999' in requested
+
+
+def test_download_in_parallel_small_file_uses_one_request(monkeypatch):
+    requested = _download_in_ranges(monkeypatch, 1500, 4)
+    assert [None] == requested
+
+
+def test_download_in_parallel_without_range_support(monkeypatch):
+    requested = _download_in_ranges(monkeypatch, 100000, 4, ranges='false')
+    assert [None] == requested
+
+
+def test_download_in_parallel_keeps_complete_prefix(monkeypatch):
+    def inside_directory_prefix(dirname):
+        _no_retry_delay(monkeypatch)
+        monkeypatch.setattr('anaconda_project.internal.http_client._MIN_RANGE_SIZE', 1024)
+        filename = os.path.join(dirname, "downloaded-file")
+        with HttpServerTestContext() as server:
+            url = server.new_download_url(download_length=40000, hash_algorithm='md5', fail_after=1000, fail_times=10)
+            download = FileDownloader(url=url, filename=filename, hash_algorithm='md5', connections=2, retries=0)
+            response = IOLoop.current().run_sync(download.run)
+            assert response is None
+            assert 1 == len(download.errors)
+            # the first range got 1000 bytes; we can't use what the second got
+            assert os.path.getsize(filename + ".part") == 1000
+
+    with_directory_contents(dict(), inside_directory_prefix)
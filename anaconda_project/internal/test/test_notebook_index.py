@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import os
+import time
+
+import pytest
+
+from anaconda_project.internal.notebook_index import NotebookIndex
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+_contents = {
+    'a.ipynb': '{}',
+    'notes.txt': '',
+    'sub/b.ipynb': '{}',
+    'sub/deeper/c.ipynb': '{}',
+    'sub/deeper/data.csv': '',
+    'envs/default/d.ipynb': '{}',
+    '.hidden/e.ipynb': '{}',
+    '.f.ipynb': '{}',
+    'not_a_notebook.ipynb/g.ipynb': '{}'
+}
+
+
+def _age_all(dirname, seconds=60):
+    when = time.time() - seconds
+    for root, dirs, files in os.walk(dirname):
+        os.utime(root, (when, when))
+
+
+def _is_ignored(relative_path, is_directory):
+    return is_directory and relative_path == 'envs'
+
+
+def _list_directory(path):
+    return list(os.scandir(path))
+
+
+def test_find_notebooks():
+    def check(dirname):
+        index = NotebookIndex(None)
+        found = index.find(dirname, _is_ignored, _list_directory)
+        assert ['a.ipynb', 'not_a_notebook.ipynb/g.ipynb', 'sub/b.ipynb', 'sub/deeper/c.ipynb'] == found
+
+    with_directory_contents(_contents, check)
+
+
+def test_find_notebooks_reuses_unchanged_directories():
+    def check(dirname):
+        _age_all(dirname)
+        index = NotebookIndex(None)
+        first = index.find(dirname, _is_ignored, _list_directory)
+        # the top, sub, sub/deeper, not_a_notebook.ipynb
+        assert (0, 4) == (index.reused, index.listed)
+
+        assert first == index.find(dirname, _is_ignored, _list_directory)
+        assert (4, 0) == (index.reused, index.listed)
+
+        # a new notebook changes only its directory
+        with open(os.path.join(dirname, 'sub', 'new.ipynb'), 'w') as f:
+            f.write('{}')
+        os.utime(os.path.join(dirname, 'sub'), (time.time() - 30, time.time() - 30))
+        assert 'sub/new.ipynb' in index.find(dirname, _is_ignored, _list_directory)
+        assert (3, 1) == (index.reused, index.listed)
+
+        # and we notice when one goes away
+        os.remove(os.path.join(dirname, 'sub', 'deeper', 'c.ipynb'))
+        os.utime(os.path.join(dirname, 'sub', 'deeper'), (time.time() - 20, time.time() - 20))
+        assert 'sub/deeper/c.ipynb' not in index.find(dirname, _is_ignored, _list_directory)
+
+    with_directory_contents(_contents, check)
+
+
+def test_find_notebooks_always_lists_recently_modified_directories():
+    def check(dirname):
+        index = NotebookIndex(None)
+        index.find(dirname, _is_ignored, _list_directory)
+        index.find(dirname, _is_ignored, _list_directory)
+        assert (0, 4) == (index.reused, index.listed)
+
+    with_directory_contents(_contents, check)
+
+
+def test_find_notebooks_saved_on_disk():
+    def check(dirname):
+        project = os.path.join(dirname, "project")
+        cache = os.path.join(dirname, "cache")
+        _age_all(project)
+
+        expected = NotebookIndex(cache).find(project, _is_ignored, _list_directory)
+        assert 1 == len(os.listdir(cache))
+
+        index = NotebookIndex(cache)
+        assert expected == index.find(project, _is_ignored, _list_directory)
+        assert (4, 0) == (index.reused, index.listed)
+
+        # garbage on disk is ignored
+        for name in os.listdir(cache):
+            with open(os.path.join(cache, name), 'w') as f:
+                f.write("[")
+        index = NotebookIndex(cache)
+        assert expected == index.find(project, _is_ignored, _list_directory)
+        assert (0, 4) == (index.reused, index.listed)
+
+    with_directory_contents(dict(("project/" + key, value) for (key, value) in _contents.items()), check)
+
+
+def test_find_notebooks_evicts_old_projects():
+    def check(dirname):
+        cache = os.path.join(dirname, "cache")
+        for i in range(3):
+            project = os.path.join(dirname, "project%d" % i)
+            _age_all(project)
+            NotebookIndex(cache, max_entries=2).find(project, _is_ignored, _list_directory)
+        assert 2 == len(os.listdir(cache))
+
+    with_directory_contents(dict(("project%d/a.ipynb" % i, "{}") for i in range(3)), check)
+
+
+def test_find_notebooks_unreadable_directories():
+    def check(dirname):
+        def list_directory(path):
+            if path.endswith("sub"):
+                raise OSError("NOPE")
+            return _list_directory(path)
+
+        index = NotebookIndex(None)
+        assert ['a.ipynb'] == index.find(dirname, lambda path, is_directory: False, list_directory)
+
+        def cannot_list(path):
+            raise OSError("NOPE")
+
+        with pytest.raises(OSError):
+            index.find(dirname, _is_ignored, cannot_list)
+
+    with_directory_contents({'a.ipynb': '{}', 'sub/b.ipynb': '{}'}, check)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import threading
+import time
+
+import pytest
+
+from anaconda_project.internal.parallel import map_in_threads, worker_count_from_environment
+
+
+def test_map_in_threads_keeps_order():
+    def slow_square(x):
+        # make the early items finish last
+        time.sleep(0.01 * (5 - x))
+        return x * x
+
+    assert [0, 1, 4, 9, 16] == map_in_threads(slow_square, range(5), max_workers=5)
+
+
+def test_map_in_threads_bounds_workers():
+    state = dict(running=0, most=0)
+    lock = threading.Lock()
+
+    def work(x):
+        with lock:
+            state['running'] += 1
+            state['most'] = max(state['most'], state['running'])
+        time.sleep(0.02)
+        with lock:
+            state['running'] -= 1
+        return x
+
+    assert list(range(10)) == map_in_threads(work, range(10), max_workers=3)
+    assert state['most'] <= 3
+    assert state['most'] > 1
+
+
+def test_map_in_threads_no_items():
+    assert [] == map_in_threads(lambda x: x, [], max_workers=4)
+
+
+def test_map_in_threads_single_worker_uses_calling_thread():
+    threads = map_in_threads(lambda x: threading.current_thread(), [1, 2], max_workers=1)
+    assert [threading.current_thread()] * 2 == threads
+
+
+def test_map_in_threads_raises_earliest_error_after_everything_runs():
+    done = []
+
+    def work(x):
+        if x in (1, 3):
+            raise ValueError("failed %d" % x)
+        done.append(x)
+        return x
+
+    with pytest.raises(ValueError) as excinfo:
+        map_in_threads(work, range(5), max_workers=2)
+    assert 'failed 1' == str(excinfo.value)
+    assert [0, 2, 4] == sorted(done)
+
+
+def test_worker_count_from_environment(monkeypatch):
+    monkeypatch.delenv('TEST_WORKERS', raising=False)
+    assert 7 == worker_count_from_environment('TEST_WORKERS', default=7)
+    assert worker_count_from_environment('TEST_WORKERS') >= 1
+
+    monkeypatch.setenv('TEST_WORKERS', '3')
+    assert 3 == worker_count_from_environment('TEST_WORKERS', default=7)
+
+    monkeypatch.setenv('TEST_WORKERS', '0')
+    assert 1 == worker_count_from_environment('TEST_WORKERS', default=7)
+
+    monkeypatch.setenv('TEST_WORKERS', 'lots')
+    assert 7 == worker_count_from_environment('TEST_WORKERS', default=7)
@@ -170,6 +170,116 @@ def test_parse_spec():
         assert "SomeProject" == pip_api.parse_spec(spec).name
 
 
+def test_parse_spec_exact_version():
+    assert "1.3" == pip_api.parse_spec("foo==1.3").exact_version
+    assert "1.3" == pip_api.parse_spec("foo[bar] == 1.3 ").exact_version
+    assert "1.0+local" == pip_api.parse_spec("foo==1.0+local").exact_version
+    for spec in [
+            'foo', 'foo>=1.3', 'foo==1.*', 'foo==1.3,!=1.3.1', 'foo===1.3', "foo==1.3 ; python_version < '2.7'",
+            'http://example.com/foo#egg=foo-1.3'
+    ]:
+        assert pip_api.parse_spec(spec).exact_version is None
+
+
+def test_version_matches():
+    assert pip_api.version_matches("1.3", "1.3")
+    assert pip_api.version_matches("1.3", "1.3.0")
+    assert pip_api.version_matches("1.3.0", "1.3")
+    assert pip_api.version_matches("1.3", "1.3+ubuntu1")
+    assert pip_api.version_matches("v1.3", "1.3")
+    assert not pip_api.version_matches("1.3", "1.3.1")
+    assert not pip_api.version_matches("1.3", "1.30")
+    assert not pip_api.version_matches("1.3+a", "1.3+b")
+    assert not pip_api.version_matches("1.3+a", "1.3")
+
+
+def test_normalize_name():
+    assert "foo-bar" == pip_api.normalize_name("Foo_Bar")
+    assert "foo-bar" == pip_api.normalize_name("foo.-bar")
+    assert "pyyaml" == pip_api.normalize_name("PyYAML")
+
+
+def _fake_env_with_metadata():
+    if platform.system() == 'Windows':
+        pip = "Scripts/pip.exe"
+        site_packages = "Lib/site-packages"
+    else:
+        pip = "bin/pip"
+        site_packages = "lib/python3.6/site-packages"
+    return {
+        pip: "",
+        site_packages + "/six-1.10.0.dist-info/METADATA": "Metadata-Version: 2.0\nName: six\nVersion: 1.10.0\n\nbody",
+        site_packages + "/PyYAML-3.12-py3.6.egg-info/PKG-INFO": "Metadata-Version: 1.1\nName: PyYAML\nVersion: 3.12\n",
+        site_packages + "/distutils_thing-0.1-py3.6.egg-info": "Metadata-Version: 1.0\nName: distutils-thing\n"
+        "Version: 0.1\n",
+        site_packages + "/broken-1.0.dist-info/RECORD": "",
+        site_packages + "/six.py": "",
+        site_packages + "/develop.egg-link": "SOURCE\n.\n",
+        "source/develop.egg-info/PKG-INFO": "Name: develop\nVersion: 0.0.dev0\n"
+    }
+
+
+def test_installed_from_metadata(monkeypatch):
+    def mock_call_pip(prefix, extra_args):
+        raise AssertionError("should not run pip")
+
+    monkeypatch.setattr('anaconda_project.internal.pip_api._call_pip', mock_call_pip)
+
+    def check(dirname):
+        egg_link = [name for name in _fake_env_with_metadata() if name.endswith(".egg-link")][0]
+        with open(os.path.join(dirname, egg_link), 'w') as f:
+            f.write(os.path.join(dirname, "source") + "\n.\n")
+
+        installed = pip_api.installed(dirname)
+        assert {
+            'six': ('six', '1.10.0'),
+            'PyYAML': ('PyYAML', '3.12'),
+            'distutils-thing': ('distutils-thing', '0.1'),
+            'develop': ('develop', '0.0.dev0')
+        } == installed
+
+    with_directory_contents(_fake_env_with_metadata(), check)
+
+
+def test_installed_without_pip_command():
+    def check(dirname):
+        assert dict() == pip_api.installed(dirname)
+
+    contents = _fake_env_with_metadata()
+    del contents["Scripts/pip.exe" if platform.system() == 'Windows' else "bin/pip"]
+    with_directory_contents(contents, check)
+
+
+def test_installed_falls_back_to_freeze(monkeypatch):
+    def mock_call_pip(prefix, extra_args):
+        assert ['freeze'] == extra_args
+        return b"six==1.10.0\r\n-e git+https://example.com/foo#egg=foo\r\nPyYAML==3.12\r\n"
+
+    monkeypatch.setattr('anaconda_project.internal.pip_api._call_pip', mock_call_pip)
+
+    def check(dirname):
+        assert {'six': ('six', '1.10.0'), 'PyYAML': ('PyYAML', '3.12')} == pip_api.installed(dirname)
+
+    with_directory_contents({"bin/pip": "", "Scripts/pip.exe": ""}, check)
+
+
+def test_install_and_download_args(monkeypatch):
+    calls = []
+
+    def mock_call_pip(prefix, extra_args):
+        calls.append(extra_args)
+
+    monkeypatch.setattr('anaconda_project.internal.pip_api._call_pip', mock_call_pip)
+    pip_api.install(prefix='/prefix', pkgs=['foo'])
+    pip_api.install(prefix='/prefix', pkgs=['foo'], find_links='/wheels')
+    pip_api.download(prefix='/prefix', pkgs=['foo', 'bar==1'], directory='/wheels')
+    assert [['install', '--quiet', 'foo'], ['install', '--quiet', '--find-links', '/wheels', 'foo'],
+            ['download', '--quiet', '--dest', '/wheels', 'foo', 'bar==1']] == calls
+
+    with pytest.raises(TypeError):
+        pip_api.download(prefix='/prefix', pkgs=[], directory='/wheels')
+
+
 def test_parse_spec_url():
     assert "bar" == pip_api.parse_spec("http://example.com/foo#egg=bar").name
     assert "bar" == pip_api.parse_spec("https://example.com/foo#egg=bar").name
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import json
+import os
+import stat
+import time
+
+from anaconda_project.internal.run_snapshot import RunSnapshots, _get_run_snapshots
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+from anaconda_project.project_commands import CommandExecInfo
+
+
+def _age(path, seconds=60):
+    when = time.time() - seconds
+    os.utime(path, (when, when))
+
+
+def _request(**kwargs):
+    request = dict(directory='/project', env_spec=None, command='hello', mode='development', extra_args=[])
+    request.update(kwargs)
+    return request
+
+
+_environ = dict(PATH='/bin', FOO='bar', CONDA_PREFIX='/old', UNRELATED='x')
+_prepared_environ = dict(PATH='/env/bin:/bin', FOO='bar', CONDA_PREFIX='/env', PROJECT_DIR='/project', UNRELATED='x')
+_exec_info = CommandExecInfo(cwd='/project', args=['echo hello'], shell=True, env=_prepared_environ)
+
+
+def _save(snapshots, dirname, **kwargs):
+    watched = os.path.join(dirname, 'watched')
+    return snapshots.save(kwargs.get('request', _request()),
+                          paths=[watched, os.path.join(dirname, 'missing')],
+                          names=['FOO'],
+                          environ=_environ,
+                          prepared_environ=_prepared_environ,
+                          exec_info=_exec_info)
+
+
+def _with_snapshots(check):
+    def wrapped(dirname):
+        _age(os.path.join(dirname, 'watched'))
+        check(dirname, RunSnapshots(os.path.join(dirname, 'snapshots')))
+
+    with_directory_contents({'watched': 'hello'}, wrapped)
+
+
+def test_load_what_we_saved():
+    def check(dirname, snapshots):
+        assert snapshots.load(_request(), _environ) is None
+        assert _save(snapshots, dirname)
+
+        key_file = os.path.join(dirname, 'snapshots', 'key')
+        assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+
+        # a new process only has the directory
+        loaded = RunSnapshots(snapshots.directory).load(_request(), _environ)
+        assert loaded['args'] == ['echo hello']
+        assert loaded['cwd'] == '/project'
+        assert loaded['shell'] is True
+        assert loaded['env'] == _prepared_environ
+
+        # variables that don't affect preparing are passed through
+        loaded = snapshots.load(_request(), dict(_environ, UNRELATED='y'))
+        assert loaded['env']['UNRELATED'] == 'y'
+
+        assert snapshots.load(_request(command='other'), _environ) is None
+        assert snapshots.load(_request(extra_args=['a']), _environ) is None
+
+    _with_snapshots(check)
+
+
+def test_changed_variables_invalidate():
+    def check(dirname, snapshots):
+        assert _save(snapshots, dirname)
+        assert snapshots.load(_request(), dict(_environ, FOO='baz')) is None
+        assert snapshots.load(_request(), dict(_environ, PATH='/usr/bin')) is None
+        assert snapshots.load(_request(), dict(_environ, ANACONDA_PROJECT_SOMETHING='1')) is None
+        assert snapshots.load(_request(), dict((k, v) for (k, v) in _environ.items() if k != 'FOO')) is None
+
+    _with_snapshots(check)
+
+
+def test_changed_files_invalidate():
+    def check(dirname, snapshots):
+        assert _save(snapshots, dirname)
+        with open(os.path.join(dirname, 'missing'), 'w') as f:
+            f.write("now it exists")
+        _age(os.path.join(dirname, 'missing'))
+        assert snapshots.load(_request(), _environ) is None
+
+    _with_snapshots(check)
+
+
+def test_recently_changed_files_are_not_saved():
+    def check(dirname, snapshots):
+        with open(os.path.join(dirname, 'watched'), 'w') as f:
+            f.write("just now")
+        assert not _save(snapshots, dirname)
+
+    _with_snapshots(check)
+
+
+def test_tampered_snapshot_is_ignored():
+    def check(dirname, snapshots):
+        assert _save(snapshots, dirname)
+        (filename, ) = [name for name in os.listdir(snapshots.directory) if name.endswith(".json")]
+        path = os.path.join(snapshots.directory, filename)
+        with open(path) as f:
+            signed = json.loads(f.read())
+        signed['body'] = signed['body'].replace('echo hello', 'echo something else')
+        with open(path, 'w') as f:
+            f.write(json.dumps(signed))
+        assert snapshots.load(_request(), _environ) is None
+
+        # and without a key, we don't trust anything
+        assert _save(snapshots, dirname)
+        os.remove(os.path.join(snapshots.directory, 'key'))
+        assert RunSnapshots(snapshots.directory).load(_request(), _environ) is None
+
+    _with_snapshots(check)
+
+
+def test_get_run_snapshots():
+    assert _get_run_snapshots(dict(ANACONDA_PROJECT_DISABLE_RUN_SNAPSHOTS='1')) is None
+    snapshots = _get_run_snapshots(dict(ANACONDA_PROJECT_RUN_SNAPSHOT_DIR='/somewhere'))
+    assert snapshots.directory == '/somewhere'
+    assert _get_run_snapshots(dict(ANACONDA_PROJECT_RUN_SNAPSHOT_DIR='/somewhere')) is snapshots
+
+
+def test_old_snapshots_are_evicted():
+    def check(dirname, snapshots):
+        snapshots.max_entries = 2
+        for command in ('first', 'second', 'third'):
+            assert _save(snapshots, dirname, request=_request(command=command))
+            for name in os.listdir(snapshots.directory):
+                if name.endswith(".json"):
+                    _age(os.path.join(snapshots.directory, name), seconds=10)
+
+        names = [name for name in os.listdir(snapshots.directory) if name.endswith(".json")]
+        assert len(names) == 2
+        assert snapshots.load(_request(command='first'), _environ) is None
+        assert snapshots.load(_request(command='second'), _environ) is not None
+        assert snapshots.load(_request(command='third'), _environ) is not None
+
+    _with_snapshots(check)
+
+
+def test_failed_save_leaves_nothing_behind(monkeypatch):
+    def check(dirname, snapshots):
+        def mock_rename(src, dest):
+            raise OSError("rename failed")
+
+        monkeypatch.setattr('anaconda_project.internal.solve_cache.rename_over_existing', mock_rename)
+        assert not _save(snapshots, dirname)
+        assert [name for name in os.listdir(snapshots.directory) if name != 'key'] == []
+        assert snapshots.load(_request(), _environ) is None
+
+    _with_snapshots(check)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import codecs
+import os
+import time
+
+from anaconda_project.internal.solve_cache import SolveCache, default_directory
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+_results = [('python', '3.6.0', '0'), ('numpy', '1.11.0', 'py36_0')]
+
+
+def test_solve_cache_put_and_get():
+    def check(dirname):
+        cache = SolveCache(os.path.join(dirname, "solves"))
+        key = cache.key(['numpy', 'python=3.6'], ['defaults'], 'linux-64')
+        assert cache.get(key, 'token') is None
+        cache.put(key, 'token', _results)
+        assert _results == cache.get(key, 'token')
+        assert (1, 1) == (cache.hits, cache.misses)
+
+        # a refreshed channel index makes it a miss
+        assert cache.get(key, 'new token') is None
+        cache.put(key, 'token', _results)
+
+        cache.forget(key)
+        assert cache.get(key, 'token') is None
+        # forgetting twice is fine
+        cache.forget(key)
+
+    with_directory_contents(dict(), check)
+
+
+def test_solve_cache_key():
+    cache = SolveCache("/nowhere")
+    key = cache.key(['numpy', 'python=3.6'], ['a', 'b'], 'linux-64')
+    assert key == cache.key(['python=3.6', 'numpy', 'numpy'], ['a', 'b'], 'linux-64')
+    assert key == cache.key([' python=3.6', 'numpy  '], ['a', 'b'], 'linux-64')
+    assert key != cache.key(['numpy', 'python=3.6'], ['b', 'a'], 'linux-64')
+    assert key != cache.key(['numpy', 'python=3.6'], ['a', 'b'], 'osx-64')
+    assert key != cache.key(['numpy', 'python=3.7'], ['a', 'b'], 'linux-64')
+    assert key == cache.key(['numpy', 'python=3.6'], ['a', 'b'], 'linux-64', configured_channels=[])
+    assert key != cache.key(['numpy', 'python=3.6'], ['a', 'b'], 'linux-64', configured_channels=['c'])
+
+
+def test_solve_cache_expires_entries():
+    def check(dirname):
+        cache = SolveCache(dirname, max_age=60)
+        key = cache.key(['numpy'], [], 'linux-64')
+        filename = os.path.join(dirname, key + ".json")
+        cache.put(key, 'token', _results)
+        cache.max_age = -1
+        assert cache.get(key, 'token') is None
+        assert not os.path.exists(filename)
+
+    with_directory_contents(dict(), check)
+
+
+def test_solve_cache_treats_corrupt_entry_as_miss():
+    def check(dirname):
+        cache = SolveCache(dirname)
+        key = cache.key(['numpy'], [], 'linux-64')
+        with codecs.open(os.path.join(dirname, key + ".json"), 'w', encoding='utf-8') as f:
+            f.write(u"{not json")
+        assert cache.get(key, 'token') is None
+        assert (0, 1) == (cache.hits, cache.misses)
+
+    with_directory_contents(dict(), check)
+
+
+def test_solve_cache_evicts_least_recently_used():
+    def check(dirname):
+        cache = SolveCache(dirname, max_entries=2)
+        keys = [cache.key([name], [], 'linux-64') for name in ('a', 'b', 'c')]
+        cache.put(keys[0], 'token', _results)
+        cache.put(keys[1], 'token', _results)
+
+        # make "a" the most recently used
+        then = time.time() - 100
+        os.utime(os.path.join(dirname, keys[1] + ".json"), (then, then))
+        os.utime(os.path.join(dirname, keys[0] + ".json"), (then - 10, then - 10))
+        assert cache.get(keys[0], 'token') is not None
+
+        cache.put(keys[2], 'token', _results)
+        assert cache.get(keys[0], 'token') is not None
+        assert cache.get(keys[1], 'token') is None
+        assert cache.get(keys[2], 'token') is not None
+
+    with_directory_contents(dict(), check)
+
+
+def test_solve_cache_ignores_unwritable_directory():
+    def check(dirname):
+        not_a_directory = os.path.join(dirname, "file")
+        cache = SolveCache(not_a_directory)
+        key = cache.key(['numpy'], [], 'linux-64')
+        cache.put(key, 'token', _results)
+        assert cache.get(key, 'token') is None
+
+    with_directory_contents({"file": ""}, check)
+
+
+def test_solve_cache_default_directory(monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', '/xdg')
+    monkeypatch.setenv('LOCALAPPDATA', '/localappdata')
+    assert default_directory() in (os.path.join('/xdg', 'anaconda-project',
+                                                'solves'), os.path.join('/localappdata', 'anaconda-project', 'solves'))
@@ -198,3 +198,54 @@ sys.exit(0)
         streaming_popen.popen(print_hello, on_stdout, on_stderr)
 
     assert "Nope" in str(excinfo.value)
+
+
+def test_io_error_in_threads(monkeypatch):
+    print_hello = tmp_script_commandline("""from __future__ import print_function
+print("hello")
+""")
+
+    def mock_read(*args, **kwargs):
+        raise IOError("Nope")
+
+    monkeypatch.setattr("anaconda_project.internal.streaming_popen._can_select_pipes", lambda: False)
+    monkeypatch.setattr("anaconda_project.internal.streaming_popen._read_from_stream", mock_read)
+
+    with pytest.raises(IOError) as excinfo:
+        streaming_popen.popen(print_hello, None, None)
+
+    assert "Nope" in str(excinfo.value)
+
+
+@pytest.mark.parametrize('use_selector', [True, False])
+def test_large_output_in_chunks(monkeypatch, use_selector):
+    print_lots = tmp_script_commandline(u"""# -*- coding: utf-8 -*-
+import os
+import sys
+# a multibyte character will land on the boundary of some chunk
+data = ((u"💯" * 1000 + u"\\n") * 300).encode('utf-8')
+while len(data) > 0:
+    data = data[os.write(sys.stdout.fileno(), data):]
+os.write(sys.stderr.fileno(), b"done")
+""")
+
+    monkeypatch.setattr("anaconda_project.internal.streaming_popen._can_select_pipes", lambda: use_selector)
+
+    stdout_from_callback = []
+
+    def on_stdout(data):
+        stdout_from_callback.append(data)
+
+    (p, out, err) = streaming_popen.popen_text(print_lots, on_stdout, None)
+
+    expected_out = (u"💯" * 1000 + u"\n") * 300
+    assert expected_out == out
+    assert expected_out == "".join(stdout_from_callback)
+    # we get batches, not a callback per line
+    assert len(stdout_from_callback) < 300
+    assert u"done" == err
+    assert p.returncode == 0
+
+    (p, out_lines, err_lines) = streaming_popen.popen(print_lots, None, None)
+    assert [u"💯" * 1000 + u"\n"] * 300 == out_lines
+    assert [u"done"] == err_lines
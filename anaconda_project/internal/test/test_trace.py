@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from anaconda_project.internal import trace
+from anaconda_project.internal import logged_subprocess
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+
+def _read_events(filename):
+    with open(filename) as f:
+        text = f.read()
+    if filename.endswith(".json"):
+        # what the trace viewers do with an unterminated array
+        return json.loads(text.rstrip().rstrip(",") + "]")
+    else:
+        return [json.loads(line) for line in text.splitlines()]
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv('ANACONDA_PROJECT_TRACE', raising=False)
+    assert not trace.enabled()
+    with trace.span("nothing", "test", a=1) as span_args:
+        span_args['b'] = 2
+    assert span_args == dict(a=1, b=2)
+
+
+@pytest.mark.parametrize('filename', ['trace.json', 'trace.jsonl'])
+def test_spans_written(monkeypatch, filename):
+    def check(dirname):
+        path = os.path.join(dirname, filename)
+        monkeypatch.setenv('ANACONDA_PROJECT_TRACE', path)
+        assert trace.enabled()
+
+        with trace.span("outer", "test", number=1) as span_args:
+            with trace.span("inner", "test"):
+                pass
+            span_args['later'] = [1, object]
+        with pytest.raises(ValueError):
+            with trace.span("broken", "test"):
+                raise ValueError("nope")
+        trace.record("recorded", "test", time.time() - 1)
+
+        events = _read_events(path)
+        assert ["inner", "outer", "broken", "recorded"] == [event['name'] for event in events]
+        for event in events:
+            assert event['ph'] == 'X'
+            assert event['cat'] == 'test'
+            assert event['pid'] == os.getpid()
+            assert event['dur'] >= 0
+        (inner, outer, broken, recorded) = events
+        assert outer['ts'] <= inner['ts']
+        assert outer['args'] == dict(number=1, later=[1, str(object)])
+        assert broken['args'] == dict(error='ValueError')
+        assert recorded['dur'] >= 1000000
+
+    with_directory_contents(dict(), check)
+
+
+def test_append_to_existing_chrome_trace(monkeypatch):
+    def check(dirname):
+        path = os.path.join(dirname, "trace.json")
+        monkeypatch.setenv('ANACONDA_PROJECT_TRACE', path)
+        trace.record("first", "test", time.time())
+        # as if it were another process
+        monkeypatch.setattr('anaconda_project.internal.trace._tracer', None)
+        trace.record("second", "test", time.time())
+        assert ["first", "second"] == [event['name'] for event in _read_events(path)]
+
+    with_directory_contents(dict(), check)
+
+
+def test_subprocess_spans(monkeypatch):
+    def check(dirname):
+        path = os.path.join(dirname, "trace.jsonl")
+        monkeypatch.setenv('ANACONDA_PROJECT_TRACE', path)
+        python = sys.executable
+        assert 3 == logged_subprocess.call([python, '-c', 'import sys; sys.exit(3)'])
+        assert b'hi' == logged_subprocess.check_output([python, '-c', 'import sys; sys.stdout.write("hi")'])
+        p = logged_subprocess.Popen([python, '-c', 'import sys; sys.exit(2)'])
+        p.communicate()
+        p.wait()
+
+        events = _read_events(path)
+        assert ["subprocess " + python] * 3 == [event['name'] for event in events]
+        assert [3, 0, 2] == [event['args']['returncode'] for event in events]
+        assert [python, '-c', 'import sys; sys.exit(2)'] == events[2]['args']['argv']
+
+    with_directory_contents(dict(), check)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import, print_function
+
+import codecs
+import hashlib
+import json
+import os
+
+from anaconda_project.internal import verified_hash
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+_content = "hello world\n" * 100
+_md5 = hashlib.md5(_content.encode('utf-8')).hexdigest()
+
+
+def _no_hashing(monkeypatch):
+    def mock_hash_file(filename, algorithm):
+        raise AssertionError("should not have hashed %s" % filename)
+
+    monkeypatch.setattr('anaconda_project.internal.verified_hash.hash_file', mock_hash_file)
+
+
+def test_hash_file():
+    def check(dirname):
+        assert _md5 == verified_hash.hash_file(os.path.join(dirname, "data.txt"), 'md5')
+        assert hashlib.sha256(b"").hexdigest() == verified_hash.hash_file(os.path.join(dirname, "empty"), 'sha256')
+
+    with_directory_contents({"data.txt": _content, "empty": ""}, check)
+
+
+def test_hash_file_without_mmap(monkeypatch):
+    def check(dirname):
+        def mock_mmap(*args, **kwargs):
+            raise EnvironmentError("no mmap")
+
+        monkeypatch.setattr('mmap.mmap', mock_mmap)
+        assert _md5 == verified_hash.hash_file(os.path.join(dirname, "data.txt"), 'md5')
+
+    with_directory_contents({"data.txt": _content}, check)
+
+
+def test_file_has_hash_records_and_trusts_sidecar(monkeypatch):
+    def check(dirname):
+        filename = os.path.join(dirname, "data.txt")
+        assert verified_hash.file_has_hash(filename, 'md5', _md5)
+        assert os.path.isfile(verified_hash.sidecar_filename(filename))
+        with codecs.open(verified_hash.sidecar_filename(filename), 'r', encoding='utf-8') as f:
+            recorded = json.loads(f.read())
+        assert recorded['digest'] == _md5
+        assert recorded['algorithm'] == 'md5'
+        assert recorded['size'] == len(_content)
+
+        _no_hashing(monkeypatch)
+        assert verified_hash.file_has_hash(filename, 'md5', _md5)
+        assert not verified_hash.file_has_hash(filename, 'md5', 'something else')
+
+    with_directory_contents({"data.txt": _content}, check)
+
+
+def test_file_has_hash_notices_changed_file():
+    def check(dirname):
+        filename = os.path.join(dirname, "data.txt")
+        assert verified_hash.file_has_hash(filename, 'md5', _md5)
+        with codecs.open(filename, 'a', encoding='utf-8') as f:
+            f.write(u"more")
+        assert not verified_hash.file_has_hash(filename, 'md5', _md5)
+
+        # and the new hash was recorded
+        changed = hashlib.md5((_content + "more").encode('utf-8')).hexdigest()
+        with codecs.open(verified_hash.sidecar_filename(filename), 'r', encoding='utf-8') as f:
+            assert json.loads(f.read())['digest'] == changed
+
+    with_directory_contents({"data.txt": _content}, check)
+
+
+def test_file_has_hash_ignores_sidecar_for_other_algorithm():
+    def check(dirname):
+        filename = os.path.join(dirname, "data.txt")
+        sha1 = hashlib.sha1(_content.encode('utf-8')).hexdigest()
+        assert verified_hash.file_has_hash(filename, 'md5', _md5)
+        assert verified_hash.file_has_hash(filename, 'sha1', sha1)
+        assert not verified_hash.file_has_hash(filename, 'sha1', _md5)
+
+    with_directory_contents({"data.txt": _content}, check)
+
+
+def test_file_has_hash_rehash_ignores_sidecar():
+    def check(dirname):
+        filename = os.path.join(dirname, "data.txt")
+        verified_hash.record_hash(filename, 'md5', 'wrong')
+        assert not verified_hash.file_has_hash(filename, 'md5', _md5)
+        assert verified_hash.file_has_hash(filename, 'md5', _md5, rehash=True)
+        assert verified_hash.file_has_hash(filename, 'md5', _md5)
+
+    with_directory_contents({"data.txt": _content}, check)
+
+
+def test_file_has_hash_with_corrupt_sidecar():
+    def check(dirname):
+        filename = os.path.join(dirname, "data.txt")
+        assert verified_hash.file_has_hash(filename, 'md5', _md5)
+
+    with_directory_contents({"data.txt": _content, "data.txt.verified": "not json"}, check)
+
+
+def test_file_has_hash_missing_file():
+    def check(dirname):
+        assert not verified_hash.file_has_hash(os.path.join(dirname, "nope"), 'md5', _md5)
+        assert not os.path.exists(os.path.join(dirname, "nope.verified"))
+
+    with_directory_contents(dict(), check)
+
+
+def test_forget_hash():
+    def check(dirname):
+        filename = os.path.join(dirname, "data.txt")
+        verified_hash.record_hash(filename, 'md5', _md5)
+        assert os.path.isfile(verified_hash.sidecar_filename(filename))
+        verified_hash.forget_hash(filename)
+        assert not os.path.exists(verified_hash.sidecar_filename(filename))
+        # no error if already gone
+        verified_hash.forget_hash(filename)
+
+    with_directory_contents({"data.txt": _content}, check)
+
+
+def test_record_hash_ignores_errors(monkeypatch):
+    def check(dirname):
+        def mock_rename(src, dest):
+            raise OSError("nope")
+
+        monkeypatch.setattr('anaconda_project.internal.verified_hash.rename_over_existing', mock_rename)
+        filename = os.path.join(dirname, "data.txt")
+        verified_hash.record_hash(filename, 'md5', _md5)
+        assert os.listdir(dirname) == ["data.txt"]
+
+    with_directory_contents({"data.txt": _content}, check)
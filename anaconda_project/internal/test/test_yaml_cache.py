@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+from __future__ import absolute_import
+
+import datetime
+import os
+import stat
+from collections import OrderedDict
+
+from anaconda_project.internal.yaml_cache import YamlCache
+from anaconda_project.internal.test.tmpfile_utils import with_directory_contents
+
+_values = OrderedDict([('name', 'foo'), ('b', [1, 2.5, True, None]), ('a', OrderedDict([('x', 'y')]))])
+
+
+def test_get_what_we_put():
+    def check(dirname):
+        cache = YamlCache(dirname, parser_version='1')
+        assert cache.get("name: foo") is None
+        assert cache.put("name: foo", _values, "dumped\n")
+        (filename, ) = os.listdir(dirname)
+        assert stat.S_IMODE(os.stat(os.path.join(dirname, filename)).st_mode) == 0o600
+
+        (values, dump) = cache.get("name: foo")
+        assert values == _values
+        assert list(values.keys()) == ['name', 'b', 'a']
+        assert values is not _values
+        assert dump == "dumped\n"
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # a new process only has the directory
+        (values, dump) = YamlCache(dirname, parser_version='1').get("name: foo")
+        assert values == _values
+        assert dump == "dumped\n"
+
+        # a different parser might dump differently
+        assert YamlCache(dirname, parser_version='2').get("name: foo") is None
+        assert cache.get("name: bar") is None
+
+    with_directory_contents(dict(), check)
+
+
+def test_memory_only():
+    cache = YamlCache(None, parser_version='1')
+    assert cache.put("name: foo", _values, "dumped\n")
+    assert cache.get("name: foo") == (_values, "dumped\n")
+
+
+def test_values_that_are_not_plain_are_not_cached():
+    cache = YamlCache(None, parser_version='1')
+    assert not cache.put("a", {1: 'b'}, "")
+    assert not cache.put("b", {'a': datetime.date(2017, 1, 1)}, "")
+    recursive = []
+    recursive.append(recursive)
+    assert not cache.put("c", {'a': recursive}, "")
+    # the same list twice isn't recursive
+    shared = [1]
+    assert cache.put("d", {'a': shared, 'b': shared}, "")
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+
+
+def test_unreadable_entry_is_a_miss():
+    def check(dirname):
+        cache = YamlCache(dirname, parser_version='1')
+        cache.put("name: foo", _values, "dumped\n")
+        for name in os.listdir(dirname):
+            with open(os.path.join(dirname, name), 'w') as f:
+                f.write("not json")
+        assert YamlCache(dirname, parser_version='1').get("name: foo") is None
+
+    with_directory_contents(dict(), check)
+
+
+def test_evict_oldest():
+    def check(dirname):
+        cache = YamlCache(dirname, parser_version='1', max_entries=2)
+        for (i, contents) in enumerate(["a: 1", "a: 2", "a: 3"]):
+            cache.put(contents, dict(a=i), "")
+            for name in os.listdir(dirname):
+                path = os.path.join(dirname, name)
+                os.utime(path, (os.path.getmtime(path) - 10, os.path.getmtime(path) - 10))
+        assert len(os.listdir(dirname)) == 2
+        fresh = YamlCache(dirname, parser_version='1')
+        assert fresh.get("a: 1") is None
+        assert fresh.get("a: 3") is not None
+
+    with_directory_contents(dict(), check)
@@ -11,6 +11,7 @@ import codecs
 import os
 
 from anaconda_project.internal.ziputils import unpack_zip
+from anaconda_project.internal.test.fake_frontend import FakeFrontend
 from anaconda_project.internal.test.tmpfile_utils import (with_directory_contents, with_tmp_zipfile)
 
 
@@ -224,3 +225,58 @@ def test_unzip_bad_zipfile():
         assert [('Failed to unzip %s: File is not a zip file' % zipname)] == errors
 
     with_directory_contents(dict(foo="not a zip file\n"), do_test)
+
+
+def test_unzip_many_files_in_threads(monkeypatch):
+    monkeypatch.setenv('ANACONDA_PROJECT_UNZIP_WORKERS', '4')
+    contents = dict()
+    for i in range(50):
+        contents["dir%d/file%d" % (i % 5, i)] = "file %d\n" % i
+
+    def do_test(zipname, workingdir):
+        target_path = os.path.join(workingdir, 'boo')
+        errors = []
+        frontend = FakeFrontend()
+        assert unpack_zip(zipname, target_path, errors, frontend=frontend)
+        assert [] == errors
+        for i in range(50):
+            path = os.path.join(target_path, "dir%d" % (i % 5), "file%d" % i)
+            assert codecs.open(path, 'r', 'utf-8').read() == "file %d\n" % i
+        assert len(frontend.logs) == 1
+        assert frontend.logs[0].startswith("Unzipped 50 files (0.0 MB) in ")
+
+    with_tmp_zipfile(contents, do_test)
+
+
+def test_unzip_preallocates_large_files(monkeypatch):
+    monkeypatch.setattr('anaconda_project.internal.ziputils._PREALLOCATE_SIZE', 10)
+    preallocated = []
+
+    def mock_fallocate(fd, offset, size):
+        preallocated.append(size)
+
+    monkeypatch.setattr('os.posix_fallocate', mock_fallocate, raising=False)
+
+    def do_test(zipname, workingdir):
+        target_path = os.path.join(workingdir, 'boo')
+        errors = []
+        assert unpack_zip(zipname, target_path, errors)
+        assert [] == errors
+        assert sorted(preallocated) == [12, 14]
+        assert codecs.open(os.path.join(target_path, 'foo'), 'r', 'utf-8').read() == "hello world\n"
+
+    with_tmp_zipfile(dict(foo="hello world\n", bar="goodbye world\n", baz="small"), do_test)
+
+
+def test_unzip_keeps_members_inside_target():
+    def do_test(zipname, workingdir):
+        target_path = os.path.join(workingdir, 'boo')
+        errors = []
+        assert unpack_zip(zipname, target_path, errors)
+        assert [] == errors
+        assert sorted(os.listdir(workingdir)) == ['boo']
+        assert codecs.open(os.path.join(target_path, 'evil'), 'r', 'utf-8').read() == "up\n"
+        assert codecs.open(os.path.join(target_path, 'abs', 'evil'), 'r', 'utf-8').read() == "absolute\n"
+        assert codecs.open(os.path.join(target_path, 'a', 'b'), 'r', 'utf-8').read() == "dots\n"
+
+    with_tmp_zipfile({"../evil": "up\n", "/abs/evil": "absolute\n", "a/./../b": "dots\n", "..": "nothing\n"}, do_test)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Optional timing trace of what anaconda-project spends its time on.
+
+Set ``ANACONDA_PROJECT_TRACE`` to a filename to record a span for
+each prepare stage, requirement check and provide, subprocess, and
+YAML file load and save. Spans are written as Chrome trace events
+("complete" events, with times in microseconds), one per line, so
+the file can be opened in ``chrome://tracing`` or Perfetto.
+
+If the filename ends in ``.json``, it's a Chrome trace array: the
+file starts with ``[`` and each event line ends with a comma, which
+the trace viewers accept without a closing bracket. Any other
+filename gets plain JSON lines, one event object per line, which is
+easier to grep and diff between versions.
+
+Several processes (or a process and the prepare daemon) can append
+to the same file; each event is a single write, and events carry
+the process and thread ids.
+"""
+from __future__ import absolute_import
+
+import contextlib
+import errno
+import json
+import os
+import threading
+import time
+
+from anaconda_project.internal.py2_compat import is_string
+
+
+class _Tracer(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._fd = None
+        self._chrome_array = filename.endswith(".json")
+
+    def _open(self):
+        if self._fd is not None:
+            return self._fd
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        try:
+            self._fd = os.open(self.filename, flags | os.O_EXCL, 0o644)
+            if self._chrome_array:
+                os.write(self._fd, b"[\n")
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            self._fd = os.open(self.filename, flags, 0o644)
+        return self._fd
+
+    def write(self, event):
+        line = json.dumps(event, sort_keys=True)
+        if self._chrome_array:
+            line = line + ","
+        data = (line + "\n").encode('utf-8')
+        with self._lock:
+            try:
+                os.write(self._open(), data)
+            except OSError:
+                # tracing is only diagnostics, so never break the real work
+                pass
+
+
+_tracer = None
+
+
+def _get_tracer():
+    global _tracer
+
+    filename = os.environ.get('ANACONDA_PROJECT_TRACE', '')
+    if filename == '':
+        return None
+    if _tracer is None or _tracer.filename != filename:
+        _tracer = _Tracer(filename)
+    return _tracer
+
+
+def enabled():
+    """True if we're recording a trace."""
+    return _get_tracer() is not None
+
+
+def _json_safe(value):
+    if value is None or is_string(value) or isinstance(value, (bool, int, float)):
+        return value
+    elif isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((str(k), _json_safe(v)) for (k, v) in value.items())
+    else:
+        return str(value)
+
+
+def record(name, category, start, args=None):
+    """Record a span that started at ``start`` (from ``time.time()``) and ends now.
+
+    Args:
+        name (str): what happened
+        category (str): kind of span, such as "stage" or "subprocess"
+        start (float): start time in seconds since the epoch
+        args (dict): extra details to show with the span
+    """
+    tracer = _get_tracer()
+    if tracer is None:
+        return
+    end = time.time()
+    event = dict(name=name,
+                 cat=category,
+                 ph='X',
+                 ts=int(start * 1000000),
+                 dur=int((end - start) * 1000000),
+                 pid=os.getpid(),
+                 tid=threading.current_thread().ident,
+                 args=_json_safe(args or dict()))
+    tracer.write(event)
+
+
+@contextlib.contextmanager
+def span(name, category, **args):
+    """Record a span around the body of a ``with`` statement.
+
+    This yields the dict of span args, so the body can add details
+    it only finds out along the way (such as an exit code). If the
+    body raises, the span records the exception type.
+
+    Args:
+        name (str): what happened
+        category (str): kind of span, such as "stage" or "subprocess"
+        args: extra details to show with the span
+    """
+    if not enabled():
+        yield args
+        return
+    start = time.time()
+    try:
+        yield args
+    except BaseException as e:
+        args['error'] = type(e).__name__
+        raise
+    finally:
+        record(name, category, start, args)
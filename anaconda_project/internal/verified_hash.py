@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Remember the hash of a downloaded file so we don't have to recompute it.
+
+Next to each file we keep a small JSON "sidecar" recording the
+file's size, mtime and inode along with its digest. If the stat
+of the file still matches the sidecar, we trust the digest;
+otherwise we hash the file again.
+"""
+from __future__ import absolute_import
+
+import codecs
+import hashlib
+import json
+import mmap
+import os
+
+from anaconda_project.internal.rename import rename_over_existing
+
+SIDECAR_SUFFIX = ".verified"
+
+_READ_SIZE = 1024 * 1024
+
+
+def sidecar_filename(filename):
+    """Get the name of the sidecar for a file."""
+    return filename + SIDECAR_SUFFIX
+
+
+def _stat_fields(filename):
+    info = os.stat(filename)
+    return dict(size=info.st_size, mtime=info.st_mtime, inode=info.st_ino)
+
+
+def hash_file(filename, algorithm):
+    """Compute the hex digest of a file with the named hashlib algorithm.
+
+    Raises EnvironmentError if the file can't be read.
+    """
+    hasher = getattr(hashlib, algorithm)()
+    with open(filename, 'rb') as f:
+        try:
+            # hashlib reads straight out of the page cache this way
+            # and releases the GIL while it does it.
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError, OverflowError):
+            # empty files can't be mapped, nor can some special
+            # files or huge files on 32-bit systems.
+            mapped = None
+        if mapped is not None:
+            try:
+                hasher.update(mapped)
+            finally:
+                mapped.close()
+        else:
+            while True:
+                data = f.read(_READ_SIZE)
+                if not data:
+                    break
+                hasher.update(data)
+    return hasher.hexdigest()
+
+
+def record_hash(filename, algorithm, digest):
+    """Save the digest of a file we just downloaded or hashed; errors are ignored."""
+    sidecar = sidecar_filename(filename)
+    tmp = sidecar + ".tmp"
+    try:
+        fields = _stat_fields(filename)
+        fields.update(algorithm=algorithm, digest=digest)
+        with codecs.open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(fields))
+        rename_over_existing(tmp, sidecar)
+    except (EnvironmentError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def forget_hash(filename):
+    """Remove the sidecar for a file if there is one."""
+    try:
+        os.remove(sidecar_filename(filename))
+    except OSError:
+        pass
+
+
+def _recorded_hash(filename, algorithm):
+    try:
+        with codecs.open(sidecar_filename(filename), 'r', encoding='utf-8') as f:
+            recorded = json.loads(f.read())
+        current = _stat_fields(filename)
+    except (EnvironmentError, ValueError):
+        return None
+    if not isinstance(recorded, dict) or recorded.get('algorithm') != algorithm:
+        return None
+    for (key, value) in current.items():
+        if recorded.get(key) != value:
+            return None
+    return recorded.get('digest')
+
+
+def file_has_hash(filename, algorithm, expected, rehash=False):
+    """Check that a file has the expected digest.
+
+    Unless rehash is True, a sidecar which still matches the file
+    lets us skip reading the file. Otherwise we hash the file and
+    record the result for next time.
+
+    Args:
+        filename (str): the file to check
+        algorithm (str): name of a hashlib algorithm
+        expected (str): the hex digest we want
+        rehash (bool): True to ignore the sidecar
+
+    Returns:
+        True if the digest matches, False if it doesn't or we can't read the file
+    """
+    if not rehash:
+        digest = _recorded_hash(filename, algorithm)
+        if digest is not None:
+            return digest == expected
+
+    try:
+        digest = hash_file(filename, algorithm)
+    except EnvironmentError:
+        return False
+    record_hash(filename, algorithm, digest)
+    return digest == expected
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Remember what the YAML files we've parsed contained.
+
+ruamel.yaml's round-trip loader keeps comments and formatting,
+which we need in order to modify a file and save it, but it's
+slow, and most commands only read the project files. For each file
+content we've parsed, we keep the parsed values as plain JSON along
+with ruamel.yaml's re-dump of the file, which ``YamlFile`` compares
+against to notice changes. The cache is kept in memory and in the
+user's cache directory for the next process.
+
+Entries are keyed by a hash of the file content and the parser
+version, so an edited file (or a ruamel.yaml that might dump
+differently) is simply a miss. Only files made of mappings with
+string keys, lists, strings, numbers, booleans and nulls can be
+cached; anything else (such as dates) is parsed every time.
+"""
+from __future__ import absolute_import
+
+import codecs
+import collections
+import hashlib
+import json
+import numbers
+import os
+import threading
+
+from anaconda_project.internal import solve_cache
+from anaconda_project.internal.py2_compat import is_string
+
+DEFAULT_MAX_ENTRIES = 500
+
+_MAX_MEMORY_ENTRIES = 100
+
+_FORMAT_VERSION = 1
+
+
+class _NotPlain(Exception):
+    pass
+
+
+def _check_plain(value, parents):
+    if value is None or isinstance(value, (numbers.Integral, float)) or is_string(value):
+        return
+    if id(value) in parents:
+        # a recursive structure made with an alias
+        raise _NotPlain()
+    if isinstance(value, dict):
+        parents.add(id(value))
+        for (key, child) in value.items():
+            if not is_string(key):
+                raise _NotPlain()
+            _check_plain(child, parents)
+        parents.remove(id(value))
+    elif isinstance(value, list):
+        parents.add(id(value))
+        for child in value:
+            _check_plain(child, parents)
+        parents.remove(id(value))
+    else:
+        raise _NotPlain()
+
+
+class YamlCache(object):
+    """Parsed values and canonical dumps of YAML file contents."""
+    def __init__(self, directory, parser_version, max_entries=DEFAULT_MAX_ENTRIES):
+        """Create a cache in the given directory (which need not exist yet), or only in memory if it's None."""
+        self.directory = directory
+        self.parser_version = parser_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, contents):
+        text = "%d\n%s\n%s" % (_FORMAT_VERSION, self.parser_version, contents)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > _MAX_MEMORY_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def get(self, contents):
+        """Get what we saw the last time we parsed these file contents.
+
+        Args:
+            contents (str): the text of the file
+
+        Returns:
+            a (values, dump) tuple with fresh copies of plain dicts and lists, or None if not cached
+        """
+        key = self._key(contents)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.directory is not None:
+            try:
+                with codecs.open(self._filename(key), 'r', encoding='utf-8') as f:
+                    entry = f.read()
+            except (IOError, OSError):
+                pass
+            else:
+                self._remember(key, entry)
+        if entry is not None:
+            try:
+                saved = json.loads(entry, object_pairs_hook=collections.OrderedDict)
+                if saved['version'] == _FORMAT_VERSION:
+                    self.hits += 1
+                    return (saved['values'], saved['dump'])
+            except (ValueError, KeyError, TypeError):
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, contents, values, dump):
+        """Remember the parsed values and dump for these file contents.
+
+        Args:
+            contents (str): the text of the file
+            values: what the file parsed to
+            dump (str): the parsed values dumped back to YAML
+
+        Returns:
+            False if the values can't be cached, True otherwise
+        """
+        try:
+            _check_plain(values, set())
+        except _NotPlain:
+            return False
+        key = self._key(contents)
+        entry = json.dumps(dict(version=_FORMAT_VERSION, values=values, dump=dump))
+        self._remember(key, entry)
+        if self.directory is None:
+            return True
+
+        # local state files can have things in them that other users shouldn't see
+        solve_cache.save_entry(self.directory, self._filename(key), entry, self.max_entries, private=True)
+        return True
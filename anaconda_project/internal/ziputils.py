@@ -8,24 +8,134 @@
 from __future__ import absolute_import, print_function
 
 import os
+import platform
+import re
 import shutil
 import tempfile
+import threading
+import time
 import zipfile
 
 from anaconda_project.internal import rename
+from anaconda_project.internal.makedirs import makedirs_ok_if_exists
+from anaconda_project.internal.parallel import map_in_threads, worker_count_from_environment
+
+_COPY_SIZE = 1024 * 1024
+# below this it isn't worth a syscall to preallocate
+_PREALLOCATE_SIZE = 1024 * 1024
+
+_windows_illegal_re = re.compile(r'[:<>|"?*]')
+
+
+def _member_path(root, member_name):
+    """Where ZipFile.extract() would put a member, or None if nowhere.
+
+    Like ZipFile.extract(), we drop drive letters, leading
+    slashes, and '.' and '..' components, so nothing can be
+    written outside of root.
+    """
+    arcname = member_name.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [part for part in arcname.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir)]
+    if platform.system() == 'Windows':
+        parts = [_windows_illegal_re.sub('_', part).rstrip('.') for part in parts]
+        parts = [part for part in parts if part != '']
+    if len(parts) == 0:
+        return None
+    return os.path.join(root, *parts)
+
+
+def _preallocate(f, size):
+    if size < _PREALLOCATE_SIZE:
+        return
+    fallocate = getattr(os, 'posix_fallocate', None)
+    if fallocate is None:
+        return
+    try:
+        fallocate(f.fileno(), 0, size)
+    except (EnvironmentError, ValueError):
+        # not supported on this filesystem; no big deal
+        pass
+
+
+class _Stats(object):
+    def __init__(self):
+        self.files = 0
+        self.size = 0
+        self.seconds = 0.0
+
+    def describe(self):
+        megabytes = self.size / (1024.0 * 1024.0)
+        rate = megabytes / max(self.seconds, 0.001)
+        return "Unzipped %d files (%.1f MB) in %.1f seconds (%.1f MB/s)." % (self.files, megabytes, self.seconds, rate)
+
+
+def _extract_all(zip_path, zf, root):
+    """Extract every member of zf under root, writing several files at once."""
+    stats = _Stats()
+    start = time.time()
+    files = []
+    for info in zf.infolist():
+        path = _member_path(root, info.filename)
+        if path is None:
+            continue
+        if info.filename.endswith('/'):
+            makedirs_ok_if_exists(path)
+        else:
+            files.append((info, path))
+    # make all the directories up front, so the workers don't race to do it
+    for (info, path) in files:
+        makedirs_ok_if_exists(os.path.dirname(path))
+
+    # ZipFile objects share one file position, so each thread reads its own
+    local = threading.local()
+    opened = []
+    opened_lock = threading.Lock()
+
+    def extract(item):
+        (info, path) = item
+        if not hasattr(local, 'zf'):
+            local.zf = zipfile.ZipFile(zip_path, mode='r')
+            with opened_lock:
+                opened.append(local.zf)
+        with local.zf.open(info) as source:
+            with open(path, 'wb') as dest:
+                _preallocate(dest, info.file_size)
+                shutil.copyfileobj(source, dest, _COPY_SIZE)
+        return info.file_size
+
+    try:
+        if len(files) == 1:
+            # no need to reopen the zip
+            local.zf = zf
+        sizes = map_in_threads(extract, files, worker_count_from_environment('ANACONDA_PROJECT_UNZIP_WORKERS'))
+    finally:
+        for other in opened:
+            other.close()
+
+    stats.files = len(sizes)
+    stats.size = sum(sizes)
+    stats.seconds = time.time() - start
+    return stats
 
 
 # we overwrite as long as the zip contains a file and target_path
 # is a file, or the zip is a dir and target_path is a dir, but if
 # they don't match we don't overwrite. Hopefully this will catch
 # most mistaken collisions.
-def unpack_zip(zip_path, target_path, errors):
+#
+# if a frontend is passed in, we tell it how fast we unzipped.
+def unpack_zip(zip_path, target_path, errors, frontend=None):
     try:
         with zipfile.ZipFile(zip_path, mode='r') as zf:
             target_dir, target_file = os.path.split(target_path)
             tmp_dir = tempfile.mkdtemp(prefix=(target_path + "_tmp"), dir=target_dir)
             try:
-                zf.extractall(tmp_dir)
+                stats = _extract_all(zip_path, zf, tmp_dir)
+                if frontend is not None and stats.files > 0:
+                    frontend.info(stats.describe())
                 extracted = os.listdir(tmp_dir)
                 if len(extracted) == 0:
                     errors.append("Zip archive was empty.")
@@ -10,16 +10,22 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 from abc import ABCMeta, abstractmethod
+import collections
 import os
+import time
 from copy import deepcopy
 
 from anaconda_project.internal.metaclass import with_metaclass
 from anaconda_project.internal.simple_status import SimpleStatus
 from anaconda_project.internal.toposort import toposort_from_dependency_info
 from anaconda_project.internal import conda_api
+from anaconda_project.internal import parallel
+from anaconda_project.internal import trace
 from anaconda_project.internal.py2_compat import is_string
+from anaconda_project.frontend import _BufferedFrontend
 from anaconda_project.local_state_file import LocalStateFile
-from anaconda_project.provide import (_all_provide_modes, PROVIDE_MODE_DEVELOPMENT)
+from anaconda_project.conda_manager import new_conda_manager, CondaManagerError
+from anaconda_project.provide import (_all_provide_modes, PROVIDE_MODE_DEVELOPMENT, PROVIDE_MODE_CHECK)
 from anaconda_project.requirements_registry.provider import ProvideContext
 from anaconda_project.requirements_registry.requirement import Requirement, EnvVarRequirement, UserConfigOverrides
 from anaconda_project.requirements_registry.requirements.conda_env import CondaEnvRequirement
@@ -287,6 +293,7 @@ class _FunctionPrepareStage(PrepareStage):
         self._statuses_before_execute = statuses
         self._execute = execute
         self._config_context = config_context
+        self._configured = False
 
     # def __repr__(self):
     #    return "_FunctionPrepareStage(%r)" % (self._description)
@@ -300,10 +307,15 @@ class _FunctionPrepareStage(PrepareStage):
         return self.result.failed
 
     def configure(self):
+        self._configured = True
         return self._config_context
 
     def execute(self):
-        return self._execute(self)
+        with trace.span("stage " + self._description, "stage") as span_args:
+            next_stage = self._execute(self)
+            if self._result is not None:
+                span_args['failed'] = self._result.failed
+            return next_stage
 
     @property
     def result(self):
@@ -422,6 +434,129 @@ def _sort_statuses(environ, local_state, statuses, missing_vars_getter):
     return toposort_from_dependency_info(statuses, get_node_key, get_dependency_keys, can_ignore_dependency_on_key)
 
 
+def _requirement_trace_name(requirement):
+    if isinstance(requirement, EnvVarRequirement):
+        return requirement.env_var
+    else:
+        return requirement.title
+
+
+def _check_status(requirement, environ, local_state, default_env_spec_name, overrides):
+    with trace.span("check " + _requirement_trace_name(requirement), "check") as span_args:
+        status = requirement.check_status(environ,
+                                          local_state,
+                                          default_env_spec_name,
+                                          overrides,
+                                          latest_provide_result=None)
+        span_args['ok'] = bool(status)
+        return status
+
+
+def _recheck(status, environ, local_state, default_env_spec_name, overrides, latest_provide_result=None):
+    with trace.span("recheck " + _requirement_trace_name(status.requirement), "check") as span_args:
+        rechecked = status.recheck(environ,
+                                   local_state,
+                                   default_env_spec_name,
+                                   overrides,
+                                   latest_provide_result=latest_provide_result)
+        span_args['ok'] = bool(rechecked)
+        return rechecked
+
+
+class _StatusChecker(object):
+    """Checks requirement statuses for one prepare, without repeating checks that can't have changed.
+
+    A status stays good while the environment, the overrides, and
+    the saved local state are all as they were when we checked
+    it. Configuring a stage can change the local state without
+    saving it, so stages ``forget()`` everything when configured.
+    """
+    def __init__(self, environ, local_state, default_env_spec_name, overrides):
+        self._environ = environ
+        self._local_state = local_state
+        self._default_env_spec_name = default_env_spec_name
+        self._overrides = overrides
+        self._inputs_by_status = dict()
+
+    def _inputs(self):
+        return (dict(self._environ), self._local_state.change_count, self._overrides.env_spec_name,
+                self._overrides.inherited_env)
+
+    def _unchanged_since(self, inputs):
+        (environ, change_count, env_spec_name, inherited_env) = inputs
+        return (change_count == self._local_state.change_count and env_spec_name == self._overrides.env_spec_name
+                and inherited_env == self._overrides.inherited_env and environ == self._environ)
+
+    def remember(self, status):
+        """Note that status is still current."""
+        self._inputs_by_status[status] = self._inputs()
+
+    def forget(self):
+        """Recheck every status the next time it's asked for."""
+        self._inputs_by_status.clear()
+
+    def check(self, requirement):
+        """Check the status of a requirement for the first time."""
+        status = _check_status(requirement, self._environ, self._local_state, self._default_env_spec_name,
+                               self._overrides)
+        self.remember(status)
+        return status
+
+    def check_all(self, requirements):
+        """Check the status of each requirement for the first time, several at once.
+
+        The checks are mostly independent IO (sockets, files,
+        conda-meta, the keyring), so we run them on threads; the
+        statuses come back in the same order as requirements.
+        """
+        return parallel.map_in_threads(self.check, requirements, _status_check_worker_count())
+
+    def recheck(self, status, latest_provide_result=None):
+        """Get the current status, which is the same status if nothing it depends on has changed."""
+        inputs = self._inputs_by_status.pop(status, None)
+        if latest_provide_result is None and inputs is not None and self._unchanged_since(inputs):
+            self._inputs_by_status[status] = inputs
+            return status
+        rechecked = _recheck(status,
+                             self._environ,
+                             self._local_state,
+                             self._default_env_spec_name,
+                             self._overrides,
+                             latest_provide_result=latest_provide_result)
+        self.remember(rechecked)
+        return rechecked
+
+
+# checks mostly wait on IO, so this isn't related to the CPU count
+_DEFAULT_STATUS_CHECK_WORKERS = 8
+
+
+def _status_check_worker_count():
+    # configured with the ANACONDA_PROJECT_CHECK_WORKERS environment variable
+    return parallel.worker_count_from_environment('ANACONDA_PROJECT_CHECK_WORKERS',
+                                                  default=_DEFAULT_STATUS_CHECK_WORKERS)
+
+
+def _changed_env_vars(old_environ, new_environ):
+    changed = set()
+    for name in set(old_environ.keys()) | set(new_environ.keys()):
+        if old_environ.get(name) != new_environ.get(name):
+            changed.add(name)
+    return changed
+
+
+def _depends_on_env_vars(status, env_vars):
+    # providers only change their own requirement's config, so
+    # another status can only be affected through the env vars it
+    # reads: its own, the ones it's waiting on, and the env prefix
+    # (which everything uses to find its config and keyring)
+    if status.requirement.env_var in env_vars or conda_api.conda_prefix_variable() in env_vars:
+        return True
+    analysis = status.analysis
+    needed = set(analysis.missing_env_vars_to_configure) | set(analysis.missing_env_vars_to_provide)
+    return len(needed & env_vars) > 0
+
+
 def _in_provide_whitelist(provide_whitelist, requirement):
     if provide_whitelist is None:
         # whitelist of None means "everything"
@@ -440,8 +575,8 @@ def _in_provide_whitelist(provide_whitelist, requirement):
     return False
 
 
-def _configure_and_provide(project, environ, local_state, statuses, all_statuses, keep_going_until_success, mode,
-                           provide_whitelist, overrides, command, extra_command_args):
+def _configure_and_provide(project, environ, local_state, checker, statuses, all_statuses, keep_going_until_success,
+                           mode, provide_whitelist, overrides, command, extra_command_args):
 
     default_env_spec_name = project.default_env_spec_name_for_command(command)
 
@@ -449,39 +584,74 @@ def _configure_and_provide(project, environ, local_state, statuses, all_statuses
         def get_missing_to_provide(status):
             return status.analysis.missing_env_vars_to_provide
 
-        sorted = _sort_statuses(environ, local_state, statuses, get_missing_to_provide)
+        if stage._configured:
+            checker.forget()
 
-        # we have to recheck all the statuses in case configuration happened
+        with trace.span("sort requirements", "prepare"):
+            sorted = _sort_statuses(environ, local_state, statuses, get_missing_to_provide)
+
+        # we have to recheck the statuses in case configuration
+        # happened or an earlier stage provided something they need
         rechecked = []
         for status in sorted:
-            rechecked.append(status.recheck(environ, local_state, default_env_spec_name, overrides))
+            rechecked.append(checker.recheck(status))
 
         errors = []
         did_any_providing = False
         results_by_status = dict()
+        # statuses whose providers would rather do them all at once
+        # (e.g. downloads); we hold on to these until either
+        # something depends on one of them or we reach the end.
+        batched = []
+        environ_before_providing = dict(environ)
+
+        def provide_batched():
+            while len(batched) > 0:
+                provider_class = type(batched[0].provider)
+                group = [status for status in batched if type(status.provider) is provider_class]
+                batched[:] = [status for status in batched if type(status.provider) is not provider_class]
+                requirements_and_contexts = [(status.requirement,
+                                              ProvideContext(environ, local_state, default_env_spec_name, status, mode,
+                                                             project.frontend)) for status in group]
+                with trace.span("provide_many " + provider_class.__name__, "provide", count=len(group)):
+                    results = group[0].provider.provide_many(requirements_and_contexts)
+                for (status, result) in zip(group, results):
+                    errors.extend(result.errors)
+                    results_by_status[status] = result
 
         for status in rechecked:
             if not _in_provide_whitelist(provide_whitelist, status.requirement):
                 continue
             elif status.has_been_provided:
                 continue
+            elif status.provider.provides_concurrently:
+                did_any_providing = True
+                batched.append(status)
             else:
                 did_any_providing = True
+                needed = status.analysis.missing_env_vars_to_provide
+                if any(other.requirement.env_var in needed for other in batched):
+                    provide_batched()
                 context = ProvideContext(environ, local_state, default_env_spec_name, status, mode, project.frontend)
-                result = status.provider.provide(status.requirement, context)
+                with trace.span("provide " + _requirement_trace_name(status.requirement), "provide") as span_args:
+                    result = status.provider.provide(status.requirement, context)
+                    span_args['errors'] = len(result.errors)
                 errors.extend(result.errors)
                 results_by_status[status] = result
 
+        provide_batched()
+
         if did_any_providing:
+            # only recheck what we provided and what depends on it
+            changed = _changed_env_vars(environ_before_providing, environ)
             old = rechecked
             rechecked = []
             for status in old:
-                rechecked.append(
-                    status.recheck(environ,
-                                   local_state,
-                                   default_env_spec_name,
-                                   overrides,
-                                   latest_provide_result=results_by_status.get(status)))
+                if status in results_by_status or _depends_on_env_vars(status, changed):
+                    rechecked.append(checker.recheck(status, latest_provide_result=results_by_status.get(status)))
+                else:
+                    checker.remember(status)
+                    rechecked.append(status)
 
         failed = False
         for status in rechecked:
@@ -515,6 +685,9 @@ def _configure_and_provide(project, environ, local_state, statuses, all_statuses
                                overrides=overrides,
                                env_spec_name=current_env_spec_name), rechecked)
             if keep_going_until_success:
+                # whatever was wrong may be fixed outside of prepare
+                # before we try again
+                checker.forget()
                 return _start_over(stage.statuses_after_execute, rechecked)
             else:
                 return None
@@ -575,7 +748,7 @@ def _partition_first_group_to_configure(environ, local_state, statuses):
     return (head, tail)
 
 
-def _process_requirement_statuses(project, environ, local_state, current_statuses, all_statuses,
+def _process_requirement_statuses(project, environ, local_state, checker, current_statuses, all_statuses,
                                   keep_going_until_success, mode, provide_whitelist, overrides, command,
                                   extra_command_args):
     (initial, remaining) = _partition_first_group_to_configure(environ, local_state, current_statuses)
@@ -589,15 +762,16 @@ def _process_requirement_statuses(project, environ, local_state, current_statuse
     # but we always want at least one _configure_and_provide()
 
     def _stages_for(statuses):
-        return _configure_and_provide(project, environ, local_state, statuses, all_statuses, keep_going_until_success,
-                                      mode, provide_whitelist, overrides, command, extra_command_args)
+        return _configure_and_provide(project, environ, local_state, checker, statuses, all_statuses,
+                                      keep_going_until_success, mode, provide_whitelist, overrides, command,
+                                      extra_command_args)
 
     if len(initial) > 0 and len(remaining) > 0:
 
         def process_remaining(updated_all_statuses):
             # get the new status for each remaining requirement
             updated = _refresh_status_list(remaining, updated_all_statuses)
-            return _process_requirement_statuses(project, environ, local_state, updated, updated_all_statuses,
+            return _process_requirement_statuses(project, environ, local_state, checker, updated, updated_all_statuses,
                                                  keep_going_until_success, mode, provide_whitelist, overrides, command,
                                                  extra_command_args)
 
@@ -649,13 +823,13 @@ def _assert_no_missing_env_var_requirements(project, environ, local_state, overr
     #     _add_missing_env_var_requirements(project, environ, local_state, overrides, command, statuses)
 
 
-def _first_stage(project, environ, local_state, statuses, keep_going_until_success, mode, provide_whitelist, overrides,
-                 command, extra_command_args):
+def _first_stage(project, environ, local_state, checker, statuses, keep_going_until_success, mode, provide_whitelist,
+                 overrides, command, extra_command_args):
     assert 'PROJECT_DIR' in environ
 
     _assert_no_missing_env_var_requirements(project, environ, local_state, overrides, command, statuses)
 
-    first_stage = _process_requirement_statuses(project, environ, local_state, statuses, statuses,
+    first_stage = _process_requirement_statuses(project, environ, local_state, checker, statuses, statuses,
                                                 keep_going_until_success, mode, provide_whitelist, overrides, command,
                                                 extra_command_args)
 
@@ -718,17 +892,11 @@ def _internal_prepare_in_stages(project, environ_copy, overrides, keep_going_unt
 
     local_state = LocalStateFile.load_for_directory(project.directory_path)
 
-    statuses = []
-    for requirement in project.requirements(overrides.env_spec_name):
-        status = requirement.check_status(environ_copy,
-                                          local_state,
-                                          project.default_env_spec_name_for_command(command),
-                                          overrides,
-                                          latest_provide_result=None)
-        statuses.append(status)
+    checker = _StatusChecker(environ_copy, local_state, project.default_env_spec_name_for_command(command), overrides)
+    statuses = checker.check_all(project.requirements(overrides.env_spec_name))
 
-    return _first_stage(project, environ_copy, local_state, statuses, keep_going_until_success, mode, provide_whitelist,
-                        overrides, command, extra_command_args)
+    return _first_stage(project, environ_copy, local_state, checker, statuses, keep_going_until_success, mode,
+                        provide_whitelist, overrides, command, extra_command_args)
 
 
 def prepare_in_stages(project,
@@ -922,17 +1090,139 @@ def prepare_without_interaction(project,
     if failure is not None:
         return failure
 
-    stage = _internal_prepare_in_stages(project,
-                                        environ_copy=environ_copy,
-                                        overrides=overrides,
-                                        keep_going_until_success=False,
-                                        mode=mode,
-                                        provide_whitelist=provide_whitelist,
-                                        command_name=command_name,
-                                        command=command,
-                                        extra_command_args=extra_command_args)
-
-    return prepare_execute_without_interaction(stage)
+    with trace.span("prepare", "prepare", directory=project.directory_path, mode=mode) as span_args:
+        stage = _internal_prepare_in_stages(project,
+                                            environ_copy=environ_copy,
+                                            overrides=overrides,
+                                            keep_going_until_success=False,
+                                            mode=mode,
+                                            provide_whitelist=provide_whitelist,
+                                            command_name=command_name,
+                                            command=command,
+                                            extra_command_args=extra_command_args)
+
+        result = prepare_execute_without_interaction(stage)
+        span_args['failed'] = result.failed
+        return result
+
+
+EnvSpecPrepareResult = collections.namedtuple('EnvSpecPrepareResult', ['env_spec_name', 'result', 'seconds'])
+
+
+def prepare_worker_count():
+    """Max number of environments to create at once when preparing all env specs.
+
+    Configured with the ANACONDA_PROJECT_PREPARE_WORKERS environment variable.
+    """
+    return parallel.worker_count_from_environment('ANACONDA_PROJECT_PREPARE_WORKERS')
+
+
+def _project_env_prefix(project, environ, local_state, env_spec_name):
+    """The prefix preparing with env_spec_name would create, or None if it uses an environment from elsewhere."""
+    requirements = project.find_requirements(env_spec_name, klass=CondaEnvRequirement)
+    if len(requirements) == 0:
+        return None
+    requirement = requirements[0]
+    (environ_copy, overrides) = _prepare_environ_and_overrides(project, environ, env_spec_name)
+    # ask the provider, so we pick the same environment the prepare will
+    provider = requirement.registry.find_provider_by_class_name(requirement._provider_class_name)
+    default_env_spec_name = project.default_env_spec_name_for_command(project.command_for_name(None))
+    config = provider.read_config(requirement, environ_copy, local_state, default_env_spec_name, overrides)
+    if config['source'] != 'project' or config.get('env_name') != env_spec_name:
+        return None
+    return config['value']
+
+
+def _env_spec_groups_by_prefix(project, environ):
+    # env specs that would use the same prefix must not be
+    # created at the same time, so they go in one group
+    local_state = LocalStateFile.load_for_directory(project.directory_path)
+    groups = collections.OrderedDict()
+    for name in project.env_specs.keys():
+        prefix = _project_env_prefix(project, environ, local_state, name)
+        if prefix is None:
+            continue
+        key = os.path.normcase(os.path.abspath(prefix))
+        groups.setdefault(key, (prefix, []))[1].append(name)
+    return list(groups.values())
+
+
+def _fix_environments(project, prefix, env_spec_names, frontend):
+    """Create or update the environment at prefix for each env spec; returns dict of name to (error, seconds)."""
+    outcomes = dict()
+    for name in env_spec_names:
+        start = time.time()
+        error = None
+        env_spec = project.env_specs[name]
+        conda = new_conda_manager(frontend)
+        try:
+            deviations = conda.find_environment_deviations(prefix, env_spec)
+            # an unfixable environment is reported by the prepare afterward
+            if not deviations.ok and not deviations.unfixable:
+                conda.fix_environment_deviations(prefix, env_spec, deviations=deviations)
+        except CondaManagerError as e:
+            error = str(e)
+        outcomes[name] = (error, time.time() - start)
+    return outcomes
+
+
+def prepare_all_env_specs_without_interaction(project, environ=None, mode=PROVIDE_MODE_DEVELOPMENT, workers=None):
+    """Prepare the project with each of its env specs.
+
+    Environments are the slow part of preparing, and each env spec
+    has its own environment, so we first create or update all of the
+    project's environments, several at a time. (Environments that
+    aren't in the project, such as an inherited one, are left to
+    the prepare.) Then we prepare with each env
+    spec in turn, which finds its environment ready and provides the
+    other requirements (which are shared by all env specs) once.
+
+    Args:
+        project (Project): from the ``load_project`` method
+        environ (dict): os.environ or the previously-prepared environ; not modified in-place
+        mode (str): mode from ``PROVIDE_MODE_PRODUCTION``, ``PROVIDE_MODE_DEVELOPMENT``, ``PROVIDE_MODE_CHECK``
+        workers (int): max environments to create at once, None for ``prepare_worker_count()``
+
+    Returns:
+        a list of ``EnvSpecPrepareResult`` with ``env_spec_name``, ``result``
+        (a ``PrepareResult``) and ``seconds``, in env spec order
+    """
+    if workers is None:
+        workers = prepare_worker_count()
+
+    outcomes = dict()
+    if mode != PROVIDE_MODE_CHECK and not project.problems:
+        groups = _env_spec_groups_by_prefix(project, environ)
+
+        # each group's conda output is buffered, so environments
+        # created at the same time don't interleave their output;
+        # we show it in env spec order afterward.
+        def fix_group(group):
+            (prefix, env_spec_names) = group
+            messages = _BufferedFrontend()
+            return (_fix_environments(project, prefix, env_spec_names, messages), messages)
+
+        for (group_outcomes, messages) in parallel.map_in_threads(fix_group, groups, workers):
+            messages.replay(project.frontend)
+            outcomes.update(group_outcomes)
+
+    results = []
+    for name in project.env_specs.keys():
+        (error, seconds) = outcomes.get(name, (None, 0.0))
+        start = time.time()
+        if error is None:
+            result = prepare_without_interaction(project, environ=environ, mode=mode, env_spec_name=name)
+        else:
+            # don't try to create the environment again, just report on it
+            project.frontend.error(error)
+            checked = prepare_without_interaction(project, environ=environ, mode=PROVIDE_MODE_CHECK, env_spec_name=name)
+            result = PrepareFailure(statuses=checked.statuses,
+                                    errors=[error] + list(checked.errors),
+                                    environ=checked.environ,
+                                    overrides=checked.overrides,
+                                    env_spec_name=checked.env_spec_name)
+        results.append(EnvSpecPrepareResult(env_spec_name=name, result=result, seconds=seconds + time.time() - start))
+    return results
 
 
 def prepare_execute_without_interaction(stage):
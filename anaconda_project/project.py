@@ -24,7 +24,7 @@ from anaconda_project.requirements_registry.requirements.service import ServiceR
 from anaconda_project.project_commands import (ProjectCommand, all_known_command_attributes)
 from anaconda_project.project_file import ProjectFile
 from anaconda_project.project_lock_file import ProjectLockFile
-from anaconda_project.archiver import _list_relative_paths_for_unignored_project_files
+from anaconda_project.archiver import _list_unignored_notebooks
 from anaconda_project import __version__ as version
 from anaconda_project.conda_manager import CondaLockSet
 from anaconda_project.frontend import _null_frontend, _new_error_recorder, Frontend
@@ -37,17 +37,9 @@ import anaconda_project.internal.notebook_analyzer as notebook_analyzer
 import anaconda_project.internal.conda_api as conda_api
 import anaconda_project.internal.pip_api as pip_api
 from anaconda_project.internal import plugins as plugins_api
-
-# These strings are used in the command line options to anaconda-project,
-# so changing them has back-compat consequences.
-COMMAND_TYPE_CONDA_APP_ENTRY = 'conda_app_entry'
-COMMAND_TYPE_SHELL = 'unix'
-COMMAND_TYPE_WINDOWS = 'windows'
-COMMAND_TYPE_NOTEBOOK = 'notebook'
-COMMAND_TYPE_BOKEH_APP = 'bokeh_app'
-
-ALL_COMMAND_TYPES = (COMMAND_TYPE_CONDA_APP_ENTRY, COMMAND_TYPE_SHELL, COMMAND_TYPE_WINDOWS, COMMAND_TYPE_NOTEBOOK,
-                     COMMAND_TYPE_BOKEH_APP)
+from anaconda_project.internal.command_types import (  # noqa: F401 (re-exported)
+    COMMAND_TYPE_CONDA_APP_ENTRY, COMMAND_TYPE_SHELL, COMMAND_TYPE_WINDOWS, COMMAND_TYPE_NOTEBOOK,
+    COMMAND_TYPE_BOKEH_APP, ALL_COMMAND_TYPES)
 
 
 class ProjectProblem(object):
@@ -201,11 +193,11 @@ class _ConfigCache(object):
 
         if project_exists and not (project_file.corrupted or lock_file.corrupted):
             _unknown_field_suggestions(
-                project_file, problems, project_file.root,
+                project_file, problems, project_file.read_only_root,
                 ('name', 'description', 'icon', 'variables', 'downloads', 'services', 'env_specs', 'commands',
                  'packages', 'dependencies', 'channels', 'platforms', 'skip_imports'))
 
-            _unknown_field_suggestions(lock_file, problems, lock_file.root, ('env_specs', 'locking_enabled'))
+            _unknown_field_suggestions(lock_file, problems, lock_file.read_only_root, ('env_specs', 'locking_enabled'))
 
             self._update_name(problems, project_file)
             self._update_description(problems, project_file)
@@ -235,7 +227,7 @@ class _ConfigCache(object):
         # while name field missing entirely is an error.
         default_name = os.path.basename(self.directory_path)
 
-        if 'name' not in project_file.root:
+        if 'name' not in project_file.read_only_root:
 
             def set_name_field(project):
                 project.project_file.set_value('name', default_name)
@@ -249,7 +241,7 @@ class _ConfigCache(object):
             # just to avoid dealing with `project.name is None` elsewhere
             # in the code, but we don't save the name to the project_file.
 
-        name = project_file.get_value('name', None)
+        name = project_file.get_read_only_value('name', None)
         if name is not None:
             if not is_string(name):
                 _file_problem(problems, project_file, "name: field should have a string value not %r" % name)
@@ -264,7 +256,7 @@ class _ConfigCache(object):
         self.name = name
 
     def _update_description(self, problems, project_file):
-        desc = project_file.get_value('description', None)
+        desc = project_file.get_read_only_value('description', None)
         if desc is not None and not is_string(desc):
             _file_problem(problems, project_file, "description: field should have a string value not %r" % desc)
             desc = None
@@ -275,7 +267,7 @@ class _ConfigCache(object):
         self.description = desc
 
     def _update_icon(self, problems, project_file):
-        icon = project_file.get_value('icon', None)
+        icon = project_file.get_read_only_value('icon', None)
         if icon is not None and not is_string(icon):
             _file_problem(problems, project_file, "icon: field should have a string value not %r" % (icon))
             icon = None
@@ -295,10 +287,10 @@ class _ConfigCache(object):
         requirements[env_spec.name].append(requirement)
 
     def _update_requirements(self, requirements, problems, project_file, dict_name, updater):
-        global_dict = project_file.get_value(dict_name)
+        global_dict = project_file.get_read_only_value(dict_name)
         updater(requirements, problems, project_file, self.global_base_env_spec, global_dict)
         for env_spec in self.env_specs.values():
-            env_dict = project_file.get_value(['env_specs', env_spec.name, dict_name], None)
+            env_dict = project_file.get_read_only_value(['env_specs', env_spec.name, dict_name], None)
             updater(requirements, problems, project_file, env_spec, env_dict)
 
     def _update_variables(self, requirements, problems, project_file):
@@ -488,13 +480,13 @@ class _ConfigCache(object):
         self.lock_sets = dict()
         self.locking_globally_enabled = False
 
-        enabled = lock_file.get_value(['locking_enabled'], True)
+        enabled = lock_file.get_read_only_value(['locking_enabled'], True)
         if not isinstance(enabled, bool):
             _file_problem(problems, lock_file, "Value for locking_enabled should be true or false, found %r" % enabled)
         else:
             self.locking_globally_enabled = enabled
 
-        lock_sets = lock_file.get_value(['env_specs'], {})
+        lock_sets = lock_file.get_read_only_value(['env_specs'], {})
         if not is_dict(lock_sets):
             _file_problem(problems, lock_file, ("'env_specs:' section in lock file should be a dictionary from " +
                                                 "env spec names to lock information, found {}").format(repr(lock_sets)))
@@ -576,15 +568,15 @@ class _ConfigCache(object):
         def _parse_packages(parent_dict):
             # dependencies allows environment.yml-like project files. It is not
             # expected to have both dependencies and packages
-            pkg_key = 'dependencies' if project_file.get_value('dependencies') else 'packages'
+            pkg_key = 'dependencies' if project_file.get_read_only_value('dependencies') else 'packages'
             return self._parse_packages(problems, project_file, pkg_key, parent_dict)
 
-        (shared_deps, shared_pip_deps) = _parse_packages(project_file.root)
-        shared_channels = _parse_channels(project_file.root)
-        shared_platforms = _parse_platforms(project_file.root)
+        (shared_deps, shared_pip_deps) = _parse_packages(project_file.read_only_root)
+        shared_channels = _parse_channels(project_file.read_only_root)
+        shared_platforms = _parse_platforms(project_file.read_only_root)
 
         _default_env_spec = CommentedMap([('default', CommentedMap([('packages', []), ('channels', [])]))])
-        env_specs = project_file.get_value('env_specs', default=_default_env_spec)
+        env_specs = project_file.get_read_only_value('env_specs', default=_default_env_spec)
 
         first_env_spec_name = None
         env_specs_is_empty = False
@@ -805,7 +797,7 @@ class _ConfigCache(object):
         (importable_spec, importable_filename) = _find_out_of_sync_importable_spec(self.env_specs.values(),
                                                                                    self.directory_path)
         if importable_spec is not None:
-            skip_spec_import = project_file.get_value(['skip_imports', 'environment'])
+            skip_spec_import = project_file.get_read_only_value(['skip_imports', 'environment'])
             if skip_spec_import == importable_spec.logical_hash:
                 importable_spec = None
 
@@ -889,7 +881,7 @@ class _ConfigCache(object):
 
         first_command_name = None
         commands = dict()
-        commands_section = project_file.get_value('commands', None)
+        commands_section = project_file.get_read_only_value('commands', None)
 
         plugins = plugins_api.get_plugins('command_run')
         all_known_command_attributes_extended = (all_known_command_attributes + tuple(plugins.keys()))
@@ -1006,7 +998,7 @@ class _ConfigCache(object):
             self.default_command_name = first_command_name
 
     def _verify_notebook_commands(self, commands, problems, requirements, project_file):
-        skipped_notebooks = project_file.get_value(['skip_imports', 'notebooks'])
+        skipped_notebooks = project_file.get_read_only_value(['skip_imports', 'notebooks'])
         if skipped_notebooks is not None:
             if skipped_notebooks is True:
                 # skip ALL notebooks forever
@@ -1023,27 +1015,19 @@ class _ConfigCache(object):
         flat_requirements = []
         for reqs in requirements.values():
             flat_requirements.extend(reqs)
-        files = _list_relative_paths_for_unignored_project_files(self.directory_path,
-                                                                 frontend=recorder,
-                                                                 requirements=flat_requirements)
+        # This skips hidden directories at the top of the project.
+        # The main reason to ignore dot directories is that they
+        # might contain packages or git cache data or other
+        # such gunk, not because we really care about
+        # ".foo.ipynb" per se.
+        # It always uses the unix file separator, and a deterministic
+        # order because the first command is the default.
+        files = _list_unignored_notebooks(self.directory_path, frontend=recorder, requirements=flat_requirements)
         if files is None:
             problems.extend(recorder.pop_errors())
             assert problems != []
             return
 
-        # chop out hidden directories. The
-        # main reason to ignore dot directories is that they
-        # might contain packages or git cache data or other
-        # such gunk, not because we really care about
-        # ".foo.ipynb" per se.
-        files = [f for f in files if not f[0] == '.']
-
-        # always use unix file separator
-        files = [f.replace("\\", "/") for f in files]
-
-        # use a deterministic order because the first command is the default
-        files = sorted(files)
-
         def need_to_import_notebook(relative_name):
             for command in commands.values():
                 if command.notebook == relative_name:
@@ -20,7 +20,7 @@ from anaconda_project import client
 from anaconda_project import prepare
 from anaconda_project import provide
 from anaconda_project.local_state_file import LocalStateFile
-from anaconda_project.frontend import _null_frontend
+from anaconda_project.frontend import _null_frontend, _BufferedFrontend
 from anaconda_project.requirements_registry.requirement import EnvVarRequirement
 from anaconda_project.requirements_registry.requirements.conda_env import CondaEnvRequirement
 from anaconda_project.requirements_registry.requirements.download import DownloadRequirement
@@ -29,6 +29,10 @@ from anaconda_project.requirements_registry.requirements.service import ServiceR
 from anaconda_project.requirements_registry.providers.conda_env import _remove_env_path
 from anaconda_project.internal.simple_status import SimpleStatus
 import anaconda_project.conda_manager as conda_manager
+import anaconda_project.internal.parallel as parallel
+import anaconda_project.internal.conda_api as conda_api
+import anaconda_project.internal.verified_hash as verified_hash
+import anaconda_project.requirements_registry.providers.download as download_provider
 from anaconda_project.internal.conda_api import (parse_spec, default_platforms_with_current)
 import anaconda_project.internal.notebook_analyzer as notebook_analyzer
 from anaconda_project.internal.py2_compat import is_string
@@ -332,6 +336,63 @@ def remove_download(project, env_spec_name, env_var, prepare_result=None):
     return status
 
 
+def verify_downloads(project, env_spec_name=None):
+    """Check the checksums of all downloaded files by reading them again.
+
+    Normally prepare trusts a file if it hasn't changed since we
+    last computed its hash. This recomputes every hash (several
+    files at once), and removes any file which doesn't match so
+    that the next prepare downloads it again. Downloads without a
+    checksum, unzipped downloads, and files which haven't been
+    downloaded yet are skipped.
+
+    The returned ``Status`` will be an instance of ``SimpleStatus``. A False
+    status will have an ``errors`` property with a list of error
+    strings.
+
+    Args:
+        project (Project): the project
+        env_spec_name (str): environment spec name or None for the default
+
+    Returns:
+        ``Status`` instance
+    """
+    failed = _check_problems(project)
+    if failed is not None:
+        return failed
+
+    to_check = []
+    for requirement in project.find_requirements(env_spec_name, klass=DownloadRequirement):
+        filename = os.path.join(project.directory_path, requirement.filename)
+        if requirement.hash_value is not None and not requirement.unzip and os.path.isfile(filename):
+            to_check.append((requirement, filename))
+
+    def check(item):
+        (requirement, filename) = item
+        return verified_hash.file_has_hash(filename, requirement.hash_algorithm, requirement.hash_value, rehash=True)
+
+    matches = parallel.map_in_threads(check, to_check, download_provider.hash_worker_count())
+
+    errors = []
+    for ((requirement, filename), match) in zip(to_check, matches):
+        if match:
+            project.frontend.info("Verified {}.".format(filename))
+        else:
+            errors.append("{} does not have the expected {} hash; removed it.".format(
+                filename, requirement.hash_algorithm))
+            project.frontend.error(errors[-1])
+            verified_hash.forget_hash(filename)
+            try:
+                os.remove(filename)
+            except OSError as e:
+                errors.append("Failed to remove {}: {}.".format(filename, e))
+                project.frontend.error(errors[-1])
+
+    if len(errors) > 0:
+        return SimpleStatus(success=False, description="Some downloaded files failed verification.", errors=errors)
+    return SimpleStatus(success=True, description="Verified {} downloaded files.".format(len(to_check)))
+
+
 # there are lots of builtin ways to do this but they wouldn't keep
 # comments properly in ruamel.yaml's CommentedSeq. We don't want to
 # copy or wholesale replace "items"
@@ -766,6 +827,30 @@ def remove_packages(project, env_spec_name, packages):
     return status
 
 
+def _resolve_env_specs(envs, refresh):
+    # Resolving is a conda subprocess per platform which doesn't
+    # depend on project state, so we do all the env specs at once
+    # up front. Each env spec's messages are buffered so we can
+    # show them in order afterward. Returns a dict from env spec
+    # name to (lock set, error, messages).
+    def resolve(env):
+        if refresh:
+            # an update should look for new packages rather than
+            # reuse an earlier solve
+            for platform in env.platforms:
+                conda_api.forget_resolved_dependencies(env.conda_packages, env.channels, platform)
+        messages = _BufferedFrontend()
+        conda = conda_manager.new_conda_manager(frontend=messages)
+        try:
+            lock_set = conda.resolve_dependencies(env.conda_packages, env.channels, env.platforms)
+            return (lock_set, None, messages)
+        except conda_manager.CondaManagerError as e:
+            return (None, e, messages)
+
+    results = parallel.map_in_threads(resolve, envs, max_workers=conda_manager.solve_worker_count())
+    return {env.name: result for (env, result) in zip(envs, results)}
+
+
 def _update_and_lock(project, env_spec_name, update):
     failed = _check_problems(project)
     if failed is not None:
@@ -820,19 +905,20 @@ def _update_and_lock(project, env_spec_name, update):
             # we'll save later after doing all the other stuff too
             need_save = True
 
-    conda = conda_manager.new_conda_manager(frontend=project.frontend)
-
     # note that "envs" are frozen from the original project state,
     # and won't update as we go through them
+    envs_to_resolve = [env for env in envs if update or env.lock_set.disabled or env.lock_set.missing]
+    resolved = _resolve_env_specs(envs_to_resolve, refresh=update)
+
     for env in envs:
-        if update or env.lock_set.disabled or env.lock_set.missing:
-            try:
-                project.frontend.info("Updating locked dependencies for env spec %s..." % env.name)
-                lock_set = conda.resolve_dependencies(env.conda_packages, env.channels, env.platforms)
-                lock_set.env_spec_hash = env.logical_hash
-            except conda_manager.CondaManagerError as e:
+        if env.name in resolved:
+            (lock_set, error, messages) = resolved[env.name]
+            project.frontend.info("Updating locked dependencies for env spec %s..." % env.name)
+            messages.replay(project.frontend)
+            if error is not None:
                 return SimpleStatus(success=False,
-                                    description="Error resolving dependencies for %s: %s." % (env.name, str(e)))
+                                    description="Error resolving dependencies for %s: %s." % (env.name, str(error)))
+            lock_set.env_spec_hash = env.logical_hash
 
             lock_set_changed = not env.lock_set.equivalent_to(lock_set)
             hash_changed = env.lock_set.env_spec_hash is not None and \
@@ -1686,17 +1772,21 @@ def clean(project, prepare_result):
         return SimpleStatus(success=False, description="Failed to clean everything up.", errors=errors)
 
 
-def archive(project, filename):
+def archive(project, filename, compression_level=None):
     """Make an archive of the non-ignored files in the project.
 
+    Tar archives are compressed on several threads; set
+    ANACONDA_PROJECT_COMPRESS_WORKERS to change how many.
+
     Args:
         project (``Project``): the project
-        filename (str): name of a zip, tar.gz, or tar.bz2 archive file
+        filename (str): name of a zip, tar.gz, tar.bz2, or tar.xz archive file
+        compression_level (int): 0 (none) to 9 (most), or None for the default
 
     Returns:
         a ``Status``, if failed has ``errors``
     """
-    return archiver._archive_project(project, filename)
+    return archiver._archive_project(project, filename, compression_level=compression_level)
 
 
 def unarchive(filename, project_dir, parent_dir=None, frontend=None):
@@ -1714,7 +1804,7 @@ def unarchive(filename, project_dir, parent_dir=None, frontend=None):
     if project_dir is None.
 
     Args:
-        filename (str): name of a zip, tar.gz, or tar.bz2 archive file
+        filename (str): name of a zip, tar.gz, tar.bz2, or tar.xz archive file
         project_dir (str): the directory to place the project inside
         parent_dir (str): directory to place project_dir within
 
@@ -39,3 +39,26 @@ def can_connect_to_socket(host, port, timeout_seconds=0.5):
         return True
     except IOError:
         return False
+
+
+def can_listen_on_port(port):
+    """Check whether a server could listen on a port, without connecting to it.
+
+    Binding fails right away if anything else has the port, which
+    is quicker than a connection attempt and also notices ports
+    that are taken but not accepting connections.
+
+    Args:
+        port (int): the port
+    Returns:
+        True if nothing else is using the port
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        # bind all interfaces, as a server would
+        s.bind(('', port))
+        return True
+    except IOError:
+        return False
+    finally:
+        s.close()
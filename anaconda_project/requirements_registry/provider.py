@@ -341,6 +341,32 @@ class Provider(with_metaclass(ABCMeta)):
         """
         pass  # pragma: no cover
 
+    @property
+    def provides_concurrently(self):
+        """True if ``provide_many()`` does better than calling ``provide()`` on each requirement in turn.
+
+        When this is True, prepare hands all the requirements of a stage
+        which use this type of provider to a single ``provide_many()``
+        call, once everything they depend on has been provided.
+        """
+        return False
+
+    def provide_many(self, requirements_and_contexts):
+        """Execute the provider for several requirements at once.
+
+        The default implementation calls ``provide()`` for each one.
+        An error providing one requirement should not keep the
+        others from being provided.
+
+        Args:
+            requirements_and_contexts (list): list of (Requirement, ProvideContext) tuples
+
+        Returns:
+            a list of ``ProvideResult``, in the same order as requirements_and_contexts
+
+        """
+        return [self.provide(requirement, context) for (requirement, context) in requirements_and_contexts]
+
     @abstractmethod
     def unprovide(self, requirement, environ, local_state_file, overrides, requirement_status=None):
         """Undo the provide, cleaning up any files or processes we created.
@@ -11,15 +11,65 @@ from __future__ import print_function
 import os
 import shutil
 
+from tornado import gen, locks
 from tornado.ioloop import IOLoop
 
 from anaconda_project.internal.http_client import FileDownloader
+from anaconda_project.internal.parallel import map_in_threads, worker_count_from_environment
+from anaconda_project.internal import verified_hash
 from anaconda_project.internal.ziputils import unpack_zip
 from anaconda_project.internal.simple_status import SimpleStatus
 from anaconda_project.requirements_registry.provider import EnvVarProvider, ProviderAnalysis
 from anaconda_project.provide import PROVIDE_MODE_CHECK
 from anaconda_project.frontend import _new_error_recorder
 
+DEFAULT_CONCURRENT_DOWNLOADS = 4
+
+
+def _concurrent_download_count():
+    return worker_count_from_environment('ANACONDA_PROJECT_CONCURRENT_DOWNLOADS', default=DEFAULT_CONCURRENT_DOWNLOADS)
+
+
+def hash_worker_count():
+    """Number of files to hash at once.
+
+    Configured with the ANACONDA_PROJECT_HASH_WORKERS environment variable.
+    """
+    return worker_count_from_environment('ANACONDA_PROJECT_HASH_WORKERS')
+
+
+def _format_size(size):
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            break
+        size = size / 1024.0
+    if unit == 'bytes':
+        return "%d bytes" % size
+    return "%.1f %s" % (size, unit)
+
+
+class _DownloadProgress(object):
+    """Tells the user how a batch of downloads is going, if there's more than one."""
+    def __init__(self, frontend, count):
+        self._frontend = frontend
+        self._count = count
+        self._finished = 0
+        self._size = 0
+        if self._count > 1:
+            self._frontend.info("Downloading {} files...".format(self._count))
+
+    def finished(self, filename):
+        """Note that a download is done; filename is None if it failed."""
+        self._finished += 1
+        if filename is not None:
+            try:
+                self._size += os.path.getsize(filename)
+            except OSError:
+                pass
+        if self._count > 1:
+            self._frontend.info("Finished {} of {} downloads ({} so far).".format(self._finished, self._count,
+                                                                                  _format_size(self._size)))
+
 
 class _DownloadProviderAnalysis(ProviderAnalysis):
     """Subtype of ProviderAnalysis showing if a filename exists."""
@@ -73,11 +123,45 @@ class DownloadProvider(EnvVarProvider):
                                          analysis.missing_env_vars_to_provide,
                                          existing_filename=existing_filename)
 
-    def _provide_download(self, requirement, context, frontend):
-        filename = context.status.analysis.existing_filename
+    @property
+    def provides_concurrently(self):
+        """Override superclass; we download all the files of a stage at once."""
+        return True
+
+    def _finish_download(self, requirement, filename, download_filename, download, response, frontend):
+        if response is None:
+            for error in download.errors:
+                frontend.error(error)
+            return None
+        elif response.code in (200, 206):
+            # 206 means we resumed an earlier partial download
+            if requirement.hash_value is not None and requirement.hash_value != download.hash:
+                frontend.error("Error downloading {}: mismatched hashes. Expected: {}, calculated: {}".format(
+                    requirement.url, requirement.hash_value, download.hash))
+                return None
+            if requirement.unzip:
+                unzip_errors = []
+                if unpack_zip(download_filename, filename, unzip_errors, frontend=frontend):
+                    os.remove(download_filename)
+                    return filename
+                else:
+                    for error in unzip_errors:
+                        frontend.error(error)
+                    return None
+            if download.hash is not None:
+                # so next time we can check the file without reading it
+                verified_hash.record_hash(filename, requirement.hash_algorithm, download.hash)
+            return filename
+        else:
+            frontend.error("Error downloading {}: response code {}".format(requirement.url, response.code))
+            return None
+
+    @gen.coroutine
+    def _provide_download(self, requirement, context, frontend, slots, progress, existing_filename):
+        filename = existing_filename
         if filename is not None:
             frontend.info("Previously downloaded file located at {}".format(filename))
-            return filename
+            raise gen.Return(filename)
 
         filename = os.path.abspath(os.path.join(context.environ['PROJECT_DIR'], requirement.filename))
         if requirement.unzip:
@@ -89,35 +173,90 @@ class DownloadProvider(EnvVarProvider):
                                   hash_algorithm=requirement.hash_algorithm)
 
         try:
-            _ioloop = IOLoop(make_current=False)
-            response = _ioloop.run_sync(download.run)
-            if response is None:
-                for error in download.errors:
-                    frontend.error(error)
-                return None
-            elif response.code == 200:
-                if requirement.hash_value is not None and requirement.hash_value != download.hash:
-                    frontend.error("Error downloading {}: mismatched hashes. Expected: {}, calculated: {}".format(
-                        requirement.url, requirement.hash_value, download.hash))
-                    return None
-                if requirement.unzip:
-                    unzip_errors = []
-                    if unpack_zip(download_filename, filename, unzip_errors):
-                        os.remove(download_filename)
-                        return filename
-                    else:
-                        for error in unzip_errors:
-                            frontend.error(error)
-                        return None
-                return filename
-            else:
-                frontend.error("Error downloading {}: response code {}".format(requirement.url, response.code))
-                return None
+            response = None
+            with (yield slots.acquire()):
+                try:
+                    response = yield download.run()
+                finally:
+                    progress.finished(download_filename if response is not None else None)
+            filename = self._finish_download(requirement, filename, download_filename, download, response, frontend)
         except Exception as e:
             frontend.error("Error downloading {}: {}".format(requirement.url, str(e)))
-            return None
-        finally:
-            _ioloop.close()
+            filename = None
+        raise gen.Return(filename)
+
+    @gen.coroutine
+    def _provide_downloads(self, work):
+        # the downloads are independent, so one failing doesn't stop the others
+        slots = locks.Semaphore(_concurrent_download_count())
+        progress = _DownloadProgress(work[0][1].frontend, len([w for w in work if w[3] is None]))
+        filenames = yield [
+            self._provide_download(requirement, context, frontend, slots, progress, existing_filename)
+            for (requirement, context, frontend, existing_filename) in work
+        ]
+        raise gen.Return(filenames)
+
+    def _verify_existing(self, work):
+        """Check the hashes of files we already have, and forget the ones that don't match."""
+        def needs_check(item):
+            (requirement, context, frontend, existing_filename) = item
+            # an unzipped download doesn't have the file the hash was for anymore
+            return (existing_filename is not None and requirement.hash_value is not None and not requirement.unzip)
+
+        def check(item):
+            (requirement, context, frontend, existing_filename) = item
+            return verified_hash.file_has_hash(existing_filename, requirement.hash_algorithm, requirement.hash_value)
+
+        to_check = [item for item in work if needs_check(item)]
+        # usually the sidecar lets us skip reading the file, but
+        # when it doesn't, hashing is mostly in C without the GIL.
+        matches = map_in_threads(check, to_check, hash_worker_count())
+        mismatched = set(id(item) for (item, match) in zip(to_check, matches) if not match)
+
+        result = []
+        for item in work:
+            if id(item) in mismatched:
+                (requirement, context, frontend, existing_filename) = item
+                frontend.info("{} does not have the expected {} hash; downloading it again.".format(
+                    existing_filename, requirement.hash_algorithm))
+                item = (requirement, context, frontend, None)
+            result.append(item)
+        return result
+
+    def provide_many(self, requirements_and_contexts):
+        """Override superclass to download the files concurrently.
+
+        At most ANACONDA_PROJECT_CONCURRENT_DOWNLOADS (default 4)
+        files are downloaded at once.
+        """
+        super_results = []
+        frontends = []
+        work = []
+        for (requirement, context) in requirements_and_contexts:
+            super_results.append(super(DownloadProvider, self).provide(requirement, context))
+            frontend = _new_error_recorder(context.frontend)
+            frontends.append(frontend)
+            # we do the download in both prod and dev mode
+            if context.mode != PROVIDE_MODE_CHECK and (requirement.env_var not in context.environ
+                                                       or context.status.analysis.config['source'] == 'download'):
+                work.append((requirement, context, frontend, context.status.analysis.existing_filename))
+
+        work = self._verify_existing(work)
+
+        if len(work) > 0:
+            _ioloop = IOLoop(make_current=False)
+            try:
+                filenames = _ioloop.run_sync(lambda: self._provide_downloads(work))
+            finally:
+                _ioloop.close()
+            for ((requirement, context, frontend, _), filename) in zip(work, filenames):
+                if filename is not None:
+                    context.environ[requirement.env_var] = filename
+
+        return [
+            super_result.copy_with_additions(errors=frontend.pop_errors())
+            for (super_result, frontend) in zip(super_results, frontends)
+        ]
 
     def provide(self, requirement, context):
         """Override superclass to start a download..
@@ -126,24 +265,13 @@ class DownloadProvider(EnvVarProvider):
         requirement's env var to that filename.
 
         """
-        super_result = super(DownloadProvider, self).provide(requirement, context)
-
-        if context.mode == PROVIDE_MODE_CHECK:
-            return super_result
-        # we do the download in both prod and dev mode
-
-        frontend = _new_error_recorder(context.frontend)
-        if requirement.env_var not in context.environ or context.status.analysis.config['source'] == 'download':
-            filename = self._provide_download(requirement, context, frontend)
-            if filename is not None:
-                context.environ[requirement.env_var] = filename
-
-        return super_result.copy_with_additions(errors=frontend.pop_errors())
+        return self.provide_many([(requirement, context)])[0]
 
     def unprovide(self, requirement, environ, local_state_file, overrides, requirement_status=None):
         """Override superclass to delete the downloaded file."""
         project_dir = environ['PROJECT_DIR']
         filename = os.path.abspath(os.path.join(project_dir, requirement.filename))
+        verified_hash.forget_hash(filename)
         try:
             if os.path.isdir(filename):
                 shutil.rmtree(filename)
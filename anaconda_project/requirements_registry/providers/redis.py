@@ -182,12 +182,13 @@ class RedisProvider(EnvVarProvider):
             # for a systemwide Redis. Try looking for a port above
             # it. This is a pretty huge hack and a race condition,
             # but Redis doesn't as far as I know have "let the OS
-            # pick the port" mode.
+            # pick the port" mode. We only try to bind each port,
+            # which is quick and doesn't bother whoever is on it.
             LOWER_PORT = config['lower_port']
             UPPER_PORT = config['upper_port']
             port = LOWER_PORT
             while port <= UPPER_PORT:
-                if not network_util.can_connect_to_socket(host='localhost', port=port):
+                if network_util.can_listen_on_port(port):
                     break
                 port += 1
             if port > UPPER_PORT:
@@ -231,15 +232,19 @@ class RedisProvider(EnvVarProvider):
             if popen.returncode == 0:
                 # now we need to wait for Redis to be ready; we
                 # are not sure whether it will create the port or
-                # pidfile first, so wait for both.
+                # pidfile first, so wait for both. It's usually
+                # ready within a few milliseconds, so we check
+                # often at first and back off from there.
                 port_is_ready = False
                 pidfile_is_ready = False
                 MAX_WAIT_TIME = 10
+                MAX_INCREMENT = MAX_WAIT_TIME / 500.0
+                increment = 0.001
                 so_far = 0
                 while so_far < MAX_WAIT_TIME:
-                    increment = MAX_WAIT_TIME / 500.0
                     time.sleep(increment)
                     so_far += increment
+                    increment = min(increment * 2, MAX_INCREMENT)
                     if not port_is_ready:
                         if network_util.can_connect_to_socket(host='localhost', port=port):
                             port_is_ready = True
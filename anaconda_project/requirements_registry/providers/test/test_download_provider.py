@@ -23,7 +23,10 @@ from anaconda_project.requirements_registry.registry import RequirementsRegistry
 from anaconda_project.requirements_registry.requirements.download import DownloadRequirement
 from anaconda_project.prepare import (prepare_without_interaction, unprepare, prepare_in_stages)
 from anaconda_project import provide
+from anaconda_project.project import Project
 from anaconda_project.project_file import DEFAULT_PROJECT_FILENAME
+from anaconda_project.internal.test.fake_frontend import FakeFrontend
+from anaconda_project.test.test_prepare import _push_fake_env_creator, _pop_fake_env_creator
 
 from tornado import gen
 
@@ -33,6 +36,9 @@ DATAFILE_CONTENT = ("downloads:\n"
                     "        md5: 12345abcdef\n"
                     "        filename: data.csv\n")
 
+# the checksum matches the 'data' that tests write to an existing data.csv
+EXISTING_DATAFILE_CONTENT = DATAFILE_CONTENT.replace("12345abcdef", "8d777f385d3dfec8815d20f7496026dc")
+
 ZIPPED_DATAFILE_CONTENT = ("downloads:\n"
                            "    DATAFILE:\n"
                            "        url: http://localhost/data.zip\n"
@@ -117,6 +123,35 @@ def test_prepare_download_mismatched_checksum_after_download(monkeypatch):
     with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: DATAFILE_CONTENT}, provide_download)
 
 
+def test_prepare_download_resumed(monkeypatch):
+    def provide_download(dirname):
+        @gen.coroutine
+        def mock_downloader_run(self):
+            class Res:
+                pass
+
+            res = Res()
+            res.code = 206
+            with open(os.path.join(dirname, 'data.csv'), 'w') as out:
+                out.write('data')
+            self._hash = '12345abcdef'
+            raise gen.Return(res)
+
+        monkeypatch.setattr("anaconda_project.internal.http_client.FileDownloader.run", mock_downloader_run)
+        try:
+            _push_fake_env_creator()
+            project = Project(dirname, frontend=FakeFrontend())
+            result = prepare_without_interaction(project, environ=minimal_environ(PROJECT_DIR=dirname))
+        finally:
+            _pop_fake_env_creator()
+        assert result
+        assert os.path.join(dirname, 'data.csv') == result.environ['DATAFILE']
+
+    with_directory_contents_completing_project_file(
+        {DEFAULT_PROJECT_FILENAME: "name: blah\nplatforms: [linux-64,osx-64,win-64]\n" + DATAFILE_CONTENT},
+        provide_download)
+
+
 def test_prepare_download_exception(monkeypatch):
     def provide_download(dirname):
         @gen.coroutine
@@ -333,7 +368,7 @@ def test_file_exists(monkeypatch):
 
     with_directory_contents_completing_project_file(
         {
-            DEFAULT_PROJECT_FILENAME: DATAFILE_CONTENT,
+            DEFAULT_PROJECT_FILENAME: EXISTING_DATAFILE_CONTENT,
             DEFAULT_LOCAL_STATE_FILENAME: LOCAL_STATE
         }, provide_download)
 
@@ -576,3 +611,148 @@ def test_configure(monkeypatch):
 downloads:
   FOO: http://example.com/data.csv
     """}, check)
+
+
+THREE_DATAFILES_CONTENT = ("name: blah\n"
+                           "platforms: [linux-32,linux-64,osx-64,win-32,win-64]\n"
+                           "downloads:\n"
+                           "    DATAFILE1: http://localhost/data1.csv\n"
+                           "    DATAFILE2: http://localhost/data2.csv\n"
+                           "    DATAFILE3: http://localhost/data3.csv\n")
+
+
+def test_prepare_downloads_concurrently(monkeypatch):
+    def provide_download(dirname):
+        state = dict(running=0, max_running=0)
+
+        @gen.coroutine
+        def mock_downloader_run(self):
+            class Res:
+                pass
+
+            state['running'] += 1
+            state['max_running'] = max(state['running'], state['max_running'])
+            yield gen.sleep(0.05)
+            state['running'] -= 1
+            res = Res()
+            res.code = 200
+            with open(self._filename, 'w') as out:
+                out.write('data')
+            raise gen.Return(res)
+
+        monkeypatch.setattr("anaconda_project.internal.http_client.FileDownloader.run", mock_downloader_run)
+        monkeypatch.setenv("ANACONDA_PROJECT_CONCURRENT_DOWNLOADS", "2")
+        try:
+            _push_fake_env_creator()
+            project = Project(dirname, frontend=FakeFrontend())
+            result = prepare_without_interaction(project, environ=minimal_environ(PROJECT_DIR=dirname))
+        finally:
+            _pop_fake_env_creator()
+        assert result.errors == []
+        assert result
+        for i in range(1, 4):
+            assert result.environ['DATAFILE%d' % i] == os.path.join(dirname, 'data%d.csv' % i)
+        assert state['max_running'] == 2
+        assert project.frontend.logs == [
+            "Downloading 3 files...", "Finished 1 of 3 downloads (4 bytes so far).",
+            "Finished 2 of 3 downloads (8 bytes so far).", "Finished 3 of 3 downloads (12 bytes so far)."
+        ]
+
+    with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: THREE_DATAFILES_CONTENT},
+                                                    provide_download)
+
+
+def test_prepare_downloads_concurrently_one_fails(monkeypatch):
+    def provide_download(dirname):
+        @gen.coroutine
+        def mock_downloader_run(self):
+            class Res:
+                pass
+
+            yield gen.moment
+            if self._url.endswith('data2.csv'):
+                raise Exception("broken")
+            res = Res()
+            res.code = 200
+            with open(self._filename, 'w') as out:
+                out.write('data')
+            raise gen.Return(res)
+
+        monkeypatch.setattr("anaconda_project.internal.http_client.FileDownloader.run", mock_downloader_run)
+        try:
+            _push_fake_env_creator()
+            project = Project(dirname, frontend=FakeFrontend())
+            result = prepare_without_interaction(project, environ=minimal_environ(PROJECT_DIR=dirname))
+        finally:
+            _pop_fake_env_creator()
+        assert not result
+        assert 'Error downloading http://localhost/data2.csv: broken' in result.errors
+        assert os.path.isfile(os.path.join(dirname, 'data1.csv'))
+        assert not os.path.exists(os.path.join(dirname, 'data2.csv'))
+        assert os.path.isfile(os.path.join(dirname, 'data3.csv'))
+        assert "Finished 3 of 3 downloads (8 bytes so far)." in project.frontend.logs
+
+    with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: THREE_DATAFILES_CONTENT},
+                                                    provide_download)
+
+
+def test_prepare_checks_hash_of_existing_download(monkeypatch):
+    content = ("name: blah\n"
+               "platforms: [linux-32,linux-64,osx-64,win-32,win-64]\n"
+               "downloads:\n"
+               "    DATAFILE:\n"
+               "        url: http://localhost/data.csv\n"
+               "        md5: 8d777f385d3dfec8815d20f7496026dc\n"
+               "        filename: data.csv\n")
+
+    def provide_download(dirname):
+        downloaded = []
+
+        @gen.coroutine
+        def mock_downloader_run(self):
+            class Res:
+                pass
+
+            downloaded.append(self._url)
+            res = Res()
+            res.code = 200
+            with open(self._filename, 'w') as out:
+                out.write('data')
+            self._hash = '8d777f385d3dfec8815d20f7496026dc'
+            raise gen.Return(res)
+
+        monkeypatch.setattr("anaconda_project.internal.http_client.FileDownloader.run", mock_downloader_run)
+        filename = os.path.join(dirname, 'data.csv')
+
+        def prepare():
+            try:
+                _push_fake_env_creator()
+                project = Project(dirname, frontend=FakeFrontend())
+                result = prepare_without_interaction(project, environ=minimal_environ(PROJECT_DIR=dirname))
+            finally:
+                _pop_fake_env_creator()
+            assert result.errors == []
+            assert result
+            return project.frontend.logs
+
+        # the file we have is wrong, so we download it again
+        logs = prepare()
+        assert ("%s does not have the expected md5 hash; downloading it again." % filename) in logs
+        assert ['http://localhost/data.csv'] == downloaded
+        with open(filename) as f:
+            assert f.read() == 'data'
+        assert os.path.isfile(filename + ".verified")
+
+        # next time, the sidecar says the file is fine without reading it
+        def mock_hash_file(filename, algorithm):
+            raise AssertionError("should not have hashed %s" % filename)
+
+        monkeypatch.setattr('anaconda_project.internal.verified_hash.hash_file', mock_hash_file)
+        logs = prepare()
+        assert ("Previously downloaded file located at %s" % filename) in logs
+        assert ['http://localhost/data.csv'] == downloaded
+
+    with_directory_contents_completing_project_file({
+        DEFAULT_PROJECT_FILENAME: content,
+        'data.csv': 'wrong'
+    }, provide_download)
@@ -466,14 +466,29 @@ def _monkeypatch_can_connect_to_socket_always_succeeds_on_nonstandard(monkeypatc
     return can_connect_args_list
 
 
+def _monkeypatch_can_listen_on_port_always_fails(monkeypatch):
+    can_listen_ports = []
+
+    def mock_can_listen_on_port(port):
+        can_listen_ports.append(port)
+        return False
+
+    monkeypatch.setattr("anaconda_project.requirements_registry.network_util.can_listen_on_port",
+                        mock_can_listen_on_port)
+
+    return can_listen_ports
+
+
 def test_fail_to_prepare_local_redis_server_no_port_available(monkeypatch, capsys):
     can_connect_args_list = _monkeypatch_can_connect_to_socket_always_succeeds_on_nonstandard(monkeypatch)
+    can_listen_ports = _monkeypatch_can_listen_on_port_always_fails(monkeypatch)
 
     def start_local_redis(dirname):
         project = project_no_dedicated_env(dirname)
         result = _prepare_printing_errors(project, environ=minimal_environ())
         assert not result
-        assert 73 == len(can_connect_args_list)
+        assert 3 == len(can_connect_args_list)
+        assert list(range(6380, 6450)) == can_listen_ports
 
     with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: """
 services:
@@ -568,12 +583,14 @@ service_options:
 
 def test_redis_server_configure_custom_port_range(monkeypatch, capsys):
     can_connect_args_list = _monkeypatch_can_connect_to_socket_always_succeeds_on_nonstandard(monkeypatch)
+    can_listen_ports = _monkeypatch_can_listen_on_port_always_fails(monkeypatch)
 
     def start_local_redis(dirname):
         project = project_no_dedicated_env(dirname)
         result = _prepare_printing_errors(project, environ=minimal_environ())
         assert not result
-        assert 36 == len(can_connect_args_list)
+        assert 3 == len(can_connect_args_list)
+        assert list(range(7389, 7422)) == can_listen_ports
 
     with_directory_contents_completing_project_file(
         {
@@ -144,7 +144,10 @@ class DownloadRequirement(EnvVarRequirement):
     @property
     def ignore_patterns(self):
         """Override superclass with our ignore patterns."""
-        return set(['/' + self.filename, '/' + self.filename + ".part"])
+        return set([
+            '/' + self.filename, '/' + self.filename + ".part", '/' + self.filename + ".part.json",
+            '/' + self.filename + ".verified"
+        ])
 
     def _why_not_provided(self, environ):
         if self.env_var not in environ:
@@ -34,3 +34,17 @@ def test_cannot_connect_to_socket():
     s.close()
 
     assert not network_util.can_connect_to_socket("127.0.0.1", port)
+
+
+def test_can_listen_on_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+
+    try:
+        # bound but not listening still counts as taken
+        assert not network_util.can_listen_on_port(port)
+    finally:
+        s.close()
+
+    assert network_util.can_listen_on_port(port)
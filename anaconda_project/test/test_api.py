@@ -113,6 +113,25 @@ def test_prepare_project_check(monkeypatch):
     _test_prepare_without_interaction(monkeypatch, 'prepare_project_check', provide.PROVIDE_MODE_CHECK)
 
 
+def test_prepare_all_env_specs(monkeypatch):
+    from anaconda_project.prepare import prepare_all_env_specs_without_interaction
+    _verify_args_match(api.AnacondaProject.prepare_all_env_specs, prepare_all_env_specs_without_interaction)
+
+    params = dict(args=(), kwargs=dict())
+
+    def mock_prepare_all(*args, **kwargs):
+        params['args'] = args
+        params['kwargs'] = kwargs
+        return 42
+
+    monkeypatch.setattr('anaconda_project.prepare.prepare_all_env_specs_without_interaction', mock_prepare_all)
+    p = api.AnacondaProject()
+    kwargs = dict(project=43, environ=57, mode=provide.PROVIDE_MODE_PRODUCTION, workers=3)
+    result = p.prepare_all_env_specs(**kwargs)
+    assert 42 == result
+    assert kwargs == params['kwargs']
+
+
 def test_unprepare(monkeypatch):
     from anaconda_project.prepare import unprepare
     _verify_args_match(api.AnacondaProject.unprepare, unprepare)
@@ -622,7 +641,7 @@ def test_archive(monkeypatch):
     monkeypatch.setattr('anaconda_project.project_ops.archive', mock_archive)
 
     p = api.AnacondaProject()
-    kwargs = dict(project=43, filename=123)
+    kwargs = dict(project=43, filename=123, compression_level=5)
     result = p.archive(**kwargs)
     assert 42 == result
     assert kwargs == params['kwargs']
@@ -168,3 +168,78 @@ def test_file_pattern_matcher_with_directories():
     tests['/foo/'] = tests['/foo']
 
     _test_file_pattern_matcher(tests, is_directory=True)
+
+
+def test_pattern_matcher_matches_any_of_many_patterns():
+    class FakeInfo(object):
+        def __init__(self, path, is_directory):
+            self.unixified_relative_path = path
+            self.is_directory = is_directory
+
+    matcher = archiver._PatternMatcher(
+        [archiver._FilePattern(p) for p in ['*.pyc', '/build', '__pycache__/', 'a?c', '[xy]z']])
+
+    for path in ['foo.pyc', 'bar/foo.pyc', 'build', 'build/lib/foo.py', 'abc', 'foo/adc/bar', 'xz', 'q/yz']:
+        assert matcher.matches(FakeInfo(path, is_directory=False))
+    for path in ['foo.py', 'src/build', 'abcd', 'zz', 'foo.pyc.txt', 'pycache']:
+        assert not matcher.matches(FakeInfo(path, is_directory=False))
+
+    assert matcher.matches(FakeInfo('foo/__pycache__', is_directory=True))
+    assert matcher.matches(FakeInfo('foo/__pycache__/bar', is_directory=True))
+    assert not matcher.matches(FakeInfo('foo/__pycache__', is_directory=False))
+
+    assert not archiver._PatternMatcher([]).matches(FakeInfo('foo', is_directory=False))
+
+
+def test_list_project_skips_ignored_directories(monkeypatch):
+    def check(dirname):
+        visited = []
+        real_scandir = archiver._scandir
+
+        def tracking_scandir(directory):
+            visited.append(os.path.relpath(directory, dirname))
+            return real_scandir(directory)
+
+        monkeypatch.setattr('anaconda_project.archiver._scandir', tracking_scandir)
+
+        frontend = FakeFrontend()
+        infos = archiver._list_project(dirname, lambda info: info.basename == 'envs', frontend)
+        assert [] == frontend.errors
+
+        paths = [info.unixified_relative_path for info in infos]
+        assert sorted(paths) == ['a', 'a/a.txt', 'a/nested', 'a/nested/deep.txt', 'b', 'b/b.txt', 'top.txt']
+        # like os.walk, the top-level entries come before anything inside them
+        assert set(paths[:3]) == set(['a', 'b', 'top.txt'])
+        assert set(info.unixified_relative_path for info in infos if info.is_directory) == set(['a', 'b', 'a/nested'])
+        for info in infos:
+            assert info.full_path == os.path.join(dirname, info.relative_path)
+            assert info.basename == os.path.basename(info.relative_path)
+        assert 'envs' not in visited
+
+    with_directory_contents(
+        {
+            'top.txt': '',
+            'a/a.txt': '',
+            'a/nested/deep.txt': '',
+            'b/b.txt': '',
+            'envs/default/huge.txt': ''
+        }, check)
+
+
+def test_list_project_ignores_unreadable_subdirectory(monkeypatch):
+    def check(dirname):
+        real_scandir = archiver._scandir
+
+        def mock_scandir(directory):
+            if directory.endswith("secret"):
+                raise OSError("NOPE")
+            return real_scandir(directory)
+
+        monkeypatch.setattr('anaconda_project.archiver._scandir', mock_scandir)
+
+        frontend = FakeFrontend()
+        infos = archiver._list_project(dirname, lambda info: False, frontend)
+        assert [] == frontend.errors
+        assert sorted(info.unixified_relative_path for info in infos) == ['ok.txt', 'secret']
+
+    with_directory_contents({'ok.txt': '', 'secret/hidden.txt': ''}, check)
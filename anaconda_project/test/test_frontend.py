@@ -7,6 +7,7 @@
 # -----------------------------------------------------------------------------
 from __future__ import absolute_import
 
+from anaconda_project.frontend import _BufferedFrontend
 from anaconda_project.internal.test.fake_frontend import FakeFrontend
 
 
@@ -39,3 +40,21 @@ def test_partial_messages_with_windows_line_endings():
     # d is stuck in the buffer
     assert frontend.logs == ['a', 'b', 'c']
     assert frontend._info_buf == 'd'
+
+
+def test_buffered_frontend_replays_in_order():
+    buffered = _BufferedFrontend()
+    buffered.info("a")
+    buffered.error("b")
+    buffered.partial_info("c\n")
+
+    frontend = FakeFrontend()
+    buffered.replay(frontend)
+    assert frontend.logs == ['a', 'c']
+    assert frontend.errors == ['b']
+
+    # replaying forgets the messages
+    frontend.reset()
+    buffered.replay(frontend)
+    assert frontend.logs == []
+    assert frontend.errors == []
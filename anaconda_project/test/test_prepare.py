@@ -8,25 +8,33 @@
 from __future__ import absolute_import
 
 from copy import deepcopy
+import json
 import os
 import platform
 import pytest
 import subprocess
 import sys
+import threading
+import time
 
 from anaconda_project.test.environ_utils import minimal_environ, strip_environ
 from anaconda_project.test.project_utils import project_no_dedicated_env
+from anaconda_project.internal.test.fake_frontend import FakeFrontend
 from anaconda_project.internal.test.tmpfile_utils import (with_directory_contents,
                                                           with_directory_contents_completing_project_file)
 from anaconda_project.internal import conda_api
-from anaconda_project.prepare import (prepare_without_interaction, unprepare, prepare_in_stages, PrepareSuccess,
-                                      PrepareFailure, _after_stage_success, _FunctionPrepareStage)
+from anaconda_project.prepare import (prepare_without_interaction, prepare_all_env_specs_without_interaction, unprepare,
+                                      prepare_in_stages, PrepareSuccess, PrepareFailure, _after_stage_success,
+                                      _FunctionPrepareStage)
 from anaconda_project.project import Project
+from anaconda_project.local_state_file import DEFAULT_LOCAL_STATE_FILENAME
 from anaconda_project.project_file import DEFAULT_PROJECT_FILENAME
 from anaconda_project.project_commands import ProjectCommand
-from anaconda_project.requirements_registry.requirement import UserConfigOverrides
+from anaconda_project.requirements_registry.requirement import EnvVarRequirement, UserConfigOverrides
+from anaconda_project.requirements_registry.requirements.conda_env import CondaEnvRequirement
 from anaconda_project.conda_manager import (push_conda_manager_class, pop_conda_manager_class, CondaManager,
-                                            CondaEnvironmentDeviations, CondaLockSet)
+                                            CondaEnvironmentDeviations, CondaLockSet, CondaManagerError)
+from anaconda_project.provide import PROVIDE_MODE_CHECK, PROVIDE_MODE_DEVELOPMENT
 
 
 def _monkeypatch_reduced_environment(monkeypatch):
@@ -168,6 +176,34 @@ variables:
 """}, prepare_some_env_var)
 
 
+def test_prepare_with_trace(monkeypatch):
+    def prepare_with_trace(dirname):
+        trace_file = os.path.join(dirname, "trace.jsonl")
+        monkeypatch.setenv('ANACONDA_PROJECT_TRACE', trace_file)
+        try:
+            _push_fake_env_creator()
+            project = Project(dirname)
+            result = prepare_without_interaction(project, environ=minimal_environ(FOO='bar'))
+            assert result
+        finally:
+            _pop_fake_env_creator()
+
+        with open(trace_file) as f:
+            events = [json.loads(line) for line in f.read().splitlines()]
+        names = [event['name'] for event in events]
+        for name in ("prepare", "stage Set up project.", "check FOO", "recheck CONDA_PREFIX", "provide CONDA_PREFIX",
+                     "sort requirements", "load anaconda-project-local.yml"):
+            assert name in names
+        prepare_event = events[names.index("prepare")]
+        assert prepare_event['args'] == dict(directory=dirname, mode=PROVIDE_MODE_DEVELOPMENT, failed=False)
+        assert events[names.index("check FOO")]['args'] == dict(ok=True)
+
+    with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: """
+variables:
+  FOO: {}
+"""}, prepare_with_trace)
+
+
 def test_prepare_some_env_var_not_set():
     def prepare_some_env_var(dirname):
         project = project_no_dedicated_env(dirname)
@@ -386,6 +422,215 @@ env_specs:
         }, check)
 
 
+def _push_slow_env_creator(fixed, failing=(), wait_seconds=5):
+    state = dict(active=0, most_active=0)
+    lock = threading.Lock()
+    both_started = threading.Event()
+
+    class SlowCondaManager(CondaManager):
+        def __init__(self, frontend):
+            pass
+
+        def resolve_dependencies(self, package_specs, channels, platforms):
+            return CondaLockSet({})
+
+        def find_environment_deviations(self, prefix, spec):
+            missing = () if prefix in fixed else ('something', )
+            return CondaEnvironmentDeviations(summary="missing" if missing else "all good",
+                                              missing_packages=missing,
+                                              wrong_version_packages=(),
+                                              missing_pip_packages=(),
+                                              wrong_version_pip_packages=())
+
+        def fix_environment_deviations(self, prefix, spec, deviations=None, create=True):
+            if prefix in fixed:
+                return
+            with lock:
+                state['active'] += 1
+                state['most_active'] = max(state['most_active'], state['active'])
+                if state['active'] == 2:
+                    both_started.set()
+            # give the other environment a chance to start
+            both_started.wait(wait_seconds)
+            with lock:
+                state['active'] -= 1
+            if spec.name in failing:
+                raise CondaManagerError("Failed to create %s" % spec.name)
+            fixed.append(prefix)
+
+        def remove_packages(self, prefix, packages):
+            pass
+
+    push_conda_manager_class(SlowCondaManager)
+    return state
+
+
+_two_env_specs = """
+name: blah
+platforms: [linux-32,linux-64,osx-64,win-32,win-64]
+env_specs:
+    foo: {}
+    bar: {}
+"""
+
+
+def test_prepare_all_env_specs():
+    def check(dirname):
+        env_var = conda_api.conda_prefix_variable()
+        fixed = []
+        state = _push_slow_env_creator(fixed)
+        try:
+            project = Project(dirname)
+            results = prepare_all_env_specs_without_interaction(project, environ=minimal_environ(), workers=2)
+        finally:
+            pop_conda_manager_class()
+
+        assert ['foo', 'bar'] == [item.env_spec_name for item in results]
+        for item in results:
+            assert item.result.errors == []
+            assert item.result
+            assert item.result.env_spec_name == item.env_spec_name
+            assert item.result.environ[env_var] == project.env_specs[item.env_spec_name].path(dirname)
+            assert item.seconds >= 0
+        # each environment was created once, both at the same time
+        assert sorted(fixed) == sorted(project.env_specs[name].path(dirname) for name in ('foo', 'bar'))
+        assert state['most_active'] == 2
+
+    with_directory_contents({DEFAULT_PROJECT_FILENAME: _two_env_specs}, check)
+
+
+def test_prepare_all_env_specs_inheriting_environment():
+    def check(dirname):
+        env_var = conda_api.conda_prefix_variable()
+        inherited = os.path.join(dirname, "inherited")
+        fixed = []
+        _push_slow_env_creator(fixed, wait_seconds=0.1)
+        try:
+            project = Project(dirname)
+            environ = minimal_environ(**{env_var: inherited})
+            results = prepare_all_env_specs_without_interaction(project, environ=environ, workers=2)
+        finally:
+            pop_conda_manager_class()
+
+        assert all(item.result for item in results)
+        used = [item.result.environ[env_var] for item in results]
+        assert inherited not in fixed
+        # we only created the environments the prepares went on to use
+        assert sorted(fixed) == sorted(used)
+
+    with_directory_contents(
+        {
+            DEFAULT_PROJECT_FILENAME: _two_env_specs,
+            DEFAULT_LOCAL_STATE_FILENAME: "inherit_environment: true\n"
+        }, check)
+
+
+def test_prepare_all_env_specs_output_in_order():
+    def check(dirname):
+        started = []
+        fixed = []
+        both_started = threading.Event()
+
+        class ChattyCondaManager(CondaManager):
+            def __init__(self, frontend):
+                self.frontend = frontend
+
+            def resolve_dependencies(self, package_specs, channels, platforms):
+                return CondaLockSet({})
+
+            def find_environment_deviations(self, prefix, spec):
+                missing = () if prefix in fixed else ('something', )
+                return CondaEnvironmentDeviations(summary="missing" if missing else "all good",
+                                                  missing_packages=missing,
+                                                  wrong_version_packages=(),
+                                                  missing_pip_packages=(),
+                                                  wrong_version_pip_packages=())
+
+            def fix_environment_deviations(self, prefix, spec, deviations=None, create=True):
+                if prefix in fixed:
+                    return
+                self.frontend.partial_info("Creating ")
+                started.append(spec.name)
+                if len(started) == 2:
+                    both_started.set()
+                # both environments are half-way through a line
+                both_started.wait(5)
+                self.frontend.partial_info("%s\n" % spec.name)
+                self.frontend.error("Warning about %s" % spec.name)
+                fixed.append(prefix)
+
+            def remove_packages(self, prefix, packages):
+                pass
+
+        push_conda_manager_class(ChattyCondaManager)
+        try:
+            project = Project(dirname, frontend=FakeFrontend())
+            results = prepare_all_env_specs_without_interaction(project, environ=minimal_environ(), workers=2)
+        finally:
+            pop_conda_manager_class()
+
+        assert all(item.result for item in results)
+        assert ["Creating foo", "Creating bar"] == [line for line in project.frontend.logs if "Creating" in line]
+        assert ["Warning about foo", "Warning about bar"] == project.frontend.errors
+
+    with_directory_contents({DEFAULT_PROJECT_FILENAME: _two_env_specs}, check)
+
+
+def test_prepare_all_env_specs_one_at_a_time():
+    def check(dirname):
+        fixed = []
+        state = _push_slow_env_creator(fixed, wait_seconds=0.1)
+        try:
+            project = Project(dirname)
+            results = prepare_all_env_specs_without_interaction(project, environ=minimal_environ(), workers=1)
+        finally:
+            pop_conda_manager_class()
+
+        assert all(item.result for item in results)
+        assert len(fixed) == 2
+        assert state['most_active'] == 1
+
+    with_directory_contents({DEFAULT_PROJECT_FILENAME: _two_env_specs}, check)
+
+
+def test_prepare_all_env_specs_with_failure():
+    def check(dirname):
+        fixed = []
+        _push_slow_env_creator(fixed, failing=('bar', ))
+        try:
+            project = Project(dirname)
+            results = prepare_all_env_specs_without_interaction(project, environ=minimal_environ(), workers=2)
+        finally:
+            pop_conda_manager_class()
+
+        (foo, bar) = results
+        assert foo.result
+        assert bar.result.failed
+        assert bar.result.errors[0] == "Failed to create bar"
+        # we didn't try to create it a second time
+        assert fixed == [project.env_specs['foo'].path(dirname)]
+
+    with_directory_contents({DEFAULT_PROJECT_FILENAME: _two_env_specs}, check)
+
+
+def test_prepare_all_env_specs_check_mode():
+    def check(dirname):
+        fixed = []
+        _push_slow_env_creator(fixed)
+        try:
+            project = Project(dirname)
+            results = prepare_all_env_specs_without_interaction(project,
+                                                                environ=minimal_environ(),
+                                                                mode=PROVIDE_MODE_CHECK)
+        finally:
+            pop_conda_manager_class()
+
+        assert [item.result.failed for item in results] == [True, True]
+        assert fixed == []
+
+    with_directory_contents({DEFAULT_PROJECT_FILENAME: _two_env_specs}, check)
+
+
 def test_prepare_no_env_specs():
     def check(dirname):
         env_var = conda_api.conda_prefix_variable()
@@ -407,6 +652,104 @@ platforms: [linux-32,linux-64,osx-64,win-32,win-64]
 """}, check)
 
 
+def test_prepare_does_not_recheck_unaffected_requirements(monkeypatch):
+    counts = dict()
+
+    def counting(check_status):
+        def wrapper(self, *args, **kwargs):
+            counts[self.env_var] = counts.get(self.env_var, 0) + 1
+            return check_status(self, *args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(EnvVarRequirement, 'check_status', counting(EnvVarRequirement.check_status))
+    monkeypatch.setattr(CondaEnvRequirement, 'check_status', counting(CondaEnvRequirement.check_status))
+
+    def check(dirname):
+        env_var = conda_api.conda_prefix_variable()
+
+        try:
+            _push_fake_env_creator()
+            project = Project(dirname)
+            environ = minimal_environ(A='a', B='b', C='c')
+            result = prepare_without_interaction(project, environ=environ)
+            assert result.errors == []
+            assert result
+            assert result.environ['D'] == 'd'
+        finally:
+            _pop_fake_env_creator()
+
+        # the env is checked up front, then again after we provide
+        # it; the variables are checked up front and again once
+        # there's an env, and only D (which we provide) is
+        # checked after providing.
+        assert counts == {env_var: 2, 'A': 2, 'B': 2, 'C': 2, 'D': 3}
+
+    with_directory_contents(
+        {
+            DEFAULT_PROJECT_FILENAME:
+            """
+name: blah
+platforms: [linux-32,linux-64,osx-64,win-32,win-64]
+variables:
+  A: {}
+  B: {}
+  C: {}
+  D: { default: 'd' }
+"""
+        }, check)
+
+
+def test_prepare_checks_requirements_concurrently(monkeypatch):
+    state = dict(active=0, most_active=0)
+    lock = threading.Lock()
+    several_started = threading.Event()
+    original_check_status = EnvVarRequirement.check_status
+
+    def slow_check_status(self, *args, **kwargs):
+        with lock:
+            state['active'] += 1
+            state['most_active'] = max(state['most_active'], state['active'])
+            if state['active'] > 1:
+                several_started.set()
+        # wait for company, but don't hang if we're on our own
+        several_started.wait(1)
+        try:
+            # the later requirements finish first
+            time.sleep(0.1 if self.env_var == 'A' else 0.01)
+            return original_check_status(self, *args, **kwargs)
+        finally:
+            with lock:
+                state['active'] -= 1
+
+    monkeypatch.setattr(EnvVarRequirement, 'check_status', slow_check_status)
+
+    def check(dirname):
+        project = project_no_dedicated_env(dirname)
+        stage = prepare_in_stages(project, environ=minimal_environ(A='a', B='b', C='c'), mode=PROVIDE_MODE_CHECK)
+        env_vars = [status.requirement.env_var for status in stage.statuses_before_execute]
+        assert ['A', 'B', 'C', 'CONDA_PREFIX'] == env_vars
+        assert state['most_active'] > 1
+        assert state['active'] == 0
+
+        # and one at a time if asked
+        state['most_active'] = 0
+        several_started.clear()
+        monkeypatch.setenv('ANACONDA_PROJECT_CHECK_WORKERS', '1')
+        stage = prepare_in_stages(project, environ=minimal_environ(A='a', B='b', C='c'), mode=PROVIDE_MODE_CHECK)
+        env_vars = [status.requirement.env_var for status in stage.statuses_before_execute]
+        assert ['A', 'B', 'C', 'CONDA_PREFIX'] == env_vars
+        assert state['most_active'] == 1
+
+    with_directory_contents_completing_project_file(
+        {DEFAULT_PROJECT_FILENAME: """
+variables:
+  A: {}
+  B: {}
+  C: {}
+"""}, check)
+
+
 def test_prepare_use_command_specified_env_spec():
     def check(dirname):
         env_var = conda_api.conda_prefix_variable()
@@ -306,10 +306,10 @@ def test_project_dir_not_readable(monkeypatch):
         project_dir = os.path.join(dirname, 'foo')
         os.makedirs(project_dir)
 
-        def mock_os_walk(dirname):
+        def mock_os_scandir(dirname):
             raise OSError("NOPE")
 
-        monkeypatch.setattr('os.walk', mock_os_walk)
+        monkeypatch.setattr('os.scandir', mock_os_scandir)
 
         project = Project(project_dir)
 
@@ -1711,6 +1711,81 @@ def test_notebook_guess_command_can_be_default():
         check_notebook_guess_command_can_be_default)
 
 
+def test_notebook_guess_command_skips_git_ignored_notebooks():
+    def check(dirname):
+        subprocess.check_call(['git', 'init', '-q'], cwd=dirname)
+        project = project_no_dedicated_env(dirname)
+
+        assert ["%s: No command runs notebook keep.ipynb" % project.project_file.basename] == project.suggestions
+
+    with_directory_contents_completing_project_file(
+        {
+            DEFAULT_PROJECT_FILENAME: "packages: ['notebook']\n",
+            '.gitignore': "scratch*.ipynb\nignored/\n",
+            'keep.ipynb': '{}',
+            'scratch1.ipynb': '{}',
+            'ignored/nested/foo.ipynb': '{}'
+        }, check)
+
+
+def test_notebook_guess_command_cannot_run_git(monkeypatch):
+    def check(dirname):
+        def mock_Popen(*args, **kwargs):
+            raise OSError("no git here")
+
+        monkeypatch.setattr('subprocess.Popen', mock_Popen)
+        project = project_no_dedicated_env(dirname)
+
+        assert ["Failed to run 'git check-ignore'; no git here"] == project.problems
+
+    with_directory_contents_completing_project_file(
+        {
+            DEFAULT_PROJECT_FILENAME: "packages: ['notebook']\n",
+            '.git/HEAD': "ref: refs/heads/master\n",
+            'foo.ipynb': '{}'
+        }, check)
+
+
+def test_notebook_guess_command_reuses_unchanged_directories(monkeypatch):
+    from anaconda_project import archiver
+    from anaconda_project.internal.notebook_index import NotebookIndex
+
+    index = NotebookIndex(None)
+    monkeypatch.setattr(archiver, '_get_notebook_index', lambda: index)
+
+    def age_directories(dirname):
+        an_hour_ago = time.time() - 3600
+        for root, dirs, files in os.walk(dirname):
+            os.utime(root, (an_hour_ago, an_hour_ago))
+
+    def check(dirname):
+        # the first load may write some files, so we do it before
+        # making the directories look old
+        assert [] != project_no_dedicated_env(dirname).suggestions
+        age_directories(dirname)
+        project = project_no_dedicated_env(dirname)
+        assert ["%s: No commands run notebooks a.ipynb, d/d.ipynb" % project.project_file.basename
+                ] == project.suggestions
+        assert (0, 2) == (index.reused, index.listed)
+
+        # loading again, or changing the config, doesn't list anything
+        project = project_no_dedicated_env(dirname)
+        assert [] != project.suggestions
+        assert (2, 0) == (index.reused, index.listed)
+        project.project_file.set_value('description', "Changed")
+        project.use_changes_without_saving()
+        assert ["%s: No commands run notebooks a.ipynb, d/d.ipynb" % project.project_file.basename
+                ] == project.suggestions
+        assert (2, 0) == (index.reused, index.listed)
+
+    with_directory_contents_completing_project_file(
+        {
+            DEFAULT_PROJECT_FILENAME: "packages: ['notebook']\n",
+            'a.ipynb': '{}',
+            'd/d.ipynb': '{}'
+        }, check)
+
+
 def test_notebook_command_jupyter_not_on_path(monkeypatch):
     def check_notebook_command(dirname):
         project = project_no_dedicated_env(dirname)
@@ -34,6 +34,7 @@ from anaconda_project.internal.test.test_conda_api import monkeypatch_conda_not_
 from anaconda_project.test.fake_server import fake_server
 import anaconda_project.internal.keyring as keyring
 import anaconda_project.internal.conda_api as conda_api
+import anaconda_project.internal.verified_hash as verified_hash
 import anaconda_project.internal.plugins as plugins_api
 
 
@@ -1511,6 +1512,50 @@ env_specs:
         }, check)
 
 
+def test_verify_downloads(monkeypatch):
+    def check(dirname):
+        project = project_no_dedicated_env(dirname)
+        good = os.path.join(dirname, "good.csv")
+        bad = os.path.join(dirname, "bad.csv")
+        # a stale sidecar says the bad file is fine, but we don't trust it
+        verified_hash.record_hash(bad, 'md5', '8d777f385d3dfec8815d20f7496026dc')
+
+        status = project_ops.verify_downloads(project)
+        assert not status
+        assert status.status_description == "Some downloaded files failed verification."
+        assert ["%s does not have the expected md5 hash; removed it." % bad] == status.errors
+        assert ["Verified %s." % good] == project.frontend.logs
+        assert os.path.isfile(good)
+        assert os.path.isfile(good + ".verified")
+        assert not os.path.exists(bad)
+        assert not os.path.exists(bad + ".verified")
+
+        project.frontend.reset()
+        status = project_ops.verify_downloads(project)
+        assert status
+        assert status.status_description == "Verified 1 downloaded files."
+
+    with_directory_contents_completing_project_file(
+        {
+            DEFAULT_PROJECT_FILENAME: """
+downloads:
+  GOOD:
+    url: "http://localhost:123456/good.csv"
+    md5: 8d777f385d3dfec8815d20f7496026dc
+  BAD:
+    url: "http://localhost:123456/bad.csv"
+    md5: 8d777f385d3dfec8815d20f7496026dc
+  NO_CHECKSUM: "http://localhost:123456/no_checksum.csv"
+  NOT_DOWNLOADED:
+    url: "http://localhost:123456/not_downloaded.csv"
+    md5: 8d777f385d3dfec8815d20f7496026dc
+""",
+            "good.csv": "data",
+            "bad.csv": "wrong",
+            "no_checksum.csv": "whatever"
+        }, check)
+
+
 # the other add_env_spec tests use a mock CondaManager, but we want to have
 # one test that does the real thing to be sure it works. Furthermore, we want
 # to exercise the logic that ensures anaconda-project can properly pin package
@@ -2906,6 +2951,51 @@ env_specs:
         }, check)
 
 
+def test_update_does_not_use_cached_solves(monkeypatch):
+    def check(dirname):
+        forgotten = []
+
+        def mock_forget(pkgs, channels, platform):
+            forgotten.append((tuple(pkgs), tuple(channels), platform))
+
+        monkeypatch.setattr('anaconda_project.internal.conda_api.forget_resolved_dependencies', mock_forget)
+
+        def attempt():
+            project = Project(dirname, frontend=FakeFrontend())
+
+            status = project_ops.lock(project, env_spec_name='foo')
+            assert status
+            assert [] == forgotten
+
+            status = project_ops.update(project, env_spec_name='foo')
+            assert status
+            assert [(('a', ), (), 'linux-64'), (('a', ), (), 'win-64')] == forgotten
+
+        _with_conda_test(attempt, resolve_dependencies={'all': ['a=1.0=1']})
+
+    with_directory_contents(
+        {
+            DEFAULT_PROJECT_FILENAME:
+            """
+name: locktest
+platforms: [linux-64,win-64]
+env_specs:
+  foo:
+    packages:
+      - a
+""",
+            DEFAULT_PROJECT_LOCK_FILENAME:
+            """
+locking_enabled: true
+env_specs:
+  foo:
+    platforms: [linux-64,win-64]
+    packages:
+      all: ['a=1.0=1']
+"""
+        }, check)
+
+
 def test_lock_conda_error():
     def check(dirname):
         def attempt():
@@ -3898,6 +3988,108 @@ services:
     with_directory_contents_completing_project_file(dict(), archivetest)
 
 
+def test_archive_tar_xz():
+    def archivetest(archive_dest_dir):
+        archivefile = os.path.join(archive_dest_dir, "foo.tar.xz")
+
+        def check(dirname):
+            project = project_no_dedicated_env(dirname)
+            status = project_ops.archive(project, archivefile, compression_level=1)
+
+            assert status
+            with open(archivefile, 'rb') as f:
+                assert f.read(6) == b"\xfd7zXZ\x00"
+            _assert_tar_contains(archivefile, ['foo.py', 'anaconda-project.yml', 'anaconda-project-local.yml'])
+
+        with_directory_contents_completing_project_file(
+            {
+                DEFAULT_PROJECT_FILENAME: "name: archivedproj\n",
+                "foo.py": "print('hello')\n"
+            }, check)
+
+    with_directory_contents_completing_project_file(dict(), archivetest)
+
+
+def test_archive_tar_compressed_on_threads_can_be_unarchived(monkeypatch):
+    from anaconda_project.internal import compression
+
+    monkeypatch.setenv('ANACONDA_PROJECT_COMPRESS_WORKERS', '3')
+    # lots of small blocks so several threads get some
+    monkeypatch.setattr(compression, '_GZIP_BLOCK_SIZE', 1000)
+    monkeypatch.setattr(compression, '_BZ2_BLOCK_SIZE', 1000)
+
+    contents = dict(("data/file%d.txt" % i, ("line %d\n" % i) * (i * 50)) for i in range(20))
+
+    def archivetest(archive_dest_dir):
+        def check(dirname):
+            project = project_no_dedicated_env(dirname)
+            for suffix in (".tar.gz", ".tar.bz2"):
+                archivefile = os.path.join(archive_dest_dir, "foo" + suffix)
+                status = project_ops.archive(project, archivefile, compression_level=6)
+                assert status
+
+                unpacked = os.path.join(archive_dest_dir, "unpacked" + suffix)
+                status = project_ops.unarchive(archivefile, unpacked)
+                assert status.errors == []
+                assert status
+                for (name, text) in contents.items():
+                    with codecs.open(os.path.join(unpacked, name), 'r', 'utf-8') as f:
+                        assert f.read() == text
+
+        with_directory_contents_completing_project_file(contents, check)
+
+    with_directory_contents(dict(), archivetest)
+
+
+def test_archive_zip_with_compression_level():
+    def archivetest(archive_dest_dir):
+        archivefile = os.path.join(archive_dest_dir, "foo.zip")
+
+        def check(dirname):
+            project = project_no_dedicated_env(dirname)
+            status = project_ops.archive(project, archivefile, compression_level=9)
+            assert status
+
+            with zipfile.ZipFile(archivefile, mode='r') as zf:
+                types = dict((os.path.basename(info.filename), info.compress_type) for info in zf.infolist())
+            assert types['foo.py'] == zipfile.ZIP_DEFLATED
+            # already compressed, so stored as-is
+            assert types['picture.png'] == zipfile.ZIP_STORED
+
+            # by default we store everything, like we always have
+            status = project_ops.archive(project, archivefile)
+            assert status
+            with zipfile.ZipFile(archivefile, mode='r') as zf:
+                assert set(info.compress_type for info in zf.infolist()) == set([zipfile.ZIP_STORED])
+
+        with_directory_contents_completing_project_file(
+            {
+                DEFAULT_PROJECT_FILENAME: "name: archivedproj\n",
+                "foo.py": "print('hello')\n" * 100,
+                "picture.png": "not really a png"
+            }, check)
+
+    with_directory_contents_completing_project_file(dict(), archivetest)
+
+
+def test_archive_with_bad_compression_level():
+    def archivetest(archive_dest_dir):
+        archivefile = os.path.join(archive_dest_dir, "foo.tar.gz")
+
+        def check(dirname):
+            project = project_no_dedicated_env(dirname)
+            status = project_ops.archive(project, archivefile, compression_level=10)
+
+            assert not status
+            assert status.status_description == "Can't create an archive."
+            assert status.errors == ["Compression level must be from 0 to 9, not 10."]
+            assert not os.path.exists(archivefile)
+
+        with_directory_contents_completing_project_file({DEFAULT_PROJECT_FILENAME: "name: archivedproj\n"}, check)
+
+    with_directory_contents_completing_project_file(dict(), archivetest)
+
+
 def test_archive_cannot_write_destination_path(monkeypatch):
     def archivetest(archive_dest_dir):
         archivefile = os.path.join(archive_dest_dir, "foo.zip")
@@ -4075,10 +4267,10 @@ def test_archive_zip_with_inability_to_walk_directory(monkeypatch):
             project = project_no_dedicated_env(dirname)
             assert project.problems == []
 
-            def mock_os_walk(dirname):
+            def mock_os_scandir(dirname):
                 raise OSError("NOPE")
 
-            monkeypatch.setattr('os.walk', mock_os_walk)
+            monkeypatch.setattr('os.scandir', mock_os_scandir)
 
             status = project_ops.archive(project, archivefile)
 
@@ -4152,7 +4344,7 @@ def test_archive_with_bogus_filename(monkeypatch):
 
             assert not status
             assert not os.path.exists(archivefile)
-            assert status.status_description == "Project archive filename must be a .zip, .tar.gz, or .tar.bz2."
+            assert status.status_description == "Project archive filename must be a .zip, .tar.gz, .tar.bz2, or .tar.xz."
             assert status.errors == ["Unsupported archive filename %s." % archivefile]
 
         with_directory_contents_completing_project_file(
@@ -4233,7 +4425,9 @@ downloads:
 """,
                 "foo.py": "print('hello')\n",
                 'downloaded.py': 'print("ignore me!")',
-                'downloaded.py.part': ''
+                'downloaded.py.part': '',
+                'downloaded.py.part.json': '',
+                'downloaded.py.verified': ''
             }), check)
 
     with_directory_contents_completing_project_file(dict(), archivetest)
@@ -4331,6 +4525,9 @@ def _make_tar(archive_dest_dir, contents, compression=None):
     elif compression == 'bz2':
         mode = mode + ':bz2'
         extension = extension + '.bz2'
+    elif compression == 'xz':
+        mode = mode + ':xz'
+        extension = extension + '.xz'
 
     # the tarfile API only lets us put in files, so we need
     # files to put in
@@ -4403,6 +4600,10 @@ def test_unarchive_tar_bz2():
     _test_unarchive_tar(compression='bz2')
 
 
+def test_unarchive_tar_xz():
+    _test_unarchive_tar(compression='xz')
+
+
 def test_unarchive_zip():
     def archivetest(archive_dest_dir):
         archivefile = _make_zip(archive_dest_dir, {
@@ -4430,6 +4631,35 @@ def test_unarchive_zip():
     with_directory_contents(dict(), archivetest)
 
 
+def test_unarchive_zip_writes_files_directly(monkeypatch):
+    def archivetest(archive_dest_dir):
+        archivefile = _make_zip(archive_dest_dir, {'a/a.txt': _CONTENTS_FILE, 'a/q/b.txt': _CONTENTS_FILE})
+
+        def check(dirname):
+            def mock_mkdtemp(*args, **kwargs):
+                raise AssertionError("should not extract to a temporary directory")
+
+            monkeypatch.setattr('tempfile.mkdtemp', mock_mkdtemp)
+            monkeypatch.setattr('shutil.copy2', mock_mkdtemp)
+
+            unpacked = os.path.join(dirname, "foo")
+            frontend = FakeFrontend()
+            status = project_ops.unarchive(archivefile, unpacked, frontend=frontend)
+
+            assert status.errors == []
+            assert status
+            _assert_dir_contains(unpacked, ['a.txt', 'q/b.txt'])
+            with codecs.open(os.path.join(unpacked, 'q', 'b.txt'), 'r', 'utf-8') as f:
+                assert f.read() == "hello"
+            assert frontend.logs[-1].startswith("Unpacked 2 files (0.0 MB) in ")
+            assert frontend.logs[-1].endswith(" MB/s).")
+            monkeypatch.undo()
+
+        with_directory_contents(dict(), check)
+
+    with_directory_contents(dict(), archivetest)
+
+
 def test_unarchive_zip_to_current_directory():
     def archivetest(archive_dest_dir):
         archivefile = _make_zip(archive_dest_dir, {
@@ -4564,7 +4794,7 @@ def test_unarchive_error_on_bad_extension():
             unpacked = os.path.join(dirname, "foo")
             status = project_ops.unarchive(archivefile, unpacked)
 
-            message = "Unsupported archive filename %s, must be a .zip, .tar.gz, or .tar.bz2" % archivefile
+            message = "Unsupported archive filename %s, must be a .zip, .tar.gz, .tar.bz2, or .tar.xz" % archivefile
             assert status.errors == [message]
             assert not status
             assert not os.path.isdir(unpacked)
@@ -4979,10 +5209,10 @@ def test_upload_cannot_walk_directory(monkeypatch):
         project = project_no_dedicated_env(dirname)
         assert [] == project.problems
 
-        def mock_os_walk(dirname):
+        def mock_os_scandir(dirname):
             raise OSError("NOPE")
 
-        monkeypatch.setattr('os.walk', mock_os_walk)
+        monkeypatch.setattr('os.scandir', mock_os_scandir)
 
         status = project_ops.upload(project, site='unit_test')
         assert not status
@@ -5,6 +5,7 @@
 # Licensed under the terms of the BSD 3-Clause License.
 # The full license is in the file LICENSE.txt, distributed with this software.
 # -----------------------------------------------------------------------------
+from anaconda_project import yaml_file
 from anaconda_project.yaml_file import YamlFile
 from anaconda_project.internal.test.tmpfile_utils import with_file_contents, with_directory_contents
 
@@ -401,6 +402,7 @@ e:
     def check_roundtrip(filename):
         yaml = YamlFile(filename)
         yaml._previous_content = "not the actual previous content"
+        yaml._dirty = True
         yaml.save()
         new_content = open(filename, 'r').read()
         print("the re-saved version of the file was:")
@@ -499,3 +501,78 @@ def test_read_yaml_file_and_set_get_empty_string():
         assert value == ' '
 
     with_file_contents("", check)
+
+
+def test_load_from_cache_then_modify(monkeypatch):
+    def check_cached(dirname):
+        monkeypatch.setenv('ANACONDA_PROJECT_YAML_CACHE_DIR', os.path.join(dirname, "cache"))
+        filename = os.path.join(dirname, "foo.yaml")
+        with open(filename, 'w') as f:
+            f.write("# comment\na:\n  b: c\n")
+
+        first = YamlFile(filename)
+        assert first._yaml is not None
+        time1 = os.path.getmtime(filename)
+
+        yaml = YamlFile(filename)
+        # nothing parsed the round-trip tree yet
+        assert yaml._yaml is None
+        assert yaml.get_read_only_value(["a", "b"]) == "c"
+        assert yaml.read_only_root == dict(a=dict(b="c"))
+        assert not yaml.has_unsaved_changes
+        yaml.save()
+        assert time1 == os.path.getmtime(filename)
+        assert yaml._yaml is None
+
+        yaml.set_value(["a", "d"], "e")
+        assert yaml._yaml is not None
+        assert yaml.get_read_only_value(["a", "d"]) == "e"
+        yaml.save()
+        assert open(filename).read() == "# comment\na:\n  b: c\n  d: e\n"
+
+        # a disabled cache always parses
+        monkeypatch.setenv('ANACONDA_PROJECT_DISABLE_YAML_CACHE', '1')
+        assert YamlFile(filename)._yaml is not None
+
+    with_directory_contents(dict(), check_cached)
+
+
+def test_dump_only_when_maybe_changed(monkeypatch):
+    def check_dumps(filename):
+        yaml = YamlFile(filename)
+
+        real_dump_string = yaml_file._dump_string
+        dumps = []
+
+        def counting_dump_string(tree):
+            dumps.append(tree)
+            return real_dump_string(tree)
+
+        monkeypatch.setattr('anaconda_project.yaml_file._dump_string', counting_dump_string)
+
+        assert yaml.get_value(["a", "b"]) == "c"
+        assert not yaml.has_unsaved_changes
+        yaml.save()
+        assert len(dumps) == 0
+
+        yaml.unset_value(["a", "nope"])
+        assert not yaml.has_unsaved_changes
+        assert len(dumps) == 0
+
+        yaml.set_value(["a", "b"], "d")
+        yaml.save()
+        assert len(dumps) == 1
+        yaml.save()
+        assert len(dumps) == 1
+
+        # someone could modify what we hand out, so now we have to check
+        yaml.get_value("a")["b"] = "e"
+        assert yaml.has_unsaved_changes
+        yaml.save()
+        assert len(dumps) == 3
+        assert YamlFile(filename).get_value(["a", "b"]) == "e"
+
+    with_file_contents("""
+a:
+  b: c
+""", check_dumps)
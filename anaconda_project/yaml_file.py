@@ -30,8 +30,10 @@ import codecs
 import errno
 import os
 import sys
+import threading
 import uuid
 
+from anaconda_project.internal import solve_cache, trace, yaml_cache
 from anaconda_project.internal.makedirs import makedirs_ok_if_exists
 from anaconda_project.internal.rename import rename_over_existing
 from anaconda_project.internal.py2_compat import is_string
@@ -94,6 +96,20 @@ def _save_file(yaml, filename, contents=None):
     _atomic_replace(filename, contents)
 
 
+_yaml_cache = None
+
+
+def _get_yaml_cache():
+    global _yaml_cache
+
+    if os.environ.get('ANACONDA_PROJECT_DISABLE_YAML_CACHE', '') != '':
+        return None
+    directory = os.environ.get('ANACONDA_PROJECT_YAML_CACHE_DIR', '') or solve_cache.default_directory("yaml")
+    if _yaml_cache is None or _yaml_cache.directory != directory:
+        _yaml_cache = yaml_cache.YamlCache(directory, parser_version=getattr(ryaml, '__version__', ''))
+    return _yaml_cache
+
+
 def _block_style_all_nodes(yaml):
     if hasattr(yaml, 'fa'):
         yaml.fa.set_block_style()
@@ -135,6 +151,9 @@ class YamlFile(object):
         self.filename = filename
         self._previous_content = ""
         self._change_count = 0
+        # requirement status checks can read the file from
+        # several threads, and any of them may build the tree
+        self._round_trip_lock = threading.Lock()
         self.load()
 
     def load(self):
@@ -148,23 +167,50 @@ class YamlFile(object):
         Returns:
             None
         """
+        with trace.span("load " + self.basename, "yaml", filename=self.filename) as span_args:
+            self._load()
+            span_args['from_cache'] = self._plain is not None
+            span_args['corrupted'] = self._corrupted
+
+    def _load(self):
         self._corrupted = False
         self._corrupted_error_message = None
         self._corrupted_maybe_line = None
         self._corrupted_maybe_column = None
         self._change_count = self._change_count + 1
+        # when we load from the cache, we don't parse the round-trip
+        # tree until someone might modify it; until then we have
+        # only the plain values from the cache
+        self._yaml = None
+        self._plain = None
+        self._contents = None
+        # set_value() and friends mark the file dirty; but once
+        # get_value() or root hands out part of the round-trip tree,
+        # the caller could change it, so only a dump can tell us
+        # whether the file changed
+        self._dirty = False
+        self._handed_out = False
 
         try:
             with codecs.open(self.filename, 'r', 'utf-8') as file:
                 contents = file.read()
-            self._yaml = _load_string(contents)
-
-            # we re-dump instead of using "contents" because
-            # when loading a hand-edited file, we may reformat
-            # in trivial ways because our round-tripping isn't perfect,
-            # and we don't want to count those trivial reformats as
-            # a reason to save.
-            self._previous_content = _dump_string(self._yaml)
+            cache = _get_yaml_cache()
+            cached = None if cache is None else cache.get(contents)
+            if cached is None:
+                self._yaml = _load_string(contents)
+
+                # we re-dump instead of using "contents" because
+                # when loading a hand-edited file, we may reformat
+                # in trivial ways because our round-tripping isn't perfect,
+                # and we don't want to count those trivial reformats as
+                # a reason to save.
+                self._previous_content = _dump_string(self._yaml)
+                if cache is not None:
+                    cache.put(contents, self._yaml, self._previous_content)
+            else:
+                (self._plain, self._cached_dump) = cached
+                self._previous_content = self._cached_dump
+                self._contents = contents
         except IOError as e:
             if e.errno == errno.ENOENT:
                 self._yaml = None
@@ -184,7 +230,7 @@ class YamlFile(object):
                     self._corrupted_maybe_column = mark.column
             self._yaml = None
 
-        if self._yaml is None:
+        if self._yaml is None and self._plain is None:
             if self._corrupted:
                 # don't want to throw exceptions if people get_value()
                 # so stick an empty dict in here
@@ -194,10 +240,39 @@ class YamlFile(object):
                 self._fill_default_content(self._yaml)
                 # make it pretty
                 _block_style_all_nodes(self._yaml)
-                if not self._save_default_content():
+                if self._save_default_content():
+                    self._dirty = True
+                else:
                     # pretend we already saved
                     self._previous_content = _dump_string(self._yaml)
 
+    def _round_trip(self):
+        # the tree we can modify and save, parsed now if we loaded from the cache.
+        # We keep _plain around because another thread may be in _read_only()
+        if self._yaml is None:
+            with self._round_trip_lock:
+                if self._yaml is None:
+                    self._yaml = _load_string(self._contents)
+        return self._yaml
+
+    def _read_only(self):
+        if self._yaml is None:
+            return self._plain
+        else:
+            return self._yaml
+
+    def _hand_out(self, value):
+        if isinstance(value, (dict, list)):
+            self._handed_out = True
+        return value
+
+    def _dump(self):
+        if self._yaml is None:
+            # nothing can have changed if we haven't parsed the round-trip tree
+            return self._cached_dump
+        else:
+            return _dump_string(self._yaml)
+
     def _load_template(self):
         # ruamel.yaml returns None if you load an empty file,
         # so we have to build this ourselves
@@ -280,8 +355,10 @@ class YamlFile(object):
     @property
     def has_unsaved_changes(self):
         """Get whether changes are all saved."""
+        if not (self._dirty or self._handed_out):
+            return False
         # this is a fairly expensive check
-        return self._previous_content != _dump_string(self._yaml)
+        return self._previous_content != self._dump()
 
     def use_changes_without_saving(self):
         """Apply any in-memory changes as if we'd saved, but don't actually save.
@@ -301,11 +378,16 @@ class YamlFile(object):
         """
         self._throw_if_corrupted()
 
-        contents = _dump_string(self._yaml)
+        if not (self._dirty or self._handed_out):
+            return
+
+        contents = self._dump()
         if contents != self._previous_content:
-            _save_file(self._yaml, self.filename, contents)
+            with trace.span("save " + self.basename, "yaml", filename=self.filename):
+                _save_file(self._yaml, self.filename, contents)
             self._change_count = self._change_count + 1
             self._previous_content = contents
+        self._dirty = False
 
     @classmethod
     def _path(cls, path):
@@ -317,8 +399,8 @@ class YamlFile(object):
             except TypeError:
                 raise ValueError("YAML file path must be a string or an iterable of strings")
 
-    def _get_dict_or_none(self, pieces):
-        current = self._yaml
+    def _get_dict_or_none(self, root, pieces):
+        current = root
         for p in pieces:
             if p in current and isinstance(current[p], dict):
                 current = current[p]
@@ -329,13 +411,14 @@ class YamlFile(object):
     def _ensure_dicts_at_path(self, pieces):
         self._throw_if_corrupted()
 
-        current = self._yaml
+        current = self._round_trip()
         for p in pieces:
             if p not in current or not isinstance(current[p], dict):
                 # It's important to use CommentedMap because it preserves
                 # order.
                 current[p] = CommentedMap()
                 _block_style_all_nodes(current[p])
+                self._dirty = True
 
             current = current[p]
         return current
@@ -356,6 +439,7 @@ class YamlFile(object):
         path = self._path(path)
         existing = self._ensure_dicts_at_path(path[:-1])
         existing[path[-1]] = value
+        self._dirty = True
 
     def unset_value(self, path):
         """Remove a single value at the given path.
@@ -369,10 +453,11 @@ class YamlFile(object):
 
         path = self._path(path)
 
-        existing = self._get_dict_or_none(path[:-1])
+        existing = self._get_dict_or_none(self._round_trip(), path[:-1])
         key = path[-1]
         if existing is not None and key in existing:
             del existing[key]
+            self._dirty = True
 
     def get_value(self, path, default=None):
         """Get a single value from the YAML file.
@@ -385,7 +470,28 @@ class YamlFile(object):
             the value from the file or the provided default
         """
         path = self._path(path)
-        existing = self._get_dict_or_none(path[:-1])
+        existing = self._get_dict_or_none(self._round_trip(), path[:-1])
+        if existing is None or path[-1] not in existing:
+            return default
+        else:
+            return self._hand_out(existing[path[-1]])
+
+    def get_read_only_value(self, path, default=None):
+        """Get a single value from the YAML file, which the caller must not modify.
+
+        This is like ``get_value()``, but if the file came from the
+        parse cache, it may return plain dicts and lists without
+        parsing the file's comments and formatting.
+
+        Args:
+            path (str or list of str): single key, or list of nested keys
+            default: any YAML-compatible value type
+
+        Returns:
+            the value from the file or the provided default
+        """
+        path = self._path(path)
+        existing = self._get_dict_or_none(self._read_only(), path[:-1])
         if existing is None:
             return default
         else:
@@ -396,4 +502,14 @@ class YamlFile(object):
         """Get the outermost value from the yaml file."""
         self._throw_if_corrupted()
 
-        return self._yaml
+        return self._hand_out(self._round_trip())
+
+    @property
+    def read_only_root(self):
+        """Get the outermost value from the yaml file, which the caller must not modify.
+
+        See ``get_read_only_value()``.
+        """
+        self._throw_if_corrupted()
+
+        return self._read_only()
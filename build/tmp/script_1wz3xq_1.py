@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+import os
+import sys
+
+print("hello")
+sys.stdout.flush()
+# write some garbage
+os.write(sys.stdout.fileno(), b"\x42\xff\xef\xaa\x00\x01\xcc")
+sys.stdout.flush()
+print("goodbye")
+sys.stdout.flush()
+
+sys.exit(0)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+import sys
+
+print("a")
+print("b", file=sys.stderr)
+
+sys.exit(0)
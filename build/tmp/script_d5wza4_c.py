@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+import sys
+import time
+
+def flush():
+    time.sleep(0.05)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+print("a")
+flush()
+print("x", file=sys.stderr)
+flush()
+print("b")
+flush()
+print("y", file=sys.stderr)
+flush()
+print("c")
+flush()
+print("z", file=sys.stderr)
+flush()
+print("d")
+flush()
+# print partial lines with multiple syscalls
+for i in [1,2,3,4,5,6]:
+  sys.stdout.write("%d" % i)
+sys.stdout.write("\n")
+# print unicode stuff, throws exception on Windows
+try:
+    print("💯 🌟")
+    flush()
+except Exception:
+    print("Windows")
+# print many lines at once, and end on non-newline
+sys.stdout.write("1\n2\n3\n4\n5\n6")
+flush()
+
+sys.exit(2)
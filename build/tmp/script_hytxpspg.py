@@ -0,0 +1,4 @@
+from __future__ import print_function
+import sys
+print("TEST_ERROR", file=sys.stderr)
+sys.exit(1)
@@ -0,0 +1,8 @@
+from __future__ import print_function
+import os
+import sys
+
+print("hello")
+sys.stdout.flush()
+
+sys.exit(0)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+# a multibyte character will land on the boundary of some chunk
+line = (u"💯" * 1000 + u"\n").encode('utf-8')
+for i in range(300):
+    os.write(sys.stdout.fileno(), line)
+os.write(sys.stderr.fileno(), b"done")
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+# a multibyte character will land on the boundary of some chunk
+data = ((u"💯" * 1000 + u"\n") * 300).encode('utf-8')
+while len(data) > 0:
+    data = data[os.write(sys.stdout.fileno(), data):]
+os.write(sys.stderr.fileno(), b"done")
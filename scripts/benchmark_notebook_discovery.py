@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Copyright (c) 2017, Anaconda, Inc. All rights reserved.
+#
+# Licensed under the terms of the BSD 3-Clause License.
+# The full license is in the file LICENSE.txt, distributed with this software.
+# -----------------------------------------------------------------------------
+"""Time notebook discovery on a synthetic project with lots of data files.
+
+Compares the full walk we use for archives with the notebook index
+that project loading uses, both on a cold index and a warm one.
+"""
+
+from __future__ import print_function
+
+# Standard library imports
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Local imports
+HERE = os.path.abspath(os.path.dirname(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from anaconda_project import archiver  # noqa: E402
+from anaconda_project.internal.notebook_index import NotebookIndex  # noqa: E402
+
+
+def make_project(directory, file_count, files_per_directory):
+    """Create a project with file_count data files and a few notebooks."""
+    with open(os.path.join(directory, "anaconda-project.yml"), 'w') as f:
+        f.write("name: benchmark\n")
+    for name in ("analysis.ipynb", "notebooks/explore.ipynb", "notebooks/deep/report.ipynb"):
+        path = os.path.join(directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write("{}")
+    for i in range(file_count):
+        subdir = os.path.join(directory, "data", "part%d" % (i // (files_per_directory * 10)),
+                              "chunk%d" % (i // files_per_directory))
+        if i % files_per_directory == 0:
+            os.makedirs(subdir)
+        with open(os.path.join(subdir, "record%d.csv" % i), 'w'):
+            pass
+
+    # so the index will trust all the directories
+    an_hour_ago = time.time() - 3600
+    for root, dirs, files in os.walk(directory):
+        os.utime(root, (an_hour_ago, an_hour_ago))
+
+
+def timed(label, func):
+    """Run func and print how long it took."""
+    start = time.time()
+    result = func()
+    print("%-40s %8.3f seconds" % (label, time.time() - start))
+    return result
+
+
+def main():
+    """Build the synthetic project and print timings."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=500000, help="number of data files (default 500000)")
+    parser.add_argument('--files-per-directory', type=int, default=1000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="anaconda-project-benchmark-")
+    try:
+        timed("create %d files" % args.files, lambda: make_project(directory, args.files, args.files_per_directory))
+        frontend = archiver._new_error_recorder(None)
+
+        infos = timed("full walk (archive listing)",
+                      lambda: archiver._enumerate_archive_files(directory, frontend, requirements=[]))
+        walked = sorted(info.unixified_relative_path for info in infos if info.basename.endswith(".ipynb"))
+
+        index = NotebookIndex(directory=None)
+        archiver._get_notebook_index = lambda: index
+        cold = timed("notebook index, cold",
+                     lambda: archiver._list_unignored_notebooks(directory, frontend, requirements=[]))
+        print("  listed %d directories" % index.listed)
+        warm = timed("notebook index, warm",
+                     lambda: archiver._list_unignored_notebooks(directory, frontend, requirements=[]))
+        print("  listed %d directories, reused %d" % (index.listed, index.reused))
+
+        assert walked == cold == warm, (walked, cold, warm)
+        print("found %d notebooks" % len(warm))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()